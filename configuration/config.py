@@ -8,6 +8,22 @@ class ProcessingStrategy(Enum):
     ALL_FRAMES_ALL_PROCESSES = 3
 
 
+class SerializationFormat(Enum):
+    PICKLE = 1
+    BINARY = 2  # versioned PipeData wire format, see ipc/pipe_data_codec.py
+
+
+class IpcBackend(Enum):
+    RUST = 1  # compiled rs_ipc wheel
+    PYTHON = 2  # ipc/shared_message.py, for hosts where rs_ipc can't be built
+
+
+class DetectionBackend(Enum):
+    ULTRALYTICS = 1  # the .pt model through ultralytics (torch, uses the gpu when available)
+    ONNX = 2  # exported once to ONNX, run by ONNX Runtime on the cpu
+    OPENVINO = 3  # exported once to OpenVINO IR, run by OpenVINO on the cpu
+
+
 class Config:
     # Directories
     models_dir_path = "configuration/models/"
@@ -26,6 +42,7 @@ class Config:
     # video_name = "Benchmarking-17min.mp4"
     color_channels = 3
     camera_fps = 0  # 0 means uncapped fps
+    camera_prefetch_count = 4  # frames the camera decodes ahead of the pacing
     output_fps = 60
     width = 1280
     height = 720
@@ -36,22 +53,95 @@ class Config:
 
     save_processed_video = True
     enable_pipeline_visualization = True
+    # Debug imagery goes over its own lossy channel per pipeline (see ipc/debug_frames.py)
+    debug_frame_downscale = 2
+    debug_frame_jpeg_quality = 0  # 1-100 JPEG encodes the debug frames, 0 sends raw pixels
+    # The filters only render debug frames while a subscriber renews its request (see ipc/render_demand.py)
+    debug_frame_lease = 1.0
+    # Runs of preprocessing filters (roi, grayscale, canny_edge, blur, dilation) run as one FusedPreprocessFilter,
+    # opt-in: it replaces the configured filters of every pipeline
+    fuse_preprocessing_filters = False
+    # Pipelines with "pipelined" run every filter on its own thread, frames waiting in front of every filter
+    # (see processes/filter_stage_pipeline.py)
+    filter_stage_queue_size = 1
+    # Pipelines with "replicas" run their filter chain in that many processes, every frame goes to the first free one
+    # (see ipc/frame_claims.py). The manager puts their results back in frame order (see
+    # processes/replica_reassembler.py), skipping a frame whose result got lost after replica_lost_result_timeout
+    # seconds and one that isn't finished after replica_stall_timeout seconds
+    replica_lost_result_timeout = 0.05
+    replica_stall_timeout = 2.0
+    # LaneDetectFilter with "tracking": smoothing weight of new measurements, half width of the searched band
+    # around the predicted lines (fraction of the frame width) and frames without a lane before a full search
+    lane_tracking_smoothing = 0.5
+    lane_tracking_band_ratio = 0.04
+    lane_tracking_max_missed_frames = 5
+    # The detection filters send their images to one InferenceServerProcess that owns the models and runs the
+    # requests for the same model in batches (see processes/inference_server.py). Only pipelines sharing a model
+    # get batches of more than one request, otherwise the server runs the models of all pipelines one after another
+    use_inference_server = False
+    inference_batch_window = 0.004  # seconds the first request of a batch waits for the other clients of its model
+    inference_batch_windows = {}  # model file name -> batch window, overrides inference_batch_window
+    inference_max_latency = 0.02  # upper bound of every batch window
+    inference_max_batch_size = 8
+    # Runtime of the detection models, the exported models are cached next to the .pt files in models_dir_path
+    # (see perception/filters/detection_backends.py)
+    detection_backend = DetectionBackend.ULTRALYTICS
+    detection_input_size = 640  # fixed (square) input of the exported models
+    detection_warmup_runs = 3
+    detection_confidence_threshold = 0.25
+    detection_iou_threshold = 0.7
+    # Detection filters with a "keyframe_interval" run the model on every Nth frame and move the boxes with optical
+    # flow in between (see perception/filters/object_tracker.py). A frame on which a track keeps less than
+    # detection_tracking_min_confidence of its flow points becomes a keyframe right away
+    detection_tracking_min_confidence = 0.5
+    detection_tracking_iou_threshold = 0.3  # a detection keeps the track_id of the track it overlaps this much
+    detection_tracking_max_points = 20  # flow points per box
+    # Detection filters with "motion_gate" reuse their last detections while less than detection_motion_gate_threshold
+    # of their roi (downsampled by detection_motion_gate_downscale) changed by more than the pixel threshold since the
+    # model last ran, for at most detection_motion_gate_max_reuse frames in a row (see perception/filters/motion_gate.py)
+    detection_motion_gate_threshold = 0.001
+    detection_motion_gate_pixel_threshold = 12  # gray levels
+    detection_motion_gate_downscale = 8
+    detection_motion_gate_max_reuse = 30
     processing_strategy = ProcessingStrategy.ALL_FRAMES_FASTEST_PROCESS
+    serialization_format = SerializationFormat.BINARY
+    # Pipeline results carry only the frame_version, consumers resolve the pixels from the frame store
+    transfer_frames_by_reference = True
+    retained_frame_count = save_queue_element_count * 2  # must cover the save queue and the visualization lag
+    # The manager publishes pipeline results as deltas, with the full merged state every N publications
+    state_keyframe_interval = 30
 
     # Shared Memory Config
+    ipc_backend = IpcBackend.RUST
     frame_size = width * height * color_channels
-    max_pipe_data_size = frame_size * 10  # approximation
+    max_pipe_data_size = frame_size * 10  # approximation, used until the channel sizes are calibrated
 
     assert (
         save_queue_element_count * max_pipe_data_size < 10 * 1024 * 1024 * 1024
     ), "Save queue size is too big"
 
+    # Shared Memory Sizing (see ipc/channel_sizing.py)
+    calibrate_channel_sizes = False  # record the payload sizes of every channel instead of using the profile
+    channel_size_profile_dir = "configuration/channel_sizes"
+    channel_size_headroom = 0.25
+    min_channel_size = 64 * 1024
+    # The manager sleeps until a pipeline result arrives, the timeout only bounds the reaction to keep_running
+    manager_wait_timeout = 0.1
+    # The manager publishes one fused state per frame, once aggregator_quorum pipelines passed the frame (0 for all
+    # of them) or aggregator_deadline seconds after its first result arrived (see processes/frame_aggregator.py)
+    aggregator_quorum = 0
+    aggregator_deadline = 0.02
+
     # Shared Memory Names
     shm_base_name = "CAR_VISION_SHM_"
     video_feed_memory_name = shm_base_name + "VIDEO_FEED"
     control_loop_memory_name = shm_base_name + "CONTROL_LOOP"
     visualization_memory_name = shm_base_name + "VISUALIZATION"
     save_final_memory_name = shm_base_name + "SAVE_FINAL"
+    frame_store_memory_name = shm_base_name + "FRAME_STORE"
+    pipeline_selector_memory_name = shm_base_name + "PIPELINE_SELECTOR"
+    inference_selector_memory_name = shm_base_name + "INFERENCE_SELECTOR"
+    render_demand_memory_name = shm_base_name + "RENDER_DEMAND"
 
     # HTTP Config
     http_connection_failed_limit = 0
@@ -75,6 +165,39 @@ class Config:
             "save_queue_element_count",
             "visualizer_strategy",
             "mp_strategy",
+            "serialization_format",
+            "transfer_frames_by_reference",
+            "retained_frame_count",
+            "ipc_backend",
+            "state_keyframe_interval",
+            "aggregator_quorum",
+            "aggregator_deadline",
+            "calibrate_channel_sizes",
+            "channel_size_headroom",
+            "debug_frame_downscale",
+            "debug_frame_jpeg_quality",
+            "debug_frame_lease",
+            "fuse_preprocessing_filters",
+            "filter_stage_queue_size",
+            "replica_lost_result_timeout",
+            "replica_stall_timeout",
+            "lane_tracking_smoothing",
+            "lane_tracking_band_ratio",
+            "lane_tracking_max_missed_frames",
+            "use_inference_server",
+            "inference_batch_window",
+            "inference_batch_windows",
+            "inference_max_latency",
+            "inference_max_batch_size",
+            "detection_backend",
+            "detection_input_size",
+            "detection_tracking_min_confidence",
+            "detection_tracking_iou_threshold",
+            "detection_tracking_max_points",
+            "detection_motion_gate_threshold",
+            "detection_motion_gate_pixel_threshold",
+            "detection_motion_gate_downscale",
+            "detection_motion_gate_max_reuse",
         ]
 
         config_data = {
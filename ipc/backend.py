@@ -0,0 +1,12 @@
+"""
+The SharedMessage implementation selected by Config.ipc_backend, import the IPC primitives from here.
+"""
+
+from configuration.config import Config, IpcBackend
+
+if Config.ipc_backend == IpcBackend.PYTHON:
+    from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage, read_all_map
+else:
+    from rs_ipc import OperationMode, ReaderWaitPolicy, SharedMessage, read_all_map
+
+__all__ = ["OperationMode", "ReaderWaitPolicy", "SharedMessage", "read_all_map"]
@@ -0,0 +1,165 @@
+"""
+Overflow path for payloads larger than their channel.
+
+ChannelWriter.write() sends a payload that doesn't fit into its SharedMessage through a spill segment: the payload
+goes into one of the two slots of a per-channel spill segment, the channel only carries a small pointer to it.
+The spill segment is created on the first overflow and replaced by a bigger generation whenever a payload doesn't
+fit into it (resize-on-demand). Readers pass every message through ChannelReader.resolve().
+
+The writer alternates between the two slots. On channels with a waiting ReaderWaitPolicy the previous message was
+read before the next write returns, so a slot is never overwritten while it is still referenced. On lossy channels a
+slot can be overwritten during the copy, the sequence number detects it and the (already stale) message is dropped.
+"""
+
+import math
+import struct
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.channel_sizing import ChannelSizeRecorder, channel_size
+from ipc.shm_segment import create_segment, open_segment
+
+SPILL_MAGIC = b"AVSP"
+SPILL_POINTER_FORMAT = "<4sBqq"  # magic, slot, sequence, payload size, followed by the spill segment name
+SPILL_HEADER_SIZE = 64  # per slot: sequence (-1 while being written), payload size
+SPILL_SLOT_COUNT = 2
+
+
+def _slot_offset(slot_size: int, slot: int) -> int:
+    return SPILL_HEADER_SIZE + slot * slot_size
+
+
+class ChannelWriter:
+    """
+    Writes to a SharedMessage created with channel_size(channel_name), spilling payloads that don't fit.
+    In calibration runs it also records the payload sizes of the channel.
+    """
+
+    def __init__(self, shared_message, channel_name: str):
+        self.shared_message = shared_message
+        self.channel_name = channel_name
+        self.capacity = channel_size(channel_name)
+        self.recorder = ChannelSizeRecorder(channel_name) if Config.calibrate_channel_sizes else None
+        self.spill_count = 0
+
+        self._spill_segment = None
+        self._previous_spill_segment = None  # a reader may still be resolving a pointer to it
+        self._spill_generation = 0
+        self._spill_header: Optional[np.ndarray] = None
+        self._slot_size = 0
+        self._sequence = 0
+
+    def write(self, payload: bytes | bytearray):
+        if self.recorder is not None:
+            self.recorder.record(len(payload))
+        if len(payload) <= self.capacity:
+            self.shared_message.write(payload)
+        else:
+            self.shared_message.write(self._spill(payload))
+
+    def is_stopped(self) -> bool:
+        return self.shared_message.is_stopped()
+
+    def stop(self):
+        self.shared_message.stop()
+
+    def _resize_spill_segment(self, payload_size: int):
+        self._close_segment(self._previous_spill_segment)
+        self._previous_spill_segment = self._spill_segment
+        self._spill_header = None
+
+        self._spill_generation += 1
+        self._slot_size = 1 << math.ceil(math.log2(payload_size))
+        name = f"{self.channel_name}_SPILL_{self._spill_generation}"
+        self._spill_segment = create_segment(name, _slot_offset(self._slot_size, SPILL_SLOT_COUNT))
+        self._spill_header = np.ndarray((SPILL_SLOT_COUNT, 2), dtype=np.int64, buffer=self._spill_segment.buf)
+        self._spill_header[:] = (-1, 0)
+        print(
+            f"[{self.channel_name}] Payload of {payload_size / 1024:.1f} KB exceeds the channel size of "
+            f"{self.capacity / 1024:.1f} KB, spilling to {name} ({self._slot_size / 1024:.1f} KB slots)"
+        )
+
+    def _spill(self, payload) -> bytes:
+        if self._spill_segment is None or len(payload) > self._slot_size:
+            self._resize_spill_segment(len(payload))
+
+        self._sequence += 1
+        self.spill_count += 1
+        slot = self._sequence % SPILL_SLOT_COUNT
+        offset = _slot_offset(self._slot_size, slot)
+
+        self._spill_header[slot, 0] = -1
+        self._spill_segment.buf[offset : offset + len(payload)] = payload
+        self._spill_header[slot] = (self._sequence, len(payload))
+
+        name = self._spill_segment.name.lstrip("/").encode("utf-8")
+        return struct.pack(SPILL_POINTER_FORMAT, SPILL_MAGIC, slot, self._sequence, len(payload)) + name
+
+    def _close_segment(self, segment):
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+
+    def close(self):
+        """Saves the calibration profile and removes the spill segments."""
+        if self.recorder is not None:
+            self.recorder.save()
+        self._spill_header = None
+        self._close_segment(self._previous_spill_segment)
+        self._close_segment(self._spill_segment)
+        self._previous_spill_segment = self._spill_segment = None
+
+
+class ChannelReader:
+    """
+    Resolves spill pointers back into payloads, one instance can serve any number of channels.
+    """
+
+    def __init__(self):
+        self._segments = {}  # spill segment name -> segment, only the latest generation per channel is kept open
+        self.dropped_count = 0
+
+    def _open(self, name: str):
+        segment = self._segments.get(name)
+        if segment is None:
+            channel_name = name.rsplit("_SPILL_", 1)[0]
+            for stale_name in [n for n in self._segments if n.rsplit("_SPILL_", 1)[0] == channel_name]:
+                self._segments.pop(stale_name).close()
+            segment = self._segments[name] = open_segment(name)
+        return segment
+
+    def resolve(self, message) -> Optional[bytes]:
+        """
+        :returns: the payload `message` refers to (the message itself if it wasn't spilled),
+        None if a spilled payload was overwritten while reading it
+        """
+        if message is None or bytes(message[: len(SPILL_MAGIC)]) != SPILL_MAGIC:
+            return message
+
+        _, slot, sequence, size = struct.unpack_from(SPILL_POINTER_FORMAT, message, 0)
+        name = bytes(message[struct.calcsize(SPILL_POINTER_FORMAT) :]).decode("utf-8")
+        try:
+            segment = self._open(name)
+        except FileNotFoundError:  # replaced by a newer generation in the meantime
+            self.dropped_count += 1
+            return None
+
+        header = np.ndarray((SPILL_SLOT_COUNT, 2), dtype=np.int64, buffer=segment.buf)
+        slot_size = (segment.size - SPILL_HEADER_SIZE) // SPILL_SLOT_COUNT
+        offset = _slot_offset(slot_size, slot)
+        payload = None
+        if header[slot, 0] == sequence:
+            payload = bytes(segment.buf[offset : offset + size])
+            if header[slot, 0] != sequence:
+                payload = None
+        del header
+        if payload is None:
+            self.dropped_count += 1
+        return payload
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
@@ -0,0 +1,98 @@
+"""
+Blocking wait on several channels at once, a select() for SharedMessages.
+
+A ChannelSelector is a small shared segment with one notification counter per channel. Writers call
+notify(index) after every write to channel `index`, the reader blocks in wait() until any counter moved past the
+value it saw last and gets the indexes of those channels back. It only signals, the messages still go through the
+SharedMessages, so it works with either IPC backend.
+
+Layout: [header: channel_count, stopped | mutex | condition][channel counters (int64)]
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+
+from ipc.pthread_sync import CONDITION_SIZE, MUTEX_SIZE, SharedCondition, SharedMutex
+from ipc.shm_segment import create_segment, open_segment
+
+
+class ChannelSelector:
+    HEADER_FORMAT = "<qq"  # channel_count, stopped
+    ALIGNMENT = 64
+    MUTEX_OFFSET = ALIGNMENT
+    CONDITION_OFFSET = MUTEX_OFFSET + MUTEX_SIZE
+    COUNTERS_OFFSET = CONDITION_OFFSET + CONDITION_SIZE
+
+    def __init__(self, segment, is_owner: bool):
+        self._segment = segment
+        self._is_owner = is_owner
+        buffer = segment.buf
+
+        self.channel_count = struct.unpack_from("<q", buffer, 0)[0]
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=buffer, offset=0)
+        self._counters = np.ndarray((self.channel_count,), dtype=np.int64, buffer=buffer, offset=self.COUNTERS_OFFSET)
+        self._mutex = SharedMutex(buffer, self.MUTEX_OFFSET)
+        self._condition = SharedCondition(buffer, self.CONDITION_OFFSET, self._mutex)
+        self._seen = np.zeros(self.channel_count, dtype=np.int64)  # counters at the last wait() of this instance
+
+    @classmethod
+    def create(cls, name: str, channel_count: int) -> "ChannelSelector":
+        if channel_count <= 0:
+            raise ValueError("Channel count must be greater than 0")
+        segment = create_segment(name, cls.COUNTERS_OFFSET + channel_count * 8)
+        struct.pack_into(cls.HEADER_FORMAT, segment.buf, 0, channel_count, 0)
+
+        selector = cls(segment, is_owner=True)
+        selector._counters[:] = 0
+        selector._mutex.initialize()
+        selector._condition.initialize()
+        return selector
+
+    @classmethod
+    def open(cls, name: str) -> "ChannelSelector":
+        return cls(open_segment(name), is_owner=False)
+
+    # ----------------- Writers -----------------
+
+    def notify(self, index: int):
+        """Marks channel `index` as ready, call it after writing to the channel."""
+        with self._mutex:
+            self._counters[index] += 1
+            self._condition.notify_all()
+
+    def stop(self):
+        """Wakes up the waiting reader, subsequent waits return immediately."""
+        with self._mutex:
+            self._header[1] = 1
+            self._condition.notify_all()
+
+    # ----------------- Reader -----------------
+
+    def _ready(self) -> np.ndarray:
+        return np.flatnonzero(self._counters != self._seen)
+
+    def wait(self, timeout: Optional[float] = None) -> list[int]:
+        """
+        Blocks until a channel was notified since the previous call (or the selector is stopped).
+        :returns: the indexes of the notified channels, empty on timeout or stop
+        """
+        with self._mutex:
+            self._condition.wait_for(lambda: self._header[1] or len(self._ready()) > 0, timeout)
+            ready = self._ready()
+            self._seen[ready] = self._counters[ready]
+        return ready.tolist()
+
+    def is_stopped(self) -> bool:
+        with self._mutex:
+            return bool(self._header[1])
+
+    def close(self):
+        self._header = None
+        self._counters = None
+        self._mutex.release()
+        self._condition.release()
+        self._segment.close()
+        if self._is_owner:
+            self._segment.unlink()
@@ -0,0 +1,134 @@
+"""
+Measured shared-memory sizing for the SharedMessage channels.
+
+With Config.calibrate_channel_sizes enabled every channel is created with the Config.max_pipe_data_size fallback and
+its writer records the size of every payload. At the end of the run each writer stores the distribution of its
+channel in Config.channel_size_profile_dir. Later runs size each channel from the observed maximum plus
+Config.channel_size_headroom, payloads that still don't fit take the overflow path of ipc/channel_overflow.py.
+
+A profile is only used with the configuration it was recorded with (resolution, serialization, pipeline config).
+"""
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from functools import cache
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config
+
+SIZE_ALIGNMENT = 4096
+
+
+@dataclass(slots=True)
+class ChannelSizeStats:
+    channel_name: str
+    config_key: str
+    count: int
+    max_size: int
+    p50_size: int
+    p99_size: int
+
+
+def profile_config_key() -> str:
+    """Everything that changes the payload sizes, a profile recorded with another configuration is ignored."""
+    return (
+        f"{Config.width}x{Config.height}x{Config.color_channels}"
+        f":{Config.serialization_format.name}"
+        f":{'by_reference' if Config.transfer_frames_by_reference else 'by_value'}"
+        f":{os.path.basename(Config.pipeline_config_path)}"
+    )
+
+
+def _profile_path(channel_name: str) -> str:
+    return os.path.join(Config.channel_size_profile_dir, f"{channel_name}.json")
+
+
+class ChannelSizeRecorder:
+    """
+    Collects the payload sizes written to one channel during a calibration run.
+    """
+
+    __slots__ = ["channel_name", "sizes"]
+
+    def __init__(self, channel_name: str):
+        self.channel_name = channel_name
+        self.sizes: list[int] = []
+
+    def record(self, size: int):
+        self.sizes.append(size)
+
+    def stats(self) -> Optional[ChannelSizeStats]:
+        if not self.sizes:
+            return None
+        sizes = np.asarray(self.sizes)
+        return ChannelSizeStats(
+            channel_name=self.channel_name,
+            config_key=profile_config_key(),
+            count=len(sizes),
+            max_size=int(sizes.max()),
+            p50_size=int(np.percentile(sizes, 50)),
+            p99_size=int(np.percentile(sizes, 99)),
+        )
+
+    def save(self):
+        stats = self.stats()
+        if stats is None:
+            return
+        os.makedirs(Config.channel_size_profile_dir, exist_ok=True)
+        with open(_profile_path(self.channel_name), "w") as f:
+            json.dump(asdict(stats), f, indent=4)
+        print(
+            f"[ChannelSizing] {self.channel_name}: {stats.count} payloads, "
+            f"p50 {stats.p50_size / 1024:.1f} KB, p99 {stats.p99_size / 1024:.1f} KB, max {stats.max_size / 1024:.1f} KB"
+        )
+
+
+@cache
+def load_channel_stats(channel_name: str) -> Optional[ChannelSizeStats]:
+    try:
+        with open(_profile_path(channel_name), "r") as f:
+            stats = ChannelSizeStats(**json.load(f))
+    except (FileNotFoundError, TypeError, ValueError):
+        return None
+    return stats if stats.config_key == profile_config_key() else None
+
+
+def channel_size(channel_name: str) -> int:
+    """
+    :returns: the size to create the channel with, the calibrated one if available
+    """
+    if Config.calibrate_channel_sizes:
+        return Config.max_pipe_data_size
+    stats = load_channel_stats(channel_name)
+    if stats is None:
+        return Config.max_pipe_data_size
+    size = max(Config.min_channel_size, math.ceil(stats.max_size * (1 + Config.channel_size_headroom)))
+    return (size + SIZE_ALIGNMENT - 1) // SIZE_ALIGNMENT * SIZE_ALIGNMENT
+
+
+def print_memory_footprint(channel_names: list[str], other_segments: list[tuple[str, int]] = ()):
+    """
+    Prints the shared-memory footprint of the run: every channel (with the origin of its size) and other segments.
+    """
+    rows = []
+    for channel_name in channel_names:
+        if Config.calibrate_channel_sizes:
+            source = "calibrating"
+        elif load_channel_stats(channel_name) is not None:
+            source = "measured"
+        else:
+            source = "fallback"
+        rows.append((channel_name, channel_size(channel_name), source))
+    rows.extend((name, size, "fixed") for name, size in other_segments)
+
+    print("[ChannelSizing] Shared memory footprint:")
+    print(f"{'Segment':<45} {'Size (MB)':>12} {'Source':>12}")
+    print("-" * 71)
+    for name, size, source in rows:
+        print(f"{name.removeprefix(Config.shm_base_name):<45} {size / 1024 / 1024:>12.2f} {source:>12}")
+    print("-" * 71)
+    print(f"{'Total':<45} {sum(size for _, size, _ in rows) / 1024 / 1024:>12.2f}")
@@ -0,0 +1,98 @@
+"""
+The debug imagery of a pipeline (PipeData.processed_frames) travels on its own lossy channel.
+
+Debug frames are only needed for the visualization, so they stay out of the pipeline results that the control loop
+and the video writer depend on. Every pipeline writes its frames to debug_frames_channel_name(pipeline_name),
+a Count(0) channel the pipeline never waits on: when the display is slower than the pipeline, frames are dropped.
+Frames are downscaled by Config.debug_frame_downscale and optionally JPEG encoded (Config.debug_frame_jpeg_quality).
+
+Message layout: [header: magic, frame_version, frame_count][per frame: encoding, height, width, channels, size][data]
+"""
+
+import struct
+
+import cv2
+import numpy as np
+
+from configuration.config import Config
+
+DEBUG_FRAMES_MAGIC = b"AVDF"
+DEBUG_FRAMES_HEADER_FORMAT = "<4sqI"  # magic, frame_version, frame_count
+DEBUG_FRAME_HEADER_FORMAT = "<BIIIQ"  # encoding, height, width, channels, data size
+DEBUG_FRAMES_HEADER_SIZE = struct.calcsize(DEBUG_FRAMES_HEADER_FORMAT)
+DEBUG_FRAME_HEADER_SIZE = struct.calcsize(DEBUG_FRAME_HEADER_FORMAT)
+
+ENCODING_RAW = 0
+ENCODING_JPEG = 1
+
+
+def debug_frames_channel_name(pipeline_name: str) -> str:
+    return Config.shm_base_name + pipeline_name + "_DEBUG"
+
+
+def _downscale(frame: np.ndarray, downscale_factor: float) -> np.ndarray:
+    if downscale_factor <= 1:
+        return frame
+    height, width = frame.shape[:2]
+    size = (max(1, int(width / downscale_factor)), max(1, int(height / downscale_factor)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_debug_frames(
+    frame_version: int,
+    frames: list[np.ndarray],
+    downscale_factor: float = None,
+    jpeg_quality: int = None,
+) -> bytes:
+    """
+    :param downscale_factor: defaults to Config.debug_frame_downscale
+    :param jpeg_quality: 1-100 JPEG encodes the frames, 0 sends raw pixels, defaults to Config.debug_frame_jpeg_quality
+    """
+    if downscale_factor is None:
+        downscale_factor = Config.debug_frame_downscale
+    if jpeg_quality is None:
+        jpeg_quality = Config.debug_frame_jpeg_quality
+
+    parts = [struct.pack(DEBUG_FRAMES_HEADER_FORMAT, DEBUG_FRAMES_MAGIC, frame_version, len(frames))]
+    for frame in frames:
+        if frame.dtype != np.uint8:
+            raise ValueError(f"Debug frames must be uint8 images, got {frame.dtype}")
+        frame = _downscale(frame, downscale_factor)
+        height, width = frame.shape[:2]
+        channels = 1 if frame.ndim == 2 else frame.shape[2]
+
+        if jpeg_quality > 0:
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if not ok:
+                raise ValueError(f"JPEG encoding of a {frame.shape} debug frame failed")
+            encoding, data = ENCODING_JPEG, encoded.data
+        else:
+            encoding, data = ENCODING_RAW, np.ascontiguousarray(frame).data
+
+        parts.append(struct.pack(DEBUG_FRAME_HEADER_FORMAT, encoding, height, width, channels, data.nbytes))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_debug_frames(message) -> tuple[int, list[np.ndarray]]:
+    """
+    :returns: the frame version the frames belong to and the frames (raw frames are read-only views of `message`)
+    """
+    magic, frame_version, frame_count = struct.unpack_from(DEBUG_FRAMES_HEADER_FORMAT, message, 0)
+    if magic != DEBUG_FRAMES_MAGIC:
+        raise ValueError(f"Not a debug frames message (magic {magic!r})")
+
+    frames = []
+    offset = DEBUG_FRAMES_HEADER_SIZE
+    for _ in range(frame_count):
+        encoding, height, width, channels, size = struct.unpack_from(DEBUG_FRAME_HEADER_FORMAT, message, offset)
+        offset += DEBUG_FRAME_HEADER_SIZE
+        data = np.frombuffer(message, dtype=np.uint8, count=size, offset=offset)
+        offset += size
+
+        if encoding == ENCODING_JPEG:
+            frame = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE if channels == 1 else cv2.IMREAD_COLOR)
+        else:
+            frame = data.reshape((height, width) if channels == 1 else (height, width, channels))
+        frames.append(frame)
+    return frame_version, frames
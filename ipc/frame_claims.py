@@ -0,0 +1,121 @@
+"""
+Hands out the camera frames among the replicas of a pipeline (several SequentialFilterProcesses running the same
+filter chain, the "replicas" setting of the pipeline config).
+
+Every replica reads every frame descriptor from the video feed and claims the frame before processing it, the first
+replica to claim a frame processes it, the others skip it. Idle replicas are the ones reading the feed, so the frames
+go to whichever replica is free (work stealing). Only frames newer than the last claimed one can be claimed, so the
+claims are in frame order. Every claim gets the next ticket, the manager releases the replicas' results ticket by
+ticket to put them back in frame order (see processes/replica_reassembler.py). A replica marks its ticket finished
+after writing the result, so the manager can tell a result that is still being computed from one that was lost.
+
+Layout: [header: capacity, ticket_count, last_claimed_version | mutex][claimed frame version of every ticket % capacity]
+[finished ticket of every ticket % capacity]
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.pthread_sync import MUTEX_SIZE, SharedMutex
+from ipc.shm_segment import create_segment, open_segment
+
+
+def frame_claims_name(pipeline_name: str) -> str:
+    return Config.shm_base_name + pipeline_name + "_CLAIMS"
+
+
+def replica_channel_name(pipeline_name: str, replica_index: int) -> str:
+    """The result channel of a replica, the first replica uses the channel of an unreplicated pipeline."""
+    if replica_index == 0:
+        return Config.shm_base_name + pipeline_name
+    return Config.shm_base_name + pipeline_name + f"_R{replica_index}"
+
+
+class FrameClaims:
+    HEADER_FORMAT = "<qqq"  # capacity, ticket_count, last_claimed_version
+    ALIGNMENT = 64
+    MUTEX_OFFSET = ALIGNMENT
+    VERSIONS_OFFSET = MUTEX_OFFSET + MUTEX_SIZE
+
+    def __init__(self, segment, is_owner: bool):
+        self._segment = segment
+        self._is_owner = is_owner
+        buffer = segment.buf
+
+        self.capacity = struct.unpack_from("<q", buffer, 0)[0]
+        self._header = np.ndarray((3,), dtype=np.int64, buffer=buffer, offset=0)
+        self._versions = np.ndarray((self.capacity,), dtype=np.int64, buffer=buffer, offset=self.VERSIONS_OFFSET)
+        self._finished = np.ndarray(
+            (self.capacity,), dtype=np.int64, buffer=buffer, offset=self.VERSIONS_OFFSET + self.capacity * 8
+        )
+        self._mutex = SharedMutex(buffer, self.MUTEX_OFFSET)
+
+    @classmethod
+    def create(cls, name: str, capacity: int) -> "FrameClaims":
+        """:param capacity: claims the manager can lag behind before the oldest are dropped"""
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0")
+        segment = create_segment(name, cls.VERSIONS_OFFSET + capacity * 16)
+        struct.pack_into(cls.HEADER_FORMAT, segment.buf, 0, capacity, 0, -1)
+
+        frame_claims = cls(segment, is_owner=True)
+        frame_claims._versions[:] = -1
+        frame_claims._finished[:] = -1
+        frame_claims._mutex.initialize()
+        return frame_claims
+
+    @classmethod
+    def open(cls, name: str) -> "FrameClaims":
+        return cls(open_segment(name), is_owner=False)
+
+    @property
+    def nbytes(self) -> int:
+        return self._segment.size
+
+    # ----------------- Replicas -----------------
+
+    def claim(self, frame_version: int) -> int:
+        """:returns: the ticket of the claim, -1 if another replica claimed this frame (or a newer one) already"""
+        with self._mutex:
+            if frame_version <= self._header[2]:
+                return -1
+            ticket = int(self._header[1])
+            self._versions[ticket % self.capacity] = frame_version
+            self._header[1] = ticket + 1
+            self._header[2] = frame_version
+            return ticket
+
+    def finish(self, ticket: int):
+        """Marks the claim as done, call it after writing its result."""
+        with self._mutex:
+            self._finished[ticket % self.capacity] = ticket
+
+    # ----------------- Manager -----------------
+
+    def ticket_count(self) -> int:
+        with self._mutex:
+            return int(self._header[1])
+
+    def claimed(self, ticket: int) -> Optional[tuple[int, bool]]:
+        """
+        :returns: (claimed frame version, whether its replica finished it) of the ticket, None if it wasn't handed
+        out yet or was dropped (more than `capacity` tickets ago)
+        """
+        with self._mutex:
+            ticket_count = int(self._header[1])
+            if not ticket_count - self.capacity <= ticket < ticket_count:
+                return None
+            slot = ticket % self.capacity
+            return int(self._versions[slot]), bool(self._finished[slot] == ticket)
+
+    def close(self):
+        self._header = None
+        self._versions = None
+        self._finished = None
+        self._mutex.release()
+        self._segment.close()
+        if self._is_owner:
+            self._segment.unlink()
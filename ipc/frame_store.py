@@ -0,0 +1,264 @@
+import struct
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from ipc.pthread_sync import CONDITION_SIZE, MUTEX_SIZE, SharedCondition, SharedMutex
+from ipc.shm_segment import create_segment, open_segment
+
+# What the camera publishes on Config.video_feed_memory_name: the pixels themselves live in the FrameStore
+FRAME_DESCRIPTOR_FORMAT = "<qq"  # version, capture_time_ns
+FRAME_DESCRIPTOR_SIZE = struct.calcsize(FRAME_DESCRIPTOR_FORMAT)
+
+
+@dataclass(slots=True)
+class RingFrame:
+    version: int
+    capture_time_ns: int
+    frame: np.ndarray
+
+
+class FrameStore:
+    """
+    N-slot ring of camera frames in shared memory, addressed by frame version.
+
+    The camera writes every frame into the oldest slot that isn't pinned, so any reader can fetch
+    "frame N" after N+1 has landed (as long as it is retained), and a reader can pin a slot to work
+    on it in place without the writer ever overwriting it or stalling on it.
+
+    Layout: [store header | mutex | condition][slot 0 header][slot 0 pixels][slot 1 header]...
+    Slot metadata (version, capture time, pin count) is only touched under the shared mutex,
+    pixels are copied outside of it: a slot being written has EMPTY_VERSION, so it can't be pinned.
+    """
+
+    STORE_HEADER_FORMAT = "<qqqqqqq"  # slot_count, height, width, channels, latest_version, next_slot, stopped
+    SLOT_HEADER_FIELDS = 3  # version, capture_time_ns, pin_count (int64 each)
+    ALIGNMENT = 64
+    MUTEX_OFFSET = ALIGNMENT
+    CONDITION_OFFSET = MUTEX_OFFSET + MUTEX_SIZE
+    SLOTS_OFFSET = CONDITION_OFFSET + CONDITION_SIZE
+    EMPTY_VERSION = -1
+
+    def __init__(self, segment, is_owner: bool):
+        self._segment = segment
+        self._is_owner = is_owner
+        buffer = segment.buf
+
+        self.slot_count, height, width, channels = struct.unpack_from("<qqqq", buffer, 0)
+        self.frame_shape = (height, width, channels)
+        self.frame_size = height * width * channels
+        self._slot_stride = self.ALIGNMENT + self._aligned(self.frame_size)
+
+        self._mutex = SharedMutex(buffer, self.MUTEX_OFFSET)
+        self._condition = SharedCondition(buffer, self.CONDITION_OFFSET, self._mutex)
+        # (slot_count, 3) strided view over every slot header, only accessed under the mutex
+        self._slot_headers = np.ndarray(
+            (self.slot_count, self.SLOT_HEADER_FIELDS),
+            dtype=np.int64,
+            buffer=buffer,
+            offset=self.SLOTS_OFFSET,
+            strides=(self._slot_stride, 8),
+        )
+        self._store_header = np.ndarray((7,), dtype=np.int64, buffer=buffer, offset=0)
+
+    @classmethod
+    def _aligned(cls, size: int) -> int:
+        return (size + cls.ALIGNMENT - 1) // cls.ALIGNMENT * cls.ALIGNMENT
+
+    @classmethod
+    def create(cls, name: str, slot_count: int, frame_shape: tuple[int, int, int]) -> "FrameStore":
+        height, width, channels = frame_shape
+        slot_stride = cls.ALIGNMENT + cls._aligned(height * width * channels)
+        segment = create_segment(name, cls.SLOTS_OFFSET + slot_count * slot_stride)
+
+        struct.pack_into(cls.STORE_HEADER_FORMAT, segment.buf, 0, slot_count, height, width, channels, 0, 0, 0)
+        store = cls(segment, is_owner=True)
+        store._mutex.initialize()
+        store._condition.initialize()
+        store._slot_headers[:] = (cls.EMPTY_VERSION, 0, 0)
+        return store
+
+    @classmethod
+    def open(cls, name: str) -> "FrameStore":
+        return cls(open_segment(name), is_owner=False)
+
+    @property
+    def nbytes(self) -> int:
+        return self._segment.size
+
+    # ----------------- Header Access (mutex held) -----------------
+
+    @property
+    def _latest_version(self) -> int:
+        return int(self._store_header[4])
+
+    @property
+    def _stopped(self) -> bool:
+        return bool(self._store_header[6])
+
+    def _find_slot(self, version: int) -> int:
+        """:returns: the slot index holding `version`, or -1"""
+        if version <= 0:
+            return -1
+        slots = np.flatnonzero(self._slot_headers[:, 0] == version)
+        return int(slots[0]) if len(slots) else -1
+
+    def _slot_pixels(self, slot: int) -> np.ndarray:
+        return np.ndarray(
+            self.frame_shape,
+            dtype=np.uint8,
+            buffer=self._segment.buf,
+            offset=self.SLOTS_OFFSET + slot * self._slot_stride + self.ALIGNMENT,
+        )
+
+    # ----------------- Writer -----------------
+
+    def write(self, frame: np.ndarray, capture_time_ns: int = None) -> int:
+        """
+        Copies `frame` into the oldest unpinned slot.
+        :returns: the version assigned to the frame (1 for the first frame, like SharedMessage versions)
+        """
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match the store's shape {self.frame_shape}")
+        if capture_time_ns is None:
+            capture_time_ns = time.time_ns()
+
+        with self._mutex:
+            # slots are filled in ring order, so the first unpinned one from next_slot on is the oldest
+            self._condition.wait_for(lambda: self._stopped or (self._slot_headers[:, 2] == 0).any())
+            if self._stopped:
+                return self._latest_version
+            slot = int(self._store_header[5])
+            while self._slot_headers[slot, 2] != 0:
+                slot = (slot + 1) % self.slot_count
+            self._slot_headers[slot] = (self.EMPTY_VERSION, 0, 0)
+            self._store_header[5] = (slot + 1) % self.slot_count
+            version = self._latest_version + 1
+
+        np.copyto(self._slot_pixels(slot), frame)
+
+        with self._mutex:
+            self._slot_headers[slot] = (version, capture_time_ns, 0)
+            self._store_header[4] = version
+            self._condition.notify_all()
+        return version
+
+    def stop(self):
+        """Wakes up every waiting reader, subsequent waits return immediately."""
+        with self._mutex:
+            self._store_header[6] = 1
+            self._condition.notify_all()
+
+    # ----------------- Readers -----------------
+
+    def latest_version(self) -> int:
+        with self._mutex:
+            return self._latest_version
+
+    def is_stopped(self) -> bool:
+        with self._mutex:
+            return self._stopped
+
+    def wait_for_version(self, min_version: int, timeout: Optional[float] = None) -> int:
+        """
+        Blocks until a frame with version >= `min_version` was written.
+        :returns: the latest version, or -1 if the store was stopped or the timeout expired
+        """
+        with self._mutex:
+            if not self._condition.wait_for(
+                lambda: self._stopped or self._latest_version >= min_version, timeout
+            ) or self._stopped:
+                return -1
+            return self._latest_version
+
+    def pin(self, version: int) -> Optional[RingFrame]:
+        """
+        Pins the slot holding `version`: the writer won't overwrite it until unpin(version) is called.
+        :returns: a read-only view onto the slot, or None if the version is not (or no longer) retained
+        """
+        with self._mutex:
+            slot = self._find_slot(version)
+            if slot < 0:
+                return None
+            self._slot_headers[slot, 2] += 1
+            capture_time_ns = int(self._slot_headers[slot, 1])
+
+        frame = self._slot_pixels(slot)
+        frame.flags.writeable = False
+        return RingFrame(version=version, capture_time_ns=capture_time_ns, frame=frame)
+
+    def unpin(self, version: int):
+        with self._mutex:
+            slot = self._find_slot(version)
+            if slot >= 0 and self._slot_headers[slot, 2] > 0:
+                self._slot_headers[slot, 2] -= 1
+                if self._slot_headers[slot, 2] == 0:
+                    self._condition.notify_all()  # the writer may be waiting for a free slot
+
+    @contextmanager
+    def pinned(self, version: int):
+        """
+        pin()/unpin() as a context manager, for readers that only need the pixels while processing them:
+            with frame_store.pinned(version) as ring_frame:
+                if ring_frame is not None:
+                    ...
+        """
+        ring_frame = self.pin(version)
+        try:
+            yield ring_frame
+        finally:
+            if ring_frame is not None:
+                ring_frame.frame = None  # the view must not outlive the pin
+                self.unpin(version)
+
+    def read_version_into(self, version: int, out: np.ndarray) -> bool:
+        """
+        Copies the frame stored under `version` into the preallocated `out` (of shape frame_shape).
+        :returns: False if the version was never stored or already evicted
+        """
+        with self.pinned(version) as ring_frame:
+            if ring_frame is None:
+                return False
+            np.copyto(out, ring_frame.frame)
+            return True
+
+    def read_version(self, version: int) -> Optional[RingFrame]:
+        """
+        :returns: a copy of the frame stored under `version`, or None if it was never stored or already evicted
+        """
+        ring_frame = self.pin(version)
+        if ring_frame is None:
+            return None
+        try:
+            ring_frame.frame = ring_frame.frame.copy()
+        finally:
+            self.unpin(version)
+        return ring_frame
+
+    def read_latest(self, block: bool = False, after_version: int = 0, timeout: Optional[float] = None) -> Optional[RingFrame]:
+        """
+        :param block: wait until a frame newer than `after_version` is available
+        :returns: a copy of the newest frame, or None if there is none (newer than `after_version`)
+        """
+        if block:
+            if self.wait_for_version(after_version + 1, timeout) < 0:
+                return None
+        while True:
+            version = self.latest_version()
+            if version <= after_version:
+                return None
+            ring_frame = self.read_version(version)
+            if ring_frame is not None:
+                return ring_frame
+
+    def close(self):
+        self._slot_headers = None
+        self._store_header = None
+        self._mutex.release()
+        self._condition.release()
+        self._segment.close()
+        if self._is_owner:
+            self._segment.unlink()
@@ -0,0 +1,153 @@
+"""
+Shared-memory channels between the detection filters and the InferenceServerProcess.
+
+Every detection filter that uses the inference server is a client with its own pair of channels: it writes the
+image to inference_request_channel_name(index), notifies the server through the ChannelSelector named
+Config.inference_selector_memory_name and blocks until the detections arrive on inference_response_channel_name(index).
+A client has at most one request in flight, so both channels are Count(0) channels nobody waits on.
+
+Request layout:  [header: magic, sequence, frame_version, height, width, channels][pixels]
+Response layout: [header: magic, sequence][RoadObject list as encoded by ipc/pipe_data_codec.py]
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.channel_overflow import ChannelReader, ChannelWriter
+from ipc.channel_select import ChannelSelector
+from ipc.pipe_data_codec import decode_road_objects, encode_road_objects
+from perception.objects.road_info import RoadObject
+
+INFERENCE_REQUEST_MAGIC = b"AVIQ"
+INFERENCE_RESPONSE_MAGIC = b"AVIR"
+INFERENCE_REQUEST_HEADER_FORMAT = "<4sqqIIB"  # magic, sequence, frame_version, height, width, channels
+INFERENCE_RESPONSE_HEADER_FORMAT = "<4sq"  # magic, sequence
+INFERENCE_REQUEST_HEADER_SIZE = struct.calcsize(INFERENCE_REQUEST_HEADER_FORMAT)
+INFERENCE_RESPONSE_HEADER_SIZE = struct.calcsize(INFERENCE_RESPONSE_HEADER_FORMAT)
+
+
+def inference_request_channel_name(client_index: int) -> str:
+    return Config.shm_base_name + f"INFERENCE_REQUEST_{client_index}"
+
+
+def inference_response_channel_name(client_index: int) -> str:
+    return Config.shm_base_name + f"INFERENCE_RESPONSE_{client_index}"
+
+
+@dataclass(slots=True)
+class InferenceRequest:
+    sequence: int
+    frame_version: int
+    image: np.ndarray
+
+
+def encode_inference_request(sequence: int, frame_version: int, image: np.ndarray) -> bytearray:
+    if image.dtype != np.uint8:
+        raise ValueError(f"Inference requests must be uint8 images, got {image.dtype}")
+    height, width = image.shape[:2]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+
+    buffer = bytearray(INFERENCE_REQUEST_HEADER_SIZE + image.nbytes)
+    struct.pack_into(
+        INFERENCE_REQUEST_HEADER_FORMAT, buffer, 0, INFERENCE_REQUEST_MAGIC, sequence, frame_version, height, width,
+        channels,
+    )
+    # the roi crop is a strided view, copyto gathers it without an intermediate contiguous copy
+    np.copyto(np.ndarray(image.shape, dtype=np.uint8, buffer=buffer, offset=INFERENCE_REQUEST_HEADER_SIZE), image)
+    return buffer
+
+
+def decode_inference_request(message) -> InferenceRequest:
+    """:returns: the request, its image is a read-only view of `message` if `message` is bytes"""
+    magic, sequence, frame_version, height, width, channels = struct.unpack_from(
+        INFERENCE_REQUEST_HEADER_FORMAT, message, 0
+    )
+    if magic != INFERENCE_REQUEST_MAGIC:
+        raise ValueError(f"Not an inference request: {magic!r}")
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    image = np.frombuffer(message, dtype=np.uint8, count=height * width * channels,
+                          offset=INFERENCE_REQUEST_HEADER_SIZE).reshape(shape)
+    return InferenceRequest(sequence=sequence, frame_version=frame_version, image=image)
+
+
+def encode_inference_response(sequence: int, detections: list[RoadObject]) -> bytes:
+    header = struct.pack(INFERENCE_RESPONSE_HEADER_FORMAT, INFERENCE_RESPONSE_MAGIC, sequence)
+    return header + encode_road_objects(detections)
+
+
+def decode_inference_response(message) -> tuple[int, list[RoadObject]]:
+    """:returns: (sequence of the request, detections)"""
+    magic, sequence = struct.unpack_from(INFERENCE_RESPONSE_HEADER_FORMAT, message, 0)
+    if magic != INFERENCE_RESPONSE_MAGIC:
+        raise ValueError(f"Not an inference response: {magic!r}")
+    return sequence, decode_road_objects(message, INFERENCE_RESPONSE_HEADER_SIZE)
+
+
+class InferenceClient:
+    """
+    The detection filter's end of a client channel pair. It is pickled along with its filter, the channels are
+    opened on the first request, in the pipeline process.
+    """
+
+    def __init__(self, client_index: int):
+        self.client_index = client_index
+        self.sequence = 0
+        self._request_channel: Optional[ChannelWriter] = None
+        self._response_shm = None
+        self._channel_reader: Optional[ChannelReader] = None
+        self._selector: Optional[ChannelSelector] = None
+
+    def __getstate__(self):
+        return {"client_index": self.client_index}
+
+    def __setstate__(self, state):
+        self.__init__(state["client_index"])
+
+    def open(self):
+        from ipc.backend import OperationMode, SharedMessage  # the configured backend, only needed once connected
+
+        self.attach(
+            SharedMessage.open(inference_request_channel_name(self.client_index), OperationMode.WriteAsync),
+            SharedMessage.open(inference_response_channel_name(self.client_index), OperationMode.ReadSync),
+            ChannelSelector.open(Config.inference_selector_memory_name),
+        )
+
+    def attach(self, request_shm, response_shm, selector: ChannelSelector):
+        """Uses already opened channels (the request side opened for writing, the response side for reading)."""
+        self._request_channel = ChannelWriter(request_shm, inference_request_channel_name(self.client_index))
+        self._response_shm = response_shm
+        self._channel_reader = ChannelReader()
+        self._selector = selector
+
+    def infer(self, frame_version: int, image: np.ndarray) -> Optional[list[RoadObject]]:
+        """
+        Sends `image` to the inference server and waits for its detections.
+        :returns: the detections in `image` coordinates, None once the server stopped
+        """
+        if self._request_channel is None:
+            self.open()
+
+        self.sequence += 1
+        self._request_channel.write(encode_inference_request(self.sequence, frame_version, image))
+        self._selector.notify(self.client_index)
+        while True:
+            message = self._channel_reader.resolve(self._response_shm.read(block=True))
+            if message is None:  # stopped (or the spilled response was lost)
+                return None
+            sequence, detections = decode_inference_response(message)
+            if sequence == self.sequence:
+                return detections
+
+    def close(self):
+        if self._request_channel is None:
+            return
+        self._request_channel.close()
+        self._request_channel.shared_message.close()
+        self._response_shm.close()
+        self._channel_reader.close()
+        self._selector.close()
+        self._request_channel = None
@@ -0,0 +1,415 @@
+"""
+Binary wire format for PipeData.
+
+Layout (little endian):
+    [header][meta section][array table][padding][array payloads...]
+
+- header:       fixed struct with the scalar fields of PipeData (see HEADER_FORMAT)
+- meta section: compact encoding of the pipeline name, RoadMarkings, RoadObject lists, result ages and TimingInfo
+- array table:  one entry per ndarray (role, owner name, dtype, shape, offset, nbytes)
+- payloads:     raw array bytes, each aligned to ARRAY_ALIGNMENT, decoded back as np.frombuffer views
+
+Arrays that are the same object (e.g. frame and raw_frame before any filter ran) are written once.
+"""
+
+import math
+import pickle
+import struct
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config, SerializationFormat
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings, RoadObject
+from perception.objects.timing_info import RECORD_SIZE, TimingInfo
+
+
+WIRE_MAGIC = b"AVPD"
+WIRE_FORMAT_VERSION = 7
+ARRAY_ALIGNMENT = 64
+
+# magic, version, flags, frame_version, creation_time, heading_error, lateral_offset, meta size, array count,
+# roi offset x, roi offset y
+HEADER_FORMAT = "<4sHHqdddIIii"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+FLAG_HAS_HEADING_ERROR = 1 << 0
+FLAG_HAS_LATERAL_OFFSET = 1 << 1
+
+ROLE_FRAME = 0
+ROLE_RAW_FRAME = 1
+ROLE_DEPTH_FRAME = 2
+ROLE_PROCESSED_FRAME = 3
+
+# role, processed frame index, ndim, offset, nbytes (followed by the owner name, dtype string and shape)
+ARRAY_ENTRY_FORMAT = "<BHBQQ"
+ARRAY_ENTRY_SIZE = struct.calcsize(ARRAY_ENTRY_FORMAT)
+
+BBOX_FLAT = 0  # [x1, y1, x2, y2]
+BBOX_POINTS = 1  # [[x1, y1], [x2, y2]] as produced by LaneDetectFilter for horizontal lines
+
+# timing span record: label index, parent label index (-1 for none), start_ns, end_ns (-1 while running)
+RECORD_FORMAT = "iiqq"
+
+
+class _MetaWriter:
+    __slots__ = ["buffer"]
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def pack(self, fmt: str, *values):
+        self.buffer += struct.pack(fmt, *values)
+
+    def string(self, value: str):
+        encoded = value.encode("utf-8")
+        self.pack("<H", len(encoded))
+        self.buffer += encoded
+
+    def line_segment(self, line: Optional[LineSegment]):
+        if line is None:
+            self.pack("<B", 0)
+        else:
+            self.pack("<Bqqqq", 1, *(int(value) for value in line))
+
+    def road_objects(self, road_objects: Optional[list[RoadObject]]):
+        if road_objects is None:
+            self.pack("<i", -1)
+            return
+
+        self.pack("<i", len(road_objects))
+        for road_object in road_objects:
+            bbox = road_object.bbox
+            if len(bbox) > 0 and isinstance(bbox[0], (list, tuple, np.ndarray)):
+                values = [float(value) for point in bbox for value in point]
+                self.pack("<BB", BBOX_POINTS, len(values))
+            else:
+                values = [float(value) for value in bbox]
+                self.pack("<BB", BBOX_FLAT, len(values))
+            self.pack(f"<{len(values)}d", *values)
+            self.string(road_object.label)
+            self.pack("<ddiq", float(road_object.conf), float(road_object.distance), road_object.track_id,
+                      road_object.source_frame_version)
+
+    def result_ages(self, result_ages: dict[str, int]):
+        self.pack("<H", len(result_ages))
+        for pipeline_name, age in result_ages.items():
+            self.string(pipeline_name)
+            self.pack("<q", age)
+
+    def timing_info(self, timing_info: TimingInfo):
+        labels, root, attached, records = timing_info.export()
+        self.pack("<I", len(labels))
+        for label in labels:
+            self.string(label)
+        self.pack("<iI", root, len(attached))
+        for span, parent in attached.items():
+            self.pack("<ii", span, parent)
+        record_count = len(records) // RECORD_SIZE
+        self.pack("<I", record_count)
+        self.pack("<" + RECORD_FORMAT * record_count, *records)
+
+
+class _MetaReader:
+    __slots__ = ["buffer", "offset"]
+
+    def __init__(self, buffer, offset: int):
+        self.buffer = buffer
+        self.offset = offset
+
+    def unpack(self, fmt: str) -> tuple:
+        values = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def string(self) -> str:
+        (length,) = self.unpack("<H")
+        value = bytes(self.buffer[self.offset : self.offset + length]).decode("utf-8")
+        self.offset += length
+        return value
+
+    def line_segment(self) -> Optional[LineSegment]:
+        (present,) = self.unpack("<B")
+        if not present:
+            return None
+        return LineSegment(*self.unpack("<qqqq"))
+
+    def road_objects(self) -> Optional[list[RoadObject]]:
+        (count,) = self.unpack("<i")
+        if count < 0:
+            return None
+
+        road_objects = []
+        for _ in range(count):
+            bbox_kind, value_count = self.unpack("<BB")
+            values = list(self.unpack(f"<{value_count}d"))
+            if bbox_kind == BBOX_POINTS:
+                bbox = [values[i : i + 2] for i in range(0, value_count, 2)]
+            else:
+                bbox = values
+            label = self.string()
+            conf, distance, track_id, source_frame_version = self.unpack("<ddiq")
+            road_objects.append(RoadObject(bbox=bbox, label=label, conf=conf, distance=distance, track_id=track_id,
+                                           source_frame_version=source_frame_version))
+        return road_objects
+
+    def result_ages(self) -> dict[str, int]:
+        (count,) = self.unpack("<H")
+        result_ages = {}
+        for _ in range(count):
+            pipeline_name = self.string()
+            (result_ages[pipeline_name],) = self.unpack("<q")
+        return result_ages
+
+    def timing_info(self) -> TimingInfo:
+        (label_count,) = self.unpack("<I")
+        labels = [self.string() for _ in range(label_count)]
+        root, attached_count = self.unpack("<iI")
+        attached = dict(self.unpack("<ii") for _ in range(attached_count))
+        (record_count,) = self.unpack("<I")
+        records = list(self.unpack("<" + RECORD_FORMAT * record_count))
+        return TimingInfo.from_export(labels, root, attached, records)
+
+
+def _collect_arrays(data: PipeData) -> list[tuple[int, str, int, np.ndarray]]:
+    arrays = []
+    if data.frame is not None:
+        arrays.append((ROLE_FRAME, "", 0, data.frame))
+    if data.raw_frame is not None:
+        arrays.append((ROLE_RAW_FRAME, "", 0, data.raw_frame))
+    if data.depth_frame is not None:
+        arrays.append((ROLE_DEPTH_FRAME, "", 0, data.depth_frame))
+    for pipeline_name, frames in data.processed_frames.items():
+        for index, frame in enumerate(frames):
+            arrays.append((ROLE_PROCESSED_FRAME, pipeline_name, index, frame))
+    return arrays
+
+
+def _align(offset: int) -> int:
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+
+def _encode_layout(data: PipeData):
+    """
+    Builds everything but the array payloads.
+    :returns: (header + meta + array table as bytes, list of (offset, array) to copy, total size)
+    """
+    meta = _MetaWriter()
+    meta.string(data.last_pipeline_name)
+
+    road_markings = data.road_markings
+    if road_markings is None:
+        meta.pack("<B", 0)
+    else:
+        meta.pack("<B", 1)
+        meta.line_segment(road_markings.left_line)
+        meta.line_segment(road_markings.center_line)
+        meta.pack("<B", road_markings.center_line_virtual)
+        meta.line_segment(road_markings.right_line)
+        meta.pack("<B", road_markings.right_line_virtual)
+        meta.pack("<I", len(road_markings.stop_lines))
+        for stop_line in road_markings.stop_lines:
+            meta.line_segment(stop_line)
+
+    meta.road_objects(data.traffic_signs)
+    meta.road_objects(data.traffic_lights)
+    meta.road_objects(data.pedestrians)
+    meta.road_objects(data.horizontal_lines)
+    meta.result_ages(data.result_ages)
+    meta.timing_info(data.timing_info)
+
+    arrays = _collect_arrays(data)
+    encoded_names = [(name.encode("utf-8"), array.dtype.str.encode("ascii")) for _, name, _, array in arrays]
+    table_size = sum(
+        ARRAY_ENTRY_SIZE + 2 + len(name) + 1 + len(dtype) + 4 * array.ndim
+        for (_, _, _, array), (name, dtype) in zip(arrays, encoded_names)
+    )
+
+    offset = _align(HEADER_SIZE + len(meta.buffer) + table_size)
+    written_offsets: dict[int, int] = {}  # id(array) -> offset, so aliased arrays are only written once
+    copies: list[tuple[int, np.ndarray]] = []
+    table = _MetaWriter()
+    for (role, _, index, array), (name, dtype) in zip(arrays, encoded_names):
+        array_offset = written_offsets.get(id(array))
+        if array_offset is None:
+            array_offset = offset
+            written_offsets[id(array)] = array_offset
+            copies.append((array_offset, array))
+            offset = _align(offset + array.nbytes)
+
+        table.pack(ARRAY_ENTRY_FORMAT, role, index, array.ndim, array_offset, array.nbytes)
+        table.pack("<H", len(name))
+        table.buffer += name
+        table.pack("<B", len(dtype))
+        table.buffer += dtype
+        table.pack(f"<{array.ndim}I", *array.shape)
+
+    flags = 0
+    if data.heading_error_degrees is not None:
+        flags |= FLAG_HAS_HEADING_ERROR
+    if data.lateral_offset is not None:
+        flags |= FLAG_HAS_LATERAL_OFFSET
+
+    header = struct.pack(
+        HEADER_FORMAT,
+        WIRE_MAGIC,
+        WIRE_FORMAT_VERSION,
+        flags,
+        data.frame_version,
+        data.creation_time,
+        float(data.heading_error_degrees) if data.heading_error_degrees is not None else math.nan,
+        float(data.lateral_offset) if data.lateral_offset is not None else math.nan,
+        len(meta.buffer),
+        len(arrays),
+        int(data.roi_offset[0]),
+        int(data.roi_offset[1]),
+    )
+
+    prefix = header + meta.buffer + table.buffer
+    total_size = offset if copies else len(prefix)
+    return prefix, copies, total_size
+
+
+def encode_pipe_data_into(data: PipeData, buffer) -> int:
+    """
+    Writes `data` into a writable buffer (bytearray, memoryview over shared memory, numpy uint8 array...)
+    using the binary wire format.
+    :returns: the number of bytes written
+    """
+    prefix, copies, total_size = _encode_layout(data)
+    if len(buffer) < total_size:
+        raise ValueError(f"Buffer of {len(buffer)} bytes is too small for PipeData of {total_size} bytes")
+
+    view = memoryview(buffer).cast("B")
+    view[: len(prefix)] = prefix
+    for offset, array in copies:
+        np.copyto(np.ndarray(array.shape, dtype=array.dtype, buffer=view, offset=offset), array)
+    return total_size
+
+
+def encode_pipe_data(
+    data: PipeData, serialization_format: SerializationFormat = None, reserve: int = 0
+) -> bytes | bytearray:
+    """
+    Serializes `data` for a shared-memory channel in the configured format.
+    :param reserve: number of zeroed leading bytes left for an envelope header, the PipeData starts after them
+    """
+    if serialization_format is None:
+        serialization_format = Config.serialization_format
+
+    if serialization_format == SerializationFormat.PICKLE:
+        if reserve:
+            return bytearray(reserve) + pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    prefix, copies, total_size = _encode_layout(data)
+    buffer = bytearray(reserve + total_size)
+    view = memoryview(buffer)[reserve:]
+    view[: len(prefix)] = prefix
+    for offset, array in copies:
+        np.copyto(np.ndarray(array.shape, dtype=array.dtype, buffer=view, offset=offset), array)
+    return buffer
+
+
+def decode_pipe_data(buffer) -> PipeData:
+    """
+    Deserializes a PipeData written by `encode_pipe_data` in either format (detected from the magic bytes).
+    Arrays of the binary format are views onto `buffer`, so they are read-only if `buffer` is.
+    """
+    if bytes(buffer[: len(WIRE_MAGIC)]) != WIRE_MAGIC:
+        return pickle.loads(buffer)
+
+    (
+        _,
+        version,
+        flags,
+        frame_version,
+        creation_time,
+        heading_error_degrees,
+        lateral_offset,
+        meta_size,
+        array_count,
+        roi_offset_x,
+        roi_offset_y,
+    ) = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+    if version != WIRE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported PipeData wire format version {version}, expected {WIRE_FORMAT_VERSION}")
+
+    meta = _MetaReader(buffer, HEADER_SIZE)
+    last_pipeline_name = meta.string()
+
+    road_markings = None
+    (has_road_markings,) = meta.unpack("<B")
+    if has_road_markings:
+        left_line = meta.line_segment()
+        center_line = meta.line_segment()
+        (center_line_virtual,) = meta.unpack("<B")
+        right_line = meta.line_segment()
+        (right_line_virtual,) = meta.unpack("<B")
+        (stop_line_count,) = meta.unpack("<I")
+        stop_lines = [meta.line_segment() for _ in range(stop_line_count)]
+        road_markings = RoadMarkings(
+            left_line=left_line,
+            center_line=center_line,
+            center_line_virtual=bool(center_line_virtual),
+            right_line=right_line,
+            right_line_virtual=bool(right_line_virtual),
+            stop_lines=stop_lines,
+        )
+
+    traffic_signs = meta.road_objects()
+    traffic_lights = meta.road_objects()
+    pedestrians = meta.road_objects()
+    horizontal_lines = meta.road_objects()
+    result_ages = meta.result_ages()
+    timing_info = meta.timing_info()
+
+    table = _MetaReader(buffer, HEADER_SIZE + meta_size)
+    arrays: dict[int, np.ndarray] = {}
+    processed_frames: dict[str, list[np.ndarray]] = {}
+    for _ in range(array_count):
+        role, index, ndim, offset, nbytes = table.unpack(ARRAY_ENTRY_FORMAT)
+        name = table.string()
+        (dtype_length,) = table.unpack("<B")
+        dtype = np.dtype(bytes(buffer[table.offset : table.offset + dtype_length]).decode("ascii"))
+        table.offset += dtype_length
+        shape = table.unpack(f"<{ndim}I")
+
+        array = np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset).reshape(shape)
+        if role == ROLE_PROCESSED_FRAME:
+            processed_frames.setdefault(name, []).append(array)
+        else:
+            arrays[role] = array
+
+    return PipeData(
+        frame=arrays.get(ROLE_FRAME),
+        frame_version=frame_version,
+        depth_frame=arrays.get(ROLE_DEPTH_FRAME),
+        raw_frame=arrays.get(ROLE_RAW_FRAME),
+        creation_time=creation_time,
+        last_pipeline_name=last_pipeline_name,
+        timing_info=timing_info,
+        processed_frames=processed_frames,
+        roi_offset=(roi_offset_x, roi_offset_y),
+        result_ages=result_ages,
+        road_markings=road_markings,
+        heading_error_degrees=heading_error_degrees if flags & FLAG_HAS_HEADING_ERROR else None,
+        lateral_offset=lateral_offset if flags & FLAG_HAS_LATERAL_OFFSET else None,
+        traffic_signs=traffic_signs,
+        traffic_lights=traffic_lights,
+        pedestrians=pedestrians,
+        horizontal_lines=horizontal_lines,
+    )
+
+
+def encode_road_objects(road_objects: Optional[list[RoadObject]]) -> bytearray:
+    """Encodes a RoadObject list the way the PipeData meta section does, for messages that only carry detections."""
+    meta = _MetaWriter()
+    meta.road_objects(road_objects)
+    return meta.buffer
+
+
+def decode_road_objects(buffer, offset: int = 0) -> Optional[list[RoadObject]]:
+    return _MetaReader(buffer, offset).road_objects()
@@ -0,0 +1,140 @@
+"""
+Process-shared pthread mutex and condition variable living inside a shared-memory segment (Linux only).
+Waiting goes through pthread_cond_(timed)wait, i.e. a futex, and ctypes releases the GIL for the duration of the call.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import time
+from typing import Optional
+
+_libc_name = ctypes.util.find_library("pthread") or ctypes.util.find_library("c")
+if not _libc_name:
+    raise RuntimeError("Could not find the pthread library")
+_libc = ctypes.CDLL(_libc_name, use_errno=True)
+
+PTHREAD_PROCESS_SHARED = 1
+CLOCK_MONOTONIC = 1
+
+# Upper bounds for the opaque pthread types (40 and 48 bytes on x86_64/aarch64 glibc)
+MUTEX_SIZE = 64
+CONDITION_SIZE = 64
+_ATTR_SIZE = 16
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _bind(name: str, *argtypes):
+    function = getattr(_libc, name)
+    function.argtypes = list(argtypes)
+    function.restype = ctypes.c_int
+    return function
+
+
+_void_p = ctypes.c_void_p
+_mutexattr_init = _bind("pthread_mutexattr_init", _void_p)
+_mutexattr_setpshared = _bind("pthread_mutexattr_setpshared", _void_p, ctypes.c_int)
+_mutex_init = _bind("pthread_mutex_init", _void_p, _void_p)
+_mutex_lock = _bind("pthread_mutex_lock", _void_p)
+_mutex_unlock = _bind("pthread_mutex_unlock", _void_p)
+_condattr_init = _bind("pthread_condattr_init", _void_p)
+_condattr_setpshared = _bind("pthread_condattr_setpshared", _void_p, ctypes.c_int)
+_condattr_setclock = _bind("pthread_condattr_setclock", _void_p, ctypes.c_int)
+_cond_init = _bind("pthread_cond_init", _void_p, _void_p)
+_cond_wait = _bind("pthread_cond_wait", _void_p, _void_p)
+_cond_timedwait = _bind("pthread_cond_timedwait", _void_p, _void_p, ctypes.POINTER(_Timespec))
+_cond_broadcast = _bind("pthread_cond_broadcast", _void_p)
+
+
+def _check(result: int, operation: str):
+    if result != 0:
+        raise OSError(result, f"{operation} failed")
+
+
+class SharedMutex:
+    """
+    A PTHREAD_PROCESS_SHARED mutex stored at `offset` in a writable shared-memory buffer.
+    The creator of the segment calls initialize() once, every process then uses it as a context manager.
+    """
+
+    def __init__(self, buffer, offset: int):
+        self._anchor = ctypes.c_char.from_buffer(buffer, offset)  # keeps the address valid
+        self.address = ctypes.addressof(self._anchor)
+
+    def initialize(self):
+        attr = ctypes.create_string_buffer(_ATTR_SIZE)
+        _check(_mutexattr_init(attr), "pthread_mutexattr_init")
+        _check(_mutexattr_setpshared(attr, PTHREAD_PROCESS_SHARED), "pthread_mutexattr_setpshared")
+        _check(_mutex_init(self.address, attr), "pthread_mutex_init")
+
+    def __enter__(self):
+        _check(_mutex_lock(self.address), "pthread_mutex_lock")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _check(_mutex_unlock(self.address), "pthread_mutex_unlock")
+
+    def release(self):
+        """Drops the exported pointer so the underlying segment can be closed."""
+        self._anchor = None
+
+
+class SharedCondition:
+    """
+    A PTHREAD_PROCESS_SHARED condition variable (CLOCK_MONOTONIC timeouts) bound to a SharedMutex.
+    wait() must be called with the mutex held.
+    """
+
+    def __init__(self, buffer, offset: int, mutex: SharedMutex):
+        self._anchor = ctypes.c_char.from_buffer(buffer, offset)
+        self.address = ctypes.addressof(self._anchor)
+        self.mutex = mutex
+
+    def initialize(self):
+        attr = ctypes.create_string_buffer(_ATTR_SIZE)
+        _check(_condattr_init(attr), "pthread_condattr_init")
+        _check(_condattr_setpshared(attr, PTHREAD_PROCESS_SHARED), "pthread_condattr_setpshared")
+        _check(_condattr_setclock(attr, CLOCK_MONOTONIC), "pthread_condattr_setclock")
+        _check(_cond_init(self.address, attr), "pthread_cond_init")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        :returns: False if the timeout (in seconds) expired, True otherwise (spurious wake-ups included)
+        """
+        if timeout is None:
+            _check(_cond_wait(self.address, self.mutex.address), "pthread_cond_wait")
+            return True
+
+        deadline = time.clock_gettime(time.CLOCK_MONOTONIC) + max(timeout, 0.0)
+        deadline_spec = _Timespec(int(deadline), int((deadline % 1) * 1e9))
+        result = _cond_timedwait(self.address, self.mutex.address, ctypes.byref(deadline_spec))
+        if result == errno.ETIMEDOUT:
+            return False
+        _check(result, "pthread_cond_timedwait")
+        return True
+
+    def wait_for(self, predicate, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until `predicate()` is true or the timeout expires, like threading.Condition.wait_for.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        result = predicate()
+        while not result:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.wait(remaining)
+            else:
+                self.wait()
+            result = predicate()
+        return result
+
+    def notify_all(self):
+        _check(_cond_broadcast(self.address), "pthread_cond_broadcast")
+
+    def release(self):
+        self._anchor = None
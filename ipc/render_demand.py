@@ -0,0 +1,74 @@
+"""
+Lets the consumers of the debug imagery tell the pipelines whether anybody looks at it.
+
+The filters of a pipeline only render their debug frames (ipc/debug_frames.py) while a subscriber asks for them.
+A subscriber renews a lease with request(pipeline_index) whenever it displays the pipeline's frames, the pipeline
+checks is_requested(pipeline_index) once per frame. When the subscriber stops asking (its window is hidden, it
+exited or crashed) the lease runs out after Config.debug_frame_lease seconds and the pipeline stops rendering.
+Pipeline indexes follow the order of the pipeline config, like the channels of the pipeline ChannelSelector.
+
+Layout: [header: pipeline_count][lease expiry of every pipeline (float64 time.monotonic(), shared by all processes)]
+"""
+
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.shm_segment import create_segment, open_segment
+
+
+class RenderDemand:
+    HEADER_FORMAT = "<q"  # pipeline_count
+    EXPIRY_OFFSET = 8
+
+    def __init__(self, segment, is_owner: bool):
+        self._segment = segment
+        self._is_owner = is_owner
+        self.pipeline_count = struct.unpack_from(self.HEADER_FORMAT, segment.buf, 0)[0]
+        self._expiry = np.ndarray(
+            (self.pipeline_count,), dtype=np.float64, buffer=segment.buf, offset=self.EXPIRY_OFFSET
+        )
+
+    @classmethod
+    def create(cls, name: str, pipeline_count: int) -> "RenderDemand":
+        if pipeline_count <= 0:
+            raise ValueError("Pipeline count must be greater than 0")
+        segment = create_segment(name, cls.EXPIRY_OFFSET + pipeline_count * 8)
+        struct.pack_into(cls.HEADER_FORMAT, segment.buf, 0, pipeline_count)
+        render_demand = cls(segment, is_owner=True)
+        render_demand._expiry[:] = 0
+        return render_demand
+
+    @classmethod
+    def open(cls, name: str) -> "RenderDemand":
+        return cls(open_segment(name), is_owner=False)
+
+    # ----------------- Subscribers -----------------
+
+    def request(self, pipeline_index: int, lease: Optional[float] = None):
+        """Asks the pipeline for its debug frames for the next `lease` seconds (default Config.debug_frame_lease)."""
+        if lease is None:
+            lease = Config.debug_frame_lease
+        self._expiry[pipeline_index] = max(self._expiry[pipeline_index], time.monotonic() + lease)
+
+    def request_all(self, lease: Optional[float] = None):
+        for pipeline_index in range(self.pipeline_count):
+            self.request(pipeline_index, lease)
+
+    def release(self, pipeline_index: int):
+        """Ends the lease right away, e.g. when the subscriber hides the pipeline's frames."""
+        self._expiry[pipeline_index] = 0
+
+    # ----------------- Pipelines -----------------
+
+    def is_requested(self, pipeline_index: int) -> bool:
+        return time.monotonic() < self._expiry[pipeline_index]
+
+    def close(self):
+        self._expiry = None
+        self._segment.close()
+        if self._is_owner:
+            self._segment.unlink()
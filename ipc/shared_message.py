@@ -0,0 +1,239 @@
+"""
+Pure-Python implementation of the rs_ipc SharedMessage API (select it with Config.ipc_backend).
+
+A SharedMessage is a single-message slot in shared memory with a version counter: every write replaces the
+message and bumps the version, every reader keeps track of the last version it read. Whether the writer may
+overwrite a message that some readers haven't seen yet is decided by the ReaderWaitPolicy given at creation:
+    - All(): wait until every registered reader read the previous message (queue-like, nothing is dropped)
+    - Count(n): wait until n readers read it (Count(0) never waits, i.e. readers only ever see the newest message)
+Sync/Async operation modes only change how the Rust backend waits, here all waits are futex waits on a shared
+pthread condition variable, so they behave alike.
+
+The API matches rs_ipc, the memory layout does not: all processes of a run must use the same backend.
+"""
+
+import os
+import struct
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Optional, TypeVar
+
+import numpy as np
+
+from ipc.pthread_sync import CONDITION_SIZE, MUTEX_SIZE, SharedCondition, SharedMutex
+from ipc.shm_segment import create_segment, open_segment
+
+T = TypeVar("T")
+
+
+class OperationMode(Enum):
+    CreateOnly = 0
+    ReadSync = 1
+    ReadAsync = 2
+    WriteSync = 3
+    WriteAsync = 4
+
+    @property
+    def is_reader(self) -> bool:
+        return self in (OperationMode.ReadSync, OperationMode.ReadAsync)
+
+    @property
+    def is_writer(self) -> bool:
+        return self in (OperationMode.WriteSync, OperationMode.WriteAsync)
+
+
+@dataclass(frozen=True, slots=True)
+class ReaderWaitPolicy:
+    count: Optional[int]  # None means all registered readers
+
+    @staticmethod
+    def All() -> "ReaderWaitPolicy":
+        return ReaderWaitPolicy(count=None)
+
+    @staticmethod
+    def Count(count: int) -> "ReaderWaitPolicy":
+        if count < 0:
+            raise ValueError(f"Reader count must be positive, got {count}")
+        return ReaderWaitPolicy(count=count)
+
+
+class SharedMessage:
+    # header: capacity, wait_count (-1 = all), version, message_size, stopped
+    HEADER_FORMAT = "<qqqqq"
+    ALIGNMENT = 64
+    MUTEX_OFFSET = ALIGNMENT
+    CONDITION_OFFSET = MUTEX_OFFSET + MUTEX_SIZE
+    READERS_OFFSET = CONDITION_OFFSET + CONDITION_SIZE
+    MAX_READERS = 32  # reader table entries: pid (0 = free), last_read_version
+    PAYLOAD_OFFSET = READERS_OFFSET + MAX_READERS * 16
+    READER_LIVENESS_INTERVAL = 0.5  # how often a waiting writer checks for readers that died without closing
+
+    def __init__(self, name: str, segment, mode: OperationMode, is_owner: bool):
+        self._name = name
+        self._segment = segment
+        self._mode = mode
+        self._is_owner = is_owner
+        self._last_read_version = 0
+        self._reader_index = -1
+
+        buffer = segment.buf
+        self._header = np.ndarray((5,), dtype=np.int64, buffer=buffer, offset=0)
+        self._readers = np.ndarray((self.MAX_READERS, 2), dtype=np.int64, buffer=buffer, offset=self.READERS_OFFSET)
+        self._capacity = int(self._header[0])
+        self._payload = segment.buf[self.PAYLOAD_OFFSET : self.PAYLOAD_OFFSET + self._capacity]
+        self._mutex = SharedMutex(buffer, self.MUTEX_OFFSET)
+        self._condition = SharedCondition(buffer, self.CONDITION_OFFSET, self._mutex)
+
+    @classmethod
+    def create(
+        cls,
+        name: str,
+        size: int,
+        mode: OperationMode,
+        reader_wait_policy: ReaderWaitPolicy = ReaderWaitPolicy.All(),
+    ) -> "SharedMessage":
+        """
+        Creates the shared memory and opens it with `mode` (CreateOnly: neither reads nor writes).
+        :param size: maximum message size in bytes
+        """
+        if size <= 0:
+            raise ValueError("Size must be greater than 0")
+        segment = create_segment(name, cls.PAYLOAD_OFFSET + size)
+        wait_count = -1 if reader_wait_policy.count is None else reader_wait_policy.count
+        struct.pack_into(cls.HEADER_FORMAT, segment.buf, 0, size, wait_count, 0, 0, 0)
+
+        shared_message = cls(name, segment, mode, is_owner=True)
+        shared_message._readers[:] = 0
+        shared_message._mutex.initialize()
+        shared_message._condition.initialize()
+        shared_message._register_reader()
+        return shared_message
+
+    @classmethod
+    def open(cls, name: str, mode: OperationMode) -> "SharedMessage":
+        shared_message = cls(name, open_segment(name), mode, is_owner=False)
+        shared_message._register_reader()
+        return shared_message
+
+    # ----------------- Reader Table (mutex held) -----------------
+
+    def _register_reader(self):
+        if not self._mode.is_reader:
+            return
+        with self._mutex:
+            free_entries = np.flatnonzero(self._readers[:, 0] == 0)
+            if len(free_entries) == 0:
+                raise RuntimeError(f"{self._name} already has {self.MAX_READERS} readers")
+            self._reader_index = int(free_entries[0])
+            self._readers[self._reader_index] = (os.getpid(), 0)
+            self._condition.notify_all()
+
+    def _readers_caught_up(self) -> bool:
+        version = self._header[2]
+        if version == 0:
+            return True
+        active = self._readers[:, 0] != 0
+        caught_up = int(np.count_nonzero(active & (self._readers[:, 1] >= version)))
+        wait_count = int(self._header[1])
+        required = int(np.count_nonzero(active)) if wait_count < 0 else min(wait_count, int(np.count_nonzero(active)))
+        return caught_up >= required
+
+    def _drop_dead_readers(self):
+        for index in np.flatnonzero(self._readers[:, 0] != 0):
+            try:
+                os.kill(int(self._readers[index, 0]), 0)
+            except ProcessLookupError:
+                self._readers[index] = (0, 0)
+
+    # ----------------- Writer -----------------
+
+    def write(self, message: bytes):
+        """
+        Replaces the message, after waiting for the readers required by the ReaderWaitPolicy.
+        Writes to a stopped SharedMessage are dropped.
+        """
+        size = len(message)
+        if size > self._capacity:
+            raise ValueError(f"Message of {size} bytes does not fit in {self._name} ({self._capacity} bytes)")
+
+        with self._mutex:
+            while not (self._header[4] or self._readers_caught_up()):
+                if not self._condition.wait(self.READER_LIVENESS_INTERVAL):
+                    self._drop_dead_readers()
+            if self._header[4]:
+                return
+            self._payload[:size] = message
+            self._header[3] = size
+            self._header[2] += 1
+            self._condition.notify_all()
+
+    # ----------------- Reader -----------------
+
+    def read(self, block: bool = True) -> Optional[bytes]:
+        """
+        :returns: the message if its version wasn't read yet by this instance, otherwise None (or waits for one when
+        `block` is set). Once stopped, an unread message can still be read, after that None is returned.
+        """
+        with self._mutex:
+            if block:
+                self._condition.wait_for(lambda: self._header[2] != self._last_read_version or self._header[4])
+            version = int(self._header[2])
+            if version == self._last_read_version:
+                return None
+
+            message = bytes(self._payload[: self._header[3]])
+            self._last_read_version = version
+            if self._reader_index >= 0:
+                self._readers[self._reader_index, 1] = version
+                self._condition.notify_all()  # the writer may be waiting for this reader
+            return message
+
+    # ----------------- State -----------------
+
+    def stop(self):
+        """Wakes up every blocked reader and writer, further writes are dropped."""
+        with self._mutex:
+            self._header[4] = 1
+            self._condition.notify_all()
+
+    def is_stopped(self) -> bool:
+        with self._mutex:
+            return bool(self._header[4])
+
+    def last_read_version(self) -> int:
+        return self._last_read_version
+
+    def last_written_version(self) -> int:
+        with self._mutex:
+            return int(self._header[2])
+
+    def name(self) -> str:
+        return self._name
+
+    def close(self):
+        """Unregisters this reader and detaches from the shared memory, the creator also unlinks it."""
+        if self._reader_index >= 0:
+            with self._mutex:
+                self._readers[self._reader_index] = (0, 0)
+                self._condition.notify_all()
+            self._reader_index = -1
+        self._header = None
+        self._readers = None
+        self._payload.release()
+        self._mutex.release()
+        self._condition.release()
+        self._segment.close()
+        if self._is_owner:
+            self._segment.unlink()
+
+
+def read_all_map(shared_messages: list[SharedMessage], function: Callable[[bytes], T]) -> list[Optional[T]]:
+    """
+    Non-blocking read of every SharedMessage.
+    :returns: function(message) for every new message, None where there was nothing new
+    """
+    results = []
+    for shared_message in shared_messages:
+        message = shared_message.read(block=False)
+        results.append(function(message) if message is not None else None)
+    return results
@@ -0,0 +1,23 @@
+from multiprocessing.shared_memory import SharedMemory
+
+
+def create_segment(name: str, size: int) -> SharedMemory:
+    """
+    Creates a named shared-memory segment. The creator is responsible for calling unlink().
+    A stale segment with the same name (left over by a crashed run) is replaced.
+    """
+    try:
+        stale = SharedMemory(name=name, create=False)
+        stale.close()
+        stale.unlink()
+    except FileNotFoundError:
+        pass
+    return SharedMemory(name=name, create=True, size=size)
+
+
+def open_segment(name: str) -> SharedMemory:
+    """
+    Opens an existing segment. All our processes are spawned from the same parent and therefore share its
+    resource tracker, so the segment is only cleaned up by the creator's unlink() (or at program exit).
+    """
+    return SharedMemory(name=name, create=False)
@@ -0,0 +1,132 @@
+"""
+Delta-encoded publication of the MultiProcessingManager's merged PipeData.
+
+Instead of serializing the whole accumulated state for every pipeline result, the manager publishes the result
+itself as a delta (only the fields that pipeline produced, e.g. traffic_lights for frame 812) and, every
+Config.state_keyframe_interval publications, the full state as a keyframe. Consumers rebuild the full view with a
+StateReconstructor, which applies deltas with the same semantics as PipeData.merge.
+
+Every delta only replaces fields, so a reader of a lossy channel that misses some deltas keeps slightly stale fields
+until they are published again (or until the next keyframe), it never ends up with an inconsistent state. A reader that
+attaches while the manager is already publishing (or restarts) would have to wait for the next keyframe, so its
+StateReconstructor bumps a shared keyframe request counter and the publisher sends a keyframe right away. Gaps don't
+request keyframes, a lossy reader would turn the stream into keyframes only.
+
+Message layout: [state header, padded to ARRAY_ALIGNMENT][PipeData in the configured serialization format]
+"""
+
+import dataclasses
+import multiprocessing as mp
+import struct
+from typing import Optional
+
+from configuration.config import Config
+from ipc.pipe_data_codec import ARRAY_ALIGNMENT, decode_pipe_data, encode_pipe_data
+from perception.objects.pipe_data import PipeData
+
+STATE_MAGIC = b"AVSM"
+STATE_HEADER_FORMAT = "<4sBq"  # magic, kind, sequence
+STATE_HEADER_SIZE = ARRAY_ALIGNMENT  # keeps the arrays of the PipeData aligned
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+
+class StatePublisher:
+    """
+    Encodes the manager's publications, see the module docstring.
+    """
+
+    def __init__(self, keyframe_interval: int = None, keyframe_requests: Optional[mp.Value] = None):
+        """
+        :param keyframe_requests: shared counter the StateReconstructors of the readers bump when they need a keyframe
+        """
+        self.keyframe_interval = Config.state_keyframe_interval if keyframe_interval is None else keyframe_interval
+        if self.keyframe_interval < 1:
+            raise ValueError(f"Keyframe interval must be at least 1, got {self.keyframe_interval}")
+        self.sequence = 0
+        self._next_keyframe_sequence = 1
+        self.keyframe_requests = keyframe_requests
+        self._handled_keyframe_requests = 0
+
+    def encode(self, state: PipeData, delta: PipeData) -> bytearray:
+        """
+        :param state: the merged state, `delta` already merged into it
+        :param delta: the pipeline result that was just merged, its timings are taken from `state`
+        """
+        if self.keyframe_requests is not None and self.keyframe_requests.value != self._handled_keyframe_requests:
+            self._handled_keyframe_requests = self.keyframe_requests.value
+            self.force_keyframe()
+
+        self.sequence += 1
+        is_keyframe = self.sequence >= self._next_keyframe_sequence
+        if is_keyframe:
+            self._next_keyframe_sequence = self.sequence + self.keyframe_interval
+            message = encode_pipe_data(state, reserve=STATE_HEADER_SIZE)
+        else:
+            # the manager recorded its own timings (merge, transfer) for this result in the state's copy
+            delta = dataclasses.replace(
+                delta, timing_info=state.timing_info.subtree(delta.timing_info.root_label)
+            )
+            message = encode_pipe_data(delta, reserve=STATE_HEADER_SIZE)
+
+        struct.pack_into(
+            STATE_HEADER_FORMAT, message, 0, STATE_MAGIC, KIND_KEYFRAME if is_keyframe else KIND_DELTA, self.sequence
+        )
+        return message
+
+    def force_keyframe(self):
+        """The next publication will be a keyframe, e.g. after a consumer (re)attached."""
+        self._next_keyframe_sequence = self.sequence + 1
+
+
+class StateReconstructor:
+    """
+    Rebuilds the manager's full state from keyframes and deltas.
+    """
+
+    __slots__ = ["state", "last_sequence", "missed_count", "keyframe_count", "keyframe_requests", "_keyframe_requested"]
+
+    def __init__(self, keyframe_requests: Optional[mp.Value] = None):
+        """
+        :param keyframe_requests: the StatePublisher's counter, bumped once when the first messages are deltas
+        """
+        self.state: Optional[PipeData] = None
+        self.last_sequence = 0
+        self.missed_count = 0  # deltas lost on lossy channels, only affects freshness
+        self.keyframe_count = 0
+        self.keyframe_requests = keyframe_requests
+        self._keyframe_requested = False
+
+    def apply(self, message) -> Optional[PipeData]:
+        """
+        :returns: the reconstructed state (the same, updated instance every time), None until the first keyframe
+        """
+        magic, kind, sequence = struct.unpack_from(STATE_HEADER_FORMAT, message, 0)
+        if magic != STATE_MAGIC:
+            raise ValueError(f"Not a state message (magic {magic!r})")
+
+        if self.state is not None and sequence > self.last_sequence + 1:
+            self.missed_count += sequence - self.last_sequence - 1
+        self.last_sequence = sequence
+
+        if kind == KIND_KEYFRAME:
+            self.state = decode_pipe_data(memoryview(message)[STATE_HEADER_SIZE:])
+            self.keyframe_count += 1
+            return self.state
+
+        if self.state is None:
+            if self.keyframe_requests is not None and not self._keyframe_requested:
+                # attached in between two keyframes
+                self._keyframe_requested = True
+                with self.keyframe_requests.get_lock():
+                    self.keyframe_requests.value += 1
+            return None
+
+        delta = decode_pipe_data(memoryview(message)[STATE_HEADER_SIZE:])
+        timing_info = self.state.timing_info
+        # like the manager, only keep the timings of the latest result below the root
+        for child in timing_info.children(timing_info.root_label):
+            timing_info.remove_recursive(child)
+        self.state.merge(delta)
+        return self.state
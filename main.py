@@ -1,6 +1,5 @@
 import multiprocessing as mp
 import os
-import pickle
 import time
 from datetime import datetime
 
@@ -8,8 +7,14 @@ import cv2
 
 import numpy as np
 
-from rs_ipc import SharedMessage, OperationMode, ReaderWaitPolicy
 from configuration.config import Config
+from ipc.backend import SharedMessage, OperationMode, ReaderWaitPolicy
+from ipc.channel_overflow import ChannelReader
+from ipc.channel_sizing import channel_size
+from ipc.debug_frames import debug_frames_channel_name, decode_debug_frames
+from ipc.frame_store import FrameStore
+from ipc.render_demand import RenderDemand
+from ipc.state_stream import StateReconstructor
 from perception.helpers import (
     get_roi_bbox_for_video,
     extract_pipeline_names,
@@ -30,15 +35,30 @@ def main():
     recording_dir_path = setup_dir_for_iteration()
 
     keep_running = mp.Value("b", True)
-    start_video = mp.Value("b", False)
+    start_video = mp.Event()
 
     visualization_shm = SharedMessage.create(
         Config.visualization_memory_name,
-        size=Config.max_pipe_data_size,
+        size=channel_size(Config.visualization_memory_name),
         mode=OperationMode.ReadSync,
         reader_wait_policy=ReaderWaitPolicy.Count(0)
     )
+    # the pipelines publish their debug imagery on lossy channels of their own, never waiting for the display
+    debug_frames_shm_dict = {}
+    render_demand = None  # the pipelines only render their debug frames while we ask for them
+    if Config.enable_pipeline_visualization:
+        render_demand = RenderDemand.create(Config.render_demand_memory_name, len(extract_pipeline_names()))
+        debug_frames_shm_dict = {
+            pipeline_name: SharedMessage.create(
+                debug_frames_channel_name(pipeline_name),
+                size=channel_size(debug_frames_channel_name(pipeline_name)),
+                mode=OperationMode.ReadSync,
+                reader_wait_policy=ReaderWaitPolicy.Count(0),
+            )
+            for pipeline_name in extract_pipeline_names()
+        }
     final_frame_version = mp.Value("i", -1)
+    keyframe_requests = mp.Value("i", 0)  # readers attaching in between two keyframes ask for one
 
     mp_manager = MultiProcessingManager(
         keep_running=keep_running,
@@ -46,6 +66,7 @@ def main():
         start_video=start_video,
         recording_dir_path=recording_dir_path,
         final_frame_version=final_frame_version,
+        keyframe_requests=keyframe_requests,
         name="MultiProcessingManager",
     )
     mp_manager.start()
@@ -62,33 +83,58 @@ def main():
     pipeline_names = extract_pipeline_names()
 
     pipe_data = None
+    frame_store = None
+    state_reconstructor = StateReconstructor(keyframe_requests)
+    channel_reader = ChannelReader()
+    debug_frames_dict: dict[str, list[np.ndarray]] = {}
     iteration_counter = 0
     cv2.namedWindow("CarVision", cv2.WINDOW_NORMAL)
 
     while not visualization_shm.is_stopped() and keep_running.value:
-        pipe_data_bytes = visualization_shm.read(block=False)
+        if render_demand is not None and cv2.getWindowProperty("CarVision", cv2.WND_PROP_VISIBLE) >= 1:
+            render_demand.request_all()  # the debug frames are displayed next to the main view
+
+        for pipeline_name, debug_frames_shm in debug_frames_shm_dict.items():
+            debug_frames_bytes = channel_reader.resolve(debug_frames_shm.read(block=False))
+            if debug_frames_bytes is not None:
+                _, debug_frames_dict[pipeline_name] = decode_debug_frames(debug_frames_bytes)
 
+        pipe_data_bytes = channel_reader.resolve(visualization_shm.read(block=False))
         if pipe_data_bytes is not None:
+            pipe_data: PipeData = state_reconstructor.apply(pipe_data_bytes)  # None until the first keyframe
+
+        if pipe_data_bytes is not None and pipe_data is not None:
             iteration_counter += 1
-            pipe_data: PipeData = pickle.loads(pipe_data_bytes)
 
             if pipe_data.frame_version == final_frame_version.value:
                 print(f"[Main] Received final frame version: {pipe_data.frame_version}")
                 break
 
-            drawn_frame = visualize_data(
-                video_info=video_info, data=pipe_data, raw_frame=pipe_data.raw_frame
-            )
-            if (
-                pipe_data.processed_frames is not None
-                and len(pipe_data.processed_frames) > 0
-            ):
+            if pipe_data.raw_frame is not None:
+                drawn_frame = visualize_data(
+                    video_info=video_info, data=pipe_data, raw_frame=pipe_data.raw_frame
+                )
+            else:
+                if frame_store is None:  # created by the MultiProcessingManager before its first publication
+                    frame_store = FrameStore.open(Config.frame_store_memory_name)
+                # visualize_data copies the frame anyway, so draw straight from the pinned ring slot
+                with frame_store.pinned(pipe_data.frame_version) as ring_frame:
+                    drawn_frame = visualize_data(
+                        video_info=video_info,
+                        data=pipe_data,
+                        raw_frame=(
+                            ring_frame.frame
+                            if ring_frame is not None
+                            else np.zeros((Config.height, Config.width, 3), dtype=np.uint8)  # already evicted
+                        ),
+                    )
+            if len(debug_frames_dict) > 0:
                 squashed_frames = [[drawn_frame]]
 
                 for pipeline_name in pipeline_names:
-                    if pipeline_name in pipe_data.processed_frames:
+                    if pipeline_name in debug_frames_dict:
                         squashed_frames.append(
-                            pipe_data.processed_frames[pipeline_name]
+                            debug_frames_dict[pipeline_name]
                         )
                     else:
                         # add black frame
@@ -105,19 +151,32 @@ def main():
         if key & 0xFF == ord("q"):
             break
         elif key & 0xFF == ord("x"):
-            if pipe_data is not None:
-                draw_rois_and_wait(pipe_data.frame, video_rois)
+            raw_frame = None if pipe_data is None else pipe_data.raw_frame
+            if raw_frame is None and pipe_data is not None and frame_store is not None:
+                ring_frame = frame_store.read_version(pipe_data.frame_version)  # a copy, the view would be unpinned
+                raw_frame = ring_frame.frame if ring_frame is not None else None
+            if raw_frame is not None:
+                draw_rois_and_wait(raw_frame.copy(), video_rois)  # decoded frames are read-only views
                 cv2.waitKey(0)
             else:
                 print("No frame to draw ROIs on")
 
-    print(f"[Main] Iteration counter: {iteration_counter}")
+    print(f"[Main] Iteration counter: {iteration_counter}, missed state deltas: {state_reconstructor.missed_count}")
     visualization_shm.stop()
+    for debug_frames_shm in debug_frames_shm_dict.values():
+        debug_frames_shm.stop()
+    channel_reader.close()
+    if frame_store is not None:
+        frame_store.close()
     keep_running.value = False
 
     print("[Main] Joining MultiProcessingManager")
     mp_manager.join()
     print("[Main] MultiProcessingManager joined")
+    for debug_frames_shm in debug_frames_shm_dict.values():
+        debug_frames_shm.close()
+    if render_demand is not None:
+        render_demand.close()
 
     cv2.destroyAllWindows()
 
@@ -17,7 +17,7 @@ def run_from_rust(rust_callback, PyFrame):
     recording_dir_path = setup_dir_for_iteration()
 
     keep_running = mp.Value("b", True)
-    start_video = mp.Value("b", False)
+    start_video = mp.Event()
 
     final_frame_version = mp.Value("i", -1)
 
@@ -25,6 +25,10 @@ class BaseFilter(ABC):
     def video_height(self):
         return self.video_info.height
 
+    def should_render(self, data: PipeData) -> bool:
+        """Debug imagery is only drawn by visualizing filters, and only when a subscriber asked for it."""
+        return self.visualize and data.render_debug_frames
+
     @abstractmethod
     def process(self, data: PipeData) -> PipeData:
         """
@@ -33,7 +37,7 @@ class BaseFilter(ABC):
         """
         # process the data
 
-        if self.visualize:
+        if self.should_render(data):
             data.add_processed_frame(data.frame)
 
         return data
\ No newline at end of file
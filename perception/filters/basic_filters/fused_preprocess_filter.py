@@ -0,0 +1,188 @@
+import cv2
+import numpy as np
+
+from perception.filters.base_filter import BaseFilter
+from perception.filters.basic_filters.blur_filter import BlurFilter
+from perception.filters.basic_filters.cannyedge_filter import CannyEdgeFilter
+from perception.filters.basic_filters.dilation_filter import DilationFilter
+from perception.filters.basic_filters.grayscale_filter import GrayScaleFilter
+from perception.filters.roi_filter import ROIFilter, get_roi_crop, get_roi_mask
+from perception.objects.pipe_data import PipeData
+from perception.objects.video_info import VideoInfo
+
+
+class FusedPreprocessFilter(BaseFilter):
+    """
+    Runs a chain of preprocessing steps (roi, grayscale, canny_edge, blur, dilation) as a single filter.
+
+    Every step writes into an output buffer allocated on the first frame (i.e. in the pipeline process) through
+    the dst= argument of OpenCV, so no full-frame array is allocated per frame. The result is identical to running
+    the separate filters with the same parameters. data.frame points into the last buffer until it is reused
+    buffer_sets frames later (1 unless the frames of several frames are alive at once, see FilterStagePipeline).
+    A cropping roi step only takes a view of the bounding box, the following steps run on the smaller frame.
+    """
+
+    STEP_PARAMS = {
+        "roi": ["roi_type", "crop"],
+        "grayscale": [],
+        "canny_edge": ["low_threshold", "high_threshold"],
+        "blur": ["kernel_size", "sigmaX"],
+        "dilation": ["kernel_size", "iterations"],
+    }
+
+    def __init__(self, video_info: VideoInfo, visualize: bool, steps: dict[str, dict]):
+        """
+        :param steps: step name -> parameters of the filter it replaces, in the order they run
+        """
+        super().__init__(video_info=video_info, visualize=visualize)
+
+        self.steps = {}
+        for step_name, params in steps.items():
+            if step_name not in self.STEP_PARAMS:
+                raise ValueError(f"Invalid step {step_name}, expected one of {list(self.STEP_PARAMS)}")
+            if step_name == "roi":
+                params = {"crop": False, **params}  # crop is optional, like for ROIFilter
+            if sorted(params) != sorted(self.STEP_PARAMS[step_name]):
+                raise ValueError(f"Step {step_name} expects {self.STEP_PARAMS[step_name]}, got {list(params)}")
+            if step_name == "roi" and params["roi_type"] not in self.video_rois:
+                raise ValueError(f"Invalid roi_type {params['roi_type']}")
+            if step_name == "roi" and params["crop"] and self.steps:
+                raise ValueError("A cropping roi step has to be the first step")
+            self.steps[step_name] = params
+
+        self.buffer_sets = 1  # output buffers of every step, used in turns
+
+        # allocated for the frame shape on the first frame, not pickled into the pipeline process
+        self._input_shape = None
+        self._input_offset = None
+        self._allocated_sets = 0
+        self._next_set = 0
+        self._crop = None
+        self._operations = None
+
+    @classmethod
+    def from_filters(cls, filters: list[BaseFilter]) -> "FusedPreprocessFilter":
+        """Fuses a linear chain of preprocessing filters, see fuse_filter_chain."""
+        steps = {}
+        for filter in filters:
+            match filter:
+                case ROIFilter():
+                    step_name, params = "roi", {"roi_type": filter.roi_type, "crop": filter.crop}
+                case GrayScaleFilter():
+                    step_name, params = "grayscale", {}
+                case CannyEdgeFilter():
+                    step_name = "canny_edge"
+                    params = {"low_threshold": filter.low_threshold, "high_threshold": filter.high_threshold}
+                case BlurFilter():
+                    step_name, params = "blur", {"kernel_size": filter.kernel_size, "sigmaX": filter.sigmaX}
+                case DilationFilter():
+                    step_name, params = "dilation", {"kernel_size": filter.kernel_size, "iterations": filter.iterations}
+                case _:
+                    raise ValueError(f"{type(filter).__name__} can't be fused")
+            if step_name in steps:
+                raise ValueError(f"{type(filter).__name__} appears twice in the chain")
+            steps[step_name] = params
+        return cls(video_info=filters[0].video_info, visualize=filters[-1].visualize, steps=steps)
+
+    def _allocate(self, frame: np.ndarray, roi_offset: tuple[int, int]):
+        """Builds the operations with their output buffers for frames of `frame`'s shape and dtype."""
+        operations = []
+        shape, dtype = frame.shape, frame.dtype
+        self._crop = None
+        for step_name, params in self.steps.items():
+            match step_name:
+                case "roi":
+                    roi_bbox = self.video_rois[params["roi_type"]]
+                    offset = roi_offset
+                    if params["crop"]:
+                        self._crop = get_roi_crop(shape, roi_bbox, roi_offset)
+                        x0, y0, x1, y1 = self._crop
+                        shape = (y1 - y0, x1 - x0) + shape[2:]
+                        offset = (roi_offset[0] + x0, roi_offset[1] + y0)
+                    mask = get_roi_mask(shape, dtype, roi_bbox, offset)
+                    operation = lambda src, dst, mask=mask: cv2.bitwise_and(src, mask, dst=dst)
+                case "grayscale":
+                    shape = shape[:2]
+                    operation = lambda src, dst: cv2.cvtColor(src, cv2.COLOR_BGR2GRAY, dst=dst)
+                case "canny_edge":
+                    shape, dtype = shape[:2], np.uint8
+                    operation = lambda src, dst, low=params["low_threshold"], high=params["high_threshold"]: cv2.Canny(
+                        src, low, high, edges=dst
+                    )
+                case "blur":
+                    operation = lambda src, dst, size=params["kernel_size"], sigma=params["sigmaX"]: cv2.GaussianBlur(
+                        src, (size, size), sigma, dst=dst
+                    )
+                case "dilation":
+                    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (params["kernel_size"], params["kernel_size"]))
+                    operation = lambda src, dst, kernel=kernel, iterations=params["iterations"]: cv2.dilate(
+                        src, kernel, dst=dst, iterations=iterations
+                    )
+            operations.append((operation, [np.empty(shape, dtype=dtype) for _ in range(self.buffer_sets)]))
+
+        self._operations = operations
+        self._input_shape = frame.shape
+        self._input_offset = roi_offset
+        self._allocated_sets = self.buffer_sets
+        self._next_set = 0
+
+    def process(self, data: PipeData) -> PipeData:
+        if (data.frame.shape != self._input_shape or data.roi_offset != self._input_offset
+                or self._allocated_sets != self.buffer_sets):
+            self._allocate(data.frame, data.roi_offset)
+        buffer_set = self._next_set
+        self._next_set = (buffer_set + 1) % self._allocated_sets
+
+        frame = data.frame
+        if self._crop is not None:
+            x0, y0, x1, y1 = self._crop
+            frame = frame[y0:y1, x0:x1]
+            data.roi_offset = (data.roi_offset[0] + x0, data.roi_offset[1] + y0)
+        for operation, buffers in self._operations:
+            operation(frame, buffers[buffer_set])
+            frame = buffers[buffer_set]
+        data.frame = frame
+
+        return super().process(data)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_input_shape"] = None
+        state["_input_offset"] = None
+        state["_allocated_sets"] = 0
+        state["_operations"] = None  # lambdas can't be pickled, rebuilt on the first frame
+        return state
+
+
+FUSABLE_FILTER_CLASSES = (ROIFilter, GrayScaleFilter, CannyEdgeFilter, BlurFilter, DilationFilter)
+
+
+def fuse_filter_chain(filters: list[BaseFilter]) -> list[BaseFilter]:
+    """
+    Replaces every run of consecutive preprocessing filters with one FusedPreprocessFilter.
+    A run ends at a filter that visualizes its output (its intermediate frame is needed) or one that is already part
+    of the run, a cropping ROIFilter starts a new run. Single filters are kept as they are.
+    """
+    fused_filters = []
+    run: list[BaseFilter] = []
+
+    def close_run():
+        if len(run) > 1:
+            fused_filters.append(FusedPreprocessFilter.from_filters(run))
+        else:
+            fused_filters.extend(run)
+        run.clear()
+
+    for filter in filters:
+        if not isinstance(filter, FUSABLE_FILTER_CLASSES):
+            close_run()
+            fused_filters.append(filter)
+            continue
+        if any(type(filter) is type(run_filter) for run_filter in run) or getattr(filter, "crop", False):
+            close_run()
+        run.append(filter)
+        if filter.visualize:
+            close_run()
+    close_run()
+
+    return fused_filters
@@ -0,0 +1,235 @@
+"""
+Runtimes for the YOLO detection models, selected by Config.detection_backend.
+
+A detector is a callable that runs the model on a batch of BGR images and returns one RoadObject list per image,
+boxes in image coordinates and the distance unknown (inf). The ULTRALYTICS backend runs the .pt model as is.
+The ONNX and OPENVINO backends export it once with ultralytics (square input of Config.detection_input_size, dynamic
+batch size), cache the artifact next to the .pt file and run it on the cpu with the letterboxing, box decoding and NMS
+done here, so only the export needs ultralytics and torch. A batch of images runs as one batch of the exported model.
+
+Each runtime is imported when its backend is loaded, hosts only need the runtime they use.
+"""
+
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from configuration.config import Config, DetectionBackend
+from perception.objects.road_info import RoadObject
+
+Detector = Callable[[list[np.ndarray]], list[list[RoadObject]]]
+
+LETTERBOX_COLOR = (114, 114, 114)
+MAX_DETECTIONS = 300
+
+
+def detections_from_yolo_result(yolo_result) -> list[RoadObject]:
+    """:returns: every box of an ultralytics result (one image) in image coordinates"""
+    labels = yolo_result.names
+    boxes = yolo_result.boxes
+    detections = []
+    for prediction_id, confidence, bbox in zip(boxes.cls.cpu().tolist(), boxes.conf.cpu().tolist(),
+                                               boxes.xyxy.cpu().tolist()):
+        detections.append(RoadObject(
+            bbox=[float(f'{el: .4f}') for el in bbox],
+            label=labels[int(prediction_id)],
+            conf=round(float(confidence), 2),
+            distance=float("inf"),
+        ))
+    return detections
+
+
+class UltralyticsDetector:
+    def __init__(self, model_path: str, verbose: bool = False):
+        from ultralytics import YOLO
+        import torch
+
+        self.model = YOLO(model_path)
+        self.verbose = verbose
+        if torch.cuda.is_available():
+            print(f'{model_path} running on gpu...')
+            self.model.cuda()
+        else:
+            print(f'{model_path} running on cpu...')
+
+    def __call__(self, images: list[np.ndarray]) -> list[list[RoadObject]]:
+        yolo_results = self.model(images, verbose=self.verbose, conf=Config.detection_confidence_threshold,
+                                  iou=Config.detection_iou_threshold)
+        return [detections_from_yolo_result(yolo_result) for yolo_result in yolo_results]
+
+
+# ----------------- Exported models -----------------
+
+def letterbox(image: np.ndarray, size: int) -> tuple[np.ndarray, float, tuple[int, int]]:
+    """
+    Resizes `image` into a size x size input the way ultralytics does (aspect ratio kept, centered, gray padding).
+    :returns: (1x3xsizexsize float32 RGB blob in [0, 1], scale factor, (left, top) padding)
+    """
+    height, width = image.shape[:2]
+    gain = min(size / height, size / width)
+    resized_width, resized_height = int(round(width * gain)), int(round(height * gain))
+    if (resized_width, resized_height) != (width, height):
+        image = cv2.resize(image, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - resized_width) / 2, (size - resized_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    blob = cv2.dnn.blobFromImage(image, scalefactor=1 / 255, swapRB=True)
+    return blob, gain, (left, top)
+
+
+def decode_yolo_output(output: np.ndarray, gain: float, padding: tuple[int, int], image_shape: tuple[int, ...],
+                       labels: dict[int, str], confidence_threshold: float, iou_threshold: float) -> list[RoadObject]:
+    """
+    Turns the raw output of a YOLO detection model (4 + class count rows: center x, center y, width, height in input
+    pixels, then the class scores) into the detections of the letterboxed image, with per-class NMS like ultralytics.
+    """
+    predictions = output.reshape(output.shape[-2], output.shape[-1]).T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_scores)), class_ids]
+    candidates = scores > confidence_threshold
+    if not candidates.any():
+        return []
+    boxes, scores, class_ids = predictions[candidates, :4], scores[candidates], class_ids[candidates]
+
+    top_left = boxes[:, :2] - boxes[:, 2:] / 2
+    keep = cv2.dnn.NMSBoxesBatched(
+        np.hstack([top_left, boxes[:, 2:]]).tolist(), scores.tolist(), class_ids.tolist(), confidence_threshold,
+        iou_threshold,
+    )
+    keep = np.asarray(keep, dtype=int).ravel()
+    keep = keep[np.argsort(-scores[keep], kind="stable")][:MAX_DETECTIONS]
+
+    height, width = image_shape[:2]
+    corners = np.hstack([top_left[keep], top_left[keep] + boxes[keep, 2:]])
+    corners = (corners - np.array([*padding, *padding])) / gain
+    corners[:, [0, 2]] = corners[:, [0, 2]].clip(0, width)
+    corners[:, [1, 3]] = corners[:, [1, 3]].clip(0, height)
+    return [
+        RoadObject(
+            bbox=[float(f'{el: .4f}') for el in bbox],
+            label=labels[int(class_id)],
+            conf=round(float(score), 2),
+            distance=float("inf"),
+        )
+        for bbox, class_id, score in zip(corners.tolist(), class_ids[keep], scores[keep])
+    ]
+
+
+def exported_model_path(model_path: str, backend: DetectionBackend, input_size: int) -> str:
+    """:returns: where the export of `model_path` for `backend` is cached (an .onnx file or an OpenVINO directory)"""
+    stem = os.path.splitext(model_path)[0]
+    if backend == DetectionBackend.ONNX:
+        return f"{stem}_{input_size}_dynamic.onnx"
+    if backend == DetectionBackend.OPENVINO:
+        return f"{stem}_{input_size}_dynamic_openvino_model"
+    raise ValueError(f"{backend.name} models are not exported")
+
+
+def _labels_path(artifact_path: str) -> str:
+    return artifact_path + ".labels.json"
+
+
+def export_model(model_path: str, backend: DetectionBackend, input_size: int) -> str:
+    """
+    Exports `model_path` for `backend` unless an export at least as recent as the .pt file is cached.
+    :returns: the path of the export
+    """
+    artifact_path = exported_model_path(model_path, backend, input_size)
+    if (os.path.exists(artifact_path) and os.path.exists(_labels_path(artifact_path))
+            and os.path.getmtime(artifact_path) >= os.path.getmtime(model_path)):
+        return artifact_path
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {model_path} to {backend.name} ({input_size}x{input_size}, dynamic batch size)...")
+    model = YOLO(model_path)
+    export_format = "onnx" if backend == DetectionBackend.ONNX else "openvino"
+    # the inference server runs the requests of a model as one batch
+    exported_path = model.export(format=export_format, imgsz=input_size, dynamic=True, half=False)
+    if os.path.isdir(artifact_path):
+        shutil.rmtree(artifact_path)
+    os.replace(exported_path, artifact_path)
+    with open(_labels_path(artifact_path), "w") as f:
+        json.dump({str(class_id): label for class_id, label in model.names.items()}, f)
+    return artifact_path
+
+
+class ExportedModelDetector(ABC):
+    """
+    Runs an exported model on a batch of images at once (the export has a Bx3xNxN input), subclasses run the blob.
+    """
+
+    def __init__(self, artifact_path: str, input_size: int, warmup_runs: int):
+        self.input_size = input_size
+        with open(_labels_path(artifact_path), "r") as f:
+            self.labels = {int(class_id): label for class_id, label in json.load(f).items()}
+        blank = np.zeros((1, 3, input_size, input_size), dtype=np.float32)
+        for _ in range(warmup_runs):  # the first runs allocate and tune the kernels
+            self.run(blank)
+
+    @abstractmethod
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        """:returns: the raw model output of every image of the Bx3xNxN `blob`"""
+
+    def __call__(self, images: list[np.ndarray]) -> list[list[RoadObject]]:
+        if not images:
+            return []
+        letterboxed = [letterbox(image, self.input_size) for image in images]
+        outputs = self.run(np.concatenate([blob for blob, _, _ in letterboxed]))
+        return [
+            decode_yolo_output(
+                output, gain, padding, image.shape, self.labels, Config.detection_confidence_threshold,
+                Config.detection_iou_threshold,
+            )
+            for output, image, (_, gain, padding) in zip(outputs, images, letterboxed)
+        ]
+
+
+class OnnxRuntimeDetector(ExportedModelDetector):
+    def __init__(self, artifact_path: str, input_size: int, warmup_runs: int):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(artifact_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        print(f'{artifact_path} running on cpu (ONNX Runtime)...')
+        super().__init__(artifact_path, input_size, warmup_runs)
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(ExportedModelDetector):
+    def __init__(self, artifact_path: str, input_size: int, warmup_runs: int):
+        import openvino
+
+        xml_path = next(
+            os.path.join(artifact_path, name) for name in sorted(os.listdir(artifact_path)) if name.endswith(".xml")
+        )
+        self.model = openvino.Core().compile_model(xml_path, "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.output = self.model.output(0)
+        print(f'{artifact_path} running on cpu (OpenVINO)...')
+        super().__init__(artifact_path, input_size, warmup_runs)
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        return self.model([blob])[self.output]
+
+
+def load_detector(model_path: str, backend: Optional[DetectionBackend] = None, verbose: bool = False) -> Detector:
+    """:param backend: defaults to Config.detection_backend"""
+    if backend is None:
+        backend = Config.detection_backend
+    if backend == DetectionBackend.ULTRALYTICS:
+        return UltralyticsDetector(model_path, verbose)
+
+    artifact_path = export_model(model_path, backend, Config.detection_input_size)
+    detector_class = OnnxRuntimeDetector if backend == DetectionBackend.ONNX else OpenVinoDetector
+    return detector_class(artifact_path, Config.detection_input_size, Config.detection_warmup_runs)
@@ -1,26 +1,73 @@
 import numpy as np
 import cv2
+from configuration.config import Config
 from perception.filters.base_filter import BaseFilter
+from perception.filters.lane_tracker import LaneTracker
 from perception.objects.line_segment import LineSegment
+from perception.objects.line_segment_batch import LineSegmentBatch
 from perception.objects.pipe_data import PipeData
 from perception.objects.road_info import RoadMarkings, RoadObject
 from perception.objects.video_info import VideoInfo
 
 
-def filter_lines_by_type(hough_line_segments: list[LineSegment], frame_width: int):
-    horizontal_lines = []
-    left_lane_lines = []
-    right_lane_lines = []
-    for line_segment in hough_line_segments:
-        if line_segment.check_is_horizontal(20):
-            horizontal_lines.append(line_segment)
-        else:
-            if line_segment.lower_x < frame_width / 2:
-                left_lane_lines.append(line_segment)
-            else:
-                right_lane_lines.append(line_segment)
+def _linspace_rows(starts: np.ndarray, stops: np.ndarray, num: int) -> np.ndarray:
+    """
+    np.linspace(start, stop, num, dtype=int) for every (start, stop) pair, one row each.
+    np.linspace with array endpoints switches to a different formula for all the rows as soon as one of them has
+    start == stop, which rounds some points differently, so the scalar formula is reproduced here.
+    """
+    if num == 1:
+        return starts[:, np.newaxis].astype(int)
+    steps = (stops - starts) / (num - 1)
+    values = np.arange(num) * steps[:, np.newaxis] + starts[:, np.newaxis]
+    values[:, -1] = stops
+    return values.astype(int)
+
+
+def compute_white_line_mask(
+        frame: np.ndarray,
+        line_segments: LineSegmentBatch,
+        threshold: int = 20,
+        num_points: int = 50
+) -> np.ndarray:
+    """
+    Batched implementation of filter_for_white_lines.
+
+    Returns:
+        np.ndarray: boolean mask, True for the line segments predominantly on white regions.
+    """
+
+    if num_points < 1:
+        raise ValueError("The number of points must be greater than 0")
+
+    # Determine if the frame is color or grayscale
+    if len(frame.shape) == 2:
+        frame_type = 'grayscale'
+    elif len(frame.shape) == 3 and frame.shape[2] == 3:
+        frame_type = 'color'
+    else:
+        raise ValueError("Unsupported frame format: expected grayscale or BGR color image.")
+
+    if len(line_segments) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # Sample the points of all the segments at once, the same points as LineSegment.discretize
+    x_values = _linspace_rows(line_segments.lower_x, line_segments.upper_x, num_points)
+    y_values = _linspace_rows(line_segments.lower_y, line_segments.upper_y, num_points)
+
+    # Points outside of the frame don't count as white
+    inside = (x_values >= 0) & (x_values < frame.shape[1]) & (y_values >= 0) & (y_values < frame.shape[0])
+    pixels = frame[np.where(inside, y_values, 0), np.where(inside, x_values, 0)]
+    if frame_type == 'color':
+        # All channel values must be above the threshold
+        is_white = np.all(pixels >= threshold, axis=-1)
+    else:  # grayscale
+        is_white = pixels >= threshold
+    white_points = np.count_nonzero(is_white & inside, axis=1)
+
+    # If more than half of the sampled points are white, classify as white line
+    return white_points / num_points > 0.5
 
-    return left_lane_lines, right_lane_lines, horizontal_lines
 
 def filter_for_white_lines(
         frame: np.ndarray,
@@ -46,44 +93,12 @@ def filter_for_white_lines(
             - white_lines: Line segments predominantly on white regions.
             - other_lines: Line segments not predominantly on white regions.
     """
-
-    if num_points < 1:
-        raise ValueError("The number of points must be greater than 0")
-
-    # Determine if the frame is color or grayscale
-    if len(frame.shape) == 2:
-        frame_type = 'grayscale'
-    elif len(frame.shape) == 3 and frame.shape[2] == 3:
-        frame_type = 'color'
-    else:
-        raise ValueError("Unsupported frame format: expected grayscale or BGR color image.")
+    is_white_line = compute_white_line_mask(frame, LineSegmentBatch.from_segments(line_segments), threshold, num_points)
 
     white_lines = []
     other_lines = []
-
-    for line_segment in line_segments:
-        white_points = 0
-
-        # Generate points along the line
-        discretized_points: list[tuple[int, int]] = line_segment.discretize(num_points)
-
-        # Check each point along the line
-        for x, y in discretized_points:
-            # Ensure x and y are integers for indexing
-            x, y = int(round(x)), int(round(y))
-            # Check if the point is within the frame boundaries
-            if 0 <= x < frame.shape[1] and 0 <= y < frame.shape[0]:
-                if frame_type == 'color':
-                    # Check if all channel values are above the threshold
-                    if np.all(frame[y, x] >= threshold):
-                        white_points += 1
-                else:  # grayscale
-                    # Check if the pixel intensity is above the threshold
-                    if frame[y, x] >= threshold:
-                        white_points += 1
-
-        # If more than half of the sampled points are white, classify as white line
-        if white_points / num_points > 0.5:
+    for line_segment, white in zip(line_segments, is_white_line):
+        if white:
             white_lines.append(line_segment)
         else:
             other_lines.append(line_segment)
@@ -100,6 +115,14 @@ def draw_lines(frame, line_segments_with_colors):
     return frame
 
 
+def paste_into_full_frame(frame: np.ndarray, roi_offset: tuple[int, int], width: int, height: int) -> np.ndarray:
+    """Places a frame cropped by an ROIFilter at its offset on a black frame of the full size."""
+    full_frame = np.zeros((height, width) + frame.shape[2:], dtype=frame.dtype)
+    offset_x, offset_y = roi_offset
+    full_frame[offset_y : offset_y + frame.shape[0], offset_x : offset_x + frame.shape[1]] = frame
+    return full_frame
+
+
 def visualize_hough_lines(data: PipeData, lane_white_horizontal_lines, left_line_segment, other_horizontal_lines,
                           other_left_lane_lines, other_right_lane_lines, right_line_segment, white_horizontal_lines,
                           white_horizontals_outside_of_lane, white_left_lane_lines, white_right_lane_lines):
@@ -138,7 +161,11 @@ def visualize_hough_lines(data: PipeData, lane_white_horizontal_lines, left_line
 
 
 class LaneDetectFilter(BaseFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, white_line_threshold):
+    def __init__(self, video_info: VideoInfo, visualize: bool, white_line_threshold, tracking: bool = False):
+        """
+        :param tracking: smooth the lane lines over time and only search edges around the predicted lines,
+        see LaneTracker
+        """
         super().__init__(video_info=video_info, visualize=visualize)
 
         self.white_line_threshold = white_line_threshold
@@ -147,40 +174,49 @@ class LaneDetectFilter(BaseFilter):
         self.lane_width_in_cm = 35
         self.camera_visible_width_in_cm = 51
         self.lane_width_in_pixels = int((self.video_width / self.camera_visible_width_in_cm) * self.lane_width_in_cm)
+        # pixel thresholds tuned on the camera frames, scaled with the frames the pipeline works on
+        processing_scale = self.video_info.processing_scale
+        self.stop_line_min_y = int(600 * processing_scale)  # horizontal lines above it are outside of the lane
+        self.hough_threshold = max(1, int(50 * processing_scale))
+        self.min_line_length = int(300 * processing_scale)
+        self.max_line_gap = int(200 * processing_scale)
+
+        self.lane_tracker = None
+        if tracking:
+            self.lane_tracker = LaneTracker(
+                frame_width=self.video_width,
+                frame_height=self.video_height,
+                max_lane_height=self.max_lane_height,
+                stop_line_min_y=self.stop_line_min_y,
+                smoothing=Config.lane_tracking_smoothing,
+                band_width=max(1, int(self.video_width * Config.lane_tracking_band_ratio)),
+                max_missed_frames=Config.lane_tracking_max_missed_frames,
+            )
 
     def process(self, data: PipeData) -> PipeData:
-        hough_lines = self.compute_hough_lines(data.frame)
+        hough_lines, hough_offset = self.search_hough_lines(data)
 
         if hough_lines is None:
+            if self.lane_tracker is not None:
+                self.lane_tracker.miss()
             return super().process(data)
 
-        hough_line_segments = [] # list of LineSegment objects with (x1, y1) being the upper point (lower in height)
-        for i in range(len(hough_lines)):
-            x1, y1, x2, y2 = hough_lines[i][0]
-            if y1 < y2:  # point 1 is the upper point
-                hough_line_segments.append(LineSegment(x2, y2, x1, y1))
-            else:
-                hough_line_segments.append(LineSegment(x1, y1, x2, y2))
+        # lower point first, the searched frame may be cropped, the line segments are in full-frame coordinates
+        hough_line_segments = LineSegmentBatch.from_hough_lines(hough_lines, hough_offset)
 
-        white_line_segments, other_line_segments = filter_for_white_lines(data.raw_frame, hough_line_segments, threshold=self.white_line_threshold)
+        is_white_line = compute_white_line_mask(data.raw_frame, hough_line_segments, threshold=self.white_line_threshold)
+        white_line_segments = hough_line_segments[is_white_line]
+        other_line_segments = hough_line_segments[~is_white_line]
 
-        white_left_lines, white_right_lines, white_horizontal_lines = filter_lines_by_type(
-            white_line_segments,
-            self.video_width
-        )
-        other_left_lines, other_right_lines, other_horizontal_lines = filter_lines_by_type(
-            other_line_segments,
-            self.video_width
-        )
+        white_left_lines, white_right_lines, white_horizontal_lines = white_line_segments.split_by_type(self.video_width)
+        other_left_lines, other_right_lines, other_horizontal_lines = other_line_segments.split_by_type(self.video_width)
 
-        left_line_segment = None
-        if len(white_left_lines) > 0:
-            left_line_segment = max(white_left_lines, key=lambda l: l.compute_vertical_distance())
+        left_line_segment = white_left_lines.argmax(white_left_lines.compute_vertical_distances())
+        if left_line_segment is not None:
             left_line_segment = self.extend_line(left_line_segment)
 
-        right_line_segment = None
-        if len(white_right_lines) > 0:
-            right_line_segment = max(white_right_lines, key=lambda l: l.compute_euclidean_distance())
+        right_line_segment = white_right_lines.argmax(white_right_lines.compute_euclidean_distances())
+        if right_line_segment is not None:
             right_line_segment = self.extend_line(right_line_segment)
 
         left_line_virtual = False
@@ -195,13 +231,19 @@ class LaneDetectFilter(BaseFilter):
                                                                  left_line_segment, threshold_cm=12)
             right_line_virtual = True
 
+        if self.lane_tracker is not None:
+            if left_line_segment and right_line_segment:
+                left_line_segment, right_line_segment = self.lane_tracker.update(left_line_segment, right_line_segment)
+            else:
+                self.lane_tracker.miss()
+
         if left_line_segment and right_line_segment:
             half_lane_distance = (right_line_segment.lower_x - left_line_segment.lower_x) / 2
             dist_to_left_lane = self.video_width / 2 - left_line_segment.lower_x
             data.lateral_offset = (dist_to_left_lane - half_lane_distance) / (half_lane_distance + 0.0001)  # avoid division by zero
 
         lane_white_horizontal_lines, white_horizontals_outside_of_lane = self.filter_horizontals_based_on_lane(
-            white_horizontal_lines,
+            white_horizontal_lines.to_list(),
             left_line_segment,
             right_line_segment)
 
@@ -221,9 +263,12 @@ class LaneDetectFilter(BaseFilter):
 
         data.horizontal_lines = horiz_line_objects
 
-        if left_line_segment and right_line_segment:
-            data.frame = cv2.cvtColor(data.frame, cv2.COLOR_GRAY2BGR)
-        if self.visualize:
+        if self.should_render(data):
+            if left_line_segment and right_line_segment:
+                data.frame = cv2.cvtColor(data.frame, cv2.COLOR_GRAY2BGR)
+            if data.roi_offset != (0, 0):  # the lines are drawn in full-frame coordinates
+                data.frame = paste_into_full_frame(data.frame, data.roi_offset, self.video_width, self.video_height)
+                data.roi_offset = (0, 0)
             visualize_hough_lines(data, lane_white_horizontal_lines, left_line_segment, other_horizontal_lines,
                                   other_left_lines, other_right_lines, right_line_segment,
                                   white_horizontal_lines, white_horizontals_outside_of_lane, white_left_lines,
@@ -271,6 +316,34 @@ class LaneDetectFilter(BaseFilter):
 
         return LineSegment(left_lower_x, left_lower_y, left_upper_x, left_upper_y)
 
+    def search_hough_lines(self, data: PipeData) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Runs the Hough transform on the whole frame, or only on the band around the tracked lanes while tracking.
+        :returns: (HoughLinesP output, (x, y) of the searched image's origin in the full frame)
+        """
+        search_region = self.lane_tracker.search_region() if self.lane_tracker is not None else None
+        if search_region is None:
+            return self.compute_scaled_hough_lines(data.frame), data.roi_offset
+
+        # the region is in full-frame coordinates, the frame may be cropped by an ROIFilter
+        mask, (x0, y0, x1, y1) = search_region
+        offset_x, offset_y = data.roi_offset
+        height, width = data.frame.shape[:2]
+        x0, y0 = max(0, x0 - offset_x), max(0, y0 - offset_y)
+        x1, y1 = min(width, x1 - offset_x), min(height, y1 - offset_y)
+        if x0 >= x1 or y0 >= y1:
+            self.lane_tracker.reset()
+            return self.compute_scaled_hough_lines(data.frame), data.roi_offset
+
+        edges = cv2.bitwise_and(
+            data.frame[y0:y1, x0:x1], mask[y0 + offset_y : y1 + offset_y, x0 + offset_x : x1 + offset_x]
+        )
+        return self.compute_scaled_hough_lines(edges), (offset_x + x0, offset_y + y0)
+
+    def compute_scaled_hough_lines(self, frame):
+        return self.compute_hough_lines(frame, threshold=self.hough_threshold, min_line_length=self.min_line_length,
+                                        max_line_gap=self.max_line_gap)
+
     @staticmethod
     def compute_hough_lines(frame, rho=1, theta=np.pi / 180, threshold=50, min_line_length=300, max_line_gap=200):
         return cv2.HoughLinesP(frame, rho, theta, threshold, np.array([]), minLineLength=min_line_length,
@@ -282,7 +355,7 @@ class LaneDetectFilter(BaseFilter):
         horizontals_outside_of_lane = []
         for horiz_line_segment in horizontal_line_segments:
             if left_line and right_line:
-                if horiz_line_segment.lower_y < 600:  # if the line is above the lane
+                if horiz_line_segment.lower_y < self.stop_line_min_y:  # if the line is above the lane
                     horizontals_outside_of_lane.append(horiz_line_segment)
                     continue
 
@@ -0,0 +1,127 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from perception.objects.line_segment import LineSegment
+
+
+class LaneTracker:
+    """
+    Tracks the center and right lane lines of LaneDetectFilter across frames.
+
+    The lines detected by LaneDetectFilter always span from the bottom of the frame to max_lane_height, so a lane is
+    described by the x coordinates of both lines at those two heights. These are smoothed with an alpha-beta filter
+    (an EMA of the position and of the velocity), which also predicts where the lines are in the next frame.
+    Edges are only searched in a band around the predicted lines (plus the lane area where stop lines are accepted).
+    After max_missed_frames frames without a lane in the band the track is dropped and the full roi is searched again.
+    """
+
+    def __init__(self, frame_width: int, frame_height: int, max_lane_height: int, stop_line_min_y: int,
+                 smoothing: float, band_width: int, max_missed_frames: int):
+        """
+        :param smoothing: weight of the new measurement in (0, 1], 1 disables the smoothing
+        :param band_width: half width in pixels of the band searched around every predicted line
+        """
+        if not 0 < smoothing <= 1:
+            raise ValueError(f"smoothing must be in (0, 1], got {smoothing}")
+
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.max_lane_height = max_lane_height
+        self.stop_line_min_y = stop_line_min_y
+        self.alpha = smoothing
+        self.beta = smoothing ** 2 / (2 - smoothing)  # the critically damped velocity gain for alpha
+        self.band_width = band_width
+        self.max_missed_frames = max_missed_frames
+
+        # x of the center line and of the right line at the bottom of the frame and at max_lane_height
+        self.state: Optional[np.ndarray] = None
+        self.velocity = np.zeros(4)
+        self.missed_frames = 0
+        self._mask = None  # full-frame search mask, reused between frames
+
+    @property
+    def is_tracking(self) -> bool:
+        return self.state is not None
+
+    def reset(self):
+        self.state = None
+        self.velocity = np.zeros(4)
+        self.missed_frames = 0
+
+    def _lines(self, values: np.ndarray) -> tuple[LineSegment, LineSegment]:
+        center_bottom, center_top, right_bottom, right_top = (int(round(value)) for value in values)
+        return (LineSegment(center_bottom, self.frame_height, center_top, self.max_lane_height),
+                LineSegment(right_bottom, self.frame_height, right_top, self.max_lane_height))
+
+    def predict(self) -> Optional[tuple[LineSegment, LineSegment]]:
+        """:returns: (center line, right line) expected in the next frame, None without a track"""
+        if self.state is None:
+            return None
+        return self._lines(self.state + self.velocity)
+
+    def update(self, center_line: LineSegment, right_line: LineSegment) -> tuple[LineSegment, LineSegment]:
+        """
+        :param center_line: detected and extended by LaneDetectFilter (possibly virtual)
+        :returns: the smoothed (center line, right line)
+        """
+        measurement = np.array([center_line.lower_x, center_line.upper_x, right_line.lower_x, right_line.upper_x],
+                               dtype=float)
+        self.missed_frames = 0
+        if self.state is None:
+            self.state = measurement
+            self.velocity = np.zeros(4)
+        else:
+            prediction = self.state + self.velocity
+            residual = measurement - prediction
+            self.state = prediction + self.alpha * residual
+            self.velocity = self.velocity + self.beta * residual
+        return self._lines(self.state)
+
+    def miss(self):
+        """Records a frame without a lane, the track is dropped after max_missed_frames of them."""
+        if self.state is None:
+            return
+        self.missed_frames += 1
+        if self.missed_frames > self.max_missed_frames:
+            self.reset()
+        else:
+            self.state = self.state + self.velocity  # coast on the prediction
+
+    def search_region(self) -> Optional[tuple[np.ndarray, tuple[int, int, int, int]]]:
+        """
+        :returns: (full-frame uint8 mask, 255 where edges are searched, (x0, y0, x1, y1) bounding box of the mask),
+        None without a track (the full roi is searched)
+        """
+        prediction = self.predict()
+        if prediction is None:
+            return None
+
+        if self._mask is None:
+            self._mask = np.zeros((self.frame_height, self.frame_width), dtype=np.uint8)
+        else:
+            self._mask.fill(0)
+
+        center_line, right_line = prediction
+        for line in prediction:
+            cv2.line(self._mask, (int(line.lower_x), int(line.lower_y)), (int(line.upper_x), int(line.upper_y)), 255,
+                     2 * self.band_width)
+        # stop lines are accepted between the lines, below stop_line_min_y
+        if self.stop_line_min_y < self.frame_height:
+            stop_line_area = np.array([[
+                (center_line.compute_intersecting_x_coordinate(self.stop_line_min_y), self.stop_line_min_y),
+                (right_line.compute_intersecting_x_coordinate(self.stop_line_min_y), self.stop_line_min_y),
+                (int(right_line.lower_x), self.frame_height),
+                (int(center_line.lower_x), self.frame_height),
+            ]], dtype=np.int32)
+            cv2.fillPoly(self._mask, stop_line_area, 255)
+
+        xs = [int(line.lower_x) for line in prediction] + [int(line.upper_x) for line in prediction]
+        x0 = max(0, min(xs) - self.band_width)
+        x1 = min(self.frame_width, max(xs) + self.band_width + 1)
+        y0 = max(0, self.max_lane_height - self.band_width)
+        if x0 >= x1:
+            self.reset()  # the prediction left the frame
+            return None
+        return self._mask, (x0, y0, x1, self.frame_height)
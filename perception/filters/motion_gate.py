@@ -0,0 +1,63 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from perception.objects.road_info import RoadObject
+
+
+class MotionGate:
+    """
+    Lets an ObjectDetectionFilter reuse its detections while its roi doesn't change (at stops, on straight roads).
+
+    Every frame is downsampled (by `downscale`, averaging the pixels) to grayscale and compared with the last frame the
+    detector ran on. The change score is the share of the downsampled pixels that differ by more than
+    pixel_threshold gray levels: the averaging hides the sensor noise, and a small object that appears still changes
+    a few whole cells while a mean difference over the roi would barely move. Below `threshold` the frame is
+    unchanged and the detections of the reference frame are reused, at most max_reuse frames in a row.
+    """
+
+    def __init__(self, threshold: float, pixel_threshold: int, downscale: int, max_reuse: int):
+        """
+        :param threshold: share of changed pixels in [0, 1] from which the detector runs again
+        """
+        if downscale < 1:
+            raise ValueError(f"downscale must be at least 1, got {downscale}")
+
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.downscale = downscale
+        self.max_reuse = max_reuse
+
+        self.reference: Optional[np.ndarray] = None  # downsampled gray frame the detector ran on
+        self.reference_frame_version = -1
+        self.detections: list[RoadObject] = []  # of the reference frame
+        self.reuse_count = 0
+        self.last_score = 1.0
+        self._candidate: Optional[np.ndarray] = None  # downsampled frame of the last check
+
+    def _downsample(self, frame: np.ndarray) -> np.ndarray:
+        size = (max(1, frame.shape[1] // self.downscale), max(1, frame.shape[0] // self.downscale))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def is_unchanged(self, frame: np.ndarray) -> bool:
+        """:returns: whether the detections of the reference frame can be reused for the frame"""
+        self._candidate = self._downsample(frame)
+        if self.reference is None or self.reference.shape != self._candidate.shape:
+            self.last_score = 1.0
+            return False
+
+        changed = cv2.absdiff(self._candidate, self.reference) > self.pixel_threshold
+        self.last_score = np.count_nonzero(changed) / changed.size
+        if self.last_score >= self.threshold or self.reuse_count >= self.max_reuse:
+            return False
+        self.reuse_count += 1
+        return True
+
+    def update(self, frame_version: int, detections: list[RoadObject]):
+        """Makes the frame of the last is_unchanged check the reference, with the detections the detector found in it."""
+        self.reference = self._candidate
+        self.reference_frame_version = frame_version
+        self.detections = detections
+        self.reuse_count = 0
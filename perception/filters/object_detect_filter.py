@@ -1,50 +1,131 @@
+from typing import Optional
+
 import cv2
-from ultralytics import YOLO
-import torch
 
+from configuration.config import Config
+from ipc.inference_channel import InferenceClient
 from perception.filters.base_filter import BaseFilter
+from perception.filters.detection_backends import Detector, load_detector
+from perception.filters.motion_gate import MotionGate
+from perception.filters.object_tracker import ObjectTracker
 from perception.objects.pipe_data import PipeData
 from perception.objects.road_info import RoadObject
 from perception.objects.video_info import VideoInfo
 
 
+def draw_detections(frame, detections: list[RoadObject]):
+    """:returns: a copy of the frame with the boxes and labels of the detections"""
+    frame = frame.copy()
+    for detection in detections:
+        x1, y1, x2, y2 = (int(value) for value in detection.bbox)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        track = f' #{detection.track_id}' if detection.track_id >= 0 else ''
+        cv2.putText(frame, f'{detection.label}{track} {detection.conf:.2f}', (x1, max(0, y1 - 5)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, (0, 255, 0), 1)
+    return frame
+
+
 class ObjectDetectionFilter(BaseFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose):
+    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose, keyframe_interval: int = 1,
+                 motion_gate: bool = False):
+        """
+        :param keyframe_interval: run the model on every Nth frame only and track the detections with optical flow
+        in between, see ObjectTracker (1 runs it on every frame)
+        :param motion_gate: reuse the detections of the last frame the model ran on while the roi doesn't change,
+        see MotionGate
+        """
         super().__init__(video_info=video_info, visualize=visualize)
-        self.model = YOLO(model_path)
+        self.model_path = model_path
+        # loaded in the pipeline process (with Config.detection_backend), unless the inference server runs the model
+        self.detector: Optional[Detector] = None
         self.verbose = verbose
-
-        if torch.cuda.is_available():
-            print(f'{model_path} running on gpu...')
-        else:
-            print(f'{model_path} running on cpu...')
+        # set by parse_pipeline_configuration when Config.use_inference_server is enabled
+        self.inference_client: Optional[InferenceClient] = None
+
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be at least 1, got {keyframe_interval}")
+        self.tracker = None
+        if keyframe_interval > 1:
+            self.tracker = ObjectTracker(
+                keyframe_interval=keyframe_interval,
+                min_confidence=Config.detection_tracking_min_confidence,
+                iou_threshold=Config.detection_tracking_iou_threshold,
+                max_points=Config.detection_tracking_max_points,
+            )
+        self.motion_gate = None
+        if motion_gate:
+            self.motion_gate = MotionGate(
+                threshold=Config.detection_motion_gate_threshold,
+                pixel_threshold=Config.detection_motion_gate_pixel_threshold,
+                downscale=Config.detection_motion_gate_downscale,
+                max_reuse=Config.detection_motion_gate_max_reuse,
+            )
+        self.detector_runs = 0
 
         self.result = None
 
-    def pre_process_result(self, yolo_results, data: PipeData, confidence_threshold=0.5):
-        labels = yolo_results.names
+    def run_detector(self, data: PipeData) -> list[RoadObject]:
+        """:returns: the detections of the model in data.frame (run locally or on the inference server)"""
+        self.detector_runs += 1
+        if self.inference_client is not None:
+            detections = self.inference_client.infer(data.frame_version, data.frame)
+            return [] if detections is None else detections  # None when the server stopped
+
+        if self.detector is None:
+            self.detector = load_detector(self.model_path, verbose=self.verbose)
+        return self.detector([data.frame])[0]
+
+    def detect(self, data: PipeData) -> list[RoadObject]:
+        """
+        Runs the model on data.frame, moves the tracked detections to it between keyframes, or reuses the detections
+        of an unchanged earlier frame. data.frame becomes the annotated frame.
+        :returns: the detections in data.frame coordinates, with the frame_version of the frame they were found in
+        """
+        if self.motion_gate is not None and self.motion_gate.is_unchanged(data.frame):
+            detections = self.motion_gate.detections
+        else:
+            detector_runs = self.detector_runs
+            if self.tracker is None:
+                detections = self.run_detector(data)
+            else:
+                detections = None
+                if not self.tracker.needs_keyframe(data.frame):
+                    detections = self.tracker.propagate(data.frame)
+                if detections is None:  # a keyframe, or a track was lost
+                    detections = self.tracker.update(data.frame, self.run_detector(data))
+
+            for detection in detections:
+                detection.source_frame_version = data.frame_version
+            if self.motion_gate is not None and self.detector_runs > detector_runs:
+                self.motion_gate.update(data.frame_version, detections)
+
+        if self.should_render(data):
+            data.frame = draw_detections(data.frame, detections)
+        return detections
+
+    def pre_process_result(self, detections: list[RoadObject], data: PipeData, confidence_threshold=0.5):
         results = []
 
-        for yolo_object in yolo_results:
-            prediction_id = int(yolo_object.boxes.cls.item())
-            prediction_label = labels[prediction_id]
-
-            confidence = round(float(yolo_object.boxes.conf.item()), 2)
-
+        for detection in detections:
+            confidence = detection.conf
             if confidence < confidence_threshold:
                 continue
-            bbox_tensor_cpu = yolo_object.boxes.xyxy.cpu()
-            bbox_list = [float(f'{el: .4f}') for el in bbox_tensor_cpu.tolist()[0]]
+            bbox_list = detection.bbox
 
-            if self.visualize:
+            if self.should_render(data):
                 data.frame = data.frame.copy() # make it writable
                 cv2.circle(data.frame, (int((bbox_list[0] + bbox_list[2]) / 2), int((bbox_list[1] + bbox_list[3]) / 2)), 4,
                            (255, 0, 0), 5)
+            # the frame may be cropped by an ROIFilter, the results are in full-frame coordinates
+            offset_x, offset_y = data.roi_offset
+            bbox_list = [bbox_list[0] + offset_x, bbox_list[1] + offset_y, bbox_list[2] + offset_x, bbox_list[3] + offset_y]
+
             if data.depth_frame is not None:  # check if realsense is connected and depth frame is available
-                distance = get_distance_from_realsense(data.depth_frame, bbox_list)
+                distance = get_distance_from_realsense(data.depth_frame, bbox_list, self.video_width, self.video_height)
             else:
                 distance = float("inf")
-            road_object = RoadObject(bbox=bbox_list, label=prediction_label, conf=confidence, distance=distance)
+            road_object = RoadObject(bbox=bbox_list, label=detection.label, conf=confidence, distance=distance,
+                                     track_id=detection.track_id, source_frame_version=detection.source_frame_version)
             results.append(road_object)
 
         return sorted(results, key=lambda x: x.distance)
@@ -53,54 +134,49 @@ class ObjectDetectionFilter(BaseFilter):
         return super().process(data)
 
 
-def get_distance_from_realsense(depth_frame, bbox_list):
-    xscaling = 640 / 1280
-    yscaling = 480 / 720
+def get_distance_from_realsense(depth_frame, bbox_list, frame_width=1280, frame_height=720):
+    """:param frame_width: of the frame the bbox is in, the depth frame is mapped onto it"""
+    xscaling = depth_frame.shape[1] / frame_width
+    yscaling = depth_frame.shape[0] / frame_height
     x = int((bbox_list[0] + bbox_list[2]) / 2 * xscaling)
     y = int((bbox_list[1] + bbox_list[3]) / 2 * yscaling)
     return depth_frame[y, x]
 
 
 class SignsDetect(ObjectDetectionFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False):
-        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose)
+    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False, keyframe_interval: int = 1,
+                 motion_gate: bool = False):
+        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose,
+                         keyframe_interval=keyframe_interval, motion_gate=motion_gate)
 
     def process(self, data):
-        if torch.cuda.is_available():
-            self.model.cuda()
-
-        yolo_results = self.model(data.frame, verbose=self.verbose)
-        data.traffic_signs = self.pre_process_result(yolo_results[0], data, 0.3)
-        data.frame = yolo_results[0].plot()
+        detections = self.detect(data)
+        data.traffic_signs = self.pre_process_result(detections, data, 0.3)
 
         return super().process(data)
 
 
 class TrafficLightDetect(ObjectDetectionFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False):
-        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose)
+    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False, keyframe_interval: int = 1,
+                 motion_gate: bool = False):
+        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose,
+                         keyframe_interval=keyframe_interval, motion_gate=motion_gate)
 
     def process(self, data):
-        if torch.cuda.is_available():
-            self.model.cuda()
-
-        yolo_results = self.model(data.frame, verbose=self.verbose)
-        data.traffic_lights = self.pre_process_result(yolo_results[0], data, 0.3)
-        data.frame = yolo_results[0].plot()
+        detections = self.detect(data)
+        data.traffic_lights = self.pre_process_result(detections, data, 0.3)
 
         return super().process(data)
 
 
 class PedestrianDetect(ObjectDetectionFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False):
-        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose)
+    def __init__(self, video_info: VideoInfo, visualize: bool, model_path, verbose=False, keyframe_interval: int = 1,
+                 motion_gate: bool = False):
+        super().__init__(video_info=video_info, visualize=visualize, model_path=model_path, verbose=verbose,
+                         keyframe_interval=keyframe_interval, motion_gate=motion_gate)
 
     def process(self, data):
-        if torch.cuda.is_available():
-            self.model.cuda()
-
-        yolo_results = self.model(data.frame, verbose=self.verbose)
-        data.pedestrians = self.pre_process_result(yolo_results[0], data, 0.3)
-        data.frame = yolo_results[0].plot()
+        detections = self.detect(data)
+        data.pedestrians = self.pre_process_result(detections, data, 0.3)
 
         return super().process(data)
\ No newline at end of file
@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from perception.objects.road_info import RoadObject
+
+
+@dataclass(slots=True)
+class Track:
+    track_id: int
+    box: np.ndarray  # x1, y1, x2, y2 in the coordinates of the detection filter's frame
+    label: str
+    conf: float  # of the last detection
+    confidence: float = 1.0  # share of the box's flow points that were tracked consistently in the last frame
+
+
+def box_iou(first: np.ndarray, second: np.ndarray) -> float:
+    width = max(0.0, min(first[2], second[2]) - max(first[0], second[0]))
+    height = max(0.0, min(first[3], second[3]) - max(first[1], second[1]))
+    intersection = width * height
+    union = (first[2] - first[0]) * (first[3] - first[1]) + (second[2] - second[0]) * (second[3] - second[1])
+    return intersection / (union - intersection) if union > intersection else 0.0
+
+
+class ObjectTracker:
+    """
+    Schedules the detector of an ObjectDetectionFilter and tracks its detections in between.
+
+    The detector runs on a keyframe every keyframe_interval frames. Between keyframes the boxes are moved with sparse
+    Lucas-Kanade optical flow: the corners inside every box are tracked from the previous frame (forward and back, to
+    drop inconsistent points), the box moves by their median displacement and scales with their median spread.
+    When a track's confidence (the share of consistent points) drops below min_confidence, the detector runs on the
+    frame right away and it becomes a keyframe.
+    On keyframes the detections are matched to the tracks by IoU (same label, greedy by overlap), matched detections
+    keep the track_id of their track, the others start a new track and the unmatched tracks end.
+    """
+
+    MIN_POINTS = 3  # a track with fewer consistent points is lost
+    MAX_FORWARD_BACKWARD_ERROR = 1.0  # pixels
+
+    def __init__(self, keyframe_interval: int, min_confidence: float, iou_threshold: float, max_points: int):
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be at least 1, got {keyframe_interval}")
+
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.max_points = max_points
+
+        self.tracks: list[Track] = []
+        self.next_track_id = 0
+        self.frames_since_keyframe = 0
+        self.previous_gray: Optional[np.ndarray] = None
+        self._tracks_on_previous_gray = False  # propagate moved the tracks to the frame that becomes a keyframe
+
+    def needs_keyframe(self, frame: np.ndarray) -> bool:
+        return (
+            self.previous_gray is None
+            or self.previous_gray.shape != frame.shape[:2]
+            or self.frames_since_keyframe + 1 >= self.keyframe_interval
+        )
+
+    def update(self, frame: np.ndarray, detections: list[RoadObject]) -> list[RoadObject]:
+        """
+        Starts a keyframe with the detections of the frame.
+        :returns: the detections with their track_id
+        """
+        gray = self._gray(frame)
+        if self._tracks_on_previous_gray:
+            gray = self.previous_gray
+        elif self.previous_gray is not None and self.previous_gray.shape == gray.shape:
+            self._move_tracks(gray)  # to the frame of the detections, so that fast objects still overlap
+        boxes = [np.array(detection.bbox, dtype=np.float64) for detection in detections]
+
+        candidates = sorted(
+            (
+                (box_iou(track.box, box), track_index, detection_index)
+                for track_index, track in enumerate(self.tracks)
+                for detection_index, box in enumerate(boxes)
+                if track.label == detections[detection_index].label
+            ),
+            reverse=True,
+        )
+        track_ids: dict[int, int] = {}
+        matched_tracks = set()
+        for iou, track_index, detection_index in candidates:
+            if iou < self.iou_threshold:
+                break
+            if track_index in matched_tracks or detection_index in track_ids:
+                continue
+            matched_tracks.add(track_index)
+            track_ids[detection_index] = self.tracks[track_index].track_id
+
+        self.tracks = []
+        for detection_index, detection in enumerate(detections):
+            track_id = track_ids.get(detection_index)
+            if track_id is None:
+                track_id = self.next_track_id
+                self.next_track_id += 1
+            self.tracks.append(Track(track_id, boxes[detection_index], detection.label, detection.conf))
+
+        self.previous_gray = gray
+        self._tracks_on_previous_gray = False
+        self.frames_since_keyframe = 0
+        return self._road_objects()
+
+    def propagate(self, frame: np.ndarray) -> Optional[list[RoadObject]]:
+        """
+        Moves the tracks to the frame, call it on the frames needs_keyframe doesn't ask the detector for.
+        :returns: the tracked objects, None when a track was lost (the frame needs a keyframe, pass it to update)
+        """
+        gray = self._gray(frame)
+        self._move_tracks(gray)
+        self.previous_gray = gray
+        if any(track.confidence < self.min_confidence for track in self.tracks):
+            self._tracks_on_previous_gray = True
+            return None
+        self.frames_since_keyframe += 1
+        return self._road_objects()
+
+    def reset(self):
+        self.tracks = []
+        self.previous_gray = None
+        self._tracks_on_previous_gray = False
+        self.frames_since_keyframe = 0
+
+    @staticmethod
+    def _gray(frame: np.ndarray) -> np.ndarray:
+        return frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _road_objects(self) -> list[RoadObject]:
+        return [
+            RoadObject(bbox=[float(value) for value in track.box], label=track.label, conf=track.conf,
+                       distance=float("inf"), track_id=track.track_id)
+            for track in self.tracks
+        ]
+
+    def _track_points(self, gray: np.ndarray) -> list[Optional[np.ndarray]]:
+        """:returns: the corners inside the box of every track in previous_gray, None for boxes without any"""
+        height, width = gray.shape
+        track_points = []
+        for track in self.tracks:
+            x1, y1 = max(0, int(track.box[0])), max(0, int(track.box[1]))
+            x2, y2 = min(width, int(np.ceil(track.box[2]))), min(height, int(np.ceil(track.box[3])))
+            corners = None
+            if x2 - x1 >= 3 and y2 - y1 >= 3:
+                corners = cv2.goodFeaturesToTrack(self.previous_gray[y1:y2, x1:x2], self.max_points, 0.01, 3)
+            if corners is None:
+                track_points.append(None)
+            else:
+                track_points.append(corners.reshape(-1, 2) + (x1, y1))
+        return track_points
+
+    def _move_tracks(self, gray: np.ndarray):
+        track_points = self._track_points(gray)
+        tracked = [points for points in track_points if points is not None]
+        if not tracked:
+            for track in self.tracks:
+                track.confidence = 0.0
+            return
+
+        # one pyramid pass for the points of all tracks, and one back to check them
+        points = np.concatenate(tracked).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, gray, points, None)
+        returned, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.previous_gray, moved, None)
+        consistent = (
+            (status.ravel() == 1)
+            & (back_status.ravel() == 1)
+            & (np.linalg.norm(returned - points, axis=1) < self.MAX_FORWARD_BACKWARD_ERROR)
+        )
+
+        height, width = gray.shape
+        start = 0
+        for track, points_of_track in zip(self.tracks, track_points):
+            if points_of_track is None:
+                track.confidence = 0.0
+                continue
+            end = start + len(points_of_track)
+            good = consistent[start:end]
+            old, new = points[start:end][good], moved[start:end][good]
+            start = end
+
+            track.confidence = len(old) / len(points_of_track) if len(old) >= self.MIN_POINTS else 0.0
+            if track.confidence == 0.0:
+                continue
+
+            old_center, new_center = np.median(old, axis=0), np.median(new, axis=0)
+            old_spread = np.linalg.norm(old - old_center, axis=1)
+            new_spread = np.linalg.norm(new - new_center, axis=1)
+            spread = old_spread > 1e-3
+            scale = float(np.median(new_spread[spread] / old_spread[spread])) if spread.any() else 1.0
+
+            box_center = (track.box[:2] + track.box[2:]) / 2 + (new_center - old_center)
+            half_size = (track.box[2:] - track.box[:2]) / 2 * scale
+            box = np.concatenate((box_center - half_size, box_center + half_size))
+            track.box = np.clip(box, 0, [width, height, width, height])
+            if track.box[2] - track.box[0] < 1 or track.box[3] - track.box[1] < 1:  # left the frame
+                track.confidence = 0.0
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
@@ -6,24 +8,70 @@ from perception.objects.pipe_data import PipeData
 from perception.objects.video_info import VideoInfo
 
 
+@lru_cache(maxsize=32)
+def _cached_roi_mask(shape: tuple[int, ...], dtype: str, polygon: tuple[tuple[int, int], ...]) -> np.ndarray:
+    mask = np.zeros(shape, dtype=np.dtype(dtype))
+    cv2.fillPoly(mask, np.array([polygon]), (255, 255, 255))
+    mask.flags.writeable = False  # shared by every filter with the same roi
+    return mask
+
+
+def get_roi_mask(shape: tuple[int, ...], dtype, roi_bbox, offset: tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    :param offset: (x, y) of the frame's origin in the full frame, the roi is given in full-frame coordinates
+    :returns: the (read-only, cached) mask with 255 inside the roi polygon
+    """
+    polygon = tuple((int(x) - offset[0], int(y) - offset[1]) for x, y in roi_bbox)
+    return _cached_roi_mask(tuple(shape), np.dtype(dtype).str, polygon)
+
+
+def get_roi_crop(frame_shape: tuple[int, ...], roi_bbox, offset: tuple[int, int] = (0, 0)) -> tuple[int, int, int, int]:
+    """
+    :returns: (x0, y0, x1, y1), the bounding box of the roi clipped to the frame, in frame coordinates
+    """
+    xs = [int(x) - offset[0] for x, _ in roi_bbox]
+    ys = [int(y) - offset[1] for _, y in roi_bbox]
+    height, width = frame_shape[:2]
+    # fillPoly includes the pixels on the polygon's edges
+    x0, x1 = max(0, min(xs)), min(width, max(xs) + 1)
+    y0, y1 = max(0, min(ys)), min(height, max(ys) + 1)
+    if x0 >= x1 or y0 >= y1:
+        raise ValueError(f"The roi {roi_bbox} lies outside of the {width}x{height} frame")
+    return x0, y0, x1, y1
+
+
 class ROIFilter(BaseFilter):
-    def __init__(self, video_info: VideoInfo, visualize: bool, roi_type: str):
+    def __init__(self, video_info: VideoInfo, visualize: bool, roi_type: str, crop: bool = False):
+        """
+        :param crop: cut the frame to the bounding box of the roi (data.roi_offset records where it starts),
+        the filters after it report their results in full-frame coordinates
+        """
         super().__init__(video_info=video_info, visualize=visualize)
 
         if not isinstance(roi_type, str) or roi_type not in self.video_rois:
             raise ValueError(f"Invalid roi_type {roi_type}")
 
+        self.roi_type = roi_type
         self.roi_bounding_box = self.video_rois.get(roi_type)
+        self.crop = crop
 
     @staticmethod
     def define_roi(image, roi_bbox):
         poly = np.array([roi_bbox])
-        mask = np.zeros_like(image)
-        cv2.fillPoly(mask, poly, (255, 255, 255))
+        mask = get_roi_mask(image.shape, image.dtype, roi_bbox)
 
         return cv2.bitwise_and(image, mask), mask, poly
 
     def process(self, data: PipeData) -> PipeData:
-        data.frame, _, _ = self.define_roi(data.frame, self.roi_bounding_box)
+        if not self.crop:
+            mask = get_roi_mask(data.frame.shape, data.frame.dtype, self.roi_bounding_box, data.roi_offset)
+            data.frame = cv2.bitwise_and(data.frame, mask)
+            return super().process(data)
+
+        x0, y0, x1, y1 = get_roi_crop(data.frame.shape, self.roi_bounding_box, data.roi_offset)
+        offset = (data.roi_offset[0] + x0, data.roi_offset[1] + y0)
+        cropped = data.frame[y0:y1, x0:x1]
+        data.frame = cv2.bitwise_and(cropped, get_roi_mask(cropped.shape, cropped.dtype, self.roi_bounding_box, offset))
+        data.roi_offset = offset
 
-        return super().process(data)
\ No newline at end of file
+        return super().process(data)
@@ -7,9 +7,12 @@ import numpy as np
 from matplotlib import pyplot as plt
 
 from configuration.config import Config
+from ipc.inference_channel import InferenceClient
 from perception.filters.base_filter import BaseFilter
+from perception.filters.basic_filters.fused_preprocess_filter import fuse_filter_chain
+from perception.filters.object_detect_filter import ObjectDetectionFilter
 from perception.objects.pipeline_config_types import PipelineConfig, JSONPipelinesTYPE, FILTER_CLASS_LOOKUP
-from perception.objects.video_info import VideoInfo, VideoRois
+from perception.objects.video_info import VideoInfo, VideoRois, scale_video_info
 
 def pack_named_images(description: str, items: list[tuple[str, np.ndarray]]) -> bytearray:
     """
@@ -68,53 +71,95 @@ def pack_named_images(description: str, items: list[tuple[str, np.ndarray]]) ->
     return buffer
 
 def parse_pipeline_configuration(JSON_pipelines_config: JSONPipelinesTYPE, video_info: VideoInfo,
-                                 models_dir_path: str, enable_pipeline_visualization: bool = True) -> list[PipelineConfig]:
+                                 models_dir_path: str, enable_pipeline_visualization: bool = True,
+                                 use_inference_server: bool = False) -> list[PipelineConfig]:
+    """
+    :param use_inference_server: the detection filters get an InferenceClient, numbered across all pipelines
+    """
     pipelines: list[PipelineConfig] = []
+    inference_client_count = 0
 
     for JSON_pipeline_config in JSON_pipelines_config:
         pipeline_name = JSON_pipeline_config.get("name", "Unnamed Pipeline")
-        filters: list[BaseFilter] = []
-
-        filters_config = JSON_pipeline_config.get("filters", {})
-        for filter_class_name, provided_params in filters_config.items():
-            class_with_expected_params = FILTER_CLASS_LOOKUP.get(filter_class_name)
-            if not class_with_expected_params:
-                raise ValueError(f"Invalid filter name: {filter_class_name}")
-
-            filter_class = class_with_expected_params.filter_class
-            expected_params = class_with_expected_params.expected_params
 
-            # validate the existence of the required files for the models
-            if "model" in provided_params:
-                if "model_path" in expected_params:
-                    provided_params["model_path"] = os.path.join(models_dir_path, provided_params["model"])
-                    del provided_params["model"]
-                else:
-                    raise ValueError(f"Provided model for {filter_class_name} that does not require it")
+        # the filters see the frame size, rois and pixel thresholds of the resized frames
+        processing_scale = JSON_pipeline_config.get("processing_scale", 1.0)
+        if not isinstance(processing_scale, (int, float)) or not 0 < processing_scale <= 1:
+            raise ValueError(f"Invalid processing_scale {processing_scale} for {pipeline_name}, expected (0, 1]")
+        pipeline_video_info = scale_video_info(video_info, processing_scale)
+        pipelined = JSON_pipeline_config.get("pipelined", False)
+        if not isinstance(pipelined, bool):
+            raise ValueError(f"Invalid pipelined {pipelined} for {pipeline_name}, expected true or false")
 
-            # validate the roi_type parameter
-            elif ("roi_type" in provided_params and
-                  provided_params["roi_type"] not in ["lines", "signs", "traffic_lights", "pedestrians"]):
-                raise ValueError(f"Invalid roi_type {provided_params['roi_type']} for {filter_class_name}")
+        replicas = JSON_pipeline_config.get("replicas", 1)
+        if not isinstance(replicas, int) or isinstance(replicas, bool) or replicas < 1:
+            raise ValueError(f"Invalid replicas {replicas} for {pipeline_name}, expected a positive integer")
 
-            if "visualize" in provided_params and not enable_pipeline_visualization:
-                provided_params["visualize"] = False # Disable visualization if not enabled in config
-
-            # validate that the provided parameters are the expected ones
-            unexpected_args = [arg for arg in provided_params if arg not in expected_params]
-            if unexpected_args:
-                raise ValueError(f"Unexpected arguments for {filter_class_name}: {unexpected_args}")
-
-            try:
-                filter_instance = filter_class(video_info=video_info, **provided_params)
-            except Exception as e:
-                raise ValueError(f"Failed to instantiate filter {filter_class_name} with error: {str(e)}")
+        # every replica gets its own filter instances
+        filters_config = JSON_pipeline_config.get("filters", {})
+        filter_chains: list[list[BaseFilter]] = []
+        for _ in range(replicas):
+            filters: list[BaseFilter] = []
+            for filter_class_name, provided_params in filters_config.items():
+                provided_params = dict(provided_params)
+                class_with_expected_params = FILTER_CLASS_LOOKUP.get(filter_class_name)
+                if not class_with_expected_params:
+                    raise ValueError(f"Invalid filter name: {filter_class_name}")
+
+                filter_class = class_with_expected_params.filter_class
+                expected_params = class_with_expected_params.expected_params
+
+                # validate the existence of the required files for the models
+                if "model" in provided_params:
+                    if "model_path" in expected_params:
+                        provided_params["model_path"] = os.path.join(models_dir_path, provided_params["model"])
+                        del provided_params["model"]
+                    else:
+                        raise ValueError(f"Provided model for {filter_class_name} that does not require it")
+
+                # validate the roi_type parameter
+                elif ("roi_type" in provided_params and
+                      provided_params["roi_type"] not in ["lines", "signs", "traffic_lights", "pedestrians"]):
+                    raise ValueError(f"Invalid roi_type {provided_params['roi_type']} for {filter_class_name}")
+
+                if "visualize" in provided_params and not enable_pipeline_visualization:
+                    provided_params["visualize"] = False # Disable visualization if not enabled in config
+
+                # validate that the provided parameters are the expected ones
+                unexpected_args = [arg for arg in provided_params if arg not in expected_params]
+                if unexpected_args:
+                    raise ValueError(f"Unexpected arguments for {filter_class_name}: {unexpected_args}")
+
+                try:
+                    filter_instance = filter_class(video_info=pipeline_video_info, **provided_params)
+                except Exception as e:
+                    raise ValueError(f"Failed to instantiate filter {filter_class_name} with error: {str(e)}")
+
+                if use_inference_server and isinstance(filter_instance, ObjectDetectionFilter):
+                    filter_instance.inference_client = InferenceClient(inference_client_count)
+                    inference_client_count += 1
+
+                filters.append(filter_instance)
+
+            if Config.fuse_preprocessing_filters:
+                filters = fuse_filter_chain(filters)
+            filter_chains.append(filters)
+
+        pipelines.append(PipelineConfig(
+            name=pipeline_name, filters=filter_chains[0], processing_scale=processing_scale, pipelined=pipelined,
+            replicas=replicas, replica_filters=filter_chains[1:],
+        ))
 
-            filters.append(filter_instance)
+    return pipelines
 
-        pipelines.append(PipelineConfig(name=pipeline_name, filters=filters))
 
-    return pipelines
+def inference_client_models(pipelines: list[PipelineConfig]) -> list[str]:
+    """:returns: the model path of every InferenceClient of the pipelines, by client index"""
+    clients = [
+        filter for pipeline in pipelines for filters in [pipeline.filters] + pipeline.replica_filters for filter in filters
+        if isinstance(filter, ObjectDetectionFilter) and filter.inference_client is not None
+    ]
+    return [filter.model_path for filter in sorted(clients, key=lambda filter: filter.inference_client.client_index)]
 
 
 def get_roi_bbox_for_video(video_name, video_width, video_height, roi_config_path: str) -> VideoRois:
@@ -136,14 +181,16 @@ def get_roi_bbox_for_video(video_name, video_width, video_height, roi_config_pat
         raise ValueError(
             f"Video name {video_name} not found and no default resolution for {resolution_key} in {roi_config_path}")
 
-def initialize_config(enable_pipeline_visualization: bool) -> tuple[list[PipelineConfig], VideoInfo, VideoRois]:
+def initialize_config(enable_pipeline_visualization: bool,
+                      use_inference_server: bool = False) -> tuple[list[PipelineConfig], VideoInfo, VideoRois]:
     video_rois: VideoRois = get_roi_bbox_for_video(Config.video_name, Config.width, Config.height, Config.roi_config_path)
 
     video_info = VideoInfo(video_name=Config.video_name, height=Config.height,
                            width=Config.width, video_rois=video_rois)
     with open(Config.pipeline_config_path, 'r') as f:
         JSON_pipeline_config: JSONPipelinesTYPE = json.load(f)
-    pipelines = parse_pipeline_configuration(JSON_pipeline_config, video_info, Config.models_dir_path, enable_pipeline_visualization)
+    pipelines = parse_pipeline_configuration(JSON_pipeline_config, video_info, Config.models_dir_path,
+                                             enable_pipeline_visualization, use_inference_server)
     return pipelines, video_info, video_rois
 
 def extract_pipeline_names() -> list[str]:
@@ -88,6 +88,13 @@ class LineSegment:
         y_values = np.linspace(self.lower_y, self.upper_y, num=num_points, dtype=int)
         return list(zip(x_values, y_values))
 
+    def scale(self, factor: float) -> "LineSegment":
+        """
+        Returns the line segment with its coordinates multiplied by `factor` (e.g. from a resized frame back to the
+        camera frame).
+        """
+        return LineSegment(*(int(round(value * factor)) for value in self.coordinates.ravel()))
+
     def compute_distance_to_point(self, point: tuple[int, int]) -> float:
         """
         Computes the distance between the line segment and a point.
@@ -0,0 +1,118 @@
+from typing import Iterator, Optional
+
+import numpy as np
+
+from perception.objects.line_segment import LineSegment
+
+
+class LineSegmentBatch:
+    """
+    Many line segments stored as one (N, 4) array of lower_x, lower_y, upper_x, upper_y rows, with the same
+    geometry as LineSegment computed for all of them at once.
+    Only the segments that are kept have to be turned into LineSegment objects (see segment, argmax and iteration).
+    """
+
+    __slots__ = ["coordinates"]
+
+    def __init__(self, coordinates: np.ndarray):
+        self.coordinates = np.asarray(coordinates, dtype=int).reshape(-1, 4)
+
+    @classmethod
+    def from_hough_lines(cls, hough_lines: Optional[np.ndarray], offset: tuple[int, int] = (0, 0)) -> "LineSegmentBatch":
+        """
+        :param hough_lines: output of cv2.HoughLinesP, (N, 1, 4) in OpenCV 4 or (N, 4) in OpenCV 5
+        :param offset: (x, y) added to every point, e.g. PipeData.roi_offset of a cropped frame
+        :returns: the segments with the lower point (the larger y) first, like LaneDetectFilter orders them
+        """
+        if hough_lines is None:
+            return cls(np.empty((0, 4), dtype=int))
+
+        lines = hough_lines.reshape(-1, 4).astype(int)
+        swap = lines[:, 1] < lines[:, 3]  # point 1 is the upper point
+        lines[swap] = lines[swap][:, [2, 3, 0, 1]]
+        lines += [offset[0], offset[1], offset[0], offset[1]]
+        return cls(lines)
+
+    @classmethod
+    def from_segments(cls, line_segments: list[LineSegment]) -> "LineSegmentBatch":
+        return cls(np.array([list(line_segment) for line_segment in line_segments], dtype=int).reshape(-1, 4))
+
+    @property
+    def lower_x(self) -> np.ndarray:
+        return self.coordinates[:, 0]
+
+    @property
+    def lower_y(self) -> np.ndarray:
+        return self.coordinates[:, 1]
+
+    @property
+    def upper_x(self) -> np.ndarray:
+        return self.coordinates[:, 2]
+
+    @property
+    def upper_y(self) -> np.ndarray:
+        return self.coordinates[:, 3]
+
+    def compute_slopes(self) -> np.ndarray:
+        """Same as LineSegment.slope: inf for vertical segments."""
+        delta_x = self.upper_x - self.lower_x
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = (self.upper_y - self.lower_y) / delta_x
+        slopes[delta_x == 0] = np.inf
+        return slopes
+
+    def compute_vertical_distances(self) -> np.ndarray:
+        return np.abs(self.upper_y - self.lower_y)
+
+    def compute_euclidean_distances(self) -> np.ndarray:
+        return np.sqrt((self.upper_x - self.lower_x) ** 2 + (self.upper_y - self.lower_y) ** 2)
+
+    def compute_angles_with_ox_radians(self) -> np.ndarray:
+        return np.arctan2(np.abs(self.upper_y - self.lower_y), np.abs(self.upper_x - self.lower_x))
+
+    def check_are_horizontal(self, threshold_degrees) -> np.ndarray:
+        """:returns: boolean mask, see LineSegment.check_is_horizontal"""
+        if threshold_degrees < 0 or threshold_degrees > 45:
+            raise ValueError("The threshold angle must be between 0 and 45 degrees")
+        return np.abs(self.compute_angles_with_ox_radians()) < np.deg2rad(threshold_degrees)
+
+    def split_by_type(
+        self, frame_width: int, horizontal_threshold_degrees=20
+    ) -> tuple["LineSegmentBatch", "LineSegmentBatch", "LineSegmentBatch"]:
+        """
+        Splits off the segments flatter than horizontal_threshold_degrees as horizontal lines, the others are left
+        lane lines if their lower end is in the left half of the frame, right lane lines otherwise.
+        :returns: (left lane lines, right lane lines, horizontal lines)
+        """
+        horizontal = self.check_are_horizontal(horizontal_threshold_degrees)
+        left = ~horizontal & (self.lower_x < frame_width / 2)
+        right = ~horizontal & ~left
+        return self[left], self[right], self[horizontal]
+
+    def argmax(self, values: np.ndarray) -> Optional[LineSegment]:
+        """
+        :returns: the segment with the largest value (the first one on ties, like max(..., key=...)),
+        None for an empty batch
+        """
+        if len(self) == 0:
+            return None
+        return self.segment(int(np.argmax(values)))
+
+    def segment(self, index: int) -> LineSegment:
+        return LineSegment(*self.coordinates[index].tolist())
+
+    def __getitem__(self, selection) -> "LineSegmentBatch":
+        """Indexes the rows (boolean mask, index array or slice), always returns a batch."""
+        return LineSegmentBatch(self.coordinates[selection])
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def __iter__(self) -> Iterator[LineSegment]:
+        return (LineSegment(*row) for row in self.coordinates.tolist())
+
+    def to_list(self) -> list[LineSegment]:
+        return list(self)
+
+    def __repr__(self):
+        return f"LineSegmentBatch({len(self)} segments)"
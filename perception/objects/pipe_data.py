@@ -20,6 +20,13 @@ class PipeData:
 
     timing_info: TimingInfo = field(default_factory=TimingInfo)
     processed_frames: dict[str, list[np.array]] = field(default_factory=dict)
+    # (x, y) of frame's top-left corner in the camera frame, set when an ROIFilter cropped it
+    roi_offset: tuple[int, int] = (0, 0)
+    # whether a subscriber asked for the debug frames of this frame, the filters skip their rendering otherwise
+    render_debug_frames: bool = True
+    # pipeline name -> frames between frame_version and the frame the pipeline's results were computed on, set by
+    # the FrameAggregator for the fused frames (0 for the pipelines that reported this frame)
+    result_ages: dict[str, int] = field(default_factory=dict)
 
     # Pipeline specific data
     road_markings: Optional[RoadMarkings] = None
@@ -57,17 +64,43 @@ class PipeData:
         # Add the (possibly downscaled) frame to processed_frames
         self.processed_frames.setdefault(self.last_pipeline_name, []).append(frame)
 
+    def scale_results(self, factor: float):
+        """
+        Multiplies the pixel coordinates of the pipeline results (road markings and road object bounding boxes)
+        by `factor`, e.g. to map the results of a pipeline running at a processing_scale back to the camera frame.
+        """
+        if self.road_markings is not None:
+            road_markings = self.road_markings
+            for line_name in ("left_line", "center_line", "right_line"):
+                line = getattr(road_markings, line_name)
+                if line is not None:
+                    setattr(road_markings, line_name, line.scale(factor))
+            road_markings.stop_lines = [stop_line.scale(factor) for stop_line in road_markings.stop_lines]
+
+        for road_objects in (self.traffic_signs, self.traffic_lights, self.pedestrians, self.horizontal_lines):
+            for road_object in road_objects or []:
+                if len(road_object.bbox) > 0 and isinstance(road_object.bbox[0], (list, tuple, np.ndarray)):
+                    road_object.bbox = [[value * factor for value in point] for point in road_object.bbox]
+                else:
+                    road_object.bbox = [value * factor for value in road_object.bbox]
+
     def merge(self, new_pipe_data: "PipeData") -> "PipeData":
         """
         Merge data from another PipeData instance into this one.
         """
         self.timing_info.append_hierarchy(new_pipe_data.timing_info)
+        return self.merge_results(new_pipe_data)
 
+    def merge_results(self, new_pipe_data: "PipeData") -> "PipeData":
+        """
+        Like merge, without the timings of the other PipeData.
+        """
         if new_pipe_data.frame_version > self.frame_version:
             self.frame = new_pipe_data.frame
             self.depth_frame = new_pipe_data.depth_frame
             self.frame_version = new_pipe_data.frame_version
             self.raw_frame = new_pipe_data.raw_frame
+            self.roi_offset = new_pipe_data.roi_offset
 
         self.last_pipeline_name = new_pipe_data.last_pipeline_name
 
@@ -88,5 +121,6 @@ class PipeData:
             self.pedestrians = new_pipe_data.pedestrians
         if new_pipe_data.horizontal_lines is not None:
             self.horizontal_lines = new_pipe_data.horizontal_lines
+        self.result_ages.update(new_pipe_data.result_ages)
 
         return self
\ No newline at end of file
@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Type, List, Union
 
 from perception.filters.base_filter import BaseFilter
 from perception.filters.basic_filters.blur_filter import BlurFilter
 from perception.filters.basic_filters.cannyedge_filter import CannyEdgeFilter
 from perception.filters.basic_filters.dilation_filter import DilationFilter
+from perception.filters.basic_filters.fused_preprocess_filter import FusedPreprocessFilter
 from perception.filters.basic_filters.grayscale_filter import GrayScaleFilter
 from perception.filters.roi_filter import ROIFilter
 from perception.filters.object_detect_filter import SignsDetect
@@ -23,6 +24,12 @@ JSONPipelinesTYPE = list[dict[str, str | json_filters_type]]
 class PipelineConfig:
     name: str
     filters: List[BaseFilter]
+    processing_scale: float = 1.0  # the pipeline's filters work on the camera frames resized by it
+    pipelined: bool = False  # every filter runs on its own thread, see FilterStagePipeline
+    # processes running the filter chain, every frame goes to the first free one (see ipc/frame_claims.py)
+    replicas: int = 1
+    # filter chains of the replicas after the first, with their own filter instances (trackers, inference clients)
+    replica_filters: List[List[BaseFilter]] = field(default_factory=list)
 
 @dataclass(slots=True)
 class FilterClassWithExpectedParams:
@@ -34,10 +41,11 @@ FILTER_CLASS_LOOKUP: dict[str, FilterClassWithExpectedParams] = {
     "dilation": FilterClassWithExpectedParams(DilationFilter, ["visualize", "kernel_size", "iterations"]),
     "grayscale": FilterClassWithExpectedParams(GrayScaleFilter, ["visualize"]),
     "canny_edge": FilterClassWithExpectedParams(CannyEdgeFilter, ["visualize", "low_threshold", "high_threshold"]),
-    "roi": FilterClassWithExpectedParams(ROIFilter, ["visualize", "roi_type"]),
-    "lane_detect": FilterClassWithExpectedParams(LaneDetectFilter, ["visualize", "white_line_threshold"]),
+    "roi": FilterClassWithExpectedParams(ROIFilter, ["visualize", "roi_type", "crop"]),
+    "fused_preprocess": FilterClassWithExpectedParams(FusedPreprocessFilter, ["visualize", "steps"]),
+    "lane_detect": FilterClassWithExpectedParams(LaneDetectFilter, ["visualize", "white_line_threshold", "tracking"]),
     "heading_error": FilterClassWithExpectedParams(HeadingErrorFilter, ["visualize"]),
-    "signs_detect": FilterClassWithExpectedParams(SignsDetect, ["visualize", "model_path"]),
-    "traffic_light_detect": FilterClassWithExpectedParams(TrafficLightDetect, ["visualize", "model_path"]),
-    "pedestrian_detect": FilterClassWithExpectedParams(PedestrianDetect, ["visualize", "model_path"]),
+    "signs_detect": FilterClassWithExpectedParams(SignsDetect, ["visualize", "model_path", "keyframe_interval", "motion_gate"]),
+    "traffic_light_detect": FilterClassWithExpectedParams(TrafficLightDetect, ["visualize", "model_path", "keyframe_interval", "motion_gate"]),
+    "pedestrian_detect": FilterClassWithExpectedParams(PedestrianDetect, ["visualize", "model_path", "keyframe_interval", "motion_gate"]),
 }
\ No newline at end of file
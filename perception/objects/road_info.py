@@ -8,6 +8,8 @@ class RoadObject:
     label: str
     conf: float
     distance: float
+    track_id: int = -1  # stable across frames while a detection filter tracks the object, -1 when untracked
+    source_frame_version: int = -1  # frame the object was found in, older than the PipeData when it was reused
 
 @dataclass(slots=True)
 class RoadMarkings:
@@ -1,4 +1,44 @@
 import time
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Optional
+
+RECORD_SIZE = 4  # every record is (span id, parent span id, start_ns, end_ns)
+NO_SPAN = -1
+ACTIVE = -1  # end_ns of a running span
+
+# Span labels are interned once per process, the records only hold their ids. The ids are process-local, TimingInfos
+# crossing processes (pickle, the wire format) carry the labels of the spans they use, see export().
+_span_ids: dict[str, int] = {}
+_span_labels: list[str] = []
+
+
+def span_id(label: str) -> int:
+    """The interned id of a span label."""
+    label_id = _span_ids.get(label)
+    if label_id is None:
+        label_id = _span_ids[label] = len(_span_labels)
+        _span_labels.append(label)
+    return label_id
+
+
+def span_label(label_id: int) -> str:
+    return _span_labels[label_id]
+
+
+@dataclass
+class TimingTree:
+    """The per-label view of a TimingInfo's records, what the tree printout and the TimingVisualizer show."""
+
+    root_label: Optional[str] = None
+    # parent label -> child labels, in the order they were first started
+    hierarchy: dict[str, list[str]] = field(default_factory=dict)
+    # label -> total elapsed of its stopped spans (in seconds)
+    timings: dict[str, float] = field(default_factory=dict)
+    # label -> number of its stopped spans
+    counts: dict[str, int] = field(default_factory=dict)
+    # label -> start time of its running span (in seconds since the epoch)
+    start_times: dict[str, float] = field(default_factory=dict)
 
 
 class TimingInfo:
@@ -6,21 +46,75 @@ class TimingInfo:
         """
         !!! DO NOT REPEAT LABEL NAMES ACROSS DIFFERENT BRANCHES/HIERARCHIES !!!
 
-        :param program_start_time_s: The program's start time in seconds (e.g. time.time_ns() / 1e9).
+        Every start() appends a record to `records`, stop() fills in its end. Appending another TimingInfo concatenates
+        its records, so merging timings is a copy of a flat list of ints instead of a walk over nested dicts.
+        """
+        # Flat (span id, parent span id, start_ns, end_ns) records, end_ns is ACTIVE while the span runs
+        self.records: list[int] = []
+        # Running spans: span id -> index of its record
+        self.active: dict[int, int] = {}
+        # Spans stopped by pause_all(): span id -> index of its record
+        self.paused: dict[int, int] = {}
+        self.paused_at_ns = 0
+        # Root span of an appended TimingInfo -> span it was appended under
+        self.attached: dict[int, int] = {}
+        self.root_id = NO_SPAN
+        # view() of the records, until they change
+        self._tree: Optional[TimingTree] = None
+
+    @property
+    def root_label(self) -> Optional[str]:
+        return None if self.root_id == NO_SPAN else _span_labels[self.root_id]
+
+    def __len__(self) -> int:
+        return len(self.records) // RECORD_SIZE
+
+    def view(self) -> TimingTree:
         """
-        # Active timers: label -> start time (in seconds)
-        self.start_times = {}
-        # Paused timers: label -> paused duration so far (in seconds)
-        self.paused_times = {}
-        # Accumulated timings: label -> total elapsed (in seconds)
-        self.timings = {}
-        # Counts of how many times this label has been started/stopped
-        self.counts = {}
-        # Hierarchy (parent -> list of children labels)
-        self.hierarchy = {}
-        # Root label for this timing hierarchy
-        self.root_label = None
-        # Keep track of when this entire process started (in seconds)
+        The per-label totals, counts and hierarchy of the records. It's cached until the records change, callers must
+        not modify it.
+        """
+        if self._tree is None:
+            self._tree = self._build_view()
+        return self._tree
+
+    def _build_view(self) -> TimingTree:
+        tree = TimingTree(root_label=self.root_label)
+        hierarchy, timings, counts, start_times = tree.hierarchy, tree.timings, tree.counts, tree.start_times
+        root_id, attached, labels = self.root_id, self.attached, _span_labels
+        records = self.records
+        for span, parent, start_ns, end_ns in zip(records[::RECORD_SIZE], records[1::RECORD_SIZE],
+                                                  records[2::RECORD_SIZE], records[3::RECORD_SIZE]):
+            label = labels[span]
+            if span != root_id:
+                parent = attached.get(span, parent)
+                if parent != NO_SPAN:
+                    children = hierarchy.setdefault(labels[parent], [])
+                    if label not in children:
+                        children.append(label)
+
+            if end_ns == ACTIVE:
+                start_times[label] = start_ns / 1e9
+            else:
+                timings[label] = timings.get(label, 0.0) + (end_ns - start_ns) / 1e9
+                counts[label] = counts.get(label, 0) + 1
+        return tree
+
+    @property
+    def hierarchy(self) -> dict[str, list[str]]:
+        return self.view().hierarchy
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return self.view().timings
+
+    @property
+    def counts(self) -> dict[str, int]:
+        return self.view().counts
+
+    @property
+    def start_times(self) -> dict[str, float]:
+        return self.view().start_times
 
     def __str__(self):
         def format_time(time_value_s: float) -> str:
@@ -34,24 +128,21 @@ class TimingInfo:
                     break
             return time_str
 
-        def get_total_time(label: str) -> float:
-            """Get the total elapsed time (in seconds) for a label."""
-            total_time = self.timings.get(label, 0.0)
-            if label in self.start_times:
-                # If it's still active, add time since it was last started
-                now_s = time.time_ns() / 1e9
-                total_time += now_s - self.start_times[label]
-            return total_time
+        tree = self.view()
+        now_s = time.time_ns() / 1e9
 
         def build_hierarchy(label: str, indent: int = 0):
             lines = []
-            total_time_s = get_total_time(label)
-            count = self.counts.get(label, 0)
+            total_time_s = tree.timings.get(label, 0.0)
+            if label in tree.start_times:
+                # If it's still active, add time since it was last started
+                total_time_s += now_s - tree.start_times[label]
+            count = tree.counts.get(label, 0)
             avg_time_s = total_time_s / count if count > 0 else 0.0
 
             formatted_total_time = format_time(total_time_s)
             formatted_avg_time = format_time(avg_time_s)
-            status = "(active)" if label in self.start_times else "(inactive)"
+            status = "(active)" if label in tree.start_times else "(inactive)"
 
             lines.append(
                 f"{'  ' * indent}{label}: "
@@ -60,14 +151,12 @@ class TimingInfo:
                 f"count {count} {status}"
             )
 
-            if label in self.hierarchy:
-                for child in self.hierarchy[label]:
-                    lines.extend(build_hierarchy(child, indent + 1))
+            for child in tree.hierarchy.get(label, []):
+                lines.extend(build_hierarchy(child, indent + 1))
             return lines
 
-        if self.root_label:
-            hierarchy_lines = build_hierarchy(self.root_label)
-            hierarchy_str = "\n".join(hierarchy_lines)
+        if tree.root_label:
+            hierarchy_str = "\n".join(build_hierarchy(tree.root_label))
         else:
             hierarchy_str = "No active hierarchy."
 
@@ -77,171 +166,249 @@ class TimingInfo:
 
     def start(self, label: str, parent: str = None, extra_time_seconds: float = 0.0):
         """Start a timer for `label`. If `parent` is provided, link in hierarchy."""
-        if label in self.start_times:
+        label_id = _span_ids.get(label)
+        if label_id is None:
+            label_id = span_id(label)
+        active = self.active
+        if label_id in active:
             print(f"Timer '{label}' is already started.")
             return
 
-        if parent is not None and parent not in self.start_times:
-            raise ValueError(
-                f"Parent timer '{parent}' is not started. Cannot start '{label}'."
-            )
-
-        # Convert from nanoseconds to seconds
-        now_s = time.time_ns() / 1e9 - extra_time_seconds
-        self.start_times[label] = now_s
-
-        # If no parent, this is (or should be) the root label
         if parent is None:
-            if self.root_label == label:
-                return
-            if self.root_label:
+            # If no parent, this is (or should be) the root label
+            if self.root_id != NO_SPAN and self.root_id != label_id:
                 raise ValueError(
                     f"Root label is already set to '{self.root_label}'. Cannot set to '{label}'."
                 )
-            self.root_label = label
-            return
+            self.root_id = label_id
+            parent_id = NO_SPAN
+        else:
+            parent_id = _span_ids.get(parent, NO_SPAN)
+            if parent_id not in active:
+                raise ValueError(
+                    f"Parent timer '{parent}' is not started. Cannot start '{label}'."
+                )
 
-        # Otherwise, attach this label under its parent
-        if parent not in self.hierarchy:
-            self.hierarchy[parent] = []
-        if label not in self.hierarchy[parent]:  # Avoid duplicates
-            self.hierarchy[parent].append(label)
+        self._tree = None
+        records = self.records
+        active[label_id] = len(records) // RECORD_SIZE
+        start_ns = time.time_ns()
+        if extra_time_seconds:
+            start_ns -= int(extra_time_seconds * 1e9)
+        records += (label_id, parent_id, start_ns, ACTIVE)
 
     def stop(self, label: str):
-        now_s = time.time_ns() / 1e9
         """Stop the timer for `label`. This also stops any active children."""
-        if label not in self.start_times:
-            # Timer not started or already stopped
-            return
-
-        # Stop active children first
-        if label in self.hierarchy:
-            for child in self.hierarchy[label]:
-                if child in self.start_times:
-                    self.stop(child)
-
-        elapsed_s = now_s - self.start_times.pop(label)
-
-        if label in self.timings:
-            self.timings[label] += elapsed_s
-            self.counts[label] += 1
+        now_ns = time.time_ns()
+        label_id = _span_ids.get(label, NO_SPAN)
+        if label_id in self.active:
+            self._tree = None
+            self._stop(label_id, now_ns)
+
+    def _stop(self, label_id: int, now_ns: int):
+        active, records = self.active, self.records
+        index = active.pop(label_id)
+        # Stop active children first, they start after their parent so the last record has none
+        if active and index < len(records) // RECORD_SIZE - 1:
+            attached = self.attached
+            for child_id, child_index in list(active.items()):
+                if child_id in active and attached.get(child_id, records[child_index * RECORD_SIZE + 1]) == label_id:
+                    self._stop(child_id, now_ns)
+        records[index * RECORD_SIZE + 3] = now_ns
+
+    def _subtree_indexes(self, label_id: int) -> tuple[set[int], list[int]]:
+        """The spans below `label_id` (and itself), and the indexes of their records."""
+        span_ids = self.records[::RECORD_SIZE]
+        if label_id not in span_ids:
+            return {label_id}, []
+        parent_ids = self.records[1::RECORD_SIZE]
+        attached = self.attached
+
+        spans = {label_id}
+        indexes = []
+        # A span starts after its parent, so a single pass from the first record of `label_id` finds all of them
+        first = span_ids.index(label_id)
+        for index, span, parent in zip(range(first, len(span_ids)), span_ids[first:], parent_ids[first:]):
+            if span in spans or attached.get(span, parent) in spans:
+                spans.add(span)
+                indexes.append(index)
+        return spans, indexes
+
+    def children(self, label: str) -> list[str]:
+        """The labels started under `label`, without building the view."""
+        label_id = _span_ids.get(label, NO_SPAN)
+        records, attached = self.records, self.attached
+        child_ids = dict.fromkeys(
+            span for span, parent in zip(records[::RECORD_SIZE], records[1::RECORD_SIZE])
+            if span != self.root_id and attached.get(span, parent) == label_id
+        )
+        return [_span_labels[child_id] for child_id in child_ids]
+
+    def _copy_records(self, target: "TimingInfo", indexes: list[int]):
+        """Appends the records at `indexes` to `target`, with their running and paused state."""
+        new_indexes = {}
+        if indexes and indexes[-1] - indexes[0] == len(indexes) - 1:  # one slice for consecutive records
+            shift = len(target) - indexes[0]
+            new_indexes = {index: index + shift for index in indexes}
+            target.records.extend(self.records[indexes[0] * RECORD_SIZE : (indexes[-1] + 1) * RECORD_SIZE])
         else:
-            self.timings[label] = elapsed_s
-            self.counts[label] = 1
+            for index in indexes:
+                new_indexes[index] = len(target)
+                target.records.extend(self.records[index * RECORD_SIZE : (index + 1) * RECORD_SIZE])
+        target.active = {span: new_indexes[index] for span, index in self.active.items() if index in new_indexes}
+        target.paused = {span: new_indexes[index] for span, index in self.paused.items() if index in new_indexes}
+        target.paused_at_ns = self.paused_at_ns
 
     def remove_recursive(self, label: str):
         """Remove `label` and all children from the hierarchy and internal records."""
-        if label in self.hierarchy:
-            for child in self.hierarchy[label]:
-                self.remove_recursive(child)
-            del self.hierarchy[label]
-
-        if label in self.start_times:
-            del self.start_times[label]
-
-        if label in self.timings:
-            del self.timings[label]
+        label_id = _span_ids.get(label, NO_SPAN)
+        if label_id == NO_SPAN:
+            return
+        spans, indexes = self._subtree_indexes(label_id)
+        self._tree = None
+        self.attached = {span: parent for span, parent in self.attached.items() if span not in spans}
+        if not indexes:
+            return
 
-        if label in self.counts:
-            del self.counts[label]
+        first = indexes[0]
+        if len(indexes) == len(self) - first:
+            # The records at the end, like the timings of a frame that were appended to the manager's state
+            del self.records[first * RECORD_SIZE :]
+            self.active = {span: index for span, index in self.active.items() if index < first}
+            self.paused = {span: index for span, index in self.paused.items() if index < first}
+        else:
+            removed = set(indexes)
+            remaining = TimingInfo()
+            self._copy_records(remaining, [index for index in range(len(self)) if index not in removed])
+            self.records, self.active, self.paused = remaining.records, remaining.active, remaining.paused
+
+    def subtree(self, label: str) -> "TimingInfo":
+        """Copy of `label` and all its children as a separate TimingInfo rooted at `label`."""
+        subtree = TimingInfo()
+        subtree.root_id = span_id(label)
+        spans, indexes = self._subtree_indexes(subtree.root_id)
+        self._copy_records(subtree, indexes)
+        subtree.attached = {
+            span: parent for span, parent in self.attached.items() if span in spans and span != subtree.root_id
+        }
+        return subtree
 
     def pause_all(self):
         """Pause (stop) all currently-active timers, but remember how long they were active."""
-        if not self.start_times:
+        if not self.active:
             print("No active timers to pause.")
             return
 
-        now_s = time.time_ns() / 1e9
-        for label in list(self.start_times.keys()):
-            elapsed_s = now_s - self.start_times.pop(label)
-            self.paused_times[label] = elapsed_s
-
-            if label not in self.timings:
-                # First time this label is 'stopped'
-                self.timings[label] = elapsed_s
-                self.counts[label] = 1
-            else:
-                self.timings[label] += elapsed_s
-                self.counts[label] += 1
+        self._tree = None
+        self.paused_at_ns = time.time_ns()
+        for index in self.active.values():
+            self.records[index * RECORD_SIZE + 3] = self.paused_at_ns
+        self.paused.update(self.active)
+        self.active.clear()
 
     def restart_all(self):
         """Restart all timers that were paused by `pause_all()`."""
-        if not self.paused_times:
+        if not self.paused:
             print("No timers to restart.")
             return
 
-        now_s = time.time_ns() / 1e9
-        for label in list(self.paused_times.keys()):
-            paused_duration_s = self.paused_times.pop(label)
-            # We start it as if it started `paused_duration_s` seconds ago
-            self.start_times[label] = now_s - paused_duration_s
-
-            # Adjust the previous cumulative timing so that the partial is 'undone'
-            if self.counts[label] == 1:
-                # If we've only accounted for it once, remove that record
-                del self.timings[label]
-            else:
-                self.timings[label] -= paused_duration_s
-                self.counts[label] -= 1
+        # Move the start forward by the pause, so the paused time doesn't count
+        self._tree = None
+        paused_ns = time.time_ns() - self.paused_at_ns
+        for index in self.paused.values():
+            offset = index * RECORD_SIZE
+            self.records[offset + 2] += paused_ns
+            self.records[offset + 3] = ACTIVE
+        self.active.update(self.paused)
+        self.paused.clear()
+
+    def resume(self, label: str, elapsed_seconds: float):
+        """Runs the last span of `label` again, as if it had been running for `elapsed_seconds` without a stop."""
+        label_id = _span_ids.get(label, NO_SPAN)
+        span_ids = self.records[::RECORD_SIZE]
+        if label_id in self.active or label_id not in span_ids:
+            return
+        self._tree = None
+        index = len(span_ids) - 1 - span_ids[::-1].index(label_id)
+        self.records[index * RECORD_SIZE + 2] = time.time_ns() - int(elapsed_seconds * 1e9)
+        self.records[index * RECORD_SIZE + 3] = ACTIVE
+        self.paused.pop(label_id, None)
+        self.active[label_id] = index
 
     def append_hierarchy(self, other: "TimingInfo", parent_label_of_other: str = None):
         """
-        Append `other`'s hierarchy under `parent_label_of_other` in this `TimingInfo`.
-        Combine timings, counts, start_times, and paused_times.
+        Append `other`'s hierarchy under `parent_label_of_other` in this `TimingInfo` by concatenating its records.
         """
         if parent_label_of_other is None:
-            parent_label_of_other = self.root_label  # Default to the current root
+            parent_id = self.root_id  # Default to the current root
+        else:
+            parent_id = _span_ids.get(parent_label_of_other, NO_SPAN)
 
         # Ensure the parent label exists
-        if (
-            parent_label_of_other not in self.hierarchy
-            and parent_label_of_other != self.root_label
+        if parent_id == NO_SPAN or (
+            parent_id != self.root_id
+            and parent_id not in self.active
+            and parent_id not in self.records[::RECORD_SIZE]
         ):
-            print(
-                f"Label '{parent_label_of_other}' does not exist in the current hierarchy."
-            )
             raise ValueError(
                 f"Label '{parent_label_of_other}' does not exist in the current hierarchy."
             )
 
         # Ensure `other` has a root label
-        if other.root_label is None:
-            print("The other TimingInfo has no root label.")
+        if other.root_id == NO_SPAN:
             raise ValueError("The other TimingInfo has no root label.")
 
-        # Add other's root under this parent's hierarchy (if not already present)
-        if self.root_label != other.root_label:
-            if parent_label_of_other not in self.hierarchy:
-                self.hierarchy[parent_label_of_other] = []
-            if other.root_label not in self.hierarchy[parent_label_of_other]:
-                self.hierarchy[parent_label_of_other].append(other.root_label)
-
-        # Recursively merge the entire hierarchy
-        def merge_hierarchy(src_hierarchy, dst_hierarchy, src_label):
-            if src_label in src_hierarchy:
-                # Ensure this label is in the destination
-                if src_label not in dst_hierarchy:
-                    dst_hierarchy[src_label] = []
-                # Merge children
-                for child in src_hierarchy[src_label]:
-                    if child not in dst_hierarchy[src_label]:
-                        dst_hierarchy[src_label].append(child)
-                    merge_hierarchy(src_hierarchy, dst_hierarchy, child)
-
-        merge_hierarchy(other.hierarchy, self.hierarchy, other.root_label)
-
-        # Merge timings and counts
-        for key, value in other.timings.items():
-            if key in self.timings:
-                self.timings[key] += value
-                self.counts[key] += other.counts[key]
-            else:
-                self.timings[key] = value
-                self.counts[key] = other.counts[key]
+        self._tree = None
+        offset = len(self)
+        self.records.extend(other.records)
+        self.attached.update(other.attached)
+        if other.root_id != self.root_id:
+            self.attached[other.root_id] = parent_id
+        for span, index in other.active.items():
+            self.active[span] = offset + index
 
-        # Merge active timers and paused timers
-        self.start_times.update(other.start_times)
-        self.paused_times.update(other.paused_times)
+    def export(self) -> tuple[list[str], int, dict[int, int], list[int]]:
+        """
+        The records with the span ids replaced by indexes into a table of their labels, to rebuild the TimingInfo in
+        another process with from_export().
+
+        :returns: labels, root index (-1 without root), attached (as indexes) and the flat records
+        """
+        records = self.records
+        span_ids, parent_ids = records[::RECORD_SIZE], records[1::RECORD_SIZE]
+        # the labels in the order of their first use, dict.fromkeys() drops the repeats
+        used = dict.fromkeys(chain(span_ids, parent_ids, self.attached, self.attached.values(), (self.root_id,)))
+        used.pop(NO_SPAN, None)
+        table = {label_id: index for index, label_id in enumerate(used)}
+        table[NO_SPAN] = NO_SPAN
+
+        exported = records.copy()
+        exported[::RECORD_SIZE] = [table[label_id] for label_id in span_ids]
+        exported[1::RECORD_SIZE] = [table[label_id] for label_id in parent_ids]
+        attached = {table[span]: table[parent] for span, parent in self.attached.items()}
+        return [_span_labels[label_id] for label_id in used], table[self.root_id], attached, exported
+
+    @classmethod
+    def from_export(cls, labels: list[str], root: int, attached: dict[int, int], records: list[int]) -> "TimingInfo":
+        # NO_SPAN (-1) indexes the NO_SPAN appended at the end
+        label_ids = [_span_ids.get(label) or span_id(label) for label in labels] + [NO_SPAN]
+        timing_info = cls()
+        timing_info.root_id = label_ids[root]
+        timing_info.attached = {label_ids[span]: label_ids[parent] for span, parent in attached.items()}
+        span_ids = [label_ids[index] for index in records[::RECORD_SIZE]]
+        records[::RECORD_SIZE] = span_ids
+        records[1::RECORD_SIZE] = [label_ids[index] for index in records[1::RECORD_SIZE]]
+        timing_info.active = {
+            span_ids[index]: index for index, end_ns in enumerate(records[3::RECORD_SIZE]) if end_ns == ACTIVE
+        }
+        timing_info.records = records
+        return timing_info
+
+    def __getstate__(self):
+        return self.export()
+
+    def __setstate__(self, state):
+        self.__dict__.update(TimingInfo.from_export(*state).__dict__)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,12 @@
 import colorsys
 import time
+from typing import Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.colors import to_rgb
 
-from perception.objects.timing_info import TimingInfo
+from perception.objects.timing_info import TimingInfo, TimingTree
 
 
 def get_color_variations(base_color, num_variations):
@@ -55,6 +56,7 @@ class TimingVisualizer:
         self.fig = None
         self.total_charts = None
         self.timing_info = TimingInfo()
+        self._tree: Optional[TimingTree] = None
 
         plt.style.use("dark_background")
         plt.rcParams.update(
@@ -173,9 +175,14 @@ class TimingVisualizer:
         # }
         self.root_color = "gray"
 
+    @property
+    def tree(self) -> TimingTree:
+        """The view of the timings, taken once per plot."""
+        return self._tree or self.timing_info.view()
+
     @property
     def hierarchy(self):
-        return self.timing_info.hierarchy
+        return self.tree.hierarchy
 
     @property
     def root_label(self):
@@ -183,15 +190,15 @@ class TimingVisualizer:
 
     @property
     def timings(self):
-        return self.timing_info.timings
+        return self.tree.timings
 
     @property
     def counts(self):
-        return self.timing_info.counts
+        return self.tree.counts
 
     @property
     def start_times(self):
-        return self.timing_info.start_times
+        return self.tree.start_times
 
     def start(self, label: str, parent=None, extra_time_seconds=0):
         return self.timing_info.start(label, parent, extra_time_seconds)
@@ -210,6 +217,7 @@ class TimingVisualizer:
     def plot_pie_charts(self, save_path=None):
         start_time = time.perf_counter()
         self.timing_info.pause_all()
+        self._tree = self.timing_info.view()
 
         # Count the total number of charts to be plotted
         new_total_charts = sum(1 for children in self.hierarchy.values() if children)
@@ -342,6 +350,7 @@ class TimingVisualizer:
             plt.savefig(save_path)
             self.save_timings(save_path + ".csv")
 
+        self._tree = None
         self.timing_info.restart_all()
         print(f"Plotting took {time.perf_counter() - start_time:.2f} s")
 
@@ -355,32 +364,14 @@ class TimingVisualizer:
                 f.write(f"{label},{total_time},{avg_time}\n")
 
     def restart_timers(self, running_timers):
-        if self.root_label in running_timers:
-            self.start_times[self.root_label] = (
-                time.perf_counter() - running_timers[self.root_label]
-            )
-            self.timings[self.root_label] -= running_timers[self.root_label]
-            self.counts[self.root_label] -= 1
-            running_timers.pop(self.root_label)
         for label, elapsed in running_timers.items():
-            self.start_times[label] = time.perf_counter() - elapsed
+            self.timing_info.resume(label, elapsed)
 
     def stop_and_store_active_timers(self) -> dict[str, float]:
-        running_timers = {}
-
-        if self.root_label in self.start_times:
-            running_timers[self.root_label] = (
-                time.perf_counter() - self.start_times.pop(self.root_label)
-            )
-            if self.root_label not in self.timings:
-                self.timings[self.root_label] = running_timers[self.root_label]
-                self.counts[self.root_label] = 1
-            else:
-                self.timings[self.root_label] += running_timers[self.root_label]
-                self.counts[self.root_label] += 1
-
-        for label in list(self.start_times.keys()):
-            running_timers[label] = time.perf_counter() - self.start_times.pop(label)
+        now = time.time()
+        running_timers = {label: now - start_time for label, start_time in self.start_times.items()}
+        for label in running_timers:
+            self.timing_info.stop(label)
         return running_timers
 
 
@@ -3,4 +3,25 @@ from collections import namedtuple
 Coord = tuple[int, int]
 VideoRois = dict[str, tuple[Coord, Coord, Coord, Coord]]
 
-VideoInfo = namedtuple("VideoInfo", ["video_name", "video_rois", "height", "width"])
\ No newline at end of file
+# processing_scale: size of the frames the filters work on relative to the camera frames
+VideoInfo = namedtuple("VideoInfo", ["video_name", "video_rois", "height", "width", "processing_scale"],
+                       defaults=[1.0])
+
+
+def scaled_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    """:returns: (width, height) of a frame resized by `scale`"""
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def scale_video_info(video_info: VideoInfo, scale: float) -> VideoInfo:
+    """:returns: the VideoInfo of the frames resized by `scale`, with the rois scaled accordingly"""
+    if scale == 1:
+        return video_info
+
+    width, height = scaled_size(video_info.width, video_info.height, scale)
+    video_rois = {
+        roi_type: [[int(round(x * scale)), int(round(y * scale))] for x, y in polygon]
+        for roi_type, polygon in video_info.video_rois.items()
+    }
+    return video_info._replace(video_rois=video_rois, height=height, width=width,
+                               processing_scale=video_info.processing_scale * scale)
@@ -1,22 +1,24 @@
 import json
-import pickle
 import time
 
 import torch.multiprocessing as mp
 import urllib3
-from rs_ipc import SharedMessage, OperationMode
 
 from configuration.config import Config
 from control.pid_controller import PIDController
+from ipc.backend import SharedMessage, OperationMode
+from ipc.channel_overflow import ChannelReader
+from ipc.state_stream import StateReconstructor
 from perception.objects.pipe_data import PipeData
 from planning.behaviour_planner import BehaviourPlanner
 
 
 class Control(mp.Process):
-    def __init__(self, keep_running: mp.Value):
+    def __init__(self, keep_running: mp.Value, keyframe_requests: mp.Value = None):
         super().__init__()
         self.steering_pid = None
         self.keep_running = keep_running
+        self.keyframe_requests = keyframe_requests
 
     def run(self):
         try:
@@ -25,13 +27,21 @@ class Control(mp.Process):
             memory_reader: SharedMessage = SharedMessage.open(
                 Config.control_loop_memory_name, OperationMode.ReadSync
             )
+            state_reconstructor = StateReconstructor(self.keyframe_requests)
+            channel_reader = ChannelReader()
 
             while self.keep_running:
                 pipe_data_bytes = memory_reader.read(block=True)
                 if pipe_data_bytes is None:
                     break
 
-                pipe_data: PipeData = pickle.loads(pipe_data_bytes)
+                pipe_data_bytes = channel_reader.resolve(pipe_data_bytes)
+                if pipe_data_bytes is None:  # overflowed and already overwritten by a newer one
+                    continue
+
+                pipe_data: PipeData = state_reconstructor.apply(pipe_data_bytes)
+                if pipe_data is None:  # waiting for the first keyframe
+                    continue
 
                 # Perform behavior planning based on processed data
                 behaviour = behaviour_planner.run_iteration(
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from perception.filters.base_filter import BaseFilter
+from perception.filters.basic_filters.fused_preprocess_filter import FusedPreprocessFilter
+from perception.objects.pipe_data import PipeData
+
+
+class FilterStagePipeline:
+    """
+    Runs the filters of a pipeline as stages on their own threads, connected by bounded queues, so while a filter works
+    on frame n the next one works on frame n - 1. OpenCV (and the detection runtimes) release the GIL, so the stages run
+    in parallel on multi-core hosts. A last stage hands every processed frame to on_result.
+
+    Every stage takes the frames in order, so the results come out in frame order and stateful filters (trackers,
+    motion gates) see their frames in order, like in the sequential loop. At most max_frames_in_flight frames are in
+    the stages at once, FusedPreprocessFilters keep that many sets of output buffers so that a frame's buffers are only
+    reused after it left the pipeline.
+    """
+
+    def __init__(self, filters: list[BaseFilter], on_result: Callable[[PipeData], None], queue_size: int = 1,
+                 max_frames_in_flight: Optional[int] = None, name: str = "FilterStage"):
+        """
+        :param queue_size: frames waiting in front of every stage
+        :param max_frames_in_flight: default one per stage (and the output), plus one waiting for the first stage
+        """
+        if queue_size < 1:
+            raise ValueError(f"Queue size must be at least 1, got {queue_size}")
+
+        self.max_frames_in_flight = max_frames_in_flight or len(filters) + 2
+        for filter in filters:
+            if isinstance(filter, FusedPreprocessFilter):
+                filter.buffer_sets = self.max_frames_in_flight
+
+        self.stages: list[tuple[str, Callable[[PipeData], object]]] = [
+            (type(filter).__name__, filter.process) for filter in filters
+        ] + [("output", on_result)]
+        self._queues: list[queue.Queue[Optional[PipeData]]] = [queue.Queue(maxsize=queue_size) for _ in self.stages]
+        self._in_flight = threading.BoundedSemaphore(self.max_frames_in_flight)
+        self._busy_times = [0.0] * len(self.stages)
+        self._start_time: Optional[float] = None
+        self._stop_time: Optional[float] = None
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=(index,), name=f"{name} {index} {stage_name}", daemon=True)
+            for index, (stage_name, _) in enumerate(self.stages)
+        ]
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+
+    def _raise_error(self):
+        if self._failed.is_set():
+            raise RuntimeError(f"Stage failed: {self._error!r}") from self._error
+
+    def _put(self, stage_queue: queue.Queue, data: Optional[PipeData]):
+        while True:
+            self._raise_error()
+            try:
+                stage_queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run_stage(self, index: int):
+        _, process = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while True:
+            data = self._queues[index].get()
+            if data is None:  # closed, pass it on to the next stage
+                if not is_last:
+                    self._queues[index + 1].put(None)
+                return
+
+            start_time = time.perf_counter()
+            try:
+                process(data)
+            except BaseException as e:
+                self._error = e
+                self._failed.set()
+                return
+            self._busy_times[index] += time.perf_counter() - start_time
+
+            if is_last:
+                self._in_flight.release()
+            else:
+                try:
+                    self._put(self._queues[index + 1], data)
+                except RuntimeError:  # a later stage failed
+                    return
+
+    def submit(self, data: PipeData):
+        """Hands the frame to the first stage, blocks while max_frames_in_flight frames are in the stages."""
+        while not self._in_flight.acquire(timeout=0.1):
+            self._raise_error()
+        self._put(self._queues[0], data)
+
+    def close(self):
+        """Finishes the frames in flight and stops the stages, raises if a stage failed."""
+        self._put(self._queues[0], None)
+        for thread in self._threads:
+            while thread.is_alive():
+                self._raise_error()
+                thread.join(timeout=0.1)
+        self._stop_time = time.perf_counter()
+        self._raise_error()
+
+    def utilization(self) -> list[tuple[str, float]]:
+        """:returns: (stage name, share of the time the stage was busy since start) for every stage"""
+        if self._start_time is None:
+            return [(stage_name, 0.0) for stage_name, _ in self.stages]
+        elapsed = (self._stop_time or time.perf_counter()) - self._start_time
+        return [(stage_name, busy_time / elapsed if elapsed > 0 else 0.0)
+                for (stage_name, _), busy_time in zip(self.stages, self._busy_times)]
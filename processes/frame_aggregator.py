@@ -0,0 +1,104 @@
+from typing import Optional
+
+from perception.objects.pipe_data import PipeData
+
+
+class FrameAggregator:
+    """
+    Fuses the pipeline results the MultiProcessingManager receives into one world state per frame.
+
+    The results are buffered by frame_version. A frame is emitted once `quorum` pipelines have passed it (reported it,
+    or a later frame: every pipeline reports its frames in order, so it won't report a frame it skipped anymore), or
+    `deadline` seconds after its first result arrived. Frames are emitted in frame order.
+
+    The fused PipeData of a frame holds the results of every pipeline: the ones computed on the frame, and for the other
+    pipelines their latest results of an earlier frame, result_ages tells how many frames old they are. Results of
+    frames that were already emitted (late ones) are included in the next frame as stale results.
+    """
+
+    TIMING_LABEL = "Aggregate Frame"  # root of the fused frames' timings, the pipelines' timings are below it
+
+    def __init__(self, pipeline_names: list[str], quorum: int, deadline: float):
+        """
+        :param quorum: pipelines that have to pass a frame before it is emitted, 0 for all of them
+        """
+        if not 0 <= quorum <= len(pipeline_names):
+            raise ValueError(f"Quorum must be between 0 and {len(pipeline_names)}, got {quorum}")
+
+        self.pipeline_names = pipeline_names
+        self.quorum = quorum or len(pipeline_names)
+        self.deadline = deadline
+
+        self.reported_versions = {name: -1 for name in pipeline_names}  # newest frame reported by every pipeline
+        # latest result of every pipeline at or before the last emitted frame
+        self.results: dict[str, PipeData] = {}
+        # frame_version -> (arrival of its first result (time.perf_counter()), its results in arrival order)
+        self.pending: dict[int, tuple[float, list[PipeData]]] = {}
+        self.last_emitted_version = -1
+        self.late_count = 0
+
+    def add(self, data: PipeData, now: float):
+        name = data.last_pipeline_name
+        self.reported_versions[name] = max(self.reported_versions[name], data.frame_version)
+        if data.frame_version <= self.last_emitted_version:  # its frame was already emitted without it
+            self.late_count += 1
+            self._keep_latest(data)
+            return
+        self.pending.setdefault(data.frame_version, (now, []))[1].append(data)
+
+    def _keep_latest(self, data: PipeData):
+        latest = self.results.get(data.last_pipeline_name)
+        if latest is None or data.frame_version >= latest.frame_version:
+            self.results[data.last_pipeline_name] = data
+
+    def _is_due(self, frame_version: int, now: float) -> bool:
+        passed = sum(version >= frame_version for version in self.reported_versions.values())
+        return passed >= self.quorum or now >= self.pending[frame_version][0] + self.deadline
+
+    def pop_ready(self, now: float) -> list[PipeData]:
+        """:returns: the fused PipeData of every frame that is due, in frame order"""
+        fused_frames = []
+        for frame_version in sorted(self.pending):
+            if not self._is_due(frame_version, now):
+                break
+            arrival, fresh_results = self.pending.pop(frame_version)
+            for data in fresh_results:
+                self._keep_latest(data)
+            fused_frames.append(self._fuse(frame_version, fresh_results, now - arrival))
+            self.last_emitted_version = frame_version
+        return fused_frames
+
+    def next_deadline(self) -> Optional[float]:
+        """:returns: when the oldest pending frame is emitted at the latest, None without pending frames"""
+        if not self.pending:
+            return None
+        return self.pending[min(self.pending)][0] + self.deadline
+
+    def wait_timeout(self, timeout: float, now: float) -> float:
+        """:returns: how long to wait for results (at most `timeout`) without missing the next deadline"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return timeout
+        return min(timeout, max(0.0, deadline - now))
+
+    def _fuse(self, frame_version: int, fresh_results: list[PipeData], waited: float) -> PipeData:
+        fused = PipeData(
+            frame=None,
+            frame_version=-1,
+            depth_frame=None,
+            raw_frame=None,
+            creation_time=min(data.creation_time for data in fresh_results),
+            last_pipeline_name=fresh_results[-1].last_pipeline_name,
+        )
+        # started when the first result of the frame arrived
+        fused.timing_info.start(self.TIMING_LABEL, extra_time_seconds=waited)
+
+        for data in sorted(self.results.values(), key=lambda data: data.frame_version):
+            fused.merge_results(data)
+        for data in fresh_results:
+            fused.timing_info.append_hierarchy(data.timing_info)
+
+        fused.last_pipeline_name = fresh_results[-1].last_pipeline_name
+        fused.result_ages = {name: frame_version - data.frame_version for name, data in self.results.items()}
+        return fused
+
@@ -0,0 +1,124 @@
+import os
+import time
+from typing import Optional
+
+from ipc.channel_overflow import ChannelReader, ChannelWriter
+from ipc.channel_select import ChannelSelector
+from ipc.inference_channel import (
+    InferenceRequest,
+    decode_inference_request,
+    encode_inference_response,
+    inference_response_channel_name,
+)
+from perception.filters.detection_backends import Detector
+
+
+class MicroBatcher:
+    """
+    Groups the pending requests by model. The batch of a model is due as soon as every client of the model has a
+    request pending (they are all working on the same frame), when it reaches max_batch_size, or when its oldest
+    request waited for the model's batch window, which is never longer than max_latency.
+
+    The requests are grouped by model only, not by their frame_version. One forward pass runs one model, so the
+    requests of pipelines with different models for the same frame are separate batches that run one after another,
+    and a model with a single client only ever gets batches of its own requests (of one request while its pipeline
+    waits for the result). A batch can hold requests of different frames, every request gets its own result.
+    """
+
+    def __init__(self, client_models: list[str], batch_windows: dict[str, float], default_batch_window: float,
+                 max_latency: float, max_batch_size: int):
+        """
+        :param client_models: model path of every client, by client index
+        :param batch_windows: batch window by model file name, models without one use default_batch_window
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"Max batch size must be at least 1, got {max_batch_size}")
+        self.client_models = client_models
+        self.max_batch_size = max_batch_size
+        self.client_counts = {model: client_models.count(model) for model in client_models}
+        self.batch_windows = {
+            model: min(max_latency, batch_windows.get(os.path.basename(model), default_batch_window))
+            for model in self.client_counts
+        }
+        # model -> [(arrival time, client index, request)], in arrival order
+        self.pending: dict[str, list[tuple[float, int, InferenceRequest]]] = {model: [] for model in self.client_counts}
+
+    def add(self, client_index: int, request: InferenceRequest, now: float):
+        self.pending[self.client_models[client_index]].append((now, client_index, request))
+
+    def _is_due(self, model: str, now: float) -> bool:
+        pending = self.pending[model]
+        if not pending:
+            return False
+        pending_clients = len({client_index for _, client_index, _ in pending})
+        return (
+            pending_clients >= self.client_counts[model]
+            or len(pending) >= self.max_batch_size
+            or now >= pending[0][0] + self.batch_windows[model]
+        )
+
+    def pop_due_batches(self, now: float) -> list[tuple[str, list[tuple[int, InferenceRequest]]]]:
+        """:returns: (model, [(client index, request)]) for every batch that is due, oldest requests first"""
+        batches = []
+        for model in self.pending:
+            while self._is_due(model, now):
+                pending = self.pending[model]
+                batch, self.pending[model] = pending[: self.max_batch_size], pending[self.max_batch_size :]
+                batches.append((model, [(client_index, request) for _, client_index, request in batch]))
+        return batches
+
+    def next_deadline(self) -> Optional[float]:
+        """:returns: when the next batch window closes, None without pending requests"""
+        deadlines = [pending[0][0] + self.batch_windows[model] for model, pending in self.pending.items() if pending]
+        return min(deadlines, default=None)
+
+
+class InferenceServer:
+    """
+    Serves the inference requests of the client channels (see ipc/inference_channel.py) with one Detector per
+    model, InferenceServerProcess runs it on the channels of the configured backend.
+    """
+
+    def __init__(self, request_shms: list, response_shms: list, selector: ChannelSelector,
+                 detectors: dict[str, Detector], batcher: MicroBatcher):
+        """
+        :param request_shms: request channel of every client, opened for reading
+        :param response_shms: response channel of every client, opened for writing
+        """
+        self.request_shms = request_shms
+        self.response_channels = [
+            ChannelWriter(response_shm, inference_response_channel_name(index))
+            for index, response_shm in enumerate(response_shms)
+        ]
+        self.selector = selector
+        self.detectors = detectors
+        self.batcher = batcher
+        self.channel_reader = ChannelReader()
+        self.batch_sizes: list[int] = []
+
+    def poll(self, timeout: float):
+        """Receives the requests that arrive within `timeout` (or until a batch window closes) and runs the due batches."""
+        deadline = self.batcher.next_deadline()
+        if deadline is not None:
+            timeout = min(timeout, max(0.0, deadline - time.perf_counter()))
+
+        for client_index in self.selector.wait(timeout=timeout):
+            message = self.channel_reader.resolve(self.request_shms[client_index].read(block=False))
+            if message is not None:
+                self.batcher.add(client_index, decode_inference_request(message), time.perf_counter())
+
+        for model, batch in self.batcher.pop_due_batches(time.perf_counter()):
+            detections = self.detectors[model]([request.image for _, request in batch])
+            self.batch_sizes.append(len(batch))
+            for (client_index, request), image_detections in zip(batch, detections):
+                self.response_channels[client_index].write(encode_inference_response(request.sequence, image_detections))
+
+    def stop(self):
+        """Wakes up the clients that still wait for a response, their requests are answered with None."""
+        for response_channel in self.response_channels:
+            response_channel.stop()
+
+    def close(self):
+        for response_channel in self.response_channels:
+            response_channel.close()
+        self.channel_reader.close()
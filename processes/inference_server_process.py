@@ -0,0 +1,81 @@
+import multiprocessing as mp
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.backend import OperationMode, ReaderWaitPolicy, SharedMessage
+from ipc.channel_select import ChannelSelector
+from ipc.channel_sizing import channel_size
+from ipc.inference_channel import inference_request_channel_name, inference_response_channel_name
+from perception.filters.detection_backends import load_detector
+from processes.inference_server import InferenceServer, MicroBatcher
+
+
+def create_inference_channels(client_count: int) -> tuple[list, ChannelSelector]:
+    """
+    Creates the request and response channel of every client and the selector the server waits on, called by the
+    manager before the pipelines and the server are started.
+    :returns: (all channels, selector), to stop and close at shutdown
+    """
+    channels = []
+    for client_index in range(client_count):
+        for channel_name in (inference_request_channel_name(client_index), inference_response_channel_name(client_index)):
+            channels.append(SharedMessage.create(
+                channel_name, channel_size(channel_name), OperationMode.CreateOnly, ReaderWaitPolicy.Count(0)
+            ))
+    return channels, ChannelSelector.create(Config.inference_selector_memory_name, client_count)
+
+
+class InferenceServerProcess(mp.Process):
+    """
+    Owns the detection models of all pipelines and serves the requests of their detection filters in batches
+    (see processes/inference_server.py), so only one process runs the inference runtime.
+    """
+
+    def __init__(self, client_models: list[str], keep_running: mp.Value, name=None):
+        """:param client_models: model path of every InferenceClient, by client index"""
+        super().__init__(name=name)
+        self.client_models = client_models
+        self.keep_running = keep_running
+
+    def run(self):
+        response_shms = []
+        try:
+            request_shms = [
+                SharedMessage.open(inference_request_channel_name(index), OperationMode.ReadSync)
+                for index in range(len(self.client_models))
+            ]
+            response_shms = [
+                SharedMessage.open(inference_response_channel_name(index), OperationMode.WriteAsync)
+                for index in range(len(self.client_models))
+            ]
+            selector = ChannelSelector.open(Config.inference_selector_memory_name)
+
+            detectors = {model_path: load_detector(model_path) for model_path in dict.fromkeys(self.client_models)}
+            batcher = MicroBatcher(
+                self.client_models,
+                Config.inference_batch_windows,
+                Config.inference_batch_window,
+                Config.inference_max_latency,
+                Config.inference_max_batch_size,
+            )
+            server = InferenceServer(request_shms, response_shms, selector, detectors, batcher)
+            print(f"[{self.name}] Serving {len(self.client_models)} clients with {len(detectors)} models")
+
+            while self.keep_running.value and not selector.is_stopped():
+                server.poll(Config.manager_wait_timeout)
+
+            server.stop()
+            if server.batch_sizes:
+                print(
+                    f"[{self.name}] Ran {len(server.batch_sizes)} batches, "
+                    f"mean batch size {np.mean(server.batch_sizes):.2f}"
+                )
+            server.close()
+            for shared_message in request_shms + response_shms:
+                shared_message.close()
+            selector.close()
+        except Exception as e:
+            print(f"[{self.name}] Error: {e}")
+            for response_shm in response_shms:  # don't leave the clients waiting
+                response_shm.stop()
@@ -1,17 +1,20 @@
 import multiprocessing as mp
 import os
+import struct
 import time
-import cv2
 
-from rs_ipc import ReaderWaitPolicy, SharedMessage, OperationMode
+import cv2
 
-from configuration.config import Config, ProcessingStrategy
+from configuration.config import Config
+from ipc.backend import SharedMessage, OperationMode
+from ipc.frame_store import FRAME_DESCRIPTOR_FORMAT, FrameStore
+from processes.video_prefetcher import VideoPrefetcher
 
 
 class MockCameraProcess(mp.Process):
     def __init__(
         self,
-        start_video: mp.Value,
+        start_video: mp.Event,
         keep_running: mp.Value,
         program_start_time: float,
         final_frame_version: mp.Value,
@@ -29,6 +32,7 @@ class MockCameraProcess(mp.Process):
                 Config.video_feed_memory_name,
                 OperationMode.WriteSync
             )
+            frame_store = FrameStore.open(Config.frame_store_memory_name)
 
             time_between_frames = 1 / Config.camera_fps if Config.camera_fps != 0 else 0
 
@@ -49,40 +53,52 @@ class MockCameraProcess(mp.Process):
                     f"[CameraProcess] Actual video width: {actual_width} height: {actual_height} so resize is needed"
                 )
 
-            while not self.start_video.value and self.keep_running.value:
-                pass
+            # Decoding starts right away, so the first frames are ready when the manager gives the signal
+            prefetcher = VideoPrefetcher(
+                capture, (Config.width, Config.height) if resize_needed else None, Config.camera_prefetch_count
+            )
+            prefetcher.start()
+
+            while not self.start_video.wait(timeout=0.1):
+                if not self.keep_running.value:
+                    break
             print(
                 f"[CameraProcess] Starting video after {(time.perf_counter() - self.program_start_time):.2f} s"
             )
 
-            while self.keep_running.value and capture.isOpened():
-                start_time = time.perf_counter()
-
-                ret, frame = capture.read()
-                if not ret:
+            # Frame n is due at start + n * time_between_frames, so the time spent writing doesn't add up
+            next_frame_time = time.perf_counter()
+            late_frame_count = 0
+            while self.keep_running.value:
+                frame = prefetcher.read()
+                if frame is None:
                     print("[CameraProcess] Video ended")
                     break
 
-                # Resize the frame to the desired resolution defined in the Config
-                if resize_needed:
-                    frame = cv2.resize(
-                        frame,
-                        (Config.width, Config.height),
-                        interpolation=cv2.INTER_LINEAR,
-                    )
-                video_feed_shm.write(frame.tobytes())
-
-                end_time = time.perf_counter() - start_time
-                time_to_wait = (
-                    time_between_frames - end_time
-                )  # make sure video is played at the correct fps
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-
-            self.final_frame_version.value = video_feed_shm.last_written_version()
+                if time_between_frames > 0:
+                    time_to_wait = next_frame_time - time.perf_counter()
+                    if time_to_wait > 0:
+                        time.sleep(time_to_wait)
+                    elif time_to_wait < -time_between_frames:
+                        # more than a frame behind (blocked by the pipelines), restart the schedule instead of
+                        # sending a burst of frames to catch up
+                        late_frame_count += 1
+                        next_frame_time = time.perf_counter()
+                    next_frame_time += time_between_frames
+
+                # The pixels go into the frame ring, the video feed only announces the new version
+                capture_time_ns = time.time_ns()
+                frame_version = frame_store.write(frame, capture_time_ns)
+                video_feed_shm.write(struct.pack(FRAME_DESCRIPTOR_FORMAT, frame_version, capture_time_ns))
+
+            if late_frame_count > 0:
+                print(f"[CameraProcess] Fell behind the {Config.camera_fps} FPS schedule {late_frame_count} times")
+            self.final_frame_version.value = frame_store.latest_version()
             video_feed_shm.stop()
+            frame_store.close()
 
+            prefetcher.stop()
             capture.release()
         except Exception as e:
             print(f"[CameraProcess]: Exception: {e}")
-            self.keep_running.value = False
\ No newline at end of file
+            self.keep_running.value = False
@@ -1,23 +1,36 @@
 import multiprocessing as mp
 import os
-import pickle
 import time
+from typing import Optional
 
 from perception.objects.video_info import VideoRois, VideoInfo
 from perception.visualize_data import visualize_data
-from rs_ipc import (
+
+from configuration.config import Config, ProcessingStrategy
+from ipc.backend import (
     SharedMessage,
     OperationMode,
     ReaderWaitPolicy,
     read_all_map,
 )
-
-from configuration.config import Config, ProcessingStrategy
-from perception.helpers import initialize_config, get_roi_bbox_for_video, pack_named_images
+from ipc.channel_overflow import ChannelReader, ChannelWriter
+from ipc.channel_select import ChannelSelector
+from ipc.channel_sizing import channel_size, print_memory_footprint
+from ipc.debug_frames import debug_frames_channel_name, decode_debug_frames
+from ipc.frame_claims import FrameClaims, frame_claims_name, replica_channel_name
+from ipc.frame_store import FRAME_DESCRIPTOR_SIZE, FrameStore
+from ipc.inference_channel import inference_request_channel_name, inference_response_channel_name
+from ipc.pipe_data_codec import decode_pipe_data
+from ipc.render_demand import RenderDemand
+from ipc.state_stream import StatePublisher
+from perception.helpers import inference_client_models, initialize_config, get_roi_bbox_for_video, pack_named_images
 from perception.objects.pipe_data import PipeData
 from perception.objects.save_info import SaveInfo
 from processes.control_process import Control
+from processes.frame_aggregator import FrameAggregator
+from processes.inference_server_process import InferenceServerProcess, create_inference_channels
 from processes.mock_camera_process import MockCameraProcess
+from processes.replica_reassembler import ReplicaReassembler, replica_channel_layout
 from processes.sequential_filter_process import SequentialFilterProcess
 from processes.video_writer_process import VideoWriterProcess
 
@@ -29,7 +42,7 @@ class MultiProcessingManager(mp.Process):
             self,
             program_start_time: float,
             keep_running: mp.Value,
-            start_video: mp.Value,
+            start_video: mp.Event,
             recording_dir_path: str,
             final_frame_version: mp.Value,
             callback=None,
@@ -46,9 +59,15 @@ class MultiProcessingManager(mp.Process):
         self.PyFrame = frame_class
 
     def run(self):
+        keyframe_requests = mp.Value("i", 0)  # bumped by readers that attach in between two keyframes
+        frame_store = FrameStore.create(
+            Config.frame_store_memory_name,
+            slot_count=Config.retained_frame_count,
+            frame_shape=(Config.height, Config.width, Config.color_channels),
+        )
         video_feed_shm = SharedMessage.create(
             name=Config.video_feed_memory_name,
-            size=Config.frame_size,
+            size=FRAME_DESCRIPTOR_SIZE,
             mode=OperationMode.CreateOnly,
             reader_wait_policy=ReaderWaitPolicy.All()
             if Config.processing_strategy
@@ -57,20 +76,23 @@ class MultiProcessingManager(mp.Process):
         )
         control_loop_shm = SharedMessage.create(
             name=Config.control_loop_memory_name,
-            size=Config.max_pipe_data_size,
+            size=channel_size(Config.control_loop_memory_name),
             mode=OperationMode.WriteAsync,
             reader_wait_policy=ReaderWaitPolicy.Count(0)
         )
+        control_loop_channel = ChannelWriter(control_loop_shm, Config.control_loop_memory_name)
 
         save_shm_queue = None
+        save_channel = None
         video_writer_process = None
         if Config.save_processed_video:
             save_shm_queue = SharedMessage.create(
                 Config.save_final_memory_name,
-                Config.max_pipe_data_size,
+                channel_size(Config.save_final_memory_name),
                 OperationMode.WriteAsync,
                 ReaderWaitPolicy.All()
             )  # ReadAsync will make it operate like a queue, as long as the writer side has ReaderWaitPolicy active
+            save_channel = ChannelWriter(save_shm_queue, Config.save_final_memory_name)
 
             video_name = os.path.splitext(Config.video_name)[0]
 
@@ -88,40 +110,95 @@ class MultiProcessingManager(mp.Process):
                 shared_memory_name=Config.save_final_memory_name,
                 keep_running=self.keep_running,
                 program_start_time=self.program_start_time,
+                keyframe_requests=keyframe_requests,
                 name="VideoWriterProcess",
             )
             video_writer_process.start()
 
-        pipelines, _, _ = initialize_config(Config.enable_pipeline_visualization)
+        pipelines, _, _ = initialize_config(Config.enable_pipeline_visualization, Config.use_inference_server)
+
+        # the detection filters of all pipelines share one inference server
+        client_models = inference_client_models(pipelines)
+        inference_channels, inference_selector, inference_server_process = [], None, None
+        if client_models:
+            inference_channels, inference_selector = create_inference_channels(len(client_models))
+            inference_server_process = InferenceServerProcess(
+                client_models, self.keep_running, name="InferenceServerProcess"
+            )
+            inference_server_process.start()
+            print("[MPManager] InferenceServerProcess started")
+
+        # pipelines with replicas hand out their frames with FrameClaims, their results are put back in order
+        reassemblers: dict[str, ReplicaReassembler] = {}
+        for pipeline in pipelines:
+            if pipeline.replicas > 1:
+                reassemblers[pipeline.name] = ReplicaReassembler(
+                    # the manager can't lag behind more frames than the frame store retains
+                    FrameClaims.create(frame_claims_name(pipeline.name), Config.retained_frame_count),
+                    Config.replica_lost_result_timeout,
+                    Config.replica_stall_timeout,
+                )
 
         pipeline_processes: list[tuple[mp.Process, mp.Pipe]] = []
         pipeline_shm_list = []
-
-        for index, pipeline in enumerate(pipelines):
+        channel_layout = replica_channel_layout(pipelines)
+        channel_names = [replica_channel_name(pipelines[index].name, replica) for index, replica in channel_layout]
+        pipeline_selector = ChannelSelector.create(Config.pipeline_selector_memory_name, len(channel_layout))
+        debug_frames_shm_dict = {}  # pipeline name -> lossy channel of its debug imagery
+        render_demand = None  # the pipelines only render their debug frames while the UI asks for them
+        if Config.enable_pipeline_visualization:
+            render_demand = RenderDemand.create(Config.render_demand_memory_name, len(pipelines))
+
+        for channel_index, (index, replica_index) in enumerate(channel_layout):
+            pipeline = pipelines[index]
             pipeline_shm_list.append(
                 SharedMessage.create(
-                    Config.shm_base_name + pipeline.name,
-                    Config.max_pipe_data_size,
+                    channel_names[channel_index],
+                    channel_size(channel_names[channel_index]),
                     OperationMode.ReadSync,
                     ReaderWaitPolicy.Count(0)
                 )
             )
 
+            if Config.enable_pipeline_visualization and replica_index == 0:  # the replicas share it
+                debug_frames_shm_dict[pipeline.name] = SharedMessage.create(
+                    debug_frames_channel_name(pipeline.name),
+                    channel_size(debug_frames_channel_name(pipeline.name)),
+                    OperationMode.ReadSync,
+                    ReaderWaitPolicy.Count(0)
+                )
+
             debug_pipe, child_debug_pipe = mp.Pipe()
             artificial_delay = 0.0
 
             process = SequentialFilterProcess(
-                filters=pipeline.filters,
+                filters=([pipeline.filters] + pipeline.replica_filters)[replica_index],
                 keep_running=self.keep_running,
                 debug_pipe=child_debug_pipe,
                 artificial_delay=artificial_delay,
                 process_name=pipeline.name,
                 program_start_time=self.program_start_time,
+                channel_index=channel_index,
+                processing_scale=pipeline.processing_scale,
+                pipelined=pipeline.pipelined,
+                pipeline_index=index,
+                replica_index=replica_index,
+                replica_count=pipeline.replicas,
             )
 
             process.start()
             pipeline_processes.append((process, debug_pipe))
         print("[MPManager] All parallel processes started")
+        print_memory_footprint(
+            [Config.control_loop_memory_name]
+            + ([Config.save_final_memory_name] if save_shm_queue else [])
+            + channel_names
+            + ([debug_frames_channel_name(pipeline.name) for pipeline in pipelines] if Config.enable_pipeline_visualization else [])
+            + [name(index) for index in range(len(client_models))
+               for name in (inference_request_channel_name, inference_response_channel_name)],
+            [(Config.frame_store_memory_name, frame_store.nbytes), (Config.video_feed_memory_name, FRAME_DESCRIPTOR_SIZE)]
+            + [(frame_claims_name(name), reassembler.claims.nbytes) for name, reassembler in reassemblers.items()],
+        )
 
         camera_process = MockCameraProcess(
             start_video=self.start_video,
@@ -133,12 +210,12 @@ class MultiProcessingManager(mp.Process):
         camera_process.start()
         print("[MPManager] CameraProcess started")
 
-        control_process = Control(self.keep_running)
+        control_process = Control(self.keep_running, keyframe_requests)
         control_process.start()
         print("[MPManager] Controller process started")
 
         print("[MPManager] Setup finished")
-        self.start_video.value = True
+        self.start_video.set()
 
         current_pipe_data = PipeData(
             frame=None,
@@ -149,6 +226,9 @@ class MultiProcessingManager(mp.Process):
             raw_frame=None,
         )
         current_pipe_data.timing_info.start("Process Video (in Parallel)")
+        # consumers rebuild the merged state from its deltas
+        state_publisher = StatePublisher(keyframe_requests=keyframe_requests)
+        channel_reader = ChannelReader()  # resolves results that overflowed their channel
 
         video_rois: VideoRois = get_roi_bbox_for_video(
             Config.video_name, Config.width, Config.height, Config.roi_config_path
@@ -162,65 +242,95 @@ class MultiProcessingManager(mp.Process):
 
         time_list = []
         iteration_counter = 0
+        aggregator = FrameAggregator(
+            [pipeline.name for pipeline in pipelines], Config.aggregator_quorum, Config.aggregator_deadline
+        )
+        ag = FrameAggregator.TIMING_LABEL
         while self.keep_running.value:
-            pipe_data_list: list[PipeData | None] = read_all_map(
-                pipeline_shm_list, deserialize_pipe_data
+            ready_indexes = pipeline_selector.wait(
+                timeout=aggregator.wait_timeout(Config.manager_wait_timeout, time.perf_counter())
             )
-            iteration_counter += 1
-            for new_pipe_data in pipe_data_list:
-                if new_pipe_data is not None:
-                    dl = f"Data Lifecycle {new_pipe_data.last_pipeline_name[0]}"
-                    md = f"Merge Data {new_pipe_data.last_pipeline_name[0]}"
-                    tf2 = f"Transfer Merged Data {new_pipe_data.last_pipeline_name[0]}"
-
-                    new_pipe_data.timing_info.start(md, parent=dl)
-                    current_pipe_data.merge(new_pipe_data)
-                    current_pipe_data.timing_info.stop(md)
-
-                    current_pipe_data.timing_info.start(tf2, dl)
-                    pickled_pipe_data = pickle.dumps(
-                        current_pipe_data, protocol=pickle.HIGHEST_PROTOCOL
-                    )
-                    if not control_loop_shm.is_stopped():
-                        control_loop_shm.write(pickled_pipe_data)
-
-                    display_frames = []
-                    if current_pipe_data.raw_frame is not None:
+            if ready_indexes:
+                pipe_data_list: list[PipeData | None] = read_all_map(
+                    [pipeline_shm_list[index] for index in ready_indexes],
+                    lambda message: deserialize_pipe_data(channel_reader.resolve(message)),
+                )
+                iteration_counter += 1
+                for new_pipe_data in pipe_data_list:
+                    if new_pipe_data is None:
+                        continue
+                    reassembler = reassemblers.get(new_pipe_data.last_pipeline_name)
+                    if reassembler is not None:
+                        reassembler.add(new_pipe_data)
+                    else:
+                        aggregator.add(new_pipe_data, time.perf_counter())
+            for reassembler in reassemblers.values():
+                for new_pipe_data in reassembler.pop_ready(time.perf_counter()):
+                    aggregator.add(new_pipe_data, time.perf_counter())
+
+            for fused_pipe_data in aggregator.pop_ready(time.perf_counter()):
+                fused_pipe_data.timing_info.start("Merge Frame", parent=ag)
+                current_pipe_data.merge(fused_pipe_data)
+                current_pipe_data.timing_info.stop("Merge Frame")
+
+                current_pipe_data.timing_info.start("Transfer Merged Frame", ag)
+                encoded_pipe_data = state_publisher.encode(current_pipe_data, fused_pipe_data)
+                if not control_loop_shm.is_stopped():
+                    control_loop_channel.write(encoded_pipe_data)
+
+                display_frames = []
+                # visualize_data copies the frame anyway, so draw straight from the pinned ring slot
+                with frame_store.pinned(current_pipe_data.frame_version) as ring_frame:
+                    raw_frame = current_pipe_data.raw_frame
+                    if raw_frame is None and ring_frame is not None:
+                        raw_frame = ring_frame.frame
+                    image = None
+                    if raw_frame is not None:
                         image = visualize_data(
-                            video_info=video_info, data=current_pipe_data, raw_frame=current_pipe_data.raw_frame, display_text=False
+                            video_info=video_info, data=current_pipe_data, raw_frame=raw_frame, display_text=False
                         )
-                        h, w = image.shape[:2]
-                        c = 1 if len(image.shape) == 2 else image.shape[2]
-                        display_frames.append(self.PyFrame("Main", image.ravel().tobytes(), w, h, c))
-
-                    if new_pipe_data.processed_frames is not None and len(new_pipe_data.processed_frames) > 0:
-                        for name, pipeline_images in new_pipe_data.processed_frames.items():
-                            for (index, image) in enumerate(pipeline_images):
-                                h, w = image.shape[:2]
-                                c = 1 if len(image.shape) == 2 else image.shape[2]
-                                display_frames.append(self.PyFrame(f"{name} {index}", image.ravel().tobytes(), w, h, c))
-
-                    x = time.perf_counter_ns()
-                    description = f"Frame: {current_pipe_data.frame_version}; Heading error: {int(current_pipe_data.heading_error_degrees)}°; Lateral Offset: {int(current_pipe_data.lateral_offset * 100)}%"
-                    should_continue = self.callback.send_frames(description, display_frames)
-                    end = (time.perf_counter_ns() - x)/1000000.0
-                    time_list.append(end)
-                    print(sum(time_list) / len(time_list))
-                    if not should_continue:
-                        print("[MPManager] Stop signal received from Rust")
-                        self.keep_running.value = False
-                        break
-
-                    if (
-                            Config.save_processed_video
-                            and save_shm_queue
-                            and not save_shm_queue.is_stopped()
-                    ):
-                        save_shm_queue.write(pickled_pipe_data)
-
-                    current_pipe_data.timing_info.remove_recursive(dl)
-
-                    del new_pipe_data
+                    del raw_frame
+                if image is not None:
+                    h, w = image.shape[:2]
+                    c = 1 if len(image.shape) == 2 else image.shape[2]
+                    display_frames.append(self.PyFrame("Main", image.ravel().tobytes(), w, h, c))
+
+                # the debug frames of the pipelines that reported this frame
+                for name in [name for name, age in fused_pipe_data.result_ages.items() if age == 0]:
+                    debug_frames_shm = debug_frames_shm_dict.get(name)
+                    debug_frames_bytes = None
+                    if debug_frames_shm is not None:
+                        debug_frames_bytes = channel_reader.resolve(debug_frames_shm.read(block=False))
+                    if debug_frames_bytes is not None:
+                        _, pipeline_images = decode_debug_frames(debug_frames_bytes)
+                        for (index, image) in enumerate(pipeline_images):
+                            h, w = image.shape[:2]
+                            c = 1 if len(image.shape) == 2 else image.shape[2]
+                            display_frames.append(self.PyFrame(f"{name} {index}", image.ravel().tobytes(), w, h, c))
+
+                x = time.perf_counter_ns()
+                description = f"Frame: {current_pipe_data.frame_version}; Heading error: {int(current_pipe_data.heading_error_degrees)}°; Lateral Offset: {int(current_pipe_data.lateral_offset * 100)}%"
+                should_continue = self.callback.send_frames(description, display_frames)
+                if render_demand is not None:
+                    render_demand.request_all()  # the UI shows the debug frames of every pipeline
+                end = (time.perf_counter_ns() - x)/1000000.0
+                time_list.append(end)
+                print(sum(time_list) / len(time_list))
+                if not should_continue:
+                    print("[MPManager] Stop signal received from Rust")
+                    self.keep_running.value = False
+                    break
+
+                if (
+                        Config.save_processed_video
+                        and save_shm_queue
+                        and not save_shm_queue.is_stopped()
+                ):
+                    save_channel.write(encoded_pipe_data)
+
+                current_pipe_data.timing_info.remove_recursive(ag)
+
+                del fused_pipe_data
 
             if current_pipe_data.frame_version == self.final_frame_version.value:
                 print(f"[Main] Received final frame version: {current_pipe_data.frame_version}")
@@ -232,6 +342,9 @@ class MultiProcessingManager(mp.Process):
         print("[MPManager] Exiting main loop")
         control_loop_shm.stop()
         video_feed_shm.stop()
+        frame_store.stop()
+        if inference_selector:
+            inference_selector.stop()
 
         print("[MPManager] Joining ControllerProcess")
         control_process.join()
@@ -257,15 +370,39 @@ class MultiProcessingManager(mp.Process):
             process.join()
         print("[MPManager] All parallel processes joined")
 
+        if inference_server_process:
+            print("[MPManager] Joining InferenceServerProcess")
+            inference_server_process.join()
+            print("[MPManager] InferenceServerProcess joined")
+
         if video_writer_process:
             print("[MPManager] Joining VideoWriterProcess")
             video_writer_process.join()
             print("[MPManager] VideoWriterProcess joined")
 
+        for channel_writer in (control_loop_channel, save_channel):
+            if channel_writer is not None:
+                channel_writer.close()
+        channel_reader.close()
+        pipeline_selector.close()
+        for inference_channel in inference_channels:
+            inference_channel.close()
+        if inference_selector:
+            inference_selector.close()
+        for debug_frames_shm in debug_frames_shm_dict.values():
+            debug_frames_shm.close()
+        if render_demand is not None:
+            render_demand.close()
+        for reassembler in reassemblers.values():
+            reassembler.claims.close()
+        frame_store.close()
+
         self.callback.stop()
 
 
-def deserialize_pipe_data(pipe_data_bytes: bytes) -> PipeData:
-    pipe_data = pickle.loads(pipe_data_bytes)
+def deserialize_pipe_data(pipe_data_bytes: Optional[bytes]) -> Optional[PipeData]:
+    if pipe_data_bytes is None:  # a spilled result that was overwritten before it could be read
+        return None
+    pipe_data = decode_pipe_data(pipe_data_bytes)
     pipe_data.timing_info.stop(f"Transfer Data {pipe_data.last_pipeline_name[0]}")
     return pipe_data
\ No newline at end of file
@@ -0,0 +1,78 @@
+from typing import Optional
+
+from ipc.frame_claims import FrameClaims
+from perception.objects.pipe_data import PipeData
+from perception.objects.pipeline_config_types import PipelineConfig
+
+
+def replica_channel_layout(pipelines: list[PipelineConfig]) -> list[tuple[int, int]]:
+    """
+    :returns: (pipeline index, replica index) of every channel of the pipeline ChannelSelector: the first replica of
+    every pipeline uses the pipeline's index, the other replicas come after all pipelines
+    """
+    return [(pipeline_index, 0) for pipeline_index in range(len(pipelines))] + [
+        (pipeline_index, replica_index)
+        for pipeline_index, pipeline in enumerate(pipelines)
+        for replica_index in range(1, pipeline.replicas)
+    ]
+
+
+class ReplicaReassembler:
+    """
+    Puts the results of a pipeline's replicas back in frame order before they reach the FrameAggregator.
+
+    The replicas claim their frames in FrameClaims, the tickets of the claims are in frame order. The results are
+    released ticket by ticket, so a result waits for the results of all earlier claims. A claim whose replica finished
+    it but whose result never arrived (overwritten on its channel) is skipped after lost_result_timeout, one that
+    isn't finished after stall_timeout (e.g. its replica died) as well. Results of skipped claims that arrive
+    afterwards are released right away, the FrameAggregator takes them as late results.
+    """
+
+    def __init__(self, claims: FrameClaims, lost_result_timeout: float, stall_timeout: float):
+        self.claims = claims
+        self.lost_result_timeout = lost_result_timeout
+        self.stall_timeout = stall_timeout
+
+        self.next_ticket = 0
+        self.pending: dict[int, PipeData] = {}  # frame_version -> result, waiting for the earlier claims
+        self.last_released_version = -1
+        # when the next ticket started to hold back the results (time.perf_counter()), and since when it's finished
+        self.blocked_since: Optional[float] = None
+        self.finished_since: Optional[float] = None
+        self.skipped_count = 0
+
+    def add(self, data: PipeData):
+        self.pending[data.frame_version] = data
+
+    def _is_expired(self, finished: bool, now: float) -> bool:
+        if self.blocked_since is None:
+            self.blocked_since = now
+        if not finished:
+            return now - self.blocked_since >= self.stall_timeout
+        if self.finished_since is None:
+            self.finished_since = now
+        return now - self.finished_since >= self.lost_result_timeout
+
+    def pop_ready(self, now: float) -> list[PipeData]:
+        """:returns: the results that are next in frame order"""
+        ready = [self.pending.pop(version) for version in sorted(self.pending) if version <= self.last_released_version]
+
+        oldest_ticket = self.claims.ticket_count() - self.claims.capacity
+        if self.next_ticket < oldest_ticket:  # the claims we lagged behind on are gone
+            self.skipped_count += oldest_ticket - self.next_ticket
+            self.next_ticket = oldest_ticket
+
+        while (claim := self.claims.claimed(self.next_ticket)) is not None:
+            frame_version, finished = claim
+            data = self.pending.pop(frame_version, None)
+            if data is not None:
+                ready.append(data)
+            elif self._is_expired(finished, now):
+                self.skipped_count += 1
+            else:
+                break
+            self.last_released_version = max(self.last_released_version, frame_version)
+            self.next_ticket += 1
+            self.blocked_since = None
+            self.finished_since = None
+        return ready
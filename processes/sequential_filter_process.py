@@ -1,14 +1,24 @@
-import pickle
+import struct
 import time
-import numpy as np
+from collections import deque
 
 import multiprocessing as mp
 
-from rs_ipc import ReaderWaitPolicy, SharedMessage, OperationMode
+import cv2
 
 from configuration.config import Config
+from ipc.backend import ReaderWaitPolicy, SharedMessage, OperationMode
+from ipc.channel_overflow import ChannelWriter
+from ipc.channel_select import ChannelSelector
+from ipc.debug_frames import debug_frames_channel_name, encode_debug_frames
+from ipc.frame_claims import FrameClaims, frame_claims_name, replica_channel_name
+from ipc.frame_store import FRAME_DESCRIPTOR_FORMAT, FrameStore
+from ipc.pipe_data_codec import encode_pipe_data
+from ipc.render_demand import RenderDemand
 from perception.filters.base_filter import BaseFilter
 from perception.objects.pipe_data import PipeData
+from perception.objects.video_info import scaled_size
+from processes.filter_stage_pipeline import FilterStagePipeline
 
 
 class SequentialFilterProcess(mp.Process):
@@ -27,70 +37,181 @@ class SequentialFilterProcess(mp.Process):
         artificial_delay: float = 0.0,
         program_start_time: float = 0.0,
         process_name: str = None,
+        channel_index: int = 0,
+        processing_scale: float = 1.0,
+        pipelined: bool = False,
+        pipeline_index: int = None,
+        replica_index: int = 0,
+        replica_count: int = 1,
     ):
-        super().__init__(name=process_name)
+        super().__init__(name=process_name if replica_count == 1 else f"{process_name} {replica_index}")
+        self.pipeline_name = process_name
         self.filters = filters
         self.keep_running = keep_running
         self.debug_pipe = debug_pipe
         self.artificial_delay = artificial_delay
         self.program_start_time = program_start_time
+        self.channel_index = channel_index  # of this pipeline in the manager's ChannelSelector
+        # the filters work on the camera frames resized by it, their results are mapped back to the camera frame
+        self.processing_scale = processing_scale
+        # every filter runs on its own thread, working on the next frame while the following filters finish the
+        # previous ones (see FilterStagePipeline)
+        self.pipelined = pipelined
+        # of this pipeline in the manager's RenderDemand, its channel_index unless it has replicas
+        self.pipeline_index = channel_index if pipeline_index is None else pipeline_index
+        # the replicas of a pipeline share its frames, every one processes the frames it claims (see FrameClaims)
+        self.replica_index = replica_index
+        self.replica_count = replica_count
 
     def run(self):
         try:
-            pipeline_shm = SharedMessage.open(
-                Config.shm_base_name + self.name,
-                OperationMode.WriteSync,
-            )
+            pipeline_channel_name = replica_channel_name(self.pipeline_name, self.replica_index)
+            pipeline_shm = SharedMessage.open(pipeline_channel_name, OperationMode.WriteSync)
+            pipeline_channel = ChannelWriter(pipeline_shm, pipeline_channel_name)
             video_feed_shm: SharedMessage = SharedMessage.open(
                 Config.video_feed_memory_name, OperationMode.ReadSync
             )
+            frame_store = FrameStore.open(Config.frame_store_memory_name)
+            frame_claims = FrameClaims.open(frame_claims_name(self.pipeline_name)) if self.replica_count > 1 else None
+            pipeline_selector = ChannelSelector.open(Config.pipeline_selector_memory_name)
+            debug_channel = None
+            render_demand = None  # headless runs never render debug frames
+            if Config.enable_pipeline_visualization:  # created by the consumer of the debug frames
+                debug_channel = ChannelWriter(
+                    SharedMessage.open(debug_frames_channel_name(self.pipeline_name), OperationMode.WriteAsync),
+                    debug_frames_channel_name(self.pipeline_name),
+                )
+                render_demand = RenderDemand.open(Config.render_demand_memory_name)
 
             processed_frame_indexes = []
+            processing_size = scaled_size(Config.width, Config.height, self.processing_scale)
+            processing_frame = None  # resized into in place, the filters don't write into their input frame
+            ring_frames = deque()  # pinned frames of the PipeData in the filters, in frame order
+            claim_tickets = deque()  # FrameClaims tickets of the PipeData in the filters, with replicas
+
+            dl = f"Data Lifecycle {self.pipeline_name[0]}"
+            pd = f"Process Data {self.pipeline_name[0]}"
+            tf = f"Transfer Data {self.pipeline_name[0]}"
+
+            def finish_frame(data: PipeData):
+                """Maps the results back to the camera frame and sends them, then unpins the frame."""
+                ring_frame = ring_frames.popleft()
+                if self.processing_scale != 1:
+                    data.scale_results(1 / self.processing_scale)
+                    # the results are in camera coordinates now, so are the frames sent along with them
+                    data.frame = ring_frame.frame
+                    data.raw_frame = ring_frame.frame
+                    data.roi_offset = (0, 0)
 
-            dl = f"Data Lifecycle {self.name[0]}"
-            pd = f"Process Data {self.name[0]}"
-            tf = f"Transfer Data {self.name[0]}"
+                data.timing_info.stop(pd)
+                data.timing_info.start(tf, parent=dl)
+
+                # debug imagery goes over the lossy debug channel, the results stay small
+                if data.processed_frames:
+                    if debug_channel is not None and not debug_channel.is_stopped():
+                        debug_frames = [frame for frames in data.processed_frames.values() for frame in frames]
+                        debug_channel.write(encode_debug_frames(data.frame_version, debug_frames))
+                    data.processed_frames = {}
+
+                if Config.transfer_frames_by_reference:
+                    # consumers resolve the pixels from the frame store using data.frame_version
+                    data.frame = None
+                    data.raw_frame = None
+
+                data_as_bytes = encode_pipe_data(data)
+                ring_frame.frame = None  # the view must not outlive the pin
+                frame_store.unpin(ring_frame.version)
+
+                pipeline_channel.write(data_as_bytes)
+                if frame_claims is not None:
+                    frame_claims.finish(claim_tickets.popleft())
+                pipeline_selector.notify(self.channel_index)
+
+            stage_pipeline = None
+            if self.pipelined:
+                stage_pipeline = FilterStagePipeline(
+                    self.filters, finish_frame, queue_size=Config.filter_stage_queue_size, name=self.name
+                )
+                stage_pipeline.start()
 
             while self.keep_running.value:
-                frame_as_bytes = video_feed_shm.read(block=True)
+                descriptor_as_bytes = video_feed_shm.read(block=True)
 
-                if frame_as_bytes is None:  # End of video
+                if descriptor_as_bytes is None:  # End of video
                     break
 
-                frame_version = video_feed_shm.last_read_version()
+                frame_version, _ = struct.unpack(FRAME_DESCRIPTOR_FORMAT, descriptor_as_bytes)
+
+                # Work on the ring slot in place, the camera skips it until we unpin it
+                ring_frame = frame_store.pin(frame_version)
+                if ring_frame is None:  # already overwritten, wait for the next one
+                    continue
+                if frame_claims is not None:
+                    ticket = frame_claims.claim(frame_version)
+                    if ticket < 0:  # another replica processes it
+                        ring_frame.frame = None
+                        frame_store.unpin(frame_version)
+                        continue
+                    claim_tickets.append(ticket)
 
                 processed_frame_indexes.append(frame_version)
+                ring_frames.append(ring_frame)
 
-                frame = np.frombuffer(frame_as_bytes, dtype=np.uint8).reshape(
-                    (Config.height, Config.width, 3)
-                )
                 data = PipeData(
-                    frame=frame,
+                    frame=ring_frame.frame,
                     frame_version=frame_version,
                     depth_frame=None,  # currently only available in real-time mode
-                    raw_frame=frame,
+                    raw_frame=ring_frame.frame,
                     creation_time=time.time_ns(),
-                    last_pipeline_name=self.name,
+                    last_pipeline_name=self.pipeline_name,
+                    render_debug_frames=render_demand is not None and render_demand.is_requested(self.pipeline_index),
                 )
 
                 data.timing_info.start(dl)
                 data.timing_info.start(pd, parent=dl)
 
+                if self.processing_scale != 1:
+                    # the stages may still work on the previous frames, so the pipelined mode doesn't reuse the buffer
+                    processing_frame = cv2.resize(
+                        ring_frame.frame, processing_size, dst=None if self.pipelined else processing_frame,
+                        interpolation=cv2.INTER_AREA
+                    )
+                    data.frame = processing_frame
+                    data.raw_frame = processing_frame
+                del ring_frame
+
                 if self.artificial_delay > 0:
                     time.sleep(self.artificial_delay)
 
+                if stage_pipeline is not None:
+                    stage_pipeline.submit(data)
+                    continue
+
                 for filter in self.filters:
                     filter.process(data)
+                finish_frame(data)
 
-                data.timing_info.stop(pd)
-                data.timing_info.start(tf, parent=dl)
-
-                data_as_bytes = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
-                pipeline_shm.write(data_as_bytes)
-
-                del data
+            if stage_pipeline is not None:
+                stage_pipeline.close()
+                utilization = ", ".join(f"{stage} {share:.0%}" for stage, share in stage_pipeline.utilization())
+                print(f"[{self.name}] Stage utilization: {utilization}")
 
             pipeline_shm.stop()
+            pipeline_selector.notify(self.channel_index)
+            pipeline_channel.close()
+            pipeline_selector.close()
+            if debug_channel is not None:
+                debug_channel.stop()
+                debug_channel.close()
+                debug_channel.shared_message.close()
+                render_demand.close()
+            for filter in self.filters:
+                inference_client = getattr(filter, "inference_client", None)
+                if inference_client is not None:
+                    inference_client.close()
+            if frame_claims is not None:
+                frame_claims.close()
+            frame_store.close()
 
             self.debug_pipe.send(processed_frame_indexes)
             self.debug_pipe.close()
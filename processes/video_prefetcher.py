@@ -0,0 +1,56 @@
+import queue
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class VideoPrefetcher:
+    """
+    Decodes (and resizes) the video on a background thread into a bounded queue, so decode jitter is absorbed by
+    the queue instead of showing up in the frame timing. OpenCV releases the GIL while decoding and resizing.
+    """
+
+    def __init__(self, capture: cv2.VideoCapture, frame_size: Optional[tuple[int, int]], prefetch_count: int):
+        """
+        :param frame_size: (width, height) to resize every frame to, None to keep the decoded size
+        """
+        self.capture = capture
+        self.frame_size = frame_size
+        self._frames: queue.Queue[Optional[np.ndarray]] = queue.Queue(maxsize=prefetch_count)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._decode, name="VideoPrefetcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _put(self, frame: Optional[np.ndarray]) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._frames.put(frame, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decode(self):
+        try:
+            while not self._stopped.is_set():
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                if self.frame_size is not None:
+                    frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_LINEAR)
+                if not self._put(frame):
+                    return
+        finally:
+            self._put(None)  # end of video (or decode error), unblocks read()
+
+    def read(self) -> Optional[np.ndarray]:
+        """:returns: the next frame, None at the end of the video"""
+        return self._frames.get()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
@@ -1,10 +1,12 @@
 import multiprocessing as mp
-import pickle
 
 import cv2
-from rs_ipc import SharedMessage, OperationMode
 
 from configuration.config import Config
+from ipc.backend import SharedMessage, OperationMode
+from ipc.channel_overflow import ChannelReader
+from ipc.frame_store import FrameStore
+from ipc.state_stream import StateReconstructor
 from perception.helpers import get_roi_bbox_for_video
 from perception.objects.save_info import SaveInfo
 from perception.objects.video_info import VideoRois, VideoInfo
@@ -18,6 +20,7 @@ class VideoWriterProcess(mp.Process):
         shared_memory_name: str,
         keep_running: mp.Value,
         program_start_time: float,
+        keyframe_requests: mp.Value = None,
         name: str = None,
     ):
         super().__init__(name=name)
@@ -25,12 +28,14 @@ class VideoWriterProcess(mp.Process):
         self.shared_memory_name = shared_memory_name
         self.keep_running = keep_running
         self.program_start_time = program_start_time
+        self.keyframe_requests = keyframe_requests
 
     def run(self):
         try:
             video_feed_shm = SharedMessage.open(
                 self.shared_memory_name, mode=OperationMode.ReadAsync
             )  # ReadAsync will make it operate like a queue, as long as the writer side has ReaderWaitPolicy active
+            frame_store = FrameStore.open(Config.frame_store_memory_name)
             video_writer = cv2.VideoWriter(
                 self.save_info.video_path,
                 cv2.VideoWriter_fourcc(*"mp4v"),
@@ -47,7 +52,10 @@ class VideoWriterProcess(mp.Process):
                 width=Config.width,
                 video_rois=video_rois,
             )
+            state_reconstructor = StateReconstructor(self.keyframe_requests)
+            channel_reader = ChannelReader()
             read_count = 0
+            evicted_count = 0
             while self.keep_running.value:
                 pipe_data_as_bytes = video_feed_shm.read(block=True)
                 read_count += 1
@@ -56,15 +64,29 @@ class VideoWriterProcess(mp.Process):
                 if pipe_data_as_bytes is None:
                     break
 
-                pipe_data = pickle.loads(pipe_data_as_bytes)
+                pipe_data = state_reconstructor.apply(channel_reader.resolve(pipe_data_as_bytes))
+                if pipe_data is None:  # the save queue is lossless, so this only happens before the first keyframe
+                    continue
 
-                drawn_frame = visualize_data(
-                    video_info=video_info, data=pipe_data, raw_frame=pipe_data.raw_frame
-                )
+                if pipe_data.raw_frame is not None:
+                    drawn_frame = visualize_data(
+                        video_info=video_info, data=pipe_data, raw_frame=pipe_data.raw_frame
+                    )
+                else:
+                    # visualize_data copies the frame anyway, so draw straight from the pinned ring slot
+                    with frame_store.pinned(pipe_data.frame_version) as ring_frame:
+                        if ring_frame is None:
+                            evicted_count += 1  # the writer fell more than Config.retained_frame_count frames behind
+                            continue
+                        drawn_frame = visualize_data(
+                            video_info=video_info, data=pipe_data, raw_frame=ring_frame.frame
+                        )
 
                 video_writer.write(drawn_frame)
 
-            print("VideoWriterProcess: Video ended")
+            print(f"VideoWriterProcess: Video ended ({evicted_count} frames were no longer in the frame store)")
+            frame_store.close()
+            channel_reader.close()
             video_writer.release()
             video_feed_shm.stop()
         except Exception as e:
@@ -0,0 +1,8 @@
+import os
+import unittest
+
+# The benchmarks time the optimized code paths against their references and only print the results, they don't run
+# with the unit tests: CAR_VISION_BENCHMARKS=1 python -m pytest -s tests/
+BENCHMARKS_ENABLED = os.environ.get("CAR_VISION_BENCHMARKS") == "1"
+
+benchmark = unittest.skipUnless(BENCHMARKS_ENABLED, "benchmark, set CAR_VISION_BENCHMARKS=1 to run it")
@@ -0,0 +1,81 @@
+import json
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from configuration.config import Config
+from perception.filters.base_filter import BaseFilter
+from perception.filters.basic_filters.blur_filter import BlurFilter
+from perception.filters.basic_filters.cannyedge_filter import CannyEdgeFilter
+from perception.filters.basic_filters.dilation_filter import DilationFilter
+from perception.filters.basic_filters.fused_preprocess_filter import fuse_filter_chain
+from perception.filters.basic_filters.grayscale_filter import GrayScaleFilter
+from perception.filters.heading_error_filter import HeadingErrorFilter
+from perception.filters.lane_detect_filter import LaneDetectFilter
+from perception.filters.roi_filter import ROIFilter
+from perception.objects.road_info import RoadObject
+from perception.objects.video_info import VideoInfo
+
+
+def make_video_info(width: int, height: int) -> VideoInfo:
+    """The VideoInfo of a test video of the given size, with the rois of Config.roi_config_path."""
+    with open(Config.roi_config_path, "r") as f:
+        video_rois = json.load(f)[f"{width}x{height}"]
+    return VideoInfo(video_name="test", video_rois=video_rois, height=height, width=width)
+
+
+def make_lane_preprocessing(video_info: VideoInfo, visualize_blur: bool = False) -> list[BaseFilter]:
+    """The preprocessing filters of the LaneDetection pipeline in full_pipeline.json, not fused."""
+    return [
+        ROIFilter(video_info, visualize=False, roi_type="lines"),
+        GrayScaleFilter(video_info, visualize=False),
+        CannyEdgeFilter(video_info, visualize=False, low_threshold=150, high_threshold=250),
+        BlurFilter(video_info, visualize=visualize_blur, kernel_size=7, sigmaX=1),
+        DilationFilter(video_info, visualize=False, kernel_size=1, iterations=1),
+    ]
+
+
+def make_lane_pipeline(video_info: VideoInfo, visualize: bool = False, tracking: bool = False) -> list[BaseFilter]:
+    """The LaneDetection pipeline of full_pipeline.json with fused preprocessing, only the lane filter visualizes."""
+    return fuse_filter_chain(make_lane_preprocessing(video_info)) + [
+        LaneDetectFilter(video_info, visualize=visualize, white_line_threshold=135, tracking=tracking),
+        HeadingErrorFilter(video_info, visualize=False),
+    ]
+
+
+def make_road_frame(width: int = 1280, height: int = 720, shift: int = 0, rng: Optional[np.random.Generator] = None,
+                    stop_line: bool = False, clutter_lines: int = 0) -> np.ndarray:
+    """
+    Two lanes at the same relative position for every resolution on a noisy road.
+    :param shift: of the lanes to the right, in pixels
+    :param rng: of the noise (and the clutter), seeded with 0 by default
+    :param clutter_lines: random white lines drawn over the road
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    frame = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+    thickness = max(2, width // 160)
+    for lower_x, upper_x in ((0.25, 0.43), (0.78, 0.58)):
+        cv2.line(frame, (int(width * lower_x) + shift, height - 1), (int(width * upper_x) + shift, int(height * 0.52)),
+                 (235, 235, 235), thickness)
+    if stop_line:
+        cv2.line(frame, (0, int(height * 0.8)), (width, int(height * 0.8)), (200, 200, 200), max(2, width // 300))
+    for _ in range(clutter_lines):
+        start = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        end = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.line(frame, start, end, (230, 230, 230), int(rng.integers(2, 8)))
+    return frame
+
+
+class FakeDetector:
+    """Stands in for a detection model: finds `detections` ((label, box) pairs) in every image, counts its calls."""
+
+    def __init__(self, detections: Optional[list[tuple[str, list[float]]]] = None):
+        self.detections = [("stop", [10.0, 10.0, 50.0, 60.0])] if detections is None else detections
+        self.calls = 0
+
+    def __call__(self, images: list[np.ndarray]) -> list[list[RoadObject]]:
+        self.calls += 1
+        return [[RoadObject(bbox=list(box), label=label, conf=0.9, distance=float("inf"))
+                 for label, box in self.detections] for _ in images]
@@ -0,0 +1,90 @@
+import multiprocessing as mp
+import time
+import unittest
+
+from ipc.channel_select import ChannelSelector
+from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage, read_all_map
+
+SELECTOR_NAME = "CAR_VISION_SHM_TEST_SELECTOR"
+CHANNEL_NAME = "CAR_VISION_SHM_TEST_SELECTED_CHANNEL"
+IDLE_DURATION = 0.5
+
+
+def write_delayed(index: int, delay: float, message_count: int):
+    shared_message = SharedMessage.open(f"{CHANNEL_NAME}_{index}", OperationMode.WriteSync)
+    selector = ChannelSelector.open(SELECTOR_NAME)
+    for _ in range(message_count):
+        time.sleep(delay)
+        shared_message.write(time.perf_counter_ns().to_bytes(8, "little"))
+        selector.notify(index)
+    selector.close()
+    shared_message.close()
+
+
+class TestChannelSelector(unittest.TestCase):
+    def setUp(self):
+        self.selector = ChannelSelector.create(SELECTOR_NAME, channel_count=3)
+
+    def tearDown(self):
+        self.selector.close()
+
+    def test_wait_returns_notified_channels(self):
+        self.selector.notify(2)
+        self.selector.notify(0)
+        self.selector.notify(2)
+        self.assertEqual([0, 2], self.selector.wait(timeout=0))
+        self.assertEqual([], self.selector.wait(timeout=0.01))
+
+        self.selector.notify(1)
+        self.assertEqual([1], self.selector.wait())
+
+        self.selector.stop()
+        start_time = time.perf_counter()
+        self.assertEqual([], self.selector.wait(timeout=5))
+        self.assertLess(time.perf_counter() - start_time, 1)
+
+    def test_idle_cpu_and_wake_latency(self):
+        channels = [
+            SharedMessage.create(f"{CHANNEL_NAME}_{index}", 64, OperationMode.ReadSync, ReaderWaitPolicy.Count(0))
+            for index in range(3)
+        ]
+
+        # the old manager loop, with every pipeline idle
+        start_cpu, start_time = time.process_time(), time.perf_counter()
+        while time.perf_counter() - start_time < IDLE_DURATION:
+            read_all_map(channels, lambda message: message)
+        busy_cpu = time.process_time() - start_cpu
+
+        start_cpu, start_time = time.process_time(), time.perf_counter()
+        while time.perf_counter() - start_time < IDLE_DURATION:
+            self.selector.wait(timeout=0.1)
+        blocking_cpu = time.process_time() - start_cpu
+
+        # wake-up latency: time from the write in another process until the manager has the message
+        message_count = 50
+        writer = mp.get_context("spawn").Process(target=write_delayed, args=(1, 0.005, message_count))
+        writer.start()
+        latencies = []
+        while len(latencies) < message_count:
+            ready = self.selector.wait(timeout=5)
+            self.assertIn(ready, ([], [1]))
+            for message in read_all_map([channels[index] for index in ready], lambda message: message):
+                if message is not None:
+                    latencies.append((time.perf_counter_ns() - int.from_bytes(message, "little")) / 1e6)
+        writer.join()
+
+        latencies.sort()
+        print(f"\nManager loop with idle pipelines ({IDLE_DURATION}s):")
+        print(f"{'':<30} {'read_all_map spin':>18} {'ChannelSelector':>18}")
+        print("-" * 68)
+        print(f"{'CPU time (ms)':<30} {busy_cpu * 1000:>18.1f} {blocking_cpu * 1000:>18.1f}")
+        print(f"{'Wake-up latency p50 (ms)':<30} {'-':>18} {latencies[len(latencies) // 2]:>18.3f}")
+        print(f"{'Wake-up latency max (ms)':<30} {'-':>18} {latencies[-1]:>18.3f}")
+
+        self.assertLess(blocking_cpu, busy_cpu / 4)
+        for channel in channels:
+            channel.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.channel_overflow import ChannelReader, ChannelWriter
+from ipc.channel_sizing import ChannelSizeRecorder, channel_size, load_channel_stats, print_memory_footprint
+from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage
+
+CHANNEL_NAME = Config.shm_base_name + "TEST_CHANNEL"
+
+
+class TestChannelSizing(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.saved_config = (Config.channel_size_profile_dir, Config.calibrate_channel_sizes)
+        Config.channel_size_profile_dir = self.profile_dir.name
+        load_channel_stats.cache_clear()
+
+    def tearDown(self):
+        Config.channel_size_profile_dir, Config.calibrate_channel_sizes = self.saved_config
+        load_channel_stats.cache_clear()
+        self.profile_dir.cleanup()
+
+    def test_calibrated_size(self):
+        self.assertEqual(Config.max_pipe_data_size, channel_size(CHANNEL_NAME))
+
+        recorder = ChannelSizeRecorder(CHANNEL_NAME)
+        for size in (100_000, 120_000, 400_000, 110_000):
+            recorder.record(size)
+        recorder.save()
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir.name, f"{CHANNEL_NAME}.json")))
+
+        load_channel_stats.cache_clear()
+        size = channel_size(CHANNEL_NAME)
+        self.assertGreaterEqual(size, 400_000 * (1 + Config.channel_size_headroom))
+        self.assertLess(size, 400_000 * (1 + Config.channel_size_headroom) + 4096)
+
+        print_memory_footprint([CHANNEL_NAME, Config.shm_base_name + "UNCALIBRATED"], [("FRAME_STORE", 1024 * 1024)])
+
+    def test_calibration_run_records_sizes(self):
+        Config.calibrate_channel_sizes = True
+        shared_message = SharedMessage.create(CHANNEL_NAME, channel_size(CHANNEL_NAME), OperationMode.WriteAsync)
+        channel_writer = ChannelWriter(shared_message, CHANNEL_NAME)
+        for size in (1000, 3000, 2000):
+            channel_writer.write(bytes(size))
+        channel_writer.close()
+        shared_message.close()
+
+        Config.calibrate_channel_sizes = False
+        load_channel_stats.cache_clear()
+        stats = load_channel_stats(CHANNEL_NAME)
+        self.assertEqual((3, 3000, 2000), (stats.count, stats.max_size, stats.p50_size))
+        self.assertEqual(Config.min_channel_size, channel_size(CHANNEL_NAME))
+
+    def test_overflow_spills_and_resizes(self):
+        recorder = ChannelSizeRecorder(CHANNEL_NAME)
+        recorder.record(10_000)
+        recorder.save()
+        load_channel_stats.cache_clear()
+
+        reader = SharedMessage.create(
+            CHANNEL_NAME, channel_size(CHANNEL_NAME), OperationMode.ReadSync, ReaderWaitPolicy.Count(0)
+        )
+        writer = SharedMessage.open(CHANNEL_NAME, OperationMode.WriteSync)
+        channel_writer = ChannelWriter(writer, CHANNEL_NAME)
+        channel_reader = ChannelReader()
+
+        for size in (1000, 200_000, 150_000, 900_000, 5000):
+            payload = np.random.randint(0, 256, size, dtype=np.uint8).tobytes()
+            channel_writer.write(payload)
+            self.assertEqual(payload, channel_reader.resolve(reader.read(block=False)))
+
+        self.assertEqual(3, channel_writer.spill_count)
+        self.assertEqual(0, channel_reader.dropped_count)
+
+        channel_reader.close()
+        channel_writer.close()
+        writer.close()
+        reader.close()
+
+    def test_overwritten_spill_is_dropped(self):
+        reader = SharedMessage.create(CHANNEL_NAME, 4096, OperationMode.ReadSync, ReaderWaitPolicy.Count(0))
+        channel_writer = ChannelWriter(SharedMessage.open(CHANNEL_NAME, OperationMode.WriteAsync), CHANNEL_NAME)
+        channel_writer.capacity = 4096
+        channel_reader = ChannelReader()
+
+        channel_writer.write(bytes(10_000))
+        stale_pointer = reader.read(block=False)
+        channel_writer.write(bytes(10_000))
+        channel_writer.write(bytes(10_000))  # reuses the slot of the first payload
+
+        self.assertIsNone(channel_reader.resolve(stale_pointer))
+        self.assertEqual(1, channel_reader.dropped_count)
+
+        channel_reader.close()
+        channel_writer.close()
+        channel_writer.shared_message.close()
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import unittest
+
+import numpy as np
+
+from ipc.debug_frames import decode_debug_frames, encode_debug_frames
+from ipc.pipe_data_codec import encode_pipe_data
+from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings
+
+CHANNEL_NAME = "CAR_VISION_SHM_TEST_DEBUG_FRAMES"
+FRAME_SHAPE = (720, 1280, 3)
+
+
+def make_debug_frames() -> list[np.ndarray]:
+    """Like the three visualize_hough_lines frames: the camera frame with some lines drawn on it."""
+    frames = []
+    for index in range(3):
+        frame = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+        frame[200 + index * 100 : 220 + index * 100, 100:1100] = (0, 255, 0)
+        frame[:, 600 + index * 20 : 610 + index * 20] = (255, 255, 255)
+        frames.append(frame)
+    return frames
+
+
+def make_lane_result(with_debug_frames: bool) -> PipeData:
+    data = PipeData(
+        frame=None, frame_version=1, depth_frame=None, raw_frame=None, creation_time=time.time_ns(),
+        last_pipeline_name="LaneDetection",
+    )
+    data.road_markings = RoadMarkings(
+        left_line=None, center_line=LineSegment(100, 720, 400, 360), center_line_virtual=False,
+        right_line=LineSegment(1100, 720, 850, 360), right_line_virtual=False, stop_lines=[],
+    )
+    data.heading_error_degrees = 1.5
+    data.lateral_offset = 0.1
+    if with_debug_frames:
+        for frame in make_debug_frames():
+            data.add_processed_frame(frame)
+    return data
+
+
+class TestDebugFrames(unittest.TestCase):
+    def test_raw_round_trip(self):
+        frames = make_debug_frames() + [np.arange(64 * 48, dtype=np.uint8).reshape(48, 64)]
+        frame_version, decoded = decode_debug_frames(encode_debug_frames(42, frames, downscale_factor=1, jpeg_quality=0))
+
+        self.assertEqual(42, frame_version)
+        self.assertEqual(len(frames), len(decoded))
+        for frame, decoded_frame in zip(frames, decoded):
+            np.testing.assert_array_equal(frame, decoded_frame)
+
+    def test_downscaled_jpeg(self):
+        frames = make_debug_frames()
+        _, decoded = decode_debug_frames(encode_debug_frames(1, frames, downscale_factor=2, jpeg_quality=80))
+
+        self.assertEqual((360, 640, 3), decoded[0].shape)
+        self.assertLess(np.abs(decoded[0].astype(int) - frames[0][::2, ::2].astype(int)).mean(), 5)
+
+    def test_writer_never_waits_for_the_display(self):
+        display = SharedMessage.create(CHANNEL_NAME, 4 * 1024 * 1024, OperationMode.ReadSync, ReaderWaitPolicy.Count(0))
+        pipeline = SharedMessage.open(CHANNEL_NAME, OperationMode.WriteAsync)
+
+        start_time = time.perf_counter()
+        for frame_version in range(1, 11):  # the display doesn't read at all
+            pipeline.write(encode_debug_frames(frame_version, make_debug_frames(), downscale_factor=2, jpeg_quality=0))
+        self.assertLess(time.perf_counter() - start_time, 1)
+
+        frame_version, _ = decode_debug_frames(display.read(block=False))
+        self.assertEqual(10, frame_version)  # only the newest one is left
+
+        pipeline.close()
+        display.close()
+
+    def test_payload_sizes(self):
+        combined = len(encode_pipe_data(make_lane_result(with_debug_frames=True)))
+        result = len(encode_pipe_data(make_lane_result(with_debug_frames=False)))
+        debug_raw = len(encode_debug_frames(1, make_debug_frames(), downscale_factor=2, jpeg_quality=0))
+        debug_jpeg = len(encode_debug_frames(1, make_debug_frames(), downscale_factor=2, jpeg_quality=80))
+
+        print("\nLane detection payload per frame (3 debug frames at 1280x720):")
+        print(f"{'Channel':<45} {'Bytes':>12}")
+        print("-" * 58)
+        print(f"{'result with processed_frames (before)':<45} {combined:>12}")
+        print(f"{'result only':<45} {result:>12}")
+        print(f"{'debug channel, downscale 2, raw':<45} {debug_raw:>12}")
+        print(f"{'debug channel, downscale 2, JPEG q80':<45} {debug_jpeg:>12}")
+
+        self.assertLess(result * 100, combined)
+        self.assertLess(debug_jpeg, debug_raw)
+
+
+if __name__ == "__main__":
+    unittest.main()
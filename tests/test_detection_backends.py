@@ -0,0 +1,188 @@
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from configuration.config import Config, DetectionBackend
+from perception.filters.detection_backends import (
+    ExportedModelDetector,
+    decode_yolo_output,
+    exported_model_path,
+    letterbox,
+    load_detector,
+)
+from tests.benchmarking import benchmark
+
+MODEL_PATH = os.path.join(Config.models_dir_path, "best_signs_close.pt")
+VIDEO_PATH = os.path.join(Config.videos_dir, Config.video_name)
+LABELS = {0: "stop", 1: "crosswalk", 2: "parking"}
+
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def make_output(boxes: list[tuple[float, float, float, float, int, float]], anchor_count: int = 8400) -> np.ndarray:
+    """Raw YOLO output with the given (center x, center y, width, height, class id, score) boxes, the rest empty."""
+    output = np.zeros((1, 4 + len(LABELS), anchor_count), dtype=np.float32)
+    for anchor, (center_x, center_y, width, height, class_id, score) in enumerate(boxes):
+        output[0, :4, anchor] = (center_x, center_y, width, height)
+        output[0, 4 + class_id, anchor] = score
+    return output
+
+
+class FakeExportedModel(ExportedModelDetector):
+    """Finds one stop sign in the middle of every input, records the batch sizes it ran."""
+
+    def __init__(self, artifact_path: str):
+        self.batch_sizes = []
+        super().__init__(artifact_path, input_size=640, warmup_runs=1)
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(blob))
+        return np.concatenate([make_output([(320, 320, 40, 40, 0, 0.9)]) for _ in blob])
+
+
+def box_iou(first: list[float], second: list[float]) -> float:
+    width = max(0.0, min(first[2], second[2]) - max(first[0], second[0]))
+    height = max(0.0, min(first[3], second[3]) - max(first[1], second[1]))
+    intersection = width * height
+    area = (first[2] - first[0]) * (first[3] - first[1]) + (second[2] - second[0]) * (second[3] - second[1])
+    return intersection / (area - intersection)
+
+
+def read_frames(count: int) -> list[np.ndarray]:
+    capture = cv2.VideoCapture(VIDEO_PATH)
+    frames = []
+    while len(frames) < count:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(cv2.resize(frame, (Config.width, Config.height)))
+    capture.release()
+    return frames
+
+
+class TestExportedModelDecoding(unittest.TestCase):
+    def test_letterbox(self):
+        image = np.full((720, 1280, 3), 255, dtype=np.uint8)
+        blob, gain, padding = letterbox(image, 640)
+        self.assertEqual((1, 3, 640, 640), blob.shape)
+        self.assertEqual(0.5, gain)
+        self.assertEqual((0, 140), padding)
+        self.assertAlmostEqual(114 / 255, blob[0, 0, 0, 0], places=5)
+        self.assertAlmostEqual(1.0, blob[0, 0, 320, 320], places=5)
+
+    def test_decode_maps_back_and_suppresses_per_class(self):
+        gain, padding = 0.5, (0, 140)
+        output = make_output([
+            (100, 240, 40, 40, 0, 0.9),
+            (102, 242, 40, 40, 0, 0.6),  # same object, suppressed
+            (101, 241, 40, 40, 1, 0.7),  # same place but another class, kept
+            (400, 300, 20, 60, 2, 0.2),  # below the confidence threshold
+        ])
+        detections = decode_yolo_output(output, gain, padding, (720, 1280, 3), LABELS, 0.25, 0.7)
+
+        self.assertEqual(["stop", "crosswalk"], [detection.label for detection in detections])
+        self.assertEqual([160.0, 160.0, 240.0, 240.0], detections[0].bbox)
+        self.assertEqual(0.9, detections[0].conf)
+        self.assertEqual(float("inf"), detections[0].distance)
+
+    def test_decode_clips_to_the_image(self):
+        output = make_output([(10, 150, 40, 40, 0, 0.9)])
+        detections = decode_yolo_output(output, 0.5, (0, 140), (720, 1280, 3), LABELS, 0.25, 0.7)
+        self.assertEqual([0.0, 0.0, 60.0, 60.0], detections[0].bbox)
+        self.assertEqual([], decode_yolo_output(make_output([]), 0.5, (0, 140), (720, 1280, 3), LABELS, 0.25, 0.7))
+
+    def test_exported_model_runs_batches(self):
+        with self.assertRaises(TypeError):  # run is abstract
+            ExportedModelDetector("", 640, 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            artifact_path = os.path.join(directory, "signs_640_dynamic.onnx")
+            with open(artifact_path + ".labels.json", "w") as f:
+                json.dump({str(class_id): label for class_id, label in LABELS.items()}, f)
+            detector = FakeExportedModel(artifact_path)
+
+        images = [np.zeros((720, 1280, 3), dtype=np.uint8), np.zeros((360, 640, 3), dtype=np.uint8)]
+        detections = detector(images)
+        self.assertEqual([1, 2], detector.batch_sizes)  # the warm-up, then both images at once
+        self.assertEqual([600.0, 320.0, 680.0, 400.0], detections[0][0].bbox)
+        self.assertEqual([300.0, 160.0, 340.0, 200.0], detections[1][0].bbox)
+        self.assertEqual([], detector([]))
+
+    def test_exported_model_path(self):
+        self.assertEqual(
+            "models/signs_640_dynamic.onnx", exported_model_path("models/signs.pt", DetectionBackend.ONNX, 640)
+        )
+        self.assertEqual(
+            "models/signs_320_dynamic_openvino_model",
+            exported_model_path("models/signs.pt", DetectionBackend.OPENVINO, 320),
+        )
+        with self.assertRaises(ValueError):
+            exported_model_path("models/signs.pt", DetectionBackend.ULTRALYTICS, 640)
+
+
+@unittest.skipUnless(has_module("ultralytics") and os.path.exists(MODEL_PATH) and os.path.exists(VIDEO_PATH),
+                     "needs ultralytics, the signs model and the test video")
+class TestBackendParity(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.frames = read_frames(30)
+        cls.backends = [DetectionBackend.ULTRALYTICS] + [
+            backend for backend, module in ((DetectionBackend.ONNX, "onnxruntime"), (DetectionBackend.OPENVINO, "openvino"))
+            if has_module(module)
+        ]
+        cls.detectors = {backend: load_detector(MODEL_PATH, backend) for backend in cls.backends}
+
+    def test_same_detections(self):
+        reference = self.detectors[DetectionBackend.ULTRALYTICS]
+        for backend in self.backends[1:]:
+            with self.subTest(backend=backend.name):
+                for frame in self.frames:
+                    expected = [detection for detection in reference([frame])[0] if detection.conf >= 0.5]
+                    detections = self.detectors[backend]([frame])[0]
+                    for expected_detection in expected:
+                        best_iou = max(
+                            (box_iou(expected_detection.bbox, detection.bbox) for detection in detections
+                             if detection.label == expected_detection.label),
+                            default=0.0,
+                        )
+                        self.assertGreater(best_iou, 0.9)
+
+    def test_batch_matches_single_images(self):
+        for backend in self.backends[1:]:
+            with self.subTest(backend=backend.name):
+                detector = self.detectors[backend]
+                batch = self.frames[:Config.inference_max_batch_size]
+                batched = detector(batch)
+                self.assertEqual(len(batch), len(batched))
+                for frame, detections in zip(batch, batched):
+                    single = detector([frame])[0]
+                    self.assertEqual([detection.label for detection in single],
+                                     [detection.label for detection in detections])
+                    for expected, detection in zip(single, detections):
+                        self.assertGreater(box_iou(expected.bbox, detection.bbox), 0.99)
+
+    @benchmark
+    def test_benchmark(self):
+        print(f"\nSigns model on {len(self.frames)} frames of {Config.video_name}:")
+        print(f"{'Backend':<12} {'batch':>6} {'per frame (ms)':>15} {'FPS':>8}")
+        print("-" * 44)
+        for backend, detector in self.detectors.items():
+            for batch_size in (1, Config.inference_max_batch_size):  # a frame per request, a full server batch
+                detector(self.frames[:batch_size])
+                start_time = time.perf_counter()
+                for batch_start in range(0, len(self.frames), batch_size):
+                    detector(self.frames[batch_start:batch_start + batch_size])
+                duration = (time.perf_counter() - start_time) / len(self.frames)
+                print(f"{backend.name:<12} {batch_size:>6} {duration * 1000:>15.3f} {1 / duration:>8.1f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
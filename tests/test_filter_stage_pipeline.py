@@ -0,0 +1,110 @@
+import os
+import time
+import unittest
+
+import numpy as np
+
+from perception.filters.base_filter import BaseFilter
+from perception.filters.basic_filters.fused_preprocess_filter import FusedPreprocessFilter
+from perception.filters.heading_error_filter import HeadingErrorFilter
+from perception.filters.lane_detect_filter import LaneDetectFilter
+from perception.objects.pipe_data import PipeData
+from processes.filter_stage_pipeline import FilterStagePipeline
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_lane_pipeline, make_road_frame, make_video_info
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def make_road_frames(count: int) -> list[np.ndarray]:
+    """Lanes drifting sideways, a few pixels per frame."""
+    rng = np.random.default_rng(0)
+    return [make_road_frame(WIDTH, HEIGHT, shift=int(40 * np.sin(index / 8)), rng=rng) for index in range(count)]
+
+
+def make_data(frame: np.ndarray, frame_version: int) -> PipeData:
+    return PipeData(frame=frame, frame_version=frame_version, depth_frame=None, raw_frame=frame, creation_time=0,
+                    last_pipeline_name="LaneDetection", render_debug_frames=False)
+
+
+def result_of(data: PipeData) -> tuple:
+    """What the pipeline sends on, copied out of the PipeData."""
+    center_line = data.road_markings.center_line
+    return data.frame_version, None if center_line is None else list(center_line), data.heading_error_degrees
+
+
+class FailingFilter(BaseFilter):
+    def process(self, data: PipeData) -> PipeData:
+        if data.frame_version == 3:
+            raise ValueError("broken frame")
+        return super().process(data)
+
+
+def run_sequential(filters: list[BaseFilter], frames: list[np.ndarray]) -> list[tuple]:
+    results = []
+    for frame_version, frame in enumerate(frames):
+        data = make_data(frame, frame_version)
+        for filter in filters:
+            filter.process(data)
+        results.append(result_of(data))
+    return results
+
+
+def run_pipelined(filters: list[BaseFilter], frames: list[np.ndarray]) -> tuple[list[tuple], FilterStagePipeline]:
+    results = []
+    stage_pipeline = FilterStagePipeline(filters, lambda data: results.append(result_of(data)))
+    stage_pipeline.start()
+    for frame_version, frame in enumerate(frames):
+        stage_pipeline.submit(make_data(frame, frame_version))
+    stage_pipeline.close()
+    return results, stage_pipeline
+
+
+class TestFilterStagePipeline(unittest.TestCase):
+    def test_same_results_in_frame_order(self):
+        frames = make_road_frames(40)
+        expected = run_sequential(make_lane_pipeline(make_video_info(WIDTH, HEIGHT), tracking=True), frames)
+
+        filters = make_lane_pipeline(make_video_info(WIDTH, HEIGHT), tracking=True)
+        results, stage_pipeline = run_pipelined(filters, frames)
+
+        self.assertEqual(expected, results)
+        fused_filter = filters[0]
+        self.assertIsInstance(fused_filter, FusedPreprocessFilter)
+        self.assertEqual(stage_pipeline.max_frames_in_flight, fused_filter.buffer_sets)
+        self.assertEqual(
+            ["FusedPreprocessFilter", "LaneDetectFilter", "HeadingErrorFilter", "output"],
+            [stage for stage, _ in stage_pipeline.utilization()],
+        )
+        self.assertTrue(all(0 <= share <= 1 for _, share in stage_pipeline.utilization()))
+
+    def test_failing_stage(self):
+        stage_pipeline = FilterStagePipeline([FailingFilter(make_video_info(WIDTH, HEIGHT), visualize=False)], lambda data: None)
+        stage_pipeline.start()
+        with self.assertRaisesRegex(RuntimeError, "broken frame"):
+            for frame_version in range(100):
+                stage_pipeline.submit(make_data(np.zeros((4, 4, 3), dtype=np.uint8), frame_version))
+            stage_pipeline.close()
+
+    @benchmark
+    def test_benchmark(self):
+        frames = make_road_frames(60)
+        print(f"\nLaneDetection pipeline on {len(frames)} frames of {WIDTH}x{HEIGHT}, {os.cpu_count()} cores:")
+        print(f"{'Mode':<12} {'per frame (ms)':>15} {'FPS':>8}")
+        print("-" * 37)
+
+        run_sequential(make_lane_pipeline(make_video_info(WIDTH, HEIGHT), tracking=True), frames[:5])
+        start_time = time.perf_counter()
+        run_sequential(make_lane_pipeline(make_video_info(WIDTH, HEIGHT), tracking=True), frames)
+        duration = (time.perf_counter() - start_time) / len(frames)
+        print(f"{'sequential':<12} {duration * 1000:>15.3f} {1 / duration:>8.1f}")
+
+        start_time = time.perf_counter()
+        _, stage_pipeline = run_pipelined(make_lane_pipeline(make_video_info(WIDTH, HEIGHT), tracking=True), frames)
+        duration = (time.perf_counter() - start_time) / len(frames)
+        print(f"{'pipelined':<12} {duration * 1000:>15.3f} {1 / duration:>8.1f}")
+        print("Stage utilization: " + ", ".join(f"{stage} {share:.0%}" for stage, share in stage_pipeline.utilization()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import time
+import unittest
+
+from ipc.state_stream import StatePublisher, StateReconstructor
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings, RoadObject
+from processes.frame_aggregator import FrameAggregator
+from tests.benchmarking import benchmark
+
+PIPELINES = ["LaneDetection", "SignDetection", "TrafficLightDetection"]
+
+
+def make_result(pipeline_name: str, frame_version: int) -> PipeData:
+    """What a SequentialFilterProcess sends: only the fields of its pipeline, frames by reference."""
+    data = PipeData(frame=None, frame_version=frame_version, depth_frame=None, raw_frame=None,
+                    creation_time=time.time_ns(), last_pipeline_name=pipeline_name)
+    dl = f"Data Lifecycle {pipeline_name[0]}"
+    data.timing_info.start(dl)
+    data.timing_info.start(f"Process Data {pipeline_name[0]}", parent=dl)
+    data.timing_info.stop(f"Process Data {pipeline_name[0]}")
+
+    if pipeline_name == "LaneDetection":
+        data.road_markings = RoadMarkings(
+            left_line=None, center_line=LineSegment(100 + frame_version, 720, 400, 360), center_line_virtual=False,
+            right_line=None, right_line_virtual=True, stop_lines=[],
+        )
+        data.heading_error_degrees = frame_version / 10
+    elif pipeline_name == "SignDetection":
+        data.traffic_signs = [RoadObject(bbox=[10.0, 20.0, 30.0, 40.0], label="stop", conf=0.9, distance=5,
+                                         source_frame_version=frame_version)]
+    else:
+        data.traffic_lights = [RoadObject(bbox=[50.0, 20.0, 60.0, 40.0], label="red", conf=0.8, distance=9,
+                                          source_frame_version=frame_version)]
+    return data
+
+
+class TestFrameAggregator(unittest.TestCase):
+    def test_all_pipelines_reported(self):
+        aggregator = FrameAggregator(PIPELINES, quorum=0, deadline=1.0)
+        aggregator.add(make_result("LaneDetection", 1), now=0.0)
+        aggregator.add(make_result("SignDetection", 1), now=0.0)
+        self.assertEqual([], aggregator.pop_ready(now=0.0))
+
+        aggregator.add(make_result("TrafficLightDetection", 1), now=0.0)
+        [fused] = aggregator.pop_ready(now=0.0)
+        self.assertEqual(1, fused.frame_version)
+        self.assertEqual(0.1, fused.heading_error_degrees)
+        self.assertEqual(["stop"], [sign.label for sign in fused.traffic_signs])
+        self.assertEqual(["red"], [light.label for light in fused.traffic_lights])
+        self.assertEqual({name: 0 for name in PIPELINES}, fused.result_ages)
+        self.assertEqual(FrameAggregator.TIMING_LABEL, fused.timing_info.root_label)
+        self.assertEqual(
+            ["Data Lifecycle L", "Data Lifecycle S", "Data Lifecycle T"],
+            fused.timing_info.hierarchy[FrameAggregator.TIMING_LABEL],
+        )
+        self.assertIsNone(aggregator.next_deadline())
+
+    def test_waits_for_a_slow_pipeline(self):
+        aggregator = FrameAggregator(PIPELINES, quorum=0, deadline=1.0)
+        for name in PIPELINES:
+            aggregator.add(make_result(name, 1), now=0.0)
+        aggregator.pop_ready(now=0.0)
+
+        for frame_version in (2, 3, 4):
+            aggregator.add(make_result("LaneDetection", frame_version), now=0.1)
+            aggregator.add(make_result("TrafficLightDetection", frame_version), now=0.1)
+        self.assertEqual([], aggregator.pop_ready(now=0.2))  # SignDetection may still report frame 2
+
+        aggregator.add(make_result("SignDetection", 4), now=0.3)  # it skipped frames 2 and 3
+        fused_frames = aggregator.pop_ready(now=0.3)
+        self.assertEqual([2, 3, 4], [fused.frame_version for fused in fused_frames])
+        self.assertEqual([1, 2, 0], [fused.result_ages["SignDetection"] for fused in fused_frames])
+        self.assertEqual([1, 1, 4], [fused.traffic_signs[0].source_frame_version for fused in fused_frames])
+        self.assertEqual([0.2, 0.3, 0.4], [fused.heading_error_degrees for fused in fused_frames])
+
+    def test_deadline(self):
+        aggregator = FrameAggregator(PIPELINES, quorum=0, deadline=0.02)
+        aggregator.add(make_result("LaneDetection", 7), now=1.0)
+        self.assertEqual(1.02, aggregator.next_deadline())
+        self.assertAlmostEqual(0.015, aggregator.wait_timeout(0.1, now=1.005))
+        self.assertEqual([], aggregator.pop_ready(now=1.01))
+
+        [fused] = aggregator.pop_ready(now=1.02)
+        self.assertEqual(7, fused.frame_version)
+        self.assertEqual({"LaneDetection": 0}, fused.result_ages)  # the others never reported
+        self.assertIsNone(fused.traffic_signs)
+
+    def test_quorum(self):
+        aggregator = FrameAggregator(PIPELINES, quorum=2, deadline=1.0)
+        aggregator.add(make_result("LaneDetection", 3), now=0.0)
+        self.assertEqual([], aggregator.pop_ready(now=0.0))
+        aggregator.add(make_result("SignDetection", 5), now=0.0)
+        self.assertEqual([3], [fused.frame_version for fused in aggregator.pop_ready(now=0.0)])
+        with self.assertRaises(ValueError):
+            FrameAggregator(PIPELINES, quorum=4, deadline=1.0)
+
+    def test_late_result(self):
+        aggregator = FrameAggregator(PIPELINES, quorum=1, deadline=1.0)
+        aggregator.add(make_result("LaneDetection", 4), now=0.0)
+        aggregator.pop_ready(now=0.0)
+
+        aggregator.add(make_result("SignDetection", 3), now=0.0)  # frame 4 was already published
+        self.assertEqual([], aggregator.pop_ready(now=0.0))
+        self.assertEqual(1, aggregator.late_count)
+
+        aggregator.add(make_result("LaneDetection", 5), now=0.0)
+        [fused] = aggregator.pop_ready(now=0.0)
+        self.assertEqual({"LaneDetection": 0, "SignDetection": 2}, fused.result_ages)
+        self.assertEqual(3, fused.traffic_signs[0].source_frame_version)
+
+    def test_publication(self):
+        """The manager's merge and publication of the fused frames, rebuilt by a consumer."""
+        state = PipeData(frame=None, frame_version=-1, depth_frame=None, raw_frame=None, creation_time=0,
+                         last_pipeline_name="None")
+        state.timing_info.start("Process Video (in Parallel)")
+        publisher, reconstructor = StatePublisher(keyframe_interval=3), StateReconstructor()
+        aggregator = FrameAggregator(PIPELINES, quorum=0, deadline=0.0)
+        ag = FrameAggregator.TIMING_LABEL
+
+        for frame_version in range(1, 8):
+            for name in PIPELINES[: 1 + frame_version % 3]:
+                aggregator.add(make_result(name, frame_version), now=0.0)
+            for fused in aggregator.pop_ready(now=0.0):
+                fused.timing_info.start("Merge Frame", parent=ag)
+                state.merge(fused)
+                state.timing_info.stop("Merge Frame")
+                state.timing_info.start("Transfer Merged Frame", ag)
+                rebuilt = reconstructor.apply(publisher.encode(state, fused))
+                state.timing_info.remove_recursive(ag)
+
+                self.assertEqual(state.frame_version, rebuilt.frame_version)
+                self.assertEqual(state.result_ages, rebuilt.result_ages)
+                self.assertEqual(state.traffic_signs, rebuilt.traffic_signs)
+                self.assertEqual(state.heading_error_degrees, rebuilt.heading_error_degrees)
+        self.assertEqual(7, state.frame_version)
+        self.assertEqual({"LaneDetection": 0, "SignDetection": 0, "TrafficLightDetection": 2}, state.result_ages)
+        self.assertNotIn(ag, state.timing_info.hierarchy)  # the frame timings are removed after their publication
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 600
+        periods = {"LaneDetection": 1, "SignDetection": 3, "TrafficLightDetection": 4}
+        results = [make_result(name, frame_version) for frame_version in range(frame_count)
+                   for name, period in periods.items() if frame_version % period == 0]
+
+        aggregator = FrameAggregator(PIPELINES, quorum=0, deadline=0.02)
+        publications = 0
+        start_time = time.perf_counter()
+        for data in results:
+            aggregator.add(data, now=0.0)
+            publications += len(aggregator.pop_ready(now=0.0))
+        duration = (time.perf_counter() - start_time) * 1000 / len(results)
+
+        print(f"\nManager publications for {frame_count} frames, pipelines every {list(periods.values())} frames:")
+        print(f"{'Publish':<12} {'publications':>13} {'per result (ms)':>16}")
+        print("-" * 43)
+        print(f"{'per result':<12} {len(results):>13} {'':>16}")
+        print(f"{'per frame':<12} {publications:>13} {duration:>16.3f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
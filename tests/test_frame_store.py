@@ -0,0 +1,88 @@
+import multiprocessing as mp
+import time
+import unittest
+
+import numpy as np
+
+from ipc.frame_store import FrameStore
+
+STORE_NAME = "CAR_VISION_SHM_TEST_FRAME_STORE"
+FRAME_SHAPE = (720, 1280, 3)
+
+
+def write_frames(frame_count: int, delay: float):
+    frame_store = FrameStore.open(STORE_NAME)
+    for index in range(frame_count):
+        time.sleep(delay)
+        frame_store.write(np.full(FRAME_SHAPE, index + 1, dtype=np.uint8))
+    frame_store.close()
+
+
+class TestFrameStore(unittest.TestCase):
+    def setUp(self):
+        self.frame_store = FrameStore.create(STORE_NAME, slot_count=4, frame_shape=FRAME_SHAPE)
+
+    def tearDown(self):
+        self.frame_store.close()
+
+    def write(self, value: int) -> int:
+        return self.frame_store.write(np.full(FRAME_SHAPE, value, dtype=np.uint8), capture_time_ns=value * 1000)
+
+    def test_read_version(self):
+        versions = [self.write(value) for value in range(1, 4)]
+        self.assertEqual([1, 2, 3], versions)
+
+        ring_frame = self.frame_store.read_version(2)
+        self.assertEqual(2, ring_frame.version)
+        self.assertEqual(2000, ring_frame.capture_time_ns)
+        self.assertTrue((ring_frame.frame == 2).all())
+
+        self.assertIsNone(self.frame_store.read_version(0))
+        self.assertIsNone(self.frame_store.read_version(4))
+
+    def test_old_versions_are_evicted(self):
+        for value in range(1, 7):
+            self.write(value)
+
+        self.assertIsNone(self.frame_store.read_version(2))
+        self.assertTrue((self.frame_store.read_version(3).frame == 3).all())
+        self.assertEqual(6, self.frame_store.read_latest().version)
+
+    def test_pinned_slot_is_not_overwritten(self):
+        self.write(1)
+        pinned = self.frame_store.pin(1)
+        self.assertFalse(pinned.frame.flags.writeable)
+
+        for value in range(2, 12):
+            self.write(value)
+
+        self.assertTrue((pinned.frame == 1).all())
+        self.assertIsNotNone(self.frame_store.read_version(1))
+        self.assertIsNotNone(self.frame_store.read_version(11))
+
+        del pinned
+        self.frame_store.unpin(1)
+        for value in range(12, 16):
+            self.write(value)
+        self.assertIsNone(self.frame_store.read_version(1))
+
+    def test_blocking_read_latest_across_processes(self):
+        writer = mp.get_context("spawn").Process(target=write_frames, args=(3, 0.05))
+        writer.start()
+
+        last_version = 0
+        while last_version < 3:
+            ring_frame = self.frame_store.read_latest(block=True, after_version=last_version, timeout=10)
+            self.assertIsNotNone(ring_frame)
+            self.assertGreater(ring_frame.version, last_version)
+            self.assertTrue((ring_frame.frame == ring_frame.version).all())
+            last_version = ring_frame.version
+        writer.join()
+
+        self.assertIsNone(self.frame_store.read_latest(block=True, after_version=3, timeout=0.05))
+        self.frame_store.stop()
+        self.assertEqual(-1, self.frame_store.wait_for_version(4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import time
+import unittest
+
+import numpy as np
+
+from ipc.frame_store import FrameStore
+from tests.benchmarking import benchmark
+
+
+class TestFrameStoreReadMethods(unittest.TestCase):
+    """
+    The production frame path: pipelines and consumers get the pixels from the FrameStore ring, either as a fresh
+    copy (read_version), copied into a preallocated buffer (read_version_into) or as a pinned view onto the slot.
+    """
+
+    def run_performance_test_frame_store(self, width, height, bytes_per_pixel, attempts, shm_name_base):
+        frame_shape = (height, width, bytes_per_pixel)
+        frame_store = FrameStore.create(shm_name_base, slot_count=4, frame_shape=frame_shape)
+        buffer = np.empty(frame_shape, dtype=np.uint8)
+
+        total_durations = {"read_version": 0.0, "read_version_into": 0.0, "pinned": 0.0}
+
+        for _ in range(attempts):
+            frame = np.random.randint(0, 256, frame_shape, dtype=np.uint8)
+            version = frame_store.write(frame)
+
+            start_time = time.perf_counter()
+            ring_frame = frame_store.read_version(version)
+            checksum = int(ring_frame.frame[-1, -1, -1])
+            total_durations["read_version"] += time.perf_counter() - start_time
+            self.assertEqual(frame[-1, -1, -1], checksum)
+
+            start_time = time.perf_counter()
+            self.assertTrue(frame_store.read_version_into(version, buffer))
+            checksum = int(buffer[-1, -1, -1])
+            total_durations["read_version_into"] += time.perf_counter() - start_time
+            self.assertEqual(frame[-1, -1, -1], checksum)
+
+            start_time = time.perf_counter()
+            with frame_store.pinned(version) as ring_frame:
+                checksum = int(ring_frame.frame[-1, -1, -1])
+            total_durations["pinned"] += time.perf_counter() - start_time
+            self.assertEqual(frame[-1, -1, -1], checksum)
+
+        np.testing.assert_array_equal(frame, buffer)
+        frame_store.close()
+
+        print("\nFrameStore Read Performance Results:")
+        print(f"{'Parameter':<30} {'Value':>20}")
+        print("-" * 50)
+        print(f"{'Width':<30} {width:>20}")
+        print(f"{'Height':<30} {height:>20}")
+        print(f"{'Bytes per Pixel':<30} {bytes_per_pixel:>20}")
+        print(f"{'Attempts':<30} {attempts:>20}")
+        print("-" * 50)
+        print(f"{'':<35} {'Total (ms)':>15} {'Average (ms)':>15}")
+        print("-" * 65)
+        for method, total_duration in total_durations.items():
+            print(f"{method:<35} {total_duration * 1000:>15.4f} {total_duration * 1000 / attempts:>15.6f}")
+        print("-" * 65)
+
+        self.assertLess(total_durations["pinned"], total_durations["read_version"])
+
+    def test_read_methods_return_the_frame(self):
+        frame_shape = (480, 640, 3)
+        frame_store = FrameStore.create("CAR_VISION_SHM_TEST_READ_METHODS", slot_count=4, frame_shape=frame_shape)
+        buffer = np.empty(frame_shape, dtype=np.uint8)
+        frame = np.random.default_rng(0).integers(0, 256, frame_shape, dtype=np.uint8)
+        version = frame_store.write(frame)
+
+        np.testing.assert_array_equal(frame, frame_store.read_version(version).frame)
+        self.assertTrue(frame_store.read_version_into(version, buffer))
+        np.testing.assert_array_equal(frame, buffer)
+        with frame_store.pinned(version) as ring_frame:
+            np.testing.assert_array_equal(frame, ring_frame.frame)
+        self.assertFalse(frame_store.read_version_into(version + 1, buffer))  # not written yet
+        frame_store.close()
+
+    @benchmark
+    def test_frame_store_read_methods(self):
+        test_cases = [
+            {'width': 640, 'height': 480, 'bytes_per_pixel': 3, 'attempts': 200, 'shm_name_base': 'CAR_VISION_SHM_TEST_READ_480p'},
+            {'width': 1280, 'height': 720, 'bytes_per_pixel': 3, 'attempts': 200, 'shm_name_base': 'CAR_VISION_SHM_TEST_READ_720p'},
+            {'width': 1920, 'height': 1080, 'bytes_per_pixel': 3, 'attempts': 100, 'shm_name_base': 'CAR_VISION_SHM_TEST_READ_1080p'},
+            {'width': 3840, 'height': 2160, 'bytes_per_pixel': 3, 'attempts': 50, 'shm_name_base': 'CAR_VISION_SHM_TEST_READ_4k'},
+        ]
+
+        for params in test_cases:
+            with self.subTest(params=params):
+                self.run_performance_test_frame_store(**params)
+
+
+if __name__ == "__main__":
+    unittest.main()
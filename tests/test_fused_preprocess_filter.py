@@ -0,0 +1,96 @@
+import time
+import unittest
+
+import numpy as np
+
+from perception.filters.basic_filters.dilation_filter import DilationFilter
+from perception.filters.basic_filters.fused_preprocess_filter import FusedPreprocessFilter, fuse_filter_chain
+from perception.objects.pipe_data import PipeData
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_lane_preprocessing, make_road_frame, make_video_info
+
+
+def make_road_frames(width: int, height: int) -> list[np.ndarray]:
+    return [make_road_frame(width, height, rng=np.random.default_rng(seed), stop_line=True) for seed in range(4)]
+
+
+def run_filters(filters: list, frame: np.ndarray) -> np.ndarray:
+    data = PipeData(
+        frame=frame, frame_version=1, depth_frame=None, raw_frame=frame, creation_time=0, last_pipeline_name="Lane"
+    )
+    for filter in filters:
+        filter.process(data)
+    return data.frame
+
+
+class TestFusedPreprocessFilter(unittest.TestCase):
+    def test_fuse_filter_chain(self):
+        video_info = make_video_info(1280, 720)
+        fused = fuse_filter_chain(make_lane_preprocessing(video_info))
+        self.assertEqual(1, len(fused))
+        self.assertEqual(["roi", "grayscale", "canny_edge", "blur", "dilation"], list(fused[0].steps))
+
+        # the visualized blur output is needed, so the chain is split after it
+        fused = fuse_filter_chain(make_lane_preprocessing(video_info, visualize_blur=True))
+        self.assertEqual([FusedPreprocessFilter, DilationFilter], [type(filter) for filter in fused])
+        self.assertTrue(fused[0].visualize)
+
+    def test_configured_filter_matches_fused_chain(self):
+        video_info = make_video_info(1280, 720)
+        configured = FusedPreprocessFilter(
+            video_info,
+            visualize=False,
+            steps={
+                "roi": {"roi_type": "lines"},
+                "grayscale": {},
+                "canny_edge": {"low_threshold": 150, "high_threshold": 250},
+                "blur": {"kernel_size": 7, "sigmaX": 1},
+                "dilation": {"kernel_size": 1, "iterations": 1},
+            },
+        )
+        frame = make_road_frame(rng=np.random.default_rng(1), stop_line=True)
+        np.testing.assert_array_equal(run_filters(make_lane_preprocessing(video_info), frame), run_filters([configured], frame))
+
+        with self.assertRaises(ValueError):
+            FusedPreprocessFilter(video_info, visualize=False, steps={"blur": {"kernel_size": 7}})
+
+    def test_same_output_as_separate_filters(self):
+        for width, height in ((1280, 720), (1920, 1080), (3840, 2160)):
+            with self.subTest(width=width, height=height):
+                video_info = make_video_info(width, height)
+                separate_filters = make_lane_preprocessing(video_info)
+                fused_filters = fuse_filter_chain(make_lane_preprocessing(video_info))
+                for frame in make_road_frames(width, height):  # also once the buffers are reused
+                    np.testing.assert_array_equal(run_filters(separate_filters, frame), run_filters(fused_filters, frame))
+
+    @benchmark
+    def test_benchmark(self):
+        test_cases = [
+            {"width": 1280, "height": 720, "attempts": 100},
+            {"width": 1920, "height": 1080, "attempts": 60},
+            {"width": 3840, "height": 2160, "attempts": 20},
+        ]
+
+        print("\nLane preprocessing (roi, grayscale, canny_edge, blur, dilation) per frame:")
+        print(f"{'Resolution':<15} {'separate (ms)':>15} {'fused (ms)':>15} {'saving (ms)':>15}")
+        print("-" * 63)
+        for params in test_cases:
+            width, height, attempts = params["width"], params["height"], params["attempts"]
+            video_info = make_video_info(width, height)
+            frames = make_road_frames(width, height)
+
+            durations = {}
+            for label, filters in (("separate", make_lane_preprocessing(video_info)),
+                                   ("fused", fuse_filter_chain(make_lane_preprocessing(video_info)))):
+                start_time = time.perf_counter()
+                for attempt in range(attempts):
+                    run_filters(filters, frames[attempt % len(frames)])
+                durations[label] = (time.perf_counter() - start_time) * 1000 / attempts
+
+            print(
+                f"{f'{width}x{height}':<15} {durations['separate']:>15.3f} {durations['fused']:>15.3f} "
+                f"{durations['separate'] - durations['fused']:>15.3f}"
+            )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from configuration.config import Config
+from ipc.channel_select import ChannelSelector
+from ipc.channel_sizing import channel_size
+from ipc.inference_channel import (
+    InferenceClient,
+    InferenceRequest,
+    decode_inference_request,
+    decode_inference_response,
+    encode_inference_request,
+    encode_inference_response,
+    inference_request_channel_name,
+    inference_response_channel_name,
+)
+from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage
+from perception.objects.road_info import RoadObject
+from processes.inference_server import InferenceServer, MicroBatcher
+from tests.benchmarking import benchmark
+
+SIGNS_MODEL = "configuration/models/signs.pt"
+LIGHTS_MODEL = "configuration/models/lights.pt"
+
+
+def make_request(value: int = 0) -> InferenceRequest:
+    return InferenceRequest(sequence=1, frame_version=1, image=np.full((4, 4, 3), value, dtype=np.uint8))
+
+
+class FakePredictor:
+    """Stands in for a YOLO model: one detection per image, labeled with the image's pixel value."""
+
+    def __init__(self, duration_per_call: float = 0.0):
+        self.duration_per_call = duration_per_call
+        self.batch_sizes = []
+
+    def __call__(self, images: list[np.ndarray]) -> list[list[RoadObject]]:
+        self.batch_sizes.append(len(images))
+        if self.duration_per_call:
+            time.sleep(self.duration_per_call)
+        return [
+            [RoadObject(bbox=[1.0, 2.0, 3.0, 4.0], label=str(int(image[0, 0, 0])), conf=0.9, distance=float("inf"))]
+            for image in images
+        ]
+
+
+class TestInferenceCodec(unittest.TestCase):
+    def test_request_round_trip(self):
+        frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+        crop = frame[100:400, 600:1100]  # an roi crop is a strided view
+        request = decode_inference_request(bytes(encode_inference_request(7, 42, crop)))
+        self.assertEqual((7, 42), (request.sequence, request.frame_version))
+        np.testing.assert_array_equal(crop, request.image)
+
+        gray = frame[:, :, 0].copy()
+        np.testing.assert_array_equal(gray, decode_inference_request(bytes(encode_inference_request(1, 1, gray))).image)
+
+    def test_response_round_trip(self):
+        detections = [RoadObject(bbox=[1.5, 2.0, 30.25, 40.0], label="stop", conf=0.87, distance=float("inf"))]
+        self.assertEqual((3, detections), decode_inference_response(encode_inference_response(3, detections)))
+        self.assertEqual((4, []), decode_inference_response(encode_inference_response(4, [])))
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def make_batcher(self, **kwargs) -> MicroBatcher:
+        params = dict(
+            client_models=[SIGNS_MODEL, SIGNS_MODEL, LIGHTS_MODEL],
+            batch_windows={},
+            default_batch_window=0.01,
+            max_latency=0.05,
+            max_batch_size=8,
+        )
+        params.update(kwargs)
+        return MicroBatcher(**params)
+
+    def test_batch_is_due_when_every_client_of_the_model_sent(self):
+        batcher = self.make_batcher()
+        batcher.add(0, make_request(), now=0.0)
+        batcher.add(2, make_request(), now=0.0)
+        self.assertEqual([LIGHTS_MODEL], [model for model, _ in batcher.pop_due_batches(now=0.0)])
+        self.assertEqual(0.01, batcher.next_deadline())
+
+        batcher.add(1, make_request(), now=0.001)
+        (model, batch), = batcher.pop_due_batches(now=0.001)
+        self.assertEqual(SIGNS_MODEL, model)
+        self.assertEqual([0, 1], [client_index for client_index, _ in batch])
+        self.assertIsNone(batcher.next_deadline())
+
+    def test_batch_window(self):
+        batcher = self.make_batcher(batch_windows={"signs.pt": 0.002})
+        batcher.add(0, make_request(), now=0.0)
+        self.assertEqual([], batcher.pop_due_batches(now=0.001))
+        self.assertEqual(0.002, batcher.next_deadline())
+        self.assertEqual([SIGNS_MODEL], [model for model, _ in batcher.pop_due_batches(now=0.002)])
+
+    def test_max_latency_bounds_the_windows(self):
+        batcher = self.make_batcher(default_batch_window=1.0, max_latency=0.02)
+        batcher.add(0, make_request(), now=0.0)
+        self.assertEqual(0.02, batcher.next_deadline())
+        self.assertEqual(1, len(batcher.pop_due_batches(now=0.02)))
+
+    def test_max_batch_size(self):
+        batcher = self.make_batcher(client_models=[SIGNS_MODEL] * 5, max_batch_size=2)
+        for client_index in range(3):
+            batcher.add(client_index, make_request(), now=0.0)
+        batches = batcher.pop_due_batches(now=0.0)
+        self.assertEqual([[0, 1]], [[client_index for client_index, _ in batch] for _, batch in batches])
+        self.assertEqual([2], [client_index for client_index, _ in batcher.pop_due_batches(now=1.0)[0][1]])
+
+
+class TestInferenceServer(unittest.TestCase):
+    def setUp(self):
+        self.client_models = [SIGNS_MODEL, SIGNS_MODEL, LIGHTS_MODEL]
+        self.channels = []
+        for client_index in range(len(self.client_models)):
+            for name in (inference_request_channel_name(client_index), inference_response_channel_name(client_index)):
+                self.channels.append(SharedMessage.create(
+                    name, channel_size(name), OperationMode.CreateOnly, ReaderWaitPolicy.Count(0)
+                ))
+        self.selector = ChannelSelector.create(Config.inference_selector_memory_name, len(self.client_models))
+        self.predictors = {SIGNS_MODEL: FakePredictor(0.005), LIGHTS_MODEL: FakePredictor(0.005)}
+
+        client_count = len(self.client_models)
+        self.server = InferenceServer(
+            [SharedMessage.open(inference_request_channel_name(i), OperationMode.ReadSync) for i in range(client_count)],
+            [SharedMessage.open(inference_response_channel_name(i), OperationMode.WriteAsync) for i in range(client_count)],
+            ChannelSelector.open(Config.inference_selector_memory_name),
+            self.predictors,
+            MicroBatcher(self.client_models, {}, default_batch_window=0.01, max_latency=0.05, max_batch_size=8),
+        )
+        self.clients = []
+        for client_index in range(client_count):
+            client = InferenceClient(client_index)
+            client.attach(
+                SharedMessage.open(inference_request_channel_name(client_index), OperationMode.WriteAsync),
+                SharedMessage.open(inference_response_channel_name(client_index), OperationMode.ReadSync),
+                ChannelSelector.open(Config.inference_selector_memory_name),
+            )
+            self.clients.append(client)
+
+        self.serving = True
+        self.server_thread = threading.Thread(target=self.serve)
+        self.server_thread.start()
+
+    def serve(self):
+        while self.serving:
+            self.server.poll(timeout=0.05)
+        self.server.stop()
+
+    def tearDown(self):
+        self.serving = False
+        self.server_thread.join()
+        for client in self.clients:
+            client.close()
+        self.server.close()
+        self.server.selector.close()
+        for shared_message in self.server.request_shms:
+            shared_message.close()
+        for response_channel in self.server.response_channels:
+            response_channel.shared_message.close()
+        self.selector.close()
+        for channel in self.channels:
+            channel.close()
+
+    def infer_all(self, frame_version: int) -> list:
+        results = [None] * len(self.clients)
+
+        def infer(client_index: int):
+            image = np.full((360, 640, 3), 10 * client_index + frame_version % 10, dtype=np.uint8)
+            results[client_index] = self.clients[client_index].infer(frame_version, image)
+
+        threads = [threading.Thread(target=infer, args=(index,)) for index in range(len(self.clients))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_same_frame_requests_are_batched(self):
+        for frame_version in range(1, 6):
+            results = self.infer_all(frame_version)
+            for client_index, detections in enumerate(results):
+                self.assertEqual([str(10 * client_index + frame_version)], [detection.label for detection in detections])
+
+        self.assertEqual([2] * 5, self.predictors[SIGNS_MODEL].batch_sizes)
+        self.assertEqual([1] * 5, self.predictors[LIGHTS_MODEL].batch_sizes)
+
+    def test_stopped_server_answers_none(self):
+        self.serving = False
+        self.server_thread.join()
+        self.assertIsNone(self.clients[0].infer(1, np.zeros((8, 8, 3), dtype=np.uint8)))
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 20
+        self.predictors[SIGNS_MODEL].duration_per_call = 0
+        self.predictors[LIGHTS_MODEL].duration_per_call = 0
+        self.infer_all(0)
+
+        start_time = time.perf_counter()
+        for frame_version in range(1, frame_count + 1):
+            self.infer_all(frame_version)
+        duration = (time.perf_counter() - start_time) * 1000 / frame_count
+
+        print("\nInference server round trip, 3 clients with 640x360 crops, instant model:")
+        print(f"{'per frame (ms)':>15} {'mean batch size (signs model)':>31}")
+        print("-" * 47)
+        print(f"{duration:>15.3f} {np.mean(self.predictors[SIGNS_MODEL].batch_sizes):>31.2f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
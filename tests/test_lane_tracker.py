@@ -0,0 +1,154 @@
+import time
+import unittest
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from configuration.config import Config
+from perception.filters.heading_error_filter import HeadingErrorFilter
+from perception.filters.lane_detect_filter import LaneDetectFilter
+from perception.objects.pipe_data import PipeData
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_video_info
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def make_lane_frame(shift: float, jitter: np.ndarray, rng, stop_line: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :returns: (edge frame as the lane preprocessing outputs it, raw BGR frame), lanes at x 300 / 1000 at the bottom
+    """
+    raw_frame = rng.integers(0, 60, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    center_bottom, center_top, right_bottom, right_top = (np.array([300, 560, 1000, 740]) + shift + jitter).astype(int)
+    lines = [((center_bottom, HEIGHT - 1), (center_top, 370)), ((right_bottom, HEIGHT - 1), (right_top, 370))]
+    if stop_line:
+        lines.append(((center_bottom + 30, 660), (right_bottom - 30, 660)))
+    for start, end in lines:
+        cv2.line(raw_frame, start, end, (230, 230, 230), 8)
+    # clutter, e.g. the curb and other cars
+    for _ in range(60):
+        x, y = int(rng.integers(0, WIDTH)), int(rng.integers(380, HEIGHT))
+        cv2.rectangle(raw_frame, (x, y), (x + 40, y + 25), (110, 110, 110), -1)
+
+    # the blur and dilation of the preprocessing merge the two edges of a painted line
+    edges = cv2.Canny(cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY), 150, 250)
+    for start, end in lines:
+        cv2.line(edges, start, end, 255, 3)
+    return edges, raw_frame
+
+
+def process(filters: list, edges: np.ndarray, raw_frame: np.ndarray) -> PipeData:
+    data = PipeData(
+        frame=edges, frame_version=1, depth_frame=None, raw_frame=raw_frame, creation_time=0,
+        last_pipeline_name="LaneDetection",
+    )
+    for filter in filters:
+        filter.process(data)
+    return data
+
+
+def make_filters(tracking: bool) -> list:
+    video_info = make_video_info(WIDTH, HEIGHT)
+    return [
+        LaneDetectFilter(video_info, visualize=False, white_line_threshold=135, tracking=tracking),
+        HeadingErrorFilter(video_info, visualize=False),
+    ]
+
+
+class ModeResult(NamedTuple):
+    duration_ms: float  # per frame
+    searched_pixels: float  # edge pixels the line search looked at, per frame
+    heading_error_std: float  # degrees, without the first frames
+
+
+def make_noisy_frames(frame_count: int = 60) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Lanes that stay in place, with 6 px of measurement noise."""
+    rng = np.random.default_rng(3)
+    return [make_lane_frame(0, rng.normal(0, 6, 4), rng) for _ in range(frame_count)]
+
+
+def compare_modes(frames: list[tuple[np.ndarray, np.ndarray]]) -> dict[bool, ModeResult]:
+    """:returns: the result without and with lane tracking"""
+    results = {}
+    for tracking in (False, True):
+        filters = make_filters(tracking)
+        heading_errors = []
+        searched_pixels = 0
+        start_time = time.perf_counter()
+        for edges, raw_frame in frames:
+            search_region = filters[0].lane_tracker.search_region() if tracking else None
+            if search_region is None:
+                searched_pixels += np.count_nonzero(edges)
+            else:
+                mask, (x0, y0, x1, y1) = search_region
+                searched_pixels += np.count_nonzero(cv2.bitwise_and(edges[y0:y1, x0:x1], mask[y0:y1, x0:x1]))
+            data = process(filters, edges, raw_frame)
+            heading_errors.append(data.heading_error_degrees)
+        duration_ms = (time.perf_counter() - start_time) * 1000 / len(frames)
+        results[tracking] = ModeResult(duration_ms, searched_pixels / len(frames), float(np.std(heading_errors[5:])))
+    return results
+
+
+class TestLaneTracking(unittest.TestCase):
+    def test_follows_the_lane(self):
+        rng = np.random.default_rng(0)
+        filters = make_filters(tracking=True)
+        tracker = filters[0].lane_tracker
+        for frame_index in range(40):
+            shift = frame_index * 2.0  # the car drifts slowly
+            data = process(filters, *make_lane_frame(shift, np.zeros(4), rng))
+            self.assertTrue(tracker.is_tracking)
+            if frame_index >= 5:
+                self.assertAlmostEqual(300 + shift, data.road_markings.center_line.lower_x, delta=15)
+                self.assertAlmostEqual(1000 + shift, data.road_markings.right_line.lower_x, delta=15)
+                self.assertFalse(data.road_markings.center_line_virtual)
+
+    def test_stop_lines_inside_the_band(self):
+        rng = np.random.default_rng(1)
+        filters = make_filters(tracking=True)
+        for _ in range(5):
+            process(filters, *make_lane_frame(0, np.zeros(4), rng))
+        self.assertIsNotNone(filters[0].lane_tracker.search_region())
+
+        data = process(filters, *make_lane_frame(0, np.zeros(4), rng, stop_line=True))
+        self.assertGreaterEqual(len(data.road_markings.stop_lines), 1)
+
+    def test_lost_track_falls_back_to_full_search(self):
+        rng = np.random.default_rng(2)
+        filters = make_filters(tracking=True)
+        tracker = filters[0].lane_tracker
+        for _ in range(5):
+            process(filters, *make_lane_frame(0, np.zeros(4), rng))
+
+        empty_edges, empty_raw = np.zeros((HEIGHT, WIDTH), dtype=np.uint8), np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        for _ in range(Config.lane_tracking_max_missed_frames):
+            process(filters, empty_edges, empty_raw)
+            self.assertTrue(tracker.is_tracking)
+        process(filters, empty_edges, empty_raw)
+        self.assertFalse(tracker.is_tracking)
+
+        # the lane reappears far from the old track, the full search finds it
+        data = process(filters, *make_lane_frame(-80, np.zeros(4), rng))
+        self.assertTrue(tracker.is_tracking)
+        self.assertAlmostEqual(220, data.road_markings.center_line.lower_x, delta=15)
+
+    def test_tracking_reduces_jitter(self):
+        results = compare_modes(make_noisy_frames())
+        self.assertLess(results[True].heading_error_std, results[False].heading_error_std)
+        self.assertLess(results[True].searched_pixels, results[False].searched_pixels)
+
+    @benchmark
+    def test_benchmark(self):
+        results = compare_modes(make_noisy_frames())
+
+        print("\nLaneDetectFilter + HeadingErrorFilter, 1280x720, lanes with 6 px of measurement noise:")
+        print(f"{'Mode':<10} {'per frame (ms)':>15} {'edge pixels searched':>21} {'heading error std (deg)':>24}")
+        print("-" * 73)
+        for tracking, result in results.items():
+            label = "tracking" if tracking else "full"
+            print(f"{label:<10} {result.duration_ms:>15.3f} {result.searched_pixels:>21.0f} "
+                  f"{result.heading_error_std:>24.3f}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import time
+import unittest
+
+import numpy as np
+
+from perception.filters.lane_detect_filter import compute_white_line_mask, filter_for_white_lines
+from perception.objects.line_segment import LineSegment
+from perception.objects.line_segment_batch import LineSegmentBatch
+from tests.benchmarking import benchmark
+
+
+def make_hough_lines(count: int, seed: int = 0) -> np.ndarray:
+    """Random HoughLinesP output (N, 1, 4) of a 1280x720 frame, with vertical, horizontal and repeated lines."""
+    rng = np.random.default_rng(seed)
+    lines = rng.integers(0, 720, (count, 1, 4), dtype=np.int32)
+    lines[::7, 0, 2] = lines[::7, 0, 0]  # vertical
+    lines[::11, 0, 3] = lines[::11, 0, 1]  # horizontal
+    lines[1::13] = lines[::13][: len(lines[1::13])]  # ties for argmax
+    return lines
+
+
+def segments_per_object(hough_lines: np.ndarray, offset=(0, 0)) -> list[LineSegment]:
+    """LaneDetectFilter's conversion before LineSegmentBatch, one LineSegment per Hough line."""
+    segments = []
+    for x1, y1, x2, y2 in hough_lines.reshape(-1, 4):
+        x1, y1, x2, y2 = x1 + offset[0], y1 + offset[1], x2 + offset[0], y2 + offset[1]
+        if y1 < y2:
+            segments.append(LineSegment(x2, y2, x1, y1))
+        else:
+            segments.append(LineSegment(x1, y1, x2, y2))
+    return segments
+
+
+def filter_lines_by_type(hough_line_segments: list[LineSegment], frame_width: int):
+    """LaneDetectFilter's split before LineSegmentBatch.split_by_type, one check per LineSegment."""
+    horizontal_lines = []
+    left_lane_lines = []
+    right_lane_lines = []
+    for line_segment in hough_line_segments:
+        if line_segment.check_is_horizontal(20):
+            horizontal_lines.append(line_segment)
+        else:
+            if line_segment.lower_x < frame_width / 2:
+                left_lane_lines.append(line_segment)
+            else:
+                right_lane_lines.append(line_segment)
+
+    return left_lane_lines, right_lane_lines, horizontal_lines
+
+
+def select_lane_lines_per_object(frame, hough_lines):
+    segments = segments_per_object(hough_lines)
+    white, other = filter_for_white_lines(frame, segments)
+    white_left, white_right, white_horizontal = filter_lines_by_type(white, 1280)
+    filter_lines_by_type(other, 1280)
+    left = max(white_left, key=lambda l: l.compute_vertical_distance()) if white_left else None
+    right = max(white_right, key=lambda l: l.compute_euclidean_distance()) if white_right else None
+    return left, right, white_horizontal
+
+
+def select_lane_lines_batched(frame, hough_lines):
+    segments = LineSegmentBatch.from_hough_lines(hough_lines)
+    is_white = compute_white_line_mask(frame, segments)
+    white_left, white_right, white_horizontal = segments[is_white].split_by_type(1280)
+    segments[~is_white].split_by_type(1280)
+    left = white_left.argmax(white_left.compute_vertical_distances())
+    right = white_right.argmax(white_right.compute_euclidean_distances())
+    return left, right, white_horizontal.to_list()
+
+
+def coordinates(line_segments) -> list[list[int]]:
+    return [[int(value) for value in line_segment] for line_segment in line_segments]
+
+
+class TestLineSegmentBatch(unittest.TestCase):
+    def setUp(self):
+        self.hough_lines = make_hough_lines(500)
+        self.segments = segments_per_object(self.hough_lines, offset=(30, 40))
+        self.batch = LineSegmentBatch.from_hough_lines(self.hough_lines, offset=(30, 40))
+
+    def test_from_hough_lines(self):
+        self.assertEqual(coordinates(self.segments), self.batch.coordinates.tolist())
+        self.assertEqual(coordinates(self.segments), coordinates(self.batch))
+        self.assertEqual(coordinates(self.segments), LineSegmentBatch.from_segments(self.segments).coordinates.tolist())
+        # OpenCV 5 returns (N, 4)
+        np.testing.assert_array_equal(self.batch.coordinates,
+                                      LineSegmentBatch.from_hough_lines(self.hough_lines[:, 0], (30, 40)).coordinates)
+        self.assertEqual(0, len(LineSegmentBatch.from_hough_lines(None)))
+
+    def test_geometry_matches_line_segment(self):
+        np.testing.assert_array_equal([segment.slope for segment in self.segments], self.batch.compute_slopes())
+        np.testing.assert_array_equal([segment.compute_vertical_distance() for segment in self.segments],
+                                      self.batch.compute_vertical_distances())
+        np.testing.assert_array_equal([segment.compute_euclidean_distance() for segment in self.segments],
+                                      self.batch.compute_euclidean_distances())
+        np.testing.assert_array_equal([segment.compute_angle_with_ox_radians() for segment in self.segments],
+                                      self.batch.compute_angles_with_ox_radians())
+        for threshold_degrees in (0, 5, 20, 45):
+            np.testing.assert_array_equal([segment.check_is_horizontal(threshold_degrees) for segment in self.segments],
+                                          self.batch.check_are_horizontal(threshold_degrees))
+        with self.assertRaises(ValueError):
+            self.batch.check_are_horizontal(50)
+
+    def test_split_and_argmax_match_per_object(self):
+        expected = filter_lines_by_type(self.segments, 1280)
+        split = self.batch.split_by_type(1280)
+        for expected_lines, lines in zip(expected, split):
+            self.assertEqual(coordinates(expected_lines), lines.coordinates.tolist())
+
+        left = split[0]
+        expected_left = max(expected[0], key=lambda l: l.compute_vertical_distance())
+        self.assertEqual(list(expected_left), list(left.argmax(left.compute_vertical_distances())))
+        self.assertIsNone(left[:0].argmax(left[:0].compute_vertical_distances()))
+
+    def test_lane_line_selection(self):
+        frame = np.random.default_rng(1).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+        for seed in range(5):
+            hough_lines = make_hough_lines(200, seed)
+            expected = select_lane_lines_per_object(frame, hough_lines)
+            result = select_lane_lines_batched(frame, hough_lines)
+            self.assertEqual(list(expected[0]), list(result[0]))
+            self.assertEqual(list(expected[1]), list(result[1]))
+            self.assertEqual(coordinates(expected[2]), coordinates(result[2]))
+
+    @benchmark
+    def test_benchmark(self):
+        frame = np.random.default_rng(2).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+
+        print("\nLane line selection from Hough output (white filter, split, longest lines):")
+        print(f"{'Segments':<10} {'LineSegment list (ms)':>22} {'LineSegmentBatch (ms)':>22} {'speedup':>9}")
+        print("-" * 66)
+        for count, attempts in ((10, 300), (100, 100), (1000, 10)):
+            hough_lines = make_hough_lines(count)
+            durations = {}
+            for label, function in (("objects", select_lane_lines_per_object), ("batch", select_lane_lines_batched)):
+                start_time = time.perf_counter()
+                for _ in range(attempts):
+                    function(frame, hough_lines)
+                durations[label] = (time.perf_counter() - start_time) * 1000 / attempts
+            print(f"{count:<10} {durations['objects']:>22.3f} {durations['batch']:>22.3f} "
+                  f"{durations['objects'] / durations['batch']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    unittest.main()
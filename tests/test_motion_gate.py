@@ -0,0 +1,115 @@
+import time
+import unittest
+
+import numpy as np
+
+from configuration.config import Config
+from perception.filters.motion_gate import MotionGate
+from perception.filters.object_detect_filter import SignsDetect
+from perception.objects.pipe_data import PipeData
+from tests.benchmarking import benchmark
+from tests.filter_testing import FakeDetector, make_video_info
+
+WIDTH, HEIGHT = 1280, 720
+FRAME_SHAPE = (400, 640, 3)  # of the cropped signs roi
+
+
+class RoadScene:
+    """A static road with sensor noise, a sign appears at `sign_box` from frame `sign_from` on."""
+
+    def __init__(self, sign_box: tuple[int, int, int, int] = (300, 150, 320, 170), sign_from: int = 10 ** 9):
+        rng = np.random.default_rng(0)
+        self.background = rng.integers(60, 200, FRAME_SHAPE, dtype=np.uint8)
+        self.sign_box = sign_box
+        self.sign_from = sign_from
+        self.noise_rng = np.random.default_rng(1)
+
+    def frame(self, frame_index: int) -> np.ndarray:
+        noise = self.noise_rng.integers(-4, 5, FRAME_SHAPE)
+        frame = np.clip(self.background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if frame_index >= self.sign_from:
+            x1, y1, x2, y2 = self.sign_box
+            frame[y1:y2, x1:x2] = (0, 0, 230)
+        return frame
+
+
+def make_filter(**params) -> SignsDetect:
+    detect = SignsDetect(make_video_info(WIDTH, HEIGHT), visualize=False, model_path="signs.pt", **params)
+    detect.detector = FakeDetector()
+    return detect
+
+
+def run_filter(detect: SignsDetect, scene: RoadScene, frame_count: int, start: int = 0) -> list[PipeData]:
+    results = []
+    for frame_index in range(start, start + frame_count):
+        frame = scene.frame(frame_index)
+        data = PipeData(frame=frame, frame_version=frame_index, depth_frame=None, raw_frame=frame, creation_time=0,
+                        last_pipeline_name="SignDetection", render_debug_frames=False)
+        detect.process(data)
+        results.append(data)
+    return results
+
+
+class TestMotionGate(unittest.TestCase):
+    def test_reuses_detections_of_a_static_roi(self):
+        detect = make_filter(motion_gate=True)
+        results = run_filter(detect, RoadScene(), 20)
+
+        self.assertEqual(1, detect.detector.calls)
+        self.assertEqual([["stop"]] * 20, [[sign.label for sign in data.traffic_signs] for data in results])
+        self.assertEqual([0] * 20, [data.traffic_signs[0].source_frame_version for data in results])
+
+    def test_a_small_new_object_runs_the_detector(self):
+        detect = make_filter(motion_gate=True)
+        results = run_filter(detect, RoadScene(sign_from=5), 10)
+
+        self.assertEqual(2, detect.detector.calls)
+        self.assertEqual([0] * 5 + [5] * 5, [data.traffic_signs[0].source_frame_version for data in results])
+
+    def test_max_reuse(self):
+        gate = MotionGate(threshold=0.001, pixel_threshold=12, downscale=8, max_reuse=2)
+        frame = RoadScene().frame(0)
+        self.assertFalse(gate.is_unchanged(frame))  # without a reference
+        gate.update(0, [])
+        self.assertEqual([True, True, False], [gate.is_unchanged(frame) for _ in range(3)])
+        gate.update(3, [])
+        self.assertTrue(gate.is_unchanged(frame))
+
+    def test_without_gate(self):
+        detect = make_filter()
+        results = run_filter(detect, RoadScene(), 5)
+        self.assertIsNone(detect.motion_gate)
+        self.assertEqual(5, detect.detector.calls)
+        self.assertEqual([0, 1, 2, 3, 4], [data.traffic_signs[0].source_frame_version for data in results])
+
+    def test_with_tracker(self):
+        detect = make_filter(motion_gate=True, keyframe_interval=3)
+        run_filter(detect, RoadScene(), 12)
+        self.assertEqual(1, detect.detector.calls)  # the tracker doesn't run on the reused frames either
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 60
+        scene = RoadScene()
+        frames = [scene.frame(frame_index) for frame_index in range(frame_count)]
+        gate = MotionGate(
+            threshold=Config.detection_motion_gate_threshold,
+            pixel_threshold=Config.detection_motion_gate_pixel_threshold,
+            downscale=Config.detection_motion_gate_downscale,
+            max_reuse=frame_count,
+        )
+        gate.is_unchanged(frames[0])
+        gate.update(0, [])
+
+        start_time = time.perf_counter()
+        reused = sum(gate.is_unchanged(frame) for frame in frames[1:])
+        duration = (time.perf_counter() - start_time) * 1000 / (frame_count - 1)
+
+        print(f"\nMotion gate on {frame_count} frames of a static {FRAME_SHAPE[1]}x{FRAME_SHAPE[0]} roi with noise:")
+        print(f"{'reused frames':>14} {'gate check (ms)':>16}")
+        print("-" * 31)
+        print(f"{reused:>14} {duration:>16.3f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import time
+import unittest
+
+import numpy as np
+
+from perception.filters.object_detect_filter import SignsDetect
+from perception.filters.object_tracker import ObjectTracker, box_iou
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadObject
+from tests.benchmarking import benchmark
+from tests.filter_testing import FakeDetector, make_video_info
+
+WIDTH, HEIGHT = 1280, 720
+FRAME_SHAPE = (400, 640, 3)  # of the cropped signs roi
+
+
+class MovingScene:
+    """Textured objects moving over a flat background at constant velocities."""
+
+    def __init__(self, objects: list[tuple[str, tuple[int, int, int, int], tuple[int, int]]]):
+        """:param objects: (label, (x, y, width, height) in the first frame, (dx, dy) per frame)"""
+        rng = np.random.default_rng(0)
+        self.objects = objects
+        self.textures = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+                         for _, (_, _, width, height), _ in objects]
+        self.hidden: set[int] = set()  # indexes of the objects that are occluded
+
+    def boxes(self, frame_index: int) -> list[tuple[str, list[float]]]:
+        boxes = []
+        for object_index, (label, (x, y, width, height), (dx, dy)) in enumerate(self.objects):
+            if object_index not in self.hidden:
+                x1, y1 = x + dx * frame_index, y + dy * frame_index
+                boxes.append((label, [float(x1), float(y1), float(x1 + width), float(y1 + height)]))
+        return boxes
+
+    def frame(self, frame_index: int) -> np.ndarray:
+        frame = np.full(FRAME_SHAPE, 90, dtype=np.uint8)
+        visible = [index for index in range(len(self.objects)) if index not in self.hidden]
+        for object_index, (_, box) in zip(visible, self.boxes(frame_index)):
+            x1, y1, x2, y2 = (int(value) for value in box)
+            frame[y1:y2, x1:x2] = self.textures[object_index]
+        return frame
+
+
+def run_filter(detect: SignsDetect, scene: MovingScene, detector: FakeDetector, frame_count: int,
+               start: int = 0) -> list[list[RoadObject]]:
+    results = []
+    for frame_index in range(start, start + frame_count):
+        detector.detections = scene.boxes(frame_index)
+        frame = scene.frame(frame_index)
+        data = PipeData(frame=frame, frame_version=frame_index, depth_frame=None, raw_frame=frame, creation_time=0,
+                        last_pipeline_name="SignDetection", render_debug_frames=False)
+        detect.process(data)
+        results.append(data.traffic_signs)
+    return results
+
+
+def make_filter(scene: MovingScene, keyframe_interval: int) -> tuple[SignsDetect, FakeDetector]:
+    detect = SignsDetect(make_video_info(WIDTH, HEIGHT), visualize=False, model_path="signs.pt", keyframe_interval=keyframe_interval)
+    detect.detector = FakeDetector(scene.boxes(0))
+    return detect, detect.detector
+
+
+class TestObjectTracker(unittest.TestCase):
+    def setUp(self):
+        self.scene = MovingScene([
+            ("stop", (100, 80, 60, 60), (4, 1)),
+            ("parking", (400, 200, 50, 80), (-3, 2)),
+        ])
+
+    def test_keyframes_and_track_ids(self):
+        detect, detector = make_filter(self.scene, keyframe_interval=4)
+        results = run_filter(detect, self.scene, detector, 20)
+
+        self.assertEqual(5, detector.calls)
+        self.assertEqual(5, detect.detector_runs)
+        self.assertEqual([[0, 1]] * 20, [sorted(sign.track_id for sign in signs) for signs in results])
+        for frame_index, signs in enumerate(results):
+            expected = dict(self.scene.boxes(frame_index))
+            for sign in signs:
+                self.assertGreater(box_iou(np.array(sign.bbox), np.array(expected[sign.label])), 0.9)
+
+    def test_lost_track_forces_a_keyframe(self):
+        detect, detector = make_filter(self.scene, keyframe_interval=10)
+        run_filter(detect, self.scene, detector, 3)
+        self.assertEqual(1, detector.calls)
+
+        self.scene.hidden.add(1)  # no flow points left in its box
+        results = run_filter(detect, self.scene, detector, 1, start=3)
+        self.assertEqual(2, detector.calls)  # detected on the same frame
+        self.assertEqual([("stop", 0)], [(sign.label, sign.track_id) for sign in results[0]])
+
+        self.scene.hidden.clear()  # the object is back, as a new track
+        run_filter(detect, self.scene, detector, 9, start=4)
+        results = run_filter(detect, self.scene, detector, 1, start=13)
+        self.assertEqual(3, detector.calls)
+        self.assertEqual([("parking", 2), ("stop", 0)], sorted((sign.label, sign.track_id) for sign in results[0]))
+
+    def test_matching_by_label(self):
+        tracker = ObjectTracker(keyframe_interval=2, min_confidence=0.5, iou_threshold=0.3, max_points=20)
+        frame = self.scene.frame(0)
+        box = [100.0, 80.0, 160.0, 140.0]
+        first = tracker.update(frame, [RoadObject(bbox=box, label="stop", conf=0.9, distance=0)])
+        second = tracker.update(frame, [RoadObject(bbox=box, label="crosswalk", conf=0.9, distance=0),
+                                        RoadObject(bbox=box, label="stop", conf=0.8, distance=0)])
+        self.assertEqual([0], [detection.track_id for detection in first])
+        self.assertEqual([1, 0], [detection.track_id for detection in second])
+
+    def test_every_frame_without_interval(self):
+        detect, detector = make_filter(self.scene, keyframe_interval=1)
+        results = run_filter(detect, self.scene, detector, 5)
+        self.assertIsNone(detect.tracker)
+        self.assertEqual(5, detector.calls)
+        self.assertTrue(all(sign.track_id == -1 for signs in results for sign in signs))
+        with self.assertRaises(ValueError):
+            make_filter(self.scene, keyframe_interval=0)
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 60
+        frames = [self.scene.frame(frame_index) for frame_index in range(frame_count)]
+
+        print(f"\nSigns filter on {frame_count} frames of {FRAME_SHAPE[1]}x{FRAME_SHAPE[0]}, 2 moving objects:")
+        print(f"{'Keyframe interval':<18} {'detector runs':>14} {'min IoU':>8} {'tracking (ms/frame)':>20}")
+        print("-" * 63)
+        for keyframe_interval in (1, 3, 5, 10):
+            detect, detector = make_filter(self.scene, keyframe_interval)
+            tracking_time = 0.0
+            ious = []
+            for frame_index, frame in enumerate(frames):
+                detector.detections = self.scene.boxes(frame_index)
+                start_time = time.perf_counter()
+                data = PipeData(frame=frame, frame_version=frame_index, depth_frame=None, raw_frame=frame,
+                                creation_time=0, last_pipeline_name="SignDetection", render_debug_frames=False)
+                calls = detector.calls
+                detect.process(data)
+                if detector.calls == calls:  # the tracker alone, the detector of a real model costs far more
+                    tracking_time += time.perf_counter() - start_time
+                expected = dict(self.scene.boxes(frame_index))
+                ious += [box_iou(np.array(sign.bbox), np.array(expected[sign.label])) for sign in data.traffic_signs]
+            tracked_frames = frame_count - detector.calls
+            tracking_ms = tracking_time * 1000 / tracked_frames if tracked_frames else 0.0
+            print(f"{keyframe_interval:<18} {detector.calls:>14} {min(ious):>8.3f} {tracking_ms:>20.3f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import pickle
+import time
+import unittest
+
+import numpy as np
+
+from configuration.config import SerializationFormat
+from ipc.pipe_data_codec import decode_pipe_data, encode_pipe_data, encode_pipe_data_into
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings, RoadObject
+from tests.benchmarking import benchmark
+
+
+def make_pipe_data(width: int, height: int) -> PipeData:
+    raw_frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+    gray_frame = np.random.randint(0, 256, (height, width), dtype=np.uint8)
+
+    data = PipeData(
+        frame=gray_frame,
+        frame_version=812,
+        depth_frame=None,
+        raw_frame=raw_frame,
+        creation_time=time.time(),
+        last_pipeline_name="LaneDetection",
+    )
+    data.timing_info.start("Data Lifecycle L")
+    data.timing_info.start("Process Data L", parent="Data Lifecycle L")
+    data.timing_info.stop("Process Data L")
+    data.timing_info.start("Transfer Data L", parent="Data Lifecycle L")
+
+    data.add_processed_frame(raw_frame.copy())
+    data.add_processed_frame(gray_frame.copy())
+
+    data.road_markings = RoadMarkings(
+        left_line=None,
+        center_line=LineSegment(100, 720, 400, 360),
+        center_line_virtual=False,
+        right_line=LineSegment(1100, 720, 850, 360),
+        right_line_virtual=True,
+        stop_lines=[LineSegment(300, 650, 900, 640)],
+    )
+    data.heading_error_degrees = -3.5
+    data.result_ages = {"LaneDetection": 0, "SignDetection": 12}
+    data.lateral_offset = None
+    data.traffic_signs = [RoadObject(bbox=[704.5, 10.25, 800.0, 120.0], label="stop", conf=0.87, distance=float("inf"),
+                                     track_id=7, source_frame_version=809)]
+    data.traffic_lights = []
+    data.pedestrians = None
+    data.horizontal_lines = [RoadObject(bbox=[[300, 650], [900, 640]], label="horiz_line", conf=1, distance=0)]
+    return data
+
+
+class TestPipeDataCodec(unittest.TestCase):
+    def assert_pipe_data_equal(self, expected: PipeData, actual: PipeData):
+        self.assertEqual(expected.frame_version, actual.frame_version)
+        self.assertEqual(expected.last_pipeline_name, actual.last_pipeline_name)
+        self.assertEqual(expected.creation_time, actual.creation_time)
+        np.testing.assert_array_equal(expected.frame, actual.frame)
+        np.testing.assert_array_equal(expected.raw_frame, actual.raw_frame)
+        self.assertIsNone(actual.depth_frame)
+
+        self.assertEqual(expected.processed_frames.keys(), actual.processed_frames.keys())
+        for name, frames in expected.processed_frames.items():
+            self.assertEqual(len(frames), len(actual.processed_frames[name]))
+            for expected_frame, actual_frame in zip(frames, actual.processed_frames[name]):
+                np.testing.assert_array_equal(expected_frame, actual_frame)
+
+        for attribute in ("left_line", "center_line", "right_line"):
+            expected_line = getattr(expected.road_markings, attribute)
+            actual_line = getattr(actual.road_markings, attribute)
+            if expected_line is None:
+                self.assertIsNone(actual_line)
+            else:
+                self.assertEqual(list(expected_line), list(actual_line))
+        self.assertEqual(expected.road_markings.center_line_virtual, actual.road_markings.center_line_virtual)
+        self.assertEqual(expected.road_markings.right_line_virtual, actual.road_markings.right_line_virtual)
+        self.assertEqual(
+            [list(line) for line in expected.road_markings.stop_lines],
+            [list(line) for line in actual.road_markings.stop_lines],
+        )
+
+        self.assertEqual(expected.heading_error_degrees, actual.heading_error_degrees)
+        self.assertEqual(expected.lateral_offset, actual.lateral_offset)
+        self.assertEqual(expected.traffic_signs, actual.traffic_signs)
+        self.assertEqual(expected.traffic_lights, actual.traffic_lights)
+        self.assertEqual(expected.pedestrians, actual.pedestrians)
+        self.assertEqual(expected.horizontal_lines, actual.horizontal_lines)
+        self.assertEqual(expected.result_ages, actual.result_ages)
+
+        self.assertEqual(expected.timing_info.root_label, actual.timing_info.root_label)
+        self.assertEqual(expected.timing_info.hierarchy, actual.timing_info.hierarchy)
+        self.assertEqual(expected.timing_info.timings, actual.timing_info.timings)
+        self.assertEqual(expected.timing_info.counts, actual.timing_info.counts)
+        self.assertEqual(expected.timing_info.start_times, actual.timing_info.start_times)
+
+    def test_round_trip(self):
+        data = make_pipe_data(1280, 720)
+        encoded = encode_pipe_data(data, SerializationFormat.BINARY)
+        self.assert_pipe_data_equal(data, decode_pipe_data(bytes(encoded)))
+
+    def test_round_trip_into_buffer(self):
+        data = make_pipe_data(640, 480)
+        buffer = np.empty(10 * 640 * 480 * 3, dtype=np.uint8)
+        size = encode_pipe_data_into(data, buffer)
+        decoded = decode_pipe_data(buffer[:size])
+
+        self.assert_pipe_data_equal(data, decoded)
+        self.assertTrue(np.shares_memory(decoded.raw_frame, buffer), "Frames should be views onto the buffer")
+
+    def test_round_trip_of_long_timings(self):
+        data = make_pipe_data(64, 48)
+        # more labels than an int16 label index and more records than a uint16 count can hold
+        for group in range(200):
+            data.timing_info.start(f"Group {group}", parent="Data Lifecycle L")
+            for index in range(165):
+                data.timing_info.start(f"Step {group}.{index}", parent=f"Group {group}")
+            data.timing_info.stop(f"Group {group}")
+        for _ in range(33000):
+            data.timing_info.start("Repeated Step", parent="Data Lifecycle L")
+            data.timing_info.stop("Repeated Step")
+        self.assertGreater(len(data.timing_info), 65535)
+
+        decoded = decode_pipe_data(encode_pipe_data(data, SerializationFormat.BINARY))
+        self.assertEqual(data.timing_info.records, decoded.timing_info.records)
+        self.assert_pipe_data_equal(data, decoded)
+
+    def test_aliased_frames_are_written_once(self):
+        data = make_pipe_data(1280, 720)
+        data.frame = data.raw_frame
+        data.processed_frames = {}
+
+        encoded = encode_pipe_data(data, SerializationFormat.BINARY)
+        decoded = decode_pipe_data(encoded)
+
+        self.assertLess(len(encoded), 2 * data.raw_frame.nbytes)
+        self.assertTrue(np.shares_memory(decoded.frame, decoded.raw_frame))
+
+    def test_pickle_payloads_still_decode(self):
+        data = make_pipe_data(320, 180)
+        encoded = encode_pipe_data(data, SerializationFormat.PICKLE)
+        self.assert_pipe_data_equal(data, decode_pipe_data(encoded))
+
+    def run_performance_test(self, width, height, attempts):
+        data = make_pipe_data(width, height)
+
+        start_time = time.perf_counter()
+        for _ in range(attempts):
+            pickle.loads(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        pickle_duration_ms = (time.perf_counter() - start_time) * 1000 / attempts
+
+        start_time = time.perf_counter()
+        for _ in range(attempts):
+            decode_pipe_data(encode_pipe_data(data, SerializationFormat.BINARY))
+        binary_duration_ms = (time.perf_counter() - start_time) * 1000 / attempts
+
+        buffer = np.empty(len(encode_pipe_data(data, SerializationFormat.BINARY)), dtype=np.uint8)
+        start_time = time.perf_counter()
+        for _ in range(attempts):
+            decode_pipe_data(buffer[: encode_pipe_data_into(data, buffer)])
+        binary_into_duration_ms = (time.perf_counter() - start_time) * 1000 / attempts
+
+        print(f"\nPipeData Serialization Results ({width}x{height}, {attempts} attempts):")
+        print(f"{'':<35} {'pickle':>12} {'binary':>12} {'binary_into':>12}")
+        print("-" * 75)
+        print(
+            f"{'Avg encode + decode (ms)':<35} {pickle_duration_ms:>12.4f} {binary_duration_ms:>12.4f} "
+            f"{binary_into_duration_ms:>12.4f}"
+        )
+
+    @benchmark
+    def test_serialization_performance(self):
+        test_cases = [
+            {"width": 1280, "height": 720, "attempts": 200},
+            {"width": 1920, "height": 1080, "attempts": 100},
+        ]
+
+        for params in test_cases:
+            with self.subTest(params=params):
+                self.run_performance_test(**params)
+
+
+if __name__ == "__main__":
+    unittest.main()
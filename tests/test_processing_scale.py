@@ -0,0 +1,114 @@
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings, RoadObject
+from perception.objects.video_info import scale_video_info, scaled_size
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_lane_pipeline, make_road_frame, make_video_info
+
+
+def run_pipeline(filters: list, camera_frame: np.ndarray, processing_scale: float) -> PipeData:
+    """Like SequentialFilterProcess: resize once, run the filters, map the results back to the camera frame."""
+    frame = camera_frame
+    if processing_scale != 1:
+        frame = cv2.resize(camera_frame, scaled_size(camera_frame.shape[1], camera_frame.shape[0], processing_scale),
+                           interpolation=cv2.INTER_AREA)
+    data = PipeData(
+        frame=frame, frame_version=1, depth_frame=None, raw_frame=frame, creation_time=0,
+        last_pipeline_name="LaneDetection",
+    )
+    for filter in filters:
+        filter.process(data)
+    if processing_scale != 1:
+        data.scale_results(1 / processing_scale)
+    return data
+
+
+class TestProcessingScale(unittest.TestCase):
+    def test_scale_video_info(self):
+        video_info = make_video_info(3840, 2160)
+        self.assertIs(video_info, scale_video_info(video_info, 1))
+
+        scaled = scale_video_info(video_info, 1 / 6)
+        self.assertEqual((640, 360), (scaled.width, scaled.height))
+        self.assertAlmostEqual(1 / 6, scaled.processing_scale)
+        for roi_type, polygon in video_info.video_rois.items():
+            for (x, y), (scaled_x, scaled_y) in zip(polygon, scaled.video_rois[roi_type]):
+                self.assertLessEqual(abs(x / 6 - scaled_x), 0.5)
+                self.assertLessEqual(abs(y / 6 - scaled_y), 0.5)
+
+    def test_scale_results(self):
+        data = PipeData(frame=None, frame_version=1, depth_frame=None, raw_frame=None, creation_time=0,
+                        last_pipeline_name="Signs")
+        data.road_markings = RoadMarkings(
+            left_line=None, center_line=LineSegment(160, 360, 280, 180), center_line_virtual=False,
+            right_line=LineSegment(500, 360, 380, 180), right_line_virtual=True, stop_lines=[LineSegment(200, 330, 450, 331)],
+        )
+        data.traffic_signs = [RoadObject(bbox=[10.5, 20.0, 30.0, 40.0], label="stop", conf=0.9, distance=1.0)]
+        data.horizontal_lines = [RoadObject(bbox=[[200, 330], [450, 331]], label="horiz_line", conf=1, distance=0)]
+        data.heading_error_degrees = 3.0
+
+        data.scale_results(2)
+        self.assertEqual([320, 720, 560, 360], list(data.road_markings.center_line))
+        self.assertEqual([1000, 720, 760, 360], list(data.road_markings.right_line))
+        self.assertEqual([400, 660, 900, 662], list(data.road_markings.stop_lines[0]))
+        self.assertIsNone(data.road_markings.left_line)
+        self.assertEqual([21.0, 40.0, 60.0, 80.0], data.traffic_signs[0].bbox)
+        self.assertEqual([[400, 660], [900, 662]], data.horizontal_lines[0].bbox)
+        self.assertEqual(3.0, data.heading_error_degrees)  # angles and ratios don't depend on the scale
+
+    def test_lane_results_in_camera_coordinates(self):
+        for width, height, processing_scale in ((1280, 720, 0.5), (1920, 1080, 1 / 3), (3840, 2160, 1 / 6)):
+            with self.subTest(resolution=f"{width}x{height}", processing_scale=processing_scale):
+                video_info = make_video_info(width, height)
+                camera_frame = make_road_frame(width, height)
+                full = run_pipeline(make_lane_pipeline(video_info), camera_frame, 1)
+                scaled = run_pipeline(make_lane_pipeline(scale_video_info(video_info, processing_scale)), camera_frame,
+                                      processing_scale)
+
+                self.assertIsNotNone(full.road_markings.center_line)
+                for line_name in ("center_line", "right_line"):
+                    full_line = getattr(full.road_markings, line_name)
+                    scaled_line = getattr(scaled.road_markings, line_name)
+                    np.testing.assert_allclose(list(full_line), list(scaled_line), atol=0.02 * width)
+                self.assertAlmostEqual(full.heading_error_degrees, scaled.heading_error_degrees, delta=1)
+                self.assertAlmostEqual(full.lateral_offset, scaled.lateral_offset, delta=0.05)
+
+    @benchmark
+    def test_benchmark(self):
+        test_cases = [
+            {"width": 1280, "height": 720, "attempts": 30},
+            {"width": 1920, "height": 1080, "attempts": 20},
+            {"width": 3840, "height": 2160, "attempts": 10},
+        ]
+
+        print("\nLaneDetection pipeline per frame, processing at 640x360:")
+        print(f"{'Camera':<12} {'camera resolution (ms)':>23} {'640x360 incl. resize (ms)':>27}")
+        print("-" * 64)
+        for params in test_cases:
+            width, height, attempts = params["width"], params["height"], params["attempts"]
+            video_info = make_video_info(width, height)
+            processing_scale = 640 / width
+            camera_frame = make_road_frame(width, height)
+
+            durations = {}
+            for label, filters, scale in (
+                ("camera", make_lane_pipeline(video_info), 1),
+                ("scaled", make_lane_pipeline(scale_video_info(video_info, processing_scale)), processing_scale),
+            ):
+                run_pipeline(filters, camera_frame, scale)  # allocates the buffers
+                start_time = time.perf_counter()
+                for _ in range(attempts):
+                    run_pipeline(filters, camera_frame, scale)
+                durations[label] = (time.perf_counter() - start_time) * 1000 / attempts
+
+            print(f"{f'{width}x{height}':<12} {durations['camera']:>23.3f} {durations['scaled']:>27.3f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
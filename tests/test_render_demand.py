@@ -0,0 +1,102 @@
+import time
+import unittest
+
+import numpy as np
+
+from ipc.render_demand import RenderDemand
+from perception.filters.object_detect_filter import SignsDetect
+from perception.objects.pipe_data import PipeData
+from tests.benchmarking import benchmark
+from tests.filter_testing import FakeDetector, make_lane_pipeline, make_road_frame, make_video_info
+
+DEMAND_NAME = "CAR_VISION_SHM_TEST_RENDER_DEMAND"
+WIDTH, HEIGHT = 1280, 720
+
+
+def run_pipeline(filters: list, frame: np.ndarray, render_debug_frames: bool) -> PipeData:
+    data = PipeData(
+        frame=frame, frame_version=1, depth_frame=None, raw_frame=frame, creation_time=0,
+        last_pipeline_name="LaneDetection", render_debug_frames=render_debug_frames,
+    )
+    for filter in filters:
+        filter.process(data)
+    return data
+
+
+class TestRenderDemand(unittest.TestCase):
+    def setUp(self):
+        self.render_demand = RenderDemand.create(DEMAND_NAME, pipeline_count=3)
+
+    def tearDown(self):
+        self.render_demand.close()
+
+    def test_lease(self):
+        pipeline_view = RenderDemand.open(DEMAND_NAME)
+        self.assertEqual(3, pipeline_view.pipeline_count)
+        self.assertFalse(pipeline_view.is_requested(1))
+
+        self.render_demand.request(1, lease=0.05)
+        self.assertTrue(pipeline_view.is_requested(1))
+        self.assertFalse(pipeline_view.is_requested(0))
+        time.sleep(0.06)
+        self.assertFalse(pipeline_view.is_requested(1))  # the subscriber stopped asking
+
+        self.render_demand.request_all(lease=10)
+        self.render_demand.request(2, lease=0.01)  # doesn't shorten a running lease
+        self.assertTrue(all(pipeline_view.is_requested(index) for index in range(3)))
+        self.render_demand.release(2)
+        self.assertFalse(pipeline_view.is_requested(2))
+        pipeline_view.close()
+
+
+class TestLazyRendering(unittest.TestCase):
+    def test_lane_pipeline(self):
+        frame = make_road_frame()
+        filters = make_lane_pipeline(make_video_info(WIDTH, HEIGHT), visualize=True)
+
+        headless = run_pipeline(filters, frame, render_debug_frames=False)
+        self.assertEqual({}, headless.processed_frames)
+        self.assertEqual(2, headless.frame.ndim)  # the edge frame isn't converted back to BGR for drawing
+        self.assertIsNotNone(headless.road_markings.center_line)
+
+        rendered = run_pipeline(filters, frame, render_debug_frames=True)
+        self.assertEqual(3, len(rendered.processed_frames["LaneDetection"]))
+        self.assertEqual(list(headless.road_markings.center_line), list(rendered.road_markings.center_line))
+        self.assertEqual(headless.heading_error_degrees, rendered.heading_error_degrees)
+
+    def test_detection_filter(self):
+        frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        frame.flags.writeable = False  # a ring slot of the frame store
+        detect = SignsDetect(make_video_info(WIDTH, HEIGHT), visualize=True, model_path="signs.pt")
+        detect.detector = FakeDetector()
+
+        data = run_pipeline([detect], frame, render_debug_frames=False)
+        self.assertIs(frame, data.frame)  # nothing copied or drawn
+        self.assertEqual({}, data.processed_frames)
+        self.assertEqual(["stop"], [sign.label for sign in data.traffic_signs])
+
+        data = run_pipeline([detect], frame, render_debug_frames=True)
+        self.assertIsNot(frame, data.frame)
+        self.assertGreater(np.count_nonzero(data.frame), 0)
+        self.assertEqual(1, len(data.processed_frames["LaneDetection"]))
+
+    @benchmark
+    def test_benchmark(self):
+        attempts = 50
+        frame = make_road_frame()
+        filters = make_lane_pipeline(make_video_info(WIDTH, HEIGHT), visualize=True)
+
+        print("\nLaneDetection pipeline per frame, 1280x720:")
+        print(f"{'Debug frames':<14} {'per frame (ms)':>15}")
+        print("-" * 30)
+        for label, render_debug_frames in (("requested", True), ("not requested", False)):
+            run_pipeline(filters, frame, render_debug_frames)
+            start_time = time.perf_counter()
+            for _ in range(attempts):
+                run_pipeline(filters, frame, render_debug_frames)
+            duration = (time.perf_counter() - start_time) * 1000 / attempts
+            print(f"{label:<14} {duration:>15.3f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import multiprocessing as mp
+import time
+import unittest
+
+from ipc.frame_claims import FrameClaims
+from perception.objects.pipe_data import PipeData
+from perception.objects.pipeline_config_types import PipelineConfig
+from processes.replica_reassembler import ReplicaReassembler, replica_channel_layout
+from tests.benchmarking import benchmark
+
+CLAIMS_NAME = "CAR_VISION_SHM_TEST_FRAME_CLAIMS"
+
+
+def make_result(frame_version: int) -> PipeData:
+    return PipeData(frame=None, frame_version=frame_version, depth_frame=None, raw_frame=None,
+                    creation_time=time.time_ns(), last_pipeline_name="SignDetection")
+
+
+def claim_frames(frame_count: int, claimed_versions):
+    """A replica reading every frame descriptor and claiming what it can."""
+    frame_claims = FrameClaims.open(CLAIMS_NAME)
+    claimed_versions.put([frame_version for frame_version in range(1, frame_count + 1)
+                          if frame_claims.claim(frame_version) >= 0])
+    frame_claims.close()
+
+
+class TestReplicaReassembler(unittest.TestCase):
+    def setUp(self):
+        self.claims = FrameClaims.create(CLAIMS_NAME, capacity=8)
+        self.reassembler = ReplicaReassembler(self.claims, lost_result_timeout=0.05, stall_timeout=2.0)
+
+    def tearDown(self):
+        self.claims.close()
+
+    def released(self, now: float = 0.0) -> list[int]:
+        return [data.frame_version for data in self.reassembler.pop_ready(now)]
+
+    def test_claims(self):
+        self.assertEqual(0, self.claims.claim(3))
+        self.assertEqual(-1, self.claims.claim(3))  # the other replica was first
+        self.assertEqual(-1, self.claims.claim(2))  # older than the last claim
+        self.assertEqual(1, self.claims.claim(5))
+        self.assertEqual(2, self.claims.ticket_count())
+
+        self.assertEqual((3, False), self.claims.claimed(0))
+        self.claims.finish(0)
+        self.assertEqual((3, True), self.claims.claimed(0))
+        self.assertIsNone(self.claims.claimed(2))  # not handed out yet
+
+    def test_results_in_frame_order(self):
+        for frame_version in (1, 2, 3):
+            self.claims.claim(frame_version)
+
+        # the replica of frame 2 and 3 is faster than the one of frame 1
+        self.reassembler.add(make_result(3))
+        self.reassembler.add(make_result(2))
+        self.assertEqual([], self.released())
+
+        self.reassembler.add(make_result(1))
+        self.assertEqual([1, 2, 3], self.released())
+        self.assertEqual({}, self.reassembler.pending)
+
+    def test_lost_result_is_skipped(self):
+        for frame_version in (1, 2):
+            self.claims.claim(frame_version)
+        self.claims.finish(0)  # written, but overwritten on the channel before the manager read it
+        self.reassembler.add(make_result(2))
+
+        self.assertEqual([], self.released(now=0.0))
+        self.assertEqual([2], self.released(now=0.05))
+        self.assertEqual(1, self.reassembler.skipped_count)
+
+    def test_stalled_replica_is_skipped(self):
+        for frame_version in (1, 2):
+            self.claims.claim(frame_version)
+        self.reassembler.add(make_result(2))
+
+        self.assertEqual([], self.released(now=0.0))
+        self.assertEqual([], self.released(now=1.0))  # still computing
+        self.assertEqual([2], self.released(now=2.0))
+
+        # it shows up after all, the FrameAggregator takes it as a late result
+        self.reassembler.add(make_result(1))
+        self.assertEqual([1], self.released(now=2.0))
+
+    def test_dropped_claims_are_skipped(self):
+        for frame_version in range(1, 12):  # 3 more than the capacity
+            self.claims.claim(frame_version)
+        self.reassembler.add(make_result(4))
+        self.assertEqual([4], self.released())
+        self.assertEqual(3, self.reassembler.skipped_count)
+        self.assertEqual(4, self.reassembler.next_ticket)
+
+    def test_every_frame_claimed_once(self):
+        frame_count = 2000
+        claimed_versions = mp.Queue()
+        replicas = [mp.Process(target=claim_frames, args=(frame_count, claimed_versions)) for _ in range(2)]
+        for replica in replicas:
+            replica.start()
+        versions = [version for _ in replicas for version in claimed_versions.get(timeout=10)]
+        for replica in replicas:
+            replica.join()
+
+        self.assertEqual(len(versions), len(set(versions)))
+        self.assertEqual(len(versions), self.claims.ticket_count())
+
+    def test_channel_layout(self):
+        pipelines = [PipelineConfig(name=name, filters=[], replicas=replicas)
+                     for name, replicas in (("LaneDetection", 1), ("SignDetection", 3), ("TrafficLightDetection", 2))]
+        self.assertEqual(
+            [(0, 0), (1, 0), (2, 0), (1, 1), (1, 2), (2, 1)],
+            replica_channel_layout(pipelines),
+        )
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 2000
+        print(f"\nReassembly of {frame_count} results, the replicas finish their frames out of order:")
+        print(f"{'replicas':>8} {'released':>9} {'per result (us)':>16}")
+        print("-" * 35)
+        for replica_count in (1, 2, 4):
+            claims = FrameClaims.create(CLAIMS_NAME + "_BENCH", capacity=64)
+            reassembler = ReplicaReassembler(claims, lost_result_timeout=0.05, stall_timeout=2.0)
+            results = [make_result(frame_version) for frame_version in range(1, frame_count + 1)]
+
+            released = 0
+            start_time = time.perf_counter()
+            for batch_start in range(0, frame_count, replica_count):
+                batch = results[batch_start:batch_start + replica_count]
+                for data in batch:
+                    claims.finish(claims.claim(data.frame_version))
+                for data in reversed(batch):  # the later claims finish first
+                    reassembler.add(data)
+                released += len(reassembler.pop_ready(0.0))
+            duration = (time.perf_counter() - start_time) * 1e6 / frame_count
+            claims.close()
+
+            self.assertEqual(frame_count, released)
+            print(f"{replica_count:>8} {released:>9} {duration:>16.1f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from configuration.config import SerializationFormat
+from ipc.pipe_data_codec import decode_pipe_data, encode_pipe_data
+from perception.filters.basic_filters.fused_preprocess_filter import FusedPreprocessFilter, fuse_filter_chain
+from perception.filters.basic_filters.grayscale_filter import GrayScaleFilter
+from perception.filters.lane_detect_filter import LaneDetectFilter
+from perception.filters.roi_filter import ROIFilter, get_roi_crop, get_roi_mask
+from perception.objects.pipe_data import PipeData
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_video_info
+
+
+def make_pipe_data(frame: np.ndarray) -> PipeData:
+    return PipeData(
+        frame=frame, frame_version=1, depth_frame=None, raw_frame=frame, creation_time=0, last_pipeline_name="Signs"
+    )
+
+
+def define_roi_uncached(image, roi_bbox):
+    """ROIFilter.define_roi before the masks were cached."""
+    mask = np.zeros_like(image)
+    cv2.fillPoly(mask, np.array([roi_bbox]), (255, 255, 255))
+    return cv2.bitwise_and(image, mask)
+
+
+class TestROIFilter(unittest.TestCase):
+    def setUp(self):
+        self.video_info = make_video_info(1280, 720)
+        self.frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+
+    def test_mask_is_cached(self):
+        roi_bbox = self.video_info.video_rois["signs"]
+        mask = get_roi_mask(self.frame.shape, self.frame.dtype, roi_bbox)
+        self.assertIs(mask, get_roi_mask(self.frame.shape, np.uint8, roi_bbox))
+        self.assertFalse(mask.flags.writeable)
+        self.assertIsNot(mask, get_roi_mask(self.frame.shape[:2], np.uint8, roi_bbox))
+
+    def test_mask_matches_uncached(self):
+        for roi_type, roi_bbox in self.video_info.video_rois.items():
+            with self.subTest(roi_type=roi_type):
+                data = ROIFilter(self.video_info, visualize=False, roi_type=roi_type).process(make_pipe_data(self.frame))
+                np.testing.assert_array_equal(define_roi_uncached(self.frame, roi_bbox), data.frame)
+                self.assertEqual((0, 0), data.roi_offset)
+
+    def test_crop(self):
+        for roi_type, roi_bbox in self.video_info.video_rois.items():
+            with self.subTest(roi_type=roi_type):
+                data = ROIFilter(self.video_info, visualize=False, roi_type=roi_type, crop=True).process(
+                    make_pipe_data(self.frame)
+                )
+                x0, y0, x1, y1 = get_roi_crop(self.frame.shape, roi_bbox)
+                self.assertEqual((x0, y0), data.roi_offset)
+                np.testing.assert_array_equal(define_roi_uncached(self.frame, roi_bbox)[y0:y1, x0:x1], data.frame)
+                # nothing of the roi is cut away
+                self.assertEqual(define_roi_uncached(self.frame, roi_bbox).sum(dtype=np.int64), data.frame.sum(dtype=np.int64))
+
+    def test_crop_of_cropped_frame(self):
+        signs = ROIFilter(self.video_info, visualize=False, roi_type="signs", crop=True)
+        lines = ROIFilter(self.video_info, visualize=False, roi_type="lines", crop=True)
+        data = lines.process(signs.process(make_pipe_data(self.frame)))
+
+        expected = define_roi_uncached(define_roi_uncached(self.frame, self.video_info.video_rois["signs"]),
+                                       self.video_info.video_rois["lines"])
+        offset_x, offset_y = data.roi_offset
+        height, width = data.frame.shape[:2]
+        np.testing.assert_array_equal(expected[offset_y : offset_y + height, offset_x : offset_x + width], data.frame)
+        self.assertEqual(expected.sum(dtype=np.int64), data.frame.sum(dtype=np.int64))
+
+    def test_fused_crop_matches_separate_filters(self):
+        filters = [
+            ROIFilter(self.video_info, visualize=False, roi_type="pedestrians", crop=True),
+            GrayScaleFilter(self.video_info, visualize=False),
+        ]
+        fused = fuse_filter_chain(filters)
+        self.assertEqual([FusedPreprocessFilter], [type(filter) for filter in fused])
+        self.assertEqual({"roi_type": "pedestrians", "crop": True}, fused[0].steps["roi"])
+
+        for _ in range(2):  # also with the buffers reused
+            separate, combined = make_pipe_data(self.frame), make_pipe_data(self.frame)
+            for filter in filters:
+                filter.process(separate)
+            fused[0].process(combined)
+            np.testing.assert_array_equal(separate.frame, combined.frame)
+            self.assertEqual(separate.roi_offset, combined.roi_offset)
+
+        # a cropping roi after another step would crop the wrong frame
+        with self.assertRaises(ValueError):
+            FusedPreprocessFilter(self.video_info, visualize=False,
+                                  steps={"grayscale": {}, "roi": {"roi_type": "signs", "crop": True}})
+        self.assertEqual(2, len(fuse_filter_chain(list(reversed(filters)))))
+
+    def test_lane_lines_in_full_frame_coordinates(self):
+        edges = np.zeros((720, 1280), dtype=np.uint8)
+        cv2.line(edges, (300, 719), (550, 380), 255, 3)
+        cv2.line(edges, (1000, 719), (750, 380), 255, 3)
+        raw_frame = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+
+        lane_filter = LaneDetectFilter(self.video_info, visualize=False, white_line_threshold=20)
+        full = make_pipe_data(edges)
+        full.raw_frame = raw_frame
+        lane_filter.process(full)
+
+        cropped = make_pipe_data(edges[300:, 200:].copy())
+        cropped.raw_frame = raw_frame
+        cropped.roi_offset = (200, 300)
+        lane_filter.process(cropped)
+
+        # HoughLinesP is probabilistic, the segments it picks may differ by a few pixels
+        for line_name in ("center_line", "right_line"):
+            full_line = getattr(full.road_markings, line_name)
+            cropped_line = getattr(cropped.road_markings, line_name)
+            self.assertIsNotNone(full_line)
+            np.testing.assert_allclose(list(full_line), list(cropped_line), atol=10)
+        self.assertAlmostEqual(full.lateral_offset, cropped.lateral_offset, delta=0.05)
+
+    def test_roi_offset_round_trip(self):
+        data = make_pipe_data(self.frame[100:300, 200:600])
+        data.roi_offset = (200, 100)
+        for serialization_format in SerializationFormat:
+            with self.subTest(serialization_format=serialization_format):
+                decoded = decode_pipe_data(encode_pipe_data(data, serialization_format))
+                self.assertEqual((200, 100), decoded.roi_offset)
+
+    @benchmark
+    def test_benchmark(self):
+        test_cases = [
+            {"width": 1280, "height": 720, "attempts": 200},
+            {"width": 1920, "height": 1080, "attempts": 100},
+            {"width": 3840, "height": 2160, "attempts": 30},
+        ]
+
+        print("\nROIFilter per frame:")
+        print(f"{'Resolution':<12} {'ROI':<16} {'uncached (ms)':>14} {'cached (ms)':>12} {'crop (ms)':>10} {'crop pixels':>12}")
+        print("-" * 81)
+        for params in test_cases:
+            width, height, attempts = params["width"], params["height"], params["attempts"]
+            video_info = make_video_info(width, height)
+            frame = np.random.default_rng(1).integers(0, 256, (height, width, 3), dtype=np.uint8)
+            for roi_type in ("signs", "pedestrians"):
+                roi_bbox = video_info.video_rois[roi_type]
+                durations = {}
+
+                start_time = time.perf_counter()
+                for _ in range(attempts):
+                    define_roi_uncached(frame, roi_bbox)
+                durations["uncached"] = (time.perf_counter() - start_time) * 1000 / attempts
+
+                for label, crop in (("cached", False), ("crop", True)):
+                    roi_filter = ROIFilter(video_info, visualize=False, roi_type=roi_type, crop=crop)
+                    start_time = time.perf_counter()
+                    for _ in range(attempts):
+                        data = roi_filter.process(make_pipe_data(frame))
+                    durations[label] = (time.perf_counter() - start_time) * 1000 / attempts
+                crop_ratio = data.frame.shape[0] * data.frame.shape[1] / (width * height)
+
+                print(
+                    f"{f'{width}x{height}':<12} {roi_type:<16} {durations['uncached']:>14.3f} "
+                    f"{durations['cached']:>12.3f} {durations['crop']:>10.3f} {crop_ratio:>11.0%}"
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import multiprocessing as mp
+import time
+import unittest
+
+import numpy as np
+
+from ipc.shared_message import OperationMode, ReaderWaitPolicy, SharedMessage, read_all_map
+
+SHM_NAME = "CAR_VISION_SHM_TEST_SHARED_MESSAGE"
+
+
+def write_messages(name: str, messages: list[bytes], stop: bool):
+    writer = SharedMessage.open(name, OperationMode.WriteSync)
+    for message in messages:
+        message = bytearray(message)
+        message[:8] = time.perf_counter_ns().to_bytes(8, "little")
+        writer.write(message)
+    if stop:
+        writer.stop()
+    writer.close()
+
+
+def read_messages(name: str, mode: OperationMode, received: mp.Queue):
+    reader = SharedMessage.open(name, mode)
+    versions = []
+    while reader.read(block=True) is not None:
+        versions.append(reader.last_read_version())
+    received.put(versions)
+    reader.close()
+
+
+class TestSharedMessage(unittest.TestCase):
+    def setUp(self):
+        self.context = mp.get_context("spawn")
+
+    def test_versions_and_non_blocking_read(self):
+        reader = SharedMessage.create(SHM_NAME, 64, OperationMode.ReadSync, ReaderWaitPolicy.Count(0))
+        writer = SharedMessage.open(SHM_NAME, OperationMode.WriteAsync)
+
+        self.assertIsNone(reader.read(block=False))
+        writer.write(b"first")
+        writer.write(b"second")  # Count(0): the writer never waits, the first message is dropped
+
+        self.assertEqual(2, writer.last_written_version())
+        self.assertEqual(b"second", reader.read(block=False))
+        self.assertEqual(2, reader.last_read_version())
+        self.assertIsNone(reader.read(block=False))
+
+        with self.assertRaises(ValueError):
+            writer.write(bytes(65))
+
+        writer.stop()
+        self.assertTrue(reader.is_stopped())
+        self.assertIsNone(reader.read(block=True))
+        writer.close()
+        reader.close()
+
+    def test_read_all_map(self):
+        channels = [
+            SharedMessage.create(f"{SHM_NAME}_{index}", 16, OperationMode.ReadSync, ReaderWaitPolicy.Count(0))
+            for index in range(3)
+        ]
+        writer = SharedMessage.open(f"{SHM_NAME}_1", OperationMode.WriteSync)
+        writer.write(b"abc")
+
+        self.assertEqual([None, 3, None], read_all_map(channels, len))
+        self.assertEqual([None, None, None], read_all_map(channels, len))
+
+        writer.close()
+        for channel in channels:
+            channel.close()
+
+    def test_all_policy_does_not_drop_messages(self):
+        creator = SharedMessage.create(SHM_NAME, 64, OperationMode.CreateOnly, ReaderWaitPolicy.All())
+        received = self.context.Queue()
+        readers = [
+            self.context.Process(target=read_messages, args=(SHM_NAME, mode, received))
+            for mode in (OperationMode.ReadSync, OperationMode.ReadAsync)
+        ]
+        for reader in readers:
+            reader.start()
+        while np.count_nonzero(creator._readers[:, 0]) < len(readers):
+            time.sleep(0.01)
+
+        write_messages(SHM_NAME, [bytes(16)] * 50, stop=True)
+
+        for _ in readers:
+            self.assertEqual(list(range(1, 51)), received.get(timeout=10))
+        for reader in readers:
+            reader.join()
+        creator.close()
+
+    def test_count_policy_waits_for_fastest_reader(self):
+        creator = SharedMessage.create(SHM_NAME, 64, OperationMode.CreateOnly, ReaderWaitPolicy.Count(1))
+        fast_reader = SharedMessage.open(SHM_NAME, OperationMode.ReadSync)
+        slow_reader = SharedMessage.open(SHM_NAME, OperationMode.ReadSync)
+        writer = SharedMessage.open(SHM_NAME, OperationMode.WriteSync)
+
+        for _ in range(3):
+            writer.write(b"frame")
+            self.assertEqual(b"frame", fast_reader.read(block=False))
+        slow_reader.read(block=False)
+
+        self.assertEqual(3, slow_reader.last_read_version())
+        for shared_message in (writer, slow_reader, fast_reader, creator):
+            shared_message.close()
+
+    def run_latency_test(self, size: int, attempts: int) -> float:
+        reader = SharedMessage.create(SHM_NAME, size, OperationMode.ReadSync, ReaderWaitPolicy.All())
+        writer = self.context.Process(target=write_messages, args=(SHM_NAME, [bytes(size)] * attempts, True))
+        writer.start()
+
+        total_latency_ns = 0
+        for _ in range(attempts):
+            message = reader.read(block=True)
+            total_latency_ns += time.perf_counter_ns() - int.from_bytes(message[:8], "little")
+        writer.join()
+        reader.close()
+        return total_latency_ns / attempts / 1e6
+
+    def test_latency(self):
+        print("\nPython SharedMessage blocking read latency:")
+        print(f"{'Message size':<20} {'Avg latency (ms)':>18}")
+        print("-" * 40)
+        for width, height in ((640, 480), (1280, 720), (1920, 1080)):
+            size = width * height * 3
+            print(f"{f'{width}x{height}x3':<20} {self.run_latency_test(size, attempts=50):>18.4f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
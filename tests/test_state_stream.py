@@ -0,0 +1,175 @@
+import multiprocessing as mp
+import struct
+import time
+import unittest
+
+import numpy as np
+
+from ipc.pipe_data_codec import encode_pipe_data
+from ipc.state_stream import KIND_KEYFRAME, STATE_HEADER_FORMAT, StatePublisher, StateReconstructor
+from perception.objects.line_segment import LineSegment
+from perception.objects.pipe_data import PipeData
+from perception.objects.road_info import RoadMarkings, RoadObject
+
+
+def make_pipeline_result(pipeline_name: str, frame_version: int) -> PipeData:
+    """Mimics what the SequentialFilterProcess sends: only the fields that pipeline produces, frames by reference."""
+    data = PipeData(
+        frame=None,
+        frame_version=frame_version,
+        depth_frame=None,
+        raw_frame=None,
+        creation_time=time.time_ns(),
+        last_pipeline_name=pipeline_name,
+    )
+    dl = f"Data Lifecycle {pipeline_name[0]}"
+    data.timing_info.start(dl)
+    data.timing_info.start(f"Process Data {pipeline_name[0]}", parent=dl)
+    data.timing_info.stop(f"Process Data {pipeline_name[0]}")
+
+    if pipeline_name == "LaneDetection":
+        data.road_markings = RoadMarkings(
+            left_line=None,
+            center_line=LineSegment(100 + frame_version, 720, 400, 360),
+            center_line_virtual=False,
+            right_line=LineSegment(1100, 720, 850 - frame_version, 360),
+            right_line_virtual=False,
+            stop_lines=[],
+        )
+        data.heading_error_degrees = frame_version / 10
+        data.lateral_offset = -frame_version / 100
+        data.add_processed_frame(np.full((360, 640), frame_version % 256, dtype=np.uint8))
+    else:
+        data.traffic_lights = [RoadObject(bbox=[10.0, 20.0, 30.0, frame_version], label="red", conf=0.9, distance=5)]
+        data.traffic_signs = []
+        data.add_processed_frame(np.full((360, 640, 3), frame_version % 256, dtype=np.uint8))
+    return data
+
+
+class ManagerSimulation:
+    """The merge loop of the MultiProcessingManager."""
+
+    def __init__(self, keyframe_interval: int, keyframe_requests=None):
+        self.state = PipeData(
+            frame=None, frame_version=-1, depth_frame=None, raw_frame=None, creation_time=time.time(), last_pipeline_name="None"
+        )
+        self.state.timing_info.start("Process Video (in Parallel)")
+        self.publisher = StatePublisher(keyframe_interval, keyframe_requests)
+
+    def publish(self, new_pipe_data: PipeData) -> tuple[bytearray, bytes]:
+        dl = f"Data Lifecycle {new_pipe_data.last_pipeline_name[0]}"
+        new_pipe_data.timing_info.start(f"Merge Data {new_pipe_data.last_pipeline_name[0]}", parent=dl)
+        self.state.merge(new_pipe_data)
+        self.state.timing_info.stop(f"Merge Data {new_pipe_data.last_pipeline_name[0]}")
+        self.state.timing_info.start(f"Transfer Merged Data {new_pipe_data.last_pipeline_name[0]}", dl)
+
+        message = self.publisher.encode(self.state, new_pipe_data)
+        full_state = encode_pipe_data(self.state)
+        self.state.timing_info.remove_recursive(dl)
+        return message, full_state
+
+
+def pipeline_results(frame_count: int):
+    for frame_version in range(1, frame_count + 1):
+        yield make_pipeline_result("LaneDetection", frame_version)
+        if frame_version % 3 == 0:  # the slow pipeline reports every third frame
+            yield make_pipeline_result("ObjectDetection", frame_version - 2)
+
+
+class TestStateStream(unittest.TestCase):
+    def assert_same_state(self, expected: PipeData, actual: PipeData):
+        self.assertEqual(expected.frame_version, actual.frame_version)
+        self.assertEqual(expected.last_pipeline_name, actual.last_pipeline_name)
+        for attribute in ("left_line", "center_line", "right_line"):
+            expected_line = getattr(expected.road_markings, attribute)
+            actual_line = getattr(actual.road_markings, attribute)
+            self.assertEqual(
+                None if expected_line is None else list(expected_line), None if actual_line is None else list(actual_line)
+            )
+        self.assertEqual(expected.heading_error_degrees, actual.heading_error_degrees)
+        self.assertEqual(expected.lateral_offset, actual.lateral_offset)
+        self.assertEqual(expected.traffic_lights, actual.traffic_lights)
+        self.assertEqual(expected.traffic_signs, actual.traffic_signs)
+        self.assertEqual(expected.processed_frames.keys(), actual.processed_frames.keys())
+        for name, frames in expected.processed_frames.items():
+            for expected_frame, actual_frame in zip(frames, actual.processed_frames[name]):
+                np.testing.assert_array_equal(expected_frame, actual_frame)
+
+    def test_reconstructed_state_matches_merged_state(self):
+        manager = ManagerSimulation(keyframe_interval=10)
+        reconstructor = StateReconstructor()
+
+        for result in pipeline_results(60):
+            message, _ = manager.publish(result)
+            state = reconstructor.apply(message)
+            self.assert_same_state(manager.state, state)
+            letter = result.last_pipeline_name[0]
+            self.assertEqual(
+                [f"Process Data {letter}", f"Merge Data {letter}", f"Transfer Merged Data {letter}"],
+                state.timing_info.hierarchy[f"Data Lifecycle {letter}"],
+            )
+
+        self.assertEqual(0, reconstructor.missed_count)
+
+    def test_lossy_reader_catches_up(self):
+        manager = ManagerSimulation(keyframe_interval=8)
+        reconstructor = StateReconstructor()
+
+        for index, result in enumerate(pipeline_results(40)):
+            message, _ = manager.publish(result)
+            if 0 < index < 20 and index % 4 != 0:  # a reader of a lossy channel missing most messages
+                continue
+            state = reconstructor.apply(message)
+            if index >= 24:  # after the first keyframe following the losses
+                self.assert_same_state(manager.state, state)
+
+        self.assertGreater(reconstructor.missed_count, 0)
+
+    def test_reader_waits_for_keyframe(self):
+        manager = ManagerSimulation(keyframe_interval=5)
+        results = list(pipeline_results(6))
+        messages = [manager.publish(result)[0] for result in results]
+
+        reconstructor = StateReconstructor()
+        self.assertIsNone(reconstructor.apply(messages[1]))
+        self.assertIsNotNone(reconstructor.apply(messages[5]))  # 6th publication is the second keyframe
+
+    def test_late_reader_requests_keyframe(self):
+        keyframe_requests = mp.Value("i", 0)
+        manager = ManagerSimulation(keyframe_interval=30, keyframe_requests=keyframe_requests)
+        results = pipeline_results(20)
+        for _ in range(3):  # the first one is a keyframe
+            manager.publish(next(results))
+
+        reconstructor = StateReconstructor(keyframe_requests)
+        deltas = [manager.publish(next(results))[0] for _ in range(2)]
+        self.assertIsNone(reconstructor.apply(deltas[0]))
+        self.assertIsNone(reconstructor.apply(deltas[1]))
+        self.assertEqual(1, keyframe_requests.value)  # requested only once
+
+        message, _ = manager.publish(next(results))
+        self.assertEqual(KIND_KEYFRAME, struct.unpack_from(STATE_HEADER_FORMAT, message, 0)[1])
+        self.assert_same_state(manager.state, reconstructor.apply(message))
+        for result in results:  # back to deltas
+            message, _ = manager.publish(result)
+            self.assertNotEqual(KIND_KEYFRAME, struct.unpack_from(STATE_HEADER_FORMAT, message, 0)[1])
+            self.assert_same_state(manager.state, reconstructor.apply(message))
+
+    def test_publication_sizes(self):
+        manager = ManagerSimulation(keyframe_interval=30)
+        delta_bytes, full_bytes, publications = 0, 0, 0
+        for result in pipeline_results(90):
+            message, full_state = manager.publish(result)
+            delta_bytes += len(message)
+            full_bytes += len(full_state)
+            publications += 1
+
+        print(f"\nManager publications ({publications} results, keyframe every 30):")
+        print(f"{'':<35} {'full state':>14} {'delta stream':>14}")
+        print("-" * 65)
+        print(f"{'Avg bytes per publication':<35} {full_bytes / publications:>14.0f} {delta_bytes / publications:>14.0f}")
+        self.assertLess(delta_bytes, full_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
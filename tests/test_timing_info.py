@@ -0,0 +1,152 @@
+import pickle
+import time
+import unittest
+
+from perception.objects.timing_info import RECORD_SIZE, TimingInfo
+from tests.benchmarking import benchmark
+
+PIPELINES = ["LaneDetection", "SignDetection", "TrafficLightDetection"]
+
+
+def make_pipeline_timing(pipeline_name: str) -> TimingInfo:
+    """The timings a SequentialFilterProcess records for a frame."""
+    dl, pd, tf = (f"{step} {pipeline_name[0]}" for step in ("Data Lifecycle", "Process Data", "Transfer Data"))
+    timing_info = TimingInfo()
+    timing_info.start(dl)
+    timing_info.start(pd, parent=dl)
+    timing_info.stop(pd)
+    timing_info.start(tf, parent=dl)
+    return timing_info
+
+
+def publish_frame(state: TimingInfo):
+    """The manager's timings of a fused frame: aggregate, merge, publish, then drop them again."""
+    fused = TimingInfo()
+    fused.start("Aggregate Frame")
+    for pipeline_name in PIPELINES:
+        timing_info = make_pipeline_timing(pipeline_name)
+        timing_info.stop(f"Transfer Data {pipeline_name[0]}")
+        fused.append_hierarchy(timing_info)
+    fused.start("Merge Frame", parent="Aggregate Frame")
+    state.append_hierarchy(fused)
+    state.stop("Merge Frame")
+    state.start("Transfer Merged Frame", "Aggregate Frame")
+    published = state.subtree("Aggregate Frame")
+    state.remove_recursive("Aggregate Frame")
+    return published
+
+
+class TestTimingInfo(unittest.TestCase):
+    def test_tree(self):
+        timing_info = TimingInfo()
+        timing_info.start("A")
+        timing_info.start("B", "A")
+        timing_info.start("C", "B")
+        timing_info.stop("B")  # stops C too
+        timing_info.start("B", "A")
+        timing_info.stop("B")
+
+        self.assertEqual("A", timing_info.root_label)
+        self.assertEqual({"A": ["B"], "B": ["C"]}, timing_info.hierarchy)
+        self.assertEqual({"B": 2, "C": 1}, timing_info.counts)
+        self.assertEqual(["A"], list(timing_info.start_times))
+        self.assertIn("  B: total", str(timing_info))
+        self.assertIn("    C: total", str(timing_info))
+
+        with self.assertRaises(ValueError):
+            timing_info.start("D", parent="C")  # not running
+        with self.assertRaises(ValueError):
+            timing_info.start("E")  # a second root
+
+    def test_append_subtree_remove(self):
+        state = TimingInfo()
+        state.start("Process Video (in Parallel)")
+        published = publish_frame(state)
+
+        self.assertEqual({}, state.hierarchy)
+        self.assertEqual(1, len(state))
+        self.assertEqual("Aggregate Frame", published.root_label)
+        self.assertEqual(
+            ["Data Lifecycle L", "Data Lifecycle S", "Data Lifecycle T", "Merge Frame", "Transfer Merged Frame"],
+            published.hierarchy["Aggregate Frame"],
+        )
+        self.assertEqual(["Process Data L", "Transfer Data L"], published.hierarchy["Data Lifecycle L"])
+        self.assertEqual({"Aggregate Frame", "Data Lifecycle L", "Data Lifecycle S", "Data Lifecycle T",
+                          "Transfer Merged Frame"}, set(published.start_times))
+
+        # the records of many frames don't pile up in the manager's state
+        for _ in range(10):
+            publish_frame(state)
+        self.assertEqual(1, len(state))
+
+    def test_pause_restart(self):
+        timing_info = TimingInfo()
+        timing_info.start("A")
+        timing_info.pause_all()
+        self.assertEqual({"A": 1}, timing_info.counts)
+        time.sleep(0.02)
+        timing_info.restart_all()
+        timing_info.stop("A")
+        self.assertEqual({"A": 1}, timing_info.counts)
+        self.assertLess(timing_info.timings["A"], 0.015)  # the pause doesn't count
+
+    def test_view_is_cached_until_the_records_change(self):
+        timing_info = TimingInfo()
+        timing_info.start("A")
+        view = timing_info.view()
+        self.assertIs(view, timing_info.view())
+
+        timing_info.start("B", "A")
+        self.assertIsNot(view, timing_info.view())
+        self.assertEqual({"A": ["B"]}, timing_info.hierarchy)
+        self.assertEqual(["B"], timing_info.children("A"))
+        timing_info.stop("B")
+        self.assertEqual({"B": 1}, timing_info.counts)
+        timing_info.remove_recursive("B")
+        self.assertEqual({}, timing_info.hierarchy)
+
+    def test_resume(self):
+        timing_info = TimingInfo()
+        timing_info.start("A")
+        timing_info.start("B", "A")
+        timing_info.stop("A")  # stops B too
+        self.assertEqual({"A": 1, "B": 1}, timing_info.counts)
+
+        timing_info.resume("A", 1.0)
+        timing_info.resume("B", 0.5)
+        self.assertEqual({}, timing_info.counts)
+        self.assertAlmostEqual(1.0, time.time() - timing_info.start_times["A"], delta=0.05)
+        self.assertAlmostEqual(0.5, time.time() - timing_info.start_times["B"], delta=0.05)
+        timing_info.stop("A")
+        self.assertEqual({"A": 1, "B": 1}, timing_info.counts)
+
+    def test_pickle(self):
+        state = TimingInfo()
+        state.start("Process Video (in Parallel)")
+        published = publish_frame(state)
+        restored = pickle.loads(pickle.dumps(published))
+        for view in ("root_label", "hierarchy", "timings", "counts", "start_times"):
+            self.assertEqual(getattr(published, view), getattr(restored, view))
+        restored.stop("Aggregate Frame")  # the running spans keep running
+        self.assertEqual({}, restored.start_times)
+
+    @benchmark
+    def test_benchmark(self):
+        frame_count = 2000
+        state = TimingInfo()
+        state.start("Process Video (in Parallel)")
+        publish_frame(state)
+
+        start_time = time.perf_counter()
+        for _ in range(frame_count):
+            published = publish_frame(state)
+        duration = (time.perf_counter() - start_time) * 1e6 / frame_count
+
+        print(f"\nManager timings of a fused frame ({len(PIPELINES)} pipelines), {frame_count} frames:")
+        print(f"{'records':>8} {'pickled (bytes)':>16} {'per frame (us)':>15}")
+        print("-" * 41)
+        print(f"{len(published.records) // RECORD_SIZE:>8} {len(pickle.dumps(published)):>16} {duration:>15.1f}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from processes.video_prefetcher import VideoPrefetcher
+
+FRAME_COUNT = 40
+WIDTH, HEIGHT = 320, 240
+
+
+class TestVideoPrefetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.video_dir = tempfile.TemporaryDirectory()
+        cls.video_path = os.path.join(cls.video_dir.name, "prefetch.avi")
+        writer = cv2.VideoWriter(cls.video_path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (WIDTH, HEIGHT))
+        for index in range(FRAME_COUNT):
+            writer.write(np.full((HEIGHT, WIDTH, 3), index * 5, dtype=np.uint8))
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.video_dir.cleanup()
+
+    def read_all(self, prefetcher: VideoPrefetcher) -> list[np.ndarray]:
+        frames = []
+        while (frame := prefetcher.read()) is not None:
+            frames.append(frame)
+        return frames
+
+    def test_frames_in_order(self):
+        capture = cv2.VideoCapture(self.video_path)
+        prefetcher = VideoPrefetcher(capture, None, prefetch_count=4)
+        prefetcher.start()
+        frames = self.read_all(prefetcher)
+        prefetcher.stop()
+        capture.release()
+
+        self.assertEqual(FRAME_COUNT, len(frames))
+        brightness = [int(frame.mean()) for frame in frames]
+        self.assertEqual(sorted(brightness), brightness)
+
+    def test_resize(self):
+        capture = cv2.VideoCapture(self.video_path)
+        prefetcher = VideoPrefetcher(capture, (160, 120), prefetch_count=2)
+        prefetcher.start()
+        frames = self.read_all(prefetcher)
+        prefetcher.stop()
+        capture.release()
+
+        self.assertEqual(FRAME_COUNT, len(frames))
+        self.assertEqual((120, 160, 3), frames[0].shape)
+
+    def test_stop_while_queue_is_full(self):
+        capture = cv2.VideoCapture(self.video_path)
+        prefetcher = VideoPrefetcher(capture, None, prefetch_count=2)
+        prefetcher.start()
+        prefetcher.read()
+        time.sleep(0.1)  # the decode thread is now blocked on the full queue
+
+        start_time = time.perf_counter()
+        prefetcher.stop()
+        self.assertLess(time.perf_counter() - start_time, 1)
+        capture.release()
+
+    def test_decode_overlaps_consumer(self):
+        """A consumer busy for about as long as a decode shouldn't also wait for it, like a pipeline-bound camera."""
+        work_duration = 0.004
+
+        capture = cv2.VideoCapture(self.video_path)
+        start_time = time.perf_counter()
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            time.sleep(work_duration)
+        inline_duration = time.perf_counter() - start_time
+        capture.release()
+
+        capture = cv2.VideoCapture(self.video_path)
+        prefetcher = VideoPrefetcher(capture, None, prefetch_count=4)
+        start_time = time.perf_counter()
+        prefetcher.start()
+        while prefetcher.read() is not None:
+            time.sleep(work_duration)
+        prefetched_duration = time.perf_counter() - start_time
+        prefetcher.stop()
+        capture.release()
+
+        print(f"\nCamera loop over {FRAME_COUNT} frames with {work_duration * 1000:.0f} ms of work per frame:")
+        print(f"{'inline decode (ms)':<30} {inline_duration * 1000:>12.1f}")
+        print(f"{'VideoPrefetcher (ms)':<30} {prefetched_duration * 1000:>12.1f}")
+        self.assertLess(prefetched_duration, inline_duration * 1.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
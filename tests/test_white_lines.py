@@ -0,0 +1,93 @@
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from perception.filters.lane_detect_filter import filter_for_white_lines
+from perception.objects.line_segment import LineSegment
+from tests.benchmarking import benchmark
+from tests.filter_testing import make_road_frame
+
+
+def filter_for_white_lines_per_point(frame, line_segments, threshold=20, num_points=50):
+    """filter_for_white_lines before it was vectorized, one indexing operation per sampled point."""
+    white_lines = []
+    other_lines = []
+    for line_segment in line_segments:
+        white_points = 0
+        for x, y in line_segment.discretize(num_points):
+            x, y = int(round(x)), int(round(y))
+            if 0 <= x < frame.shape[1] and 0 <= y < frame.shape[0]:
+                if len(frame.shape) == 3:
+                    if np.all(frame[y, x] >= threshold):
+                        white_points += 1
+                elif frame[y, x] >= threshold:
+                    white_points += 1
+        if white_points / num_points > 0.5:
+            white_lines.append(line_segment)
+        else:
+            other_lines.append(line_segment)
+    return white_lines, other_lines
+
+
+def make_hough_segments(frame: np.ndarray, count: int) -> list[LineSegment]:
+    """Hough output of the lane preprocessing on `frame`, repeated up to `count` segments."""
+    edges = cv2.Canny(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 150, 250)
+    hough_lines = cv2.HoughLinesP(edges, 1, np.pi / 180, 20, np.array([]), minLineLength=20, maxLineGap=10)
+    segments = []
+    for x1, y1, x2, y2 in hough_lines.reshape(-1, 4):
+        if y1 < y2:
+            segments.append(LineSegment(x2, y2, x1, y1))
+        else:
+            segments.append(LineSegment(x1, y1, x2, y2))
+    return (segments * (count // len(segments) + 1))[:count]
+
+
+class TestFilterForWhiteLines(unittest.TestCase):
+    def test_matches_per_point_classification(self):
+        frame = make_road_frame(clutter_lines=40)
+        rng = np.random.default_rng(1)
+        # also segments partially or fully outside of the frame and degenerate ones
+        segments = make_hough_segments(frame, 300) + [
+            LineSegment(*rng.integers(-300, 1600, 4)) for _ in range(300)
+        ] + [LineSegment(100, 100, 100, 100), LineSegment(-5, -5, -1, -1)]
+
+        for frame_variant in (frame, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)):
+            for threshold, num_points in ((20, 50), (200, 50), (200, 7), (200, 1)):
+                with self.subTest(ndim=frame_variant.ndim, threshold=threshold, num_points=num_points):
+                    expected = filter_for_white_lines_per_point(frame_variant, segments, threshold, num_points)
+                    white, other = filter_for_white_lines(frame_variant, segments, threshold, num_points)
+                    self.assertEqual([id(line) for line in expected[0]], [id(line) for line in white])
+                    self.assertEqual([id(line) for line in expected[1]], [id(line) for line in other])
+
+    def test_edge_cases(self):
+        frame = make_road_frame(clutter_lines=40)
+        self.assertEqual(([], []), filter_for_white_lines(frame, []))
+        with self.assertRaises(ValueError):
+            filter_for_white_lines(frame, [LineSegment(0, 0, 10, 10)], num_points=0)
+        with self.assertRaises(ValueError):
+            filter_for_white_lines(np.zeros((10, 10, 4), dtype=np.uint8), [LineSegment(0, 0, 10, 10)])
+
+    @benchmark
+    def test_benchmark(self):
+        frame = make_road_frame(clutter_lines=40)
+
+        print("\nfilter_for_white_lines per frame (50 points per segment, 1280x720 BGR):")
+        print(f"{'Segments':<10} {'per point (ms)':>15} {'vectorized (ms)':>16} {'speedup':>9}")
+        print("-" * 53)
+        for count, attempts in ((10, 200), (100, 50), (1000, 5)):
+            segments = make_hough_segments(frame, count)
+            durations = {}
+            for label, function in (("per_point", filter_for_white_lines_per_point),
+                                    ("vectorized", filter_for_white_lines)):
+                start_time = time.perf_counter()
+                for _ in range(attempts):
+                    function(frame, segments, 200)
+                durations[label] = (time.perf_counter() - start_time) * 1000 / attempts
+            print(f"{count:<10} {durations['per_point']:>15.3f} {durations['vectorized']:>16.3f} "
+                  f"{durations['per_point'] / durations['vectorized']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    unittest.main()